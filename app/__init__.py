@@ -1,63 +1,174 @@
-# App package
+"""
+Performance Reporting application package.
+Importing the package is cheap: blueprints, extensions and Sentry are only
+loaded when an app is created. create_app() builds a new app (tests pass
+their own config), while get_app() and the module attribute ``app`` (what
+gunicorn's ``app:app`` and ``flask run`` resolve) construct the
+process-wide instance once, on first use.
+"""
 import os
-import sys
-import importlib.util
-from flask import Flask
-from flask_assets import Environment, Bundle
-from app.routes.home import home_bp
-from app.routes.auth import auth_bp
-from app.routes.settings import settings_bp
-import logging
-from app.utils.sentry_utils import init_sentry
-
-# This tracks whether we're in the process of importing the app
-_importing_app = False
+import atexit
+import threading
+import importlib
 
-def get_app():
-    """Helper function to get the Flask app instance without causing circular imports"""
-    global _importing_app
-    
-    # If we're already in the process of importing the app, return None
-    if _importing_app:
-        logging.getLogger(__name__).warning(
-            "Circular import detected in app/__init__.py. Returning None for app."
-        )
-        return None
-    
-    # Mark that we're importing the app
-    _importing_app = True
-    
+from app.utils.startup_profile import StartupProfile
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (module, attribute) of each route blueprint, imported when an app is created
+BLUEPRINTS = (
+    ('app.routes.home', 'home_bp'),
+    ('app.routes.auth', 'auth_bp'),
+    ('app.routes.settings', 'settings_bp'),
+    ('app.routes.reports', 'reports_bp'),
+    ('app.routes.metrics', 'metrics_bp'),
+)
+
+_app = None
+_app_lock = threading.Lock()
+_process_initialized = False
+_report_enforcer_enabled = False
+
+
+def _init_process(app):
+    """
+    One-time, per-process setup: Sentry and the build-report exit hook.
+
+    Args:
+        app: The first app created in this process
+    """
+    global _process_initialized, _report_enforcer_enabled
+    if _process_initialized:
+        return
+    _process_initialized = True
+
+    from app.utils.sentry_utils import init_sentry
+    init_sentry(app)
+
+    # Enable TDD report enforcement - Never skip build reports
     try:
-        # Try to import app.py dynamically to avoid circular imports
-        spec = importlib.util.spec_from_file_location("app_module", os.path.join(os.path.dirname(os.path.dirname(__file__)), "app.py"))
-        app_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(app_module)
-        
-        # Get the app instance
-        if hasattr(app_module, "app"):
-            return app_module.app
-        elif hasattr(app_module, "create_app"):
-            return app_module.create_app()
-        else:
-            logging.getLogger(__name__).error("Could not find Flask app instance in app.py")
-            return None
-    except Exception as e:
-        logging.getLogger(__name__).error(f"Error importing app.py: {e}")
-        return None
-    finally:
-        # Reset the importing flag
-        _importing_app = False
-
-def create_app():
-    """Create and configure the Flask application."""
-    app = Flask(__name__)
-    
-    # Register blueprints
-    app.register_blueprint(home_bp)
-    app.register_blueprint(auth_bp)
-    app.register_blueprint(settings_bp)
-    
-    # ... existing code ...
-
-# Export the app instance
-app = get_app() 
\ No newline at end of file
+        from app.utils import report_enforcer
+        atexit.register(report_enforcer.enforce_report_generation)
+        _report_enforcer_enabled = True
+    except ImportError:
+        app.logger.warning("Report enforcer not available. Build reports may be skipped!")
+
+
+def _register_blueprints(app):
+    """Import and register the route blueprints."""
+    for module, attribute in BLUEPRINTS:
+        app.register_blueprint(getattr(importlib.import_module(module), attribute))
+
+
+def _register_handlers(app, profile):
+    """Template context, error pages and the startup-profile command."""
+    from flask import render_template
+    import click
+
+    # Context processor to inject build version into all templates
+    @app.context_processor
+    def inject_build_version():
+        return dict(build_version=app.config.get('BUILD_VERSION'))
+
+    @app.errorhandler(404)
+    def page_not_found(e):
+        return render_template('errors/404.html'), 404
+
+    @app.errorhandler(500)
+    def server_error(e):
+        return render_template('errors/500.html'), 500
+
+    @app.cli.command('startup-profile')
+    def startup_profile():
+        """Show how long each phase of building the app took."""
+        click.echo(profile.report())
+
+    @app.cli.command('import-profile')
+    @click.option('--top', default=8, show_default=True, help='Heaviest dependencies listed per module.')
+    def import_profile(top):
+        """Time the imports of a cold start, broken down per blueprint (-X importtime)."""
+        from app.utils.import_profile import profile_imports, format_report
+        click.echo(format_report(profile_imports(['app'] + [module for module, _ in BLUEPRINTS]), top=top))
+
+
+def create_app(config_class=None):
+    """
+    Create and configure a new Flask application.
+
+    Args:
+        config_class (optional): Configuration class. Defaults to the one selected by FLASK_ENV.
+
+    Returns:
+        Flask: The configured application
+    """
+    profile = StartupProfile()
+
+    with profile.phase('environment'):
+        # python-dotenv is only imported when there is a .env file to load
+        env_file = next((path for path in (os.path.join(os.getcwd(), '.env'), os.path.join(PROJECT_ROOT, '.env'))
+                         if os.path.isfile(path)), None)
+        if env_file:
+            from dotenv import load_dotenv
+            load_dotenv(env_file)
+
+    with profile.phase('config'):
+        from flask import Flask
+        from config import get_config
+
+        if config_class is None:
+            config_class = get_config()
+        app = Flask(__name__)
+        app.config.from_object(config_class)
+        config_class.init_app(app)
+        from app.utils.log_pipeline import init_logging
+        from app.utils.sessions import init_sessions
+        from config.integrations import init_integration_settings
+        init_logging(app)
+        init_integration_settings(app)
+        init_sessions(app)
+        app.static_folder = app.config.get('STATIC_FOLDER')
+        app.template_folder = app.config.get('TEMPLATE_FOLDER')
+
+    with profile.phase('blueprints'):
+        _register_blueprints(app)
+
+    with profile.phase('handlers'):
+        _register_handlers(app, profile)
+        from app.utils.metrics import init_metrics
+        from app.utils.server_timing import init_server_timing
+        from app.utils.debug_capture import init_debug_capture
+        init_metrics(app)
+        init_server_timing(app)
+        init_debug_capture(app)
+
+    with profile.phase('process'):
+        _init_process(app)
+    app.config['REPORT_ENFORCER_ENABLED'] = _report_enforcer_enabled
+
+    profile.finish()
+    app.extensions['startup_profile'] = profile
+    app.logger.info(profile.summary())
+    return app
+
+
+def get_app():
+    """
+    Return the process-wide application, creating it on first call.
+
+    Returns:
+        Flask: The shared application
+    """
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                _app = create_app()
+    return _app
+
+
+def __getattr__(name):
+    # ``from app import app`` and ``app:app`` build the shared app lazily
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,16 +1,81 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request, session, current_app, abort
 from functools import wraps
+from app.services.user_directory import AuthenticatedUser, get_user_directory
+from app.utils.sessions import regenerate_session
+from app.utils.server_timing import timing
 
 auth_bp = Blueprint('auth', __name__)
 
+# Roles allowed to run the admin endpoints (publishing messages, issuing bidder numbers, loading batches)
+STAFF_ROLES = ('Administrator', 'Staff')
+
+# environ key holding the current request's resolved user
+USER_ENVIRON_KEY = 'performance_reporting.current_user'
+
+def current_user():
+    """
+    The signed-in user, resolved once per request.
+
+    With USER_DIRECTORY_ENABLED the user comes from the membership views
+    through the shared user cache; otherwise from the demo sign-in in the
+    session, with the roles in DEMO_USER_ROLES.
+
+    Returns:
+        AuthenticatedUser: The user, or None when nobody active is signed in
+    """
+    if USER_ENVIRON_KEY in request.environ:
+        return request.environ[USER_ENVIRON_KEY]
+
+    user = None
+    user_id = session.get('user_id')
+    if user_id is not None:
+        if current_app.config.get('USER_DIRECTORY_ENABLED'):
+            user = get_user_directory(ttl=current_app.config.get('USER_CACHE_TTL', 60)).get(user_id)
+            if user is not None and not user.active:
+                user = None
+        else:
+            email = session.get('user_email')
+            roles = frozenset(role.lower() for role in current_app.config.get('DEMO_USER_ROLES', ()))
+            user = AuthenticatedUser(user_id, email, email, True, False, None, None, None, roles)
+    request.environ[USER_ENVIRON_KEY] = user
+    return user
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        with timing('auth'):
+            user = current_user()
+        if user is None:
+            # Unknown, unapproved or locked out users lose their session
+            if 'user_id' in session:
+                session.clear()
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
     return decorated_function
 
+def role_required(*role_names):
+    """Like login_required, and the user must also be in one of role_names."""
+    def decorator(f):
+        @wraps(f)
+        @login_required
+        def decorated_function(*args, **kwargs):
+            if not current_user().has_role(*role_names):
+                abort(403)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def staff_required(f):
+    """role_required(*STAFF_ROLES)."""
+    return role_required(*STAFF_ROLES)(f)
+
+def is_self_or_staff(user_id):
+    """Whether the signed-in user is user_id (compared case-insensitively) or staff."""
+    user = current_user()
+    if user is None:
+        return False
+    return user.has_role(*STAFF_ROLES) or str(user.UserId).strip().lower() == str(user_id).strip().lower()
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     """Handle user login."""
@@ -19,7 +84,12 @@ def login():
         password = request.form.get('password')
         
         # TODO: Implement proper authentication
-        if email == "demo@example.com" and password == "demo123":
+        if current_app.config.get('USER_DIRECTORY_ENABLED'):
+            # The demo user has no membership record to resolve
+            flash('Demo sign-in is not available while USER_DIRECTORY_ENABLED is set', 'error')
+        elif email == "demo@example.com" and password == "demo123":
+            # Never authenticate a session id that existed before the sign-in
+            regenerate_session()
             session['user_id'] = 1
             session['user_email'] = email
             return redirect(url_for('home.dashboard'))
@@ -31,5 +101,9 @@ def login():
 @auth_bp.route('/logout')
 def logout():
     """Handle user logout."""
+    user_id = session.get('user_id')
+    if user_id is not None and current_app.config.get('USER_DIRECTORY_ENABLED'):
+        # The next sign-in reads the user's current roles
+        get_user_directory(ttl=current_app.config.get('USER_CACHE_TTL', 60)).invalidate_users([user_id])
     session.clear()
     return redirect(url_for('auth.login')) 
\ No newline at end of file
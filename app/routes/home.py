@@ -1,8 +1,7 @@
 from flask import Blueprint, render_template, current_app, redirect, url_for, session, jsonify
-import os
-import sentry_sdk
 from app.utils.sentry_utils import capture_message, capture_exception
 from app.routes.auth import login_required
+from config.integrations import integration_settings
 
 # Create blueprint
 home_bp = Blueprint('home', __name__)
@@ -23,7 +22,7 @@ def dashboard():
 @home_bp.route('/debug-sentry')
 def test_sentry():
     """Test endpoint for Sentry integration"""
-    sentry_dsn = os.getenv('SENTRY_DSN')
+    sentry_dsn = integration_settings().sentry.dsn
     if not sentry_dsn:
         return "Sentry not configured. Set SENTRY_DSN environment variable to enable error tracking."
     
@@ -35,8 +34,9 @@ def test_sentry():
 @home_bp.route('/debug-appinsights')
 def test_appinsights():
     """Test endpoint for Azure Application Insights integration"""
-    app_id = os.getenv('APP_INSIGHTS_APPLICATION_ID')
-    api_key = os.getenv('APP_INSIGHTS_API_KEY')
+    app_insights = integration_settings().app_insights
+    app_id = app_insights.application_id
+    api_key = app_insights.api_key
     
     if not app_id or not api_key:
         return "App Insights not properly configured. Check APP_INSIGHTS_APPLICATION_ID and APP_INSIGHTS_API_KEY environment variables."
@@ -53,7 +53,7 @@ def test_appinsights():
 @home_bp.route('/debug-sentry-error')
 def trigger_error():
     """Trigger a test error for Sentry"""
-    sentry_dsn = os.getenv('SENTRY_DSN')
+    sentry_dsn = integration_settings().sentry.dsn
     if not sentry_dsn:
         return "Sentry not configured. Set SENTRY_DSN environment variable to enable error tracking."
     
@@ -0,0 +1,21 @@
+from flask import Blueprint, Response, current_app, jsonify, request
+import hmac
+from app.utils.metrics import metrics_enabled, render_metrics
+
+# Create blueprint
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint, protected by METRICS_TOKEN (required when METRICS_REQUIRE_TOKEN is set)."""
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token and current_app.config.get('METRICS_REQUIRE_TOKEN'):
+        return jsonify({'success': False, 'error': 'Metrics require METRICS_TOKEN to be configured'}), 403
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    if not metrics_enabled():
+        return jsonify({'success': False, 'error': 'Metrics are not enabled'}), 503
+
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
@@ -0,0 +1,712 @@
+import os
+import datetime
+import json
+import click
+import uuid
+from flask import Blueprint, jsonify, request, current_app, session
+from werkzeug.utils import secure_filename
+from flask_executor import Executor
+from app.routes.auth import login_required, staff_required, current_user, is_self_or_staff
+from app.services.db import TaxsaleSource
+from app.services.reporting_store import ReportingStore
+from app.services.replication import ReplicationPipeline, replication_lag, DEFAULT_BATCH_SIZE
+from app.services.auction_analytics import AuctionResultsAnalytics
+from app.services.bid_throughput import BidThroughputEngine, DEFAULT_WINDOW
+from app.services.reconciliation import ReconciliationEngine, FLAGS, save_result, load_result
+from app.services.activity_rollup import ActivityRollup
+from app.services.message_index import UnreadMessageIndex
+from app.services.bidder_numbers import BidderNumberService
+from app.services.county_snapshot import get_county_snapshot, bump_county_snapshot
+from app.services.bid_exposure import BidExposure, DEFAULT_NEAR_THRESHOLD
+from app.services.saved_search import SavedSearchEngine, SearchCompileError, DEFAULT_PAGE_SIZE
+from app.services.property_search import PropertySearchIndex, NUMERIC_FACETS
+from app.services.county_import import CountyImporter, ImportValidationError
+from app.services.schema_catalog import get_catalog
+from app.services.queue_simulator import (QueueLoadSimulator, DEFAULT_LOOKBACK, DEFAULT_REQUESTS_PER_BID, curve_path,
+                                          save_curve, load_curve)
+from app.services.batch_ingest import BatchIngestor
+
+# Create blueprint
+reports_bp = Blueprint('reports', __name__, url_prefix='/reports')
+
+
+def get_service(name, factory):
+    """
+    Return the app-wide instance of a reporting service, creating it on first use.
+
+    Args:
+        name (str): Key the service is stored under
+        factory (callable): Builds the service when it does not exist yet
+    """
+    services = current_app.extensions.setdefault('reporting_services', {})
+    if name not in services:
+        services[name] = factory()
+    return services[name]
+
+
+def get_reporting_store():
+    """Return the app-wide local reporting replica."""
+    return get_service('reporting_store', lambda: ReportingStore(current_app.config['REPORTING_STORE_DIR']))
+
+
+def reporting_source():
+    """Source reports read from: the local replica when enabled, otherwise the live database."""
+    if current_app.config.get('REPORTING_USE_REPLICA'):
+        return get_reporting_store()
+    return TaxsaleSource()
+
+
+def get_activity_rollup():
+    """Return the app-wide activity rollup, brought up to date with the log."""
+    rollup = get_service('activity_rollup', lambda: ActivityRollup(
+        source=reporting_source(),
+        state_path=os.path.join(current_app.config['REPORTING_STORE_DIR'], 'activity_rollup.npz'),
+        update_interval=current_app.config.get('REPORTING_UPDATE_INTERVAL', 30)))
+    rollup.update()
+    return rollup
+
+
+def get_bid_exposure():
+    """Return the app-wide bid exposure, brought up to date with new bids and budgets."""
+    exposure = get_service('bid_exposure', lambda: BidExposure(
+        source=reporting_source(),
+        state_path=os.path.join(current_app.config['REPORTING_STORE_DIR'], 'bid_exposure.npz'),
+        update_interval=current_app.config.get('REPORTING_UPDATE_INTERVAL', 30)))
+    exposure.update()
+    return exposure
+
+
+def get_message_index():
+    """Return the app-wide unread message index, refreshed from the live database."""
+    # Reads must be visible immediately, so the index does not use the replica
+    index = get_service('message_index', lambda: UnreadMessageIndex(source=TaxsaleSource()))
+    index.refresh()
+    return index
+
+
+def get_bidder_numbers():
+    """Return the app-wide bidder number index (writes go to the live database)."""
+    return get_service('bidder_numbers', lambda: BidderNumberService(source=TaxsaleSource()))
+
+
+def county_snapshot():
+    """Return the process-wide snapshot of vg_CountyInfo, vg_Dates and vg_AuctionConfiguration."""
+    return get_county_snapshot(ttl=current_app.config.get('COUNTY_SNAPSHOT_TTL', 300))
+
+
+def get_batch_ingestor():
+    """Return the app-wide bid batch ingestor and its background workers."""
+    return get_service('batch_ingestor', lambda: BatchIngestor(
+        source=TaxsaleSource(),
+        progress_dir=os.path.join(current_app.config['REPORTING_STORE_DIR'], 'batch_progress'),
+        executor=Executor(current_app._get_current_object(), name='batch_ingest')))
+
+
+def get_schema_catalog(rebuild=False):
+    """Return the schema catalog, loaded from its JSON cache when the sql/ scripts are unchanged."""
+    return get_catalog(cache_path=current_app.config.get('SCHEMA_CATALOG_PATH'), rebuild=rebuild)
+
+
+def get_property_index():
+    """Return the app-wide property search index."""
+    return get_service('property_search', lambda: PropertySearchIndex(
+        os.path.join(current_app.config['REPORTING_STORE_DIR'], 'property_search.db')))
+
+
+@reports_bp.route('/api/auction-results/<int:product_id>')
+@login_required
+def auction_results(product_id):
+    """Per-county and per-queue auction results report."""
+    refresh = request.args.get('refresh') == '1'
+    try:
+        analytics = get_service('auction_analytics', lambda: AuctionResultsAnalytics(source=reporting_source()))
+        report = analytics.report(product_id, refresh=refresh)
+    except Exception as e:
+        current_app.logger.error(f"Error building auction results report for product {product_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'report': report})
+
+
+@reports_bp.route('/api/bid-throughput')
+@login_required
+def bid_throughput():
+    """Bids per second/minute by product and bid source, with peak windows."""
+    product_id = request.args.get('product_id', type=int)
+    window = request.args.get('window', DEFAULT_WINDOW, type=int)
+    resolution = request.args.get('resolution', type=int)
+    try:
+        engine = get_service('bid_throughput', lambda: BidThroughputEngine(
+            source=reporting_source(),
+            state_path=os.path.join(current_app.config['REPORTING_STORE_DIR'], 'bid_throughput.npz'),
+            update_interval=current_app.config.get('REPORTING_UPDATE_INTERVAL', 30)))
+        new_bids = engine.update()
+        report = engine.report(product_id=product_id, window=max(window, 1))
+        if resolution:
+            report['timeline'] = engine.timeline(product_id=product_id,
+                                                 bid_source=request.args.get('bid_source'),
+                                                 resolution=resolution)
+    except Exception as e:
+        current_app.logger.error(f"Error building bid throughput report: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'new_bids': new_bids, 'report': report})
+
+
+def reconciliation_dir():
+    """Directory the reconcile command saves its results in."""
+    return os.path.join(current_app.config['REPORTING_STORE_DIR'], 'reconciliation')
+
+
+@reports_bp.route('/api/payments/reconciliation/<int:product_id>')
+@staff_required
+def payment_reconciliation(product_id):
+    """The last saved reconciliation of one county's payment transactions."""
+    try:
+        result = load_result(reconciliation_dir(), product_id=product_id)
+    except Exception as e:
+        current_app.logger.error(f"Error reading reconciliation for product {product_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    if result is None:
+        return jsonify({'success': False,
+                        'error': f"Product {product_id} has not been reconciled; run 'flask reports reconcile "
+                                 f"--product-id {product_id}'"}), 404
+    return jsonify({'success': True, 'reconciliation': result})
+
+
+def _date_range():
+    """
+    The start and end query parameters as dates.
+
+    Raises:
+        ValueError: When either is not an ISO date
+    """
+    return tuple(datetime.date.fromisoformat(value) if value else None
+                 for value in (request.args.get('start'), request.args.get('end')))
+
+
+@reports_bp.route('/api/activity/users/<user_id>')
+@login_required
+def user_activity(user_id):
+    """One user's activity per day, served from the rollup; users may only see their own."""
+    if not is_self_or_staff(user_id):
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    try:
+        start, end = _date_range()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'start and end must be YYYY-MM-DD dates'}), 400
+
+    try:
+        report = get_activity_rollup().user_activity(user_id, start=start, end=end)
+    except Exception as e:
+        current_app.logger.error(f"Error building activity report for user {user_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'report': report})
+
+
+@reports_bp.route('/api/activity/daily')
+@staff_required
+def daily_activity():
+    """Activity counts and active users per day, served from the rollup."""
+    activities = request.args.get('activities')
+    try:
+        start, end = _date_range()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'start and end must be YYYY-MM-DD dates'}), 400
+
+    try:
+        report = get_activity_rollup().daily_summary(
+            start=start, end=end, activity_names=activities.split(',') if activities else None)
+    except Exception as e:
+        current_app.logger.error(f"Error building daily activity report: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'days': report})
+
+
+@reports_bp.route('/api/activity/funnel')
+@staff_required
+def activity_funnel():
+    """Users progressing through a comma-separated list of activities."""
+    steps = [step for step in request.args.get('steps', '').split(',') if step]
+    if not steps:
+        return jsonify({'success': False, 'error': 'At least one funnel step is required'}), 400
+    try:
+        start, end = _date_range()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'start and end must be YYYY-MM-DD dates'}), 400
+
+    try:
+        funnel = get_activity_rollup().funnel(steps, start=start, end=end)
+    except Exception as e:
+        current_app.logger.error(f"Error building activity funnel: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'funnel': funnel})
+
+
+@reports_bp.route('/api/saved-searches/<int:search_id>')
+@login_required
+def run_saved_search(search_id):
+    """One page of a saved property search."""
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int)
+    include_total = request.args.get('total') == '1'
+    try:
+        # County certificate tables are not replicated, so searches run on the live database
+        engine = get_service('saved_search', lambda: SavedSearchEngine(source=TaxsaleSource()))
+        if request.args.get('refresh') == '1':
+            engine.invalidate(search_id)
+        result = engine.run(search_id, page=page, page_size=page_size, include_total=include_total)
+    except SearchCompileError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error running saved search {search_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'search': result})
+
+
+@reports_bp.route('/api/properties/search')
+@login_required
+def property_search():
+    """Prefix/fuzzy property search with numeric facets, e.g. ?q=smith&just_value_min=50000."""
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = min(max(request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int), 1), 500)
+    ranges = {}
+    for facet in NUMERIC_FACETS:
+        low = request.args.get(f"{facet}_min", type=float)
+        high = request.args.get(f"{facet}_max", type=float)
+        if low is not None or high is not None:
+            ranges[facet] = (low, high)
+    try:
+        # Read-only: the index-properties command keeps it current
+        result = get_property_index().search(
+            text=request.args.get('q'), product_id=request.args.get('product_id', type=int), ranges=ranges,
+            fuzzy=request.args.get('fuzzy') == '1', limit=page_size, offset=(page - 1) * page_size)
+    except Exception as e:
+        current_app.logger.error(f"Error searching properties: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'page': page, 'page_size': page_size, 'results': result})
+
+
+def get_queue_simulator():
+    """Return the app-wide queue load simulator."""
+    # Queue configuration is not replicated; the bid history is read from the reporting source
+    return get_service('queue_simulator', lambda: QueueLoadSimulator(
+        source=TaxsaleSource(), history_source=reporting_source()))
+
+
+@reports_bp.route('/api/queues/<int:auction_id>/load-forecast')
+@staff_required
+def queue_load_forecast(auction_id):
+    """Expected bids and requests per second for every minute of an auction's queue closings."""
+    history = request.args.get('history_products')
+    lookback = max(request.args.get('lookback', DEFAULT_LOOKBACK, type=int), 1)
+    requests_per_bid = request.args.get('requests_per_bid', DEFAULT_REQUESTS_PER_BID, type=float)
+    try:
+        history_product_ids = [int(p) for p in history.split(',')] if history else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'history_products must be comma-separated product ids'}), 400
+
+    curve = None
+    if not history_product_ids:
+        # Every county's history is too much to read in a request; it is learned offline
+        curve = load_curve(curve_path(current_app.config['REPORTING_STORE_DIR'], lookback))
+        if curve is None:
+            return jsonify({'success': False,
+                            'error': f"Pass history_products, or run 'flask reports learn-arrival-curve "
+                                     f"--lookback {lookback}' first"}), 400
+
+    try:
+        forecast = get_queue_simulator().simulate(auction_id, history_product_ids=history_product_ids, curve=curve,
+                                                  lookback=lookback, requests_per_bid=requests_per_bid)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except Exception as e:
+        current_app.logger.error(f"Error forecasting queue load for auction {auction_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'forecast': forecast})
+
+
+@reports_bp.route('/api/bid-exposure')
+@staff_required
+def bid_exposure():
+    """Bidders over (status=over) or close to (status=near) their budget."""
+    status = request.args.get('status', 'over')
+    if status not in ('over', 'near'):
+        return jsonify({'success': False, 'error': f"Unknown status: {status}"}), 400
+    product_id = request.args.get('product_id', type=int)
+    threshold = request.args.get('threshold', DEFAULT_NEAR_THRESHOLD, type=float)
+
+    try:
+        exposure = get_bid_exposure()
+        if status == 'over':
+            bidders = exposure.over_budget(product_id=product_id)
+        else:
+            bidders = exposure.near_budget(threshold=threshold, product_id=product_id)
+    except Exception as e:
+        current_app.logger.error(f"Error building bid exposure report: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'status': status, 'bidders': bidders})
+
+
+@reports_bp.route('/api/bid-exposure/users/<user_id>')
+@login_required
+def user_bid_exposure(user_id):
+    """One bidder's committed amount and budget in every county; bidders may only see their own."""
+    if not is_self_or_staff(user_id):
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    try:
+        exposure = get_bid_exposure().user_exposure(user_id)
+    except Exception as e:
+        current_app.logger.error(f"Error building bid exposure for user {user_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'exposure': exposure})
+
+
+@reports_bp.route('/api/messages/unread')
+@login_required
+def unread_messages():
+    """The signed-in user's unread badge counts per county, or their unread MessageIds of one county."""
+    product_id = request.args.get('product_id', type=int)
+    user_id = current_user().UserId
+    try:
+        index = get_message_index()
+        if product_id is None:
+            counts = index.unread_counts(user_id)
+            return jsonify({'success': True, 'unread': sum(counts.values()),
+                            'counties': {str(product): count for product, count in counts.items()}})
+        message_ids = index.unread_messages(user_id, product_id)
+    except Exception as e:
+        current_app.logger.error(f"Error counting unread messages for user {user_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'unread': len(message_ids), 'message_ids': message_ids})
+
+
+@reports_bp.route('/api/messages', methods=['POST'])
+@staff_required
+def post_message():
+    """Publish a county message."""
+    data = request.get_json() or {}
+    if not data.get('product_id') or not data.get('message'):
+        return jsonify({'success': False, 'error': 'product_id and message are required'}), 400
+
+    try:
+        expiration_date = data.get('expiration_date')
+        message_id = get_message_index().post_message(
+            int(data['product_id']), data['message'][:250],
+            datetime.datetime.fromisoformat(expiration_date) if expiration_date else None)
+    except Exception as e:
+        current_app.logger.error(f"Error posting message: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'message_id': message_id})
+
+
+@reports_bp.route('/api/messages/<int:message_id>/read', methods=['POST'])
+@login_required
+def read_message(message_id):
+    """Mark a message read for the signed-in user."""
+    user_id = current_user().UserId
+    try:
+        if not get_message_index().record_read(user_id, message_id):
+            return jsonify({'success': False, 'error': f"Message {message_id} is not live"}), 404
+    except Exception as e:
+        current_app.logger.error(f"Error marking message {message_id} read: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True})
+
+
+@reports_bp.route('/api/bidder-numbers/<int:product_id>/users/<user_id>')
+@login_required
+def bidder_number(product_id, user_id):
+    """A user's bidder number in a county, served from memory."""
+    if not is_self_or_staff(user_id):
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    try:
+        service = get_bidder_numbers()
+        number = service.lookup(user_id, product_id)
+        pending = number is None and service.is_pending(user_id, product_id)
+    except Exception as e:
+        current_app.logger.error(f"Error looking up bidder number for user {user_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'bidder_number': number, 'pending': pending})
+
+
+@reports_bp.route('/api/bidder-numbers/<int:product_id>/allocate', methods=['POST'])
+@staff_required
+def allocate_bidder_numbers(product_id):
+    """Issue bidder numbers to a county's pending requests, or to the posted user_ids."""
+    user_ids = (request.get_json(silent=True) or {}).get('user_ids')
+    try:
+        allocated = get_bidder_numbers().allocate(product_id, user_ids=user_ids)
+    except Exception as e:
+        current_app.logger.error(f"Error allocating bidder numbers for product {product_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'allocated': allocated})
+
+
+@reports_bp.route('/api/bidder-numbers/pending', methods=['DELETE'])
+@staff_required
+def purge_pending_bidder_numbers():
+    """Delete pending bidder number requests, optionally for one county or set of users."""
+    data = request.get_json(silent=True) or {}
+    try:
+        deleted = get_bidder_numbers().purge_pending(
+            product_id=request.args.get('product_id', type=int), user_ids=data.get('user_ids'))
+    except Exception as e:
+        current_app.logger.error(f"Error purging pending bidder numbers: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'deleted': deleted})
+
+
+@reports_bp.route('/api/counties')
+@login_required
+def counties():
+    """Enabled counties with their sale dates, served from the county snapshot."""
+    try:
+        snapshot = county_snapshot()
+        result = [{
+            'county': county._asdict(),
+            'dates': snapshot.sale_dates(county.VGProductID)._asdict()
+            if snapshot.sale_dates(county.VGProductID) else None,
+        } for county in snapshot.enabled_counties()]
+    except Exception as e:
+        current_app.logger.error(f"Error reading county snapshot: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'version': snapshot.version, 'counties': result})
+
+
+@reports_bp.route('/api/counties/<int:product_id>')
+@login_required
+def county_detail(product_id):
+    """One county's metadata, sale dates and auction configurations."""
+    try:
+        snapshot = county_snapshot()
+        county = snapshot.county(product_id)
+        if county is None:
+            return jsonify({'success': False, 'error': f"Unknown product {product_id}"}), 404
+        dates = snapshot.sale_dates(product_id)
+        auctions = [auction._asdict() for auction in snapshot.auctions_for(product_id)]
+    except Exception as e:
+        current_app.logger.error(f"Error reading county {product_id} from the snapshot: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'county': county._asdict(), 'dates': dates._asdict() if dates else None,
+                    'auctions': auctions})
+
+
+@reports_bp.route('/api/counties/refresh', methods=['POST'])
+@staff_required
+def refresh_counties():
+    """
+    Bump the snapshot version so the next request reloads the county tables.
+
+    The snapshot is cached per process: only the worker that answers this
+    request reloads at once. The others pick up the change when their
+    snapshot expires, within COUNTY_SNAPSHOT_TTL seconds.
+    """
+    ttl = current_app.config.get('COUNTY_SNAPSHOT_TTL', 300)
+    return jsonify({'success': True, 'version': bump_county_snapshot(), 'scope': 'worker',
+                    'other_workers_within_seconds': ttl})
+
+
+@reports_bp.route('/api/batches', methods=['POST'])
+@staff_required
+def upload_batch():
+    """Accept a bid workbook and load it into vg_BatchCerts in the background."""
+    upload = request.files.get('file')
+    product_id = request.form.get('product_id', type=int)
+    if upload is None or not upload.filename or product_id is None:
+        return jsonify({'success': False, 'error': 'file and product_id are required'}), 400
+    file_name = secure_filename(upload.filename)
+    if not file_name.lower().endswith(('.xlsx', '.xlsm', '.csv')):
+        return jsonify({'success': False, 'error': 'Upload an .xlsx or .csv workbook'}), 400
+
+    try:
+        upload_dir = os.path.join(current_app.config['REPORTING_STORE_DIR'], 'batch_uploads')
+        os.makedirs(upload_dir, exist_ok=True)
+        path = os.path.join(upload_dir, f"{uuid.uuid4().hex}_{file_name}")
+        upload.save(path)
+        batch_id = get_batch_ingestor().submit(
+            path, product_id, user_name=session.get('user_email'), description=request.form.get('description'),
+            file_name=file_name)
+    except Exception as e:
+        current_app.logger.error(f"Error submitting bid batch {file_name}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'batch_id': batch_id}), 202
+
+
+@reports_bp.route('/api/batches/<int:batch_id>')
+@login_required
+def batch_progress(batch_id):
+    """Progress of a submitted bid batch."""
+    progress = get_batch_ingestor().progress(batch_id)
+    if progress is None:
+        return jsonify({'success': False, 'error': f"Unknown batch {batch_id}"}), 404
+    return jsonify({'success': True, 'progress': progress})
+
+
+@reports_bp.route('/api/replication/status')
+@login_required
+def replication_status():
+    """Lag metrics for the local reporting replica."""
+    include_source = request.args.get('live') == '1'
+    try:
+        metrics = replication_lag(get_reporting_store(), source=TaxsaleSource() if include_source else None)
+    except Exception as e:
+        current_app.logger.error(f"Error reading replication status: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'use_replica': bool(current_app.config.get('REPORTING_USE_REPLICA')),
+                    'tables': metrics})
+
+
+@reports_bp.cli.command('reconcile')
+@click.option('--product-id', type=int, default=None, help='Only reconcile this VGProductID.')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='Write the full result as JSON to this file.')
+def reconcile(product_id, output):
+    """Reconcile payment transactions for the whole season."""
+    # InvoiceKey ranges are full scans against the live database
+    if not current_app.config.get('REPORTING_USE_REPLICA'):
+        raise click.ClickException("Reconciliation reads from the reporting replica; set REPORTING_USE_REPLICA "
+                                   "and run 'flask reports replicate' first")
+    result = ReconciliationEngine(source=get_reporting_store()).reconcile(product_id=product_id)
+    save_result(result, reconciliation_dir())
+    if output:
+        with open(output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    click.echo(f"Reconciled in {result['duration_seconds']}s over {result['chunks']} chunks")
+    for product, totals in result['summary'].items():
+        flags = ', '.join(f"{flag}={totals[flag]}" for flag in FLAGS)
+        click.echo(f"Product {product}: {totals['transactions']} transactions, {flags}")
+
+
+@reports_bp.cli.command('learn-arrival-curve')
+@click.option('--lookback', default=DEFAULT_LOOKBACK, show_default=True, help='Minutes before a close covered.')
+def learn_arrival_curve(lookback):
+    """Learn the bid arrival curve from every county's history for the load forecast."""
+    curve = get_queue_simulator().arrival_curve(lookback=max(lookback, 1))
+    path = curve_path(current_app.config['REPORTING_STORE_DIR'], max(lookback, 1))
+    save_curve(curve, path)
+    click.echo(f"Saved a {len(curve)}-minute arrival curve to {path}")
+
+
+@reports_bp.cli.command('replicate')
+@click.option('--follow', is_flag=True, help='Keep tailing the database after the first pass.')
+@click.option('--interval', default=5.0, show_default=True, help='Seconds to wait when there is nothing new.')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, help='Identity range copied per batch.')
+def replicate(follow, interval, batch_size):
+    """Copy new Taxsale rows into the local reporting store."""
+    pipeline = ReplicationPipeline(get_reporting_store(), batch_size=batch_size)
+    if follow:
+        pipeline.run_forever(interval=interval)
+        return
+
+    for result in pipeline.sync():
+        if 'error' in result:
+            click.echo(f"{result['table']}: ERROR {result['error']}")
+        else:
+            click.echo(f"{result['table']}: copied {result['rows_copied']} rows, "
+                       f"high-water {result['high_water']} of {result['source_high_water']}")
+
+
+@reports_bp.cli.command('purge-pending-bidders')
+@click.option('--product-id', type=int, default=None, help='Only purge this VGProductID.')
+def purge_pending_bidders(product_id):
+    """Delete bidder number requests that were never issued a number."""
+    deleted = BidderNumberService().purge_pending(product_id=product_id)
+    click.echo(f"Deleted {deleted} pending bidder number requests")
+
+
+@reports_bp.cli.command('index-properties')
+@click.option('--product-id', type=int, default=None, help='Reindex only this VGProductID.')
+@click.option('--follow', is_flag=True, help='Keep reindexing counties as new imports are recorded.')
+@click.option('--interval', default=60, show_default=True, help='Seconds between vg_DTSImport checks.')
+def index_properties(product_id, follow, interval):
+    """Bring the property search index up to date with vg_DTSImport."""
+    index = get_property_index()
+    if follow:
+        index.refresh_interval = interval
+        index.run_forever()
+        return
+    if product_id is not None:
+        click.echo(f"Product {product_id}: indexed {index.reindex(product_id)} properties")
+        return
+
+    reindexed = index.refresh(force=True)
+    click.echo(f"Reindexed {len(reindexed)} counties")
+    for county in index.status():
+        click.echo(f"Product {county['product_id']}: {county['row_count']} properties, "
+                   f"import {county['import_id']} indexed {county['indexed_at']}")
+
+
+@reports_bp.cli.command('import-county')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--product-id', type=int, required=True, help='VGProductID of the county.')
+@click.option('--table', default=None, help='Target table. Defaults to the county\'s TaxCertTableName.')
+@click.option('--fixed-width', is_flag=True, help='Fields are fixed width, sized from the table DDL.')
+@click.option('--delimiter', default='|', show_default=True, help='Field separator of delimited files.')
+@click.option('--header', is_flag=True, help='Skip the first line of the file.')
+@click.option('--workers', type=int, default=None, help='Parser processes. Defaults to the CPU count.')
+def import_county(path, product_id, table, fixed_width, delimiter, header, workers):
+    """Bulk-load a county certificate file and record it in vg_DTSImport."""
+    get_schema_catalog()
+    importer = CountyImporter(workers=workers)
+    try:
+        result = importer.load(path, product_id, table=table, file_format='fixed' if fixed_width else 'delimited',
+                               delimiter=delimiter, has_header=header)
+    except ImportValidationError as e:
+        click.echo(f"Import abandoned: {e}")
+        for line, message in e.errors[:20]:
+            click.echo(f"  line {line}: {message}")
+        raise SystemExit(1)
+
+    click.echo(f"Loaded {result['rows_loaded']} rows into {result['table']} in {result['duration_seconds']}s "
+               f"({result['rows_rejected']} rejected), import {result['import_id']}")
+    for error in result['errors'][:20]:
+        click.echo(f"  line {error['line']}: {error['error']}")
+
+
+@reports_bp.cli.command('schema')
+@click.argument('name', required=False)
+@click.option('--rebuild', is_flag=True, help='Re-parse the sql/ scripts even if the cache is current.')
+def schema(name, rebuild):
+    """Summarize the schema catalog, or describe one table or view."""
+    catalog = get_schema_catalog(rebuild=rebuild)
+    if not name:
+        click.echo(f"{len(catalog.table_names)} tables, {len(catalog.view_names)} views "
+                   f"(fingerprint {catalog.fingerprint[:12]})")
+        return
+
+    if not catalog.has_table(name):
+        view = catalog.view(name)
+        click.echo(f"View {view['name']} over {', '.join(view['references'])}")
+        click.echo(f"  columns: {', '.join(view['columns'])}")
+        return
+
+    table = catalog.table(name)
+    click.echo(f"Table {table['name']} (primary key: {', '.join(table['primary_key']) or 'none'})")
+    for column in catalog.columns(name):
+        size = f"({column.length}{f', {column.scale}' if column.scale else ''})" if column.length else ''
+        flags = ' '.join(flag for flag, on in (('IDENTITY', column.identity), ('NOT NULL', not column.nullable)) if on)
+        default = f" DEFAULT {column.default}" if column.default else ''
+        click.echo(f"  {column.name} {column.type}{size} {flags}{default}".rstrip())
+    for key in catalog.foreign_keys(name):
+        click.echo(f"  FK {', '.join(key['columns'])} -> {key['ref_table']} ({', '.join(key['ref_columns'])})")
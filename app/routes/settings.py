@@ -1,12 +1,18 @@
-from flask import Blueprint, render_template, jsonify, request, current_app, Response
-from app.routes.auth import login_required
-import requests
-import os
+from flask import Blueprint, render_template, jsonify, request, current_app, Response, session
+from app.routes.auth import login_required, staff_required
+from app.utils.lazy_import import lazy_import
+from app.utils.metrics import track_upstream
+from app.utils.server_timing import timing
+from app.utils.debug_capture import capture, capture_enabled, environment_summary, mask_secret, SESSION_KEY
+from config.integrations import integration_settings
 import json
 import uuid
 import time
 import datetime
 
+# Only loaded when a Grafana / App Insights / OpenAI request is actually made
+requests = lazy_import('requests')
+
 # Create blueprint
 settings_bp = Blueprint('settings', __name__, url_prefix='/settings')
 
@@ -14,28 +20,30 @@ settings_bp = Blueprint('settings', __name__, url_prefix='/settings')
 @login_required
 def general():
     """General settings page route."""
+    settings = integration_settings()
+    
     # Get App Insights credentials for display in the template
-    app_insights_url = os.getenv('AZURE_APP_INSIGHTS_URL', '')
-    app_insights_api_key = os.getenv('AZURE_APP_INSIGHTS_API_KEY', '')
+    app_insights_url = settings.app_insights.url
+    app_insights_api_key = settings.app_insights.azure_api_key
     # Mask the API key for security
     app_insights_api_key_masked = "•" * len(app_insights_api_key) if app_insights_api_key else ''
     
-    # Get Grafana credentials from environment
-    grafana_url = os.getenv('GRAFANA_URL', '')
-    grafana_api_key = os.getenv('GRAFANA_API_TOKEN', '')
+    # Get Grafana credentials
+    grafana_url = settings.grafana.url
+    grafana_api_key = settings.grafana.api_token
     # Mask the API key for security
     grafana_api_key_masked = "•" * len(grafana_api_key) if grafana_api_key else ''
     
-    # Get Azure DevOps credentials from environment
-    devops_org_url = os.getenv('AZURE_DEVOPS_ORG', 'supercomputing2020')
-    devops_pat = os.getenv('AZURE_DEVOPS_PAT', '')
+    # Get Azure DevOps credentials
+    devops_org_url = settings.devops.org
+    devops_pat = settings.devops.pat
     # Mask the PAT for security
     devops_pat_masked = "•" * len(devops_pat) if devops_pat else ''
     
-    # Get OpenAI endpoint and deployment from environment, and load API key
-    openai_endpoint = os.getenv('OPENAI_API_ENDPOINT', 'https://api.openai.com/v1')
-    openai_api_key = os.getenv('OPENAI_API_KEY', '')
-    openai_deployment = os.getenv('OPENAI_DEPLOYMENT', 'gpt-3.5-turbo')
+    # Get OpenAI endpoint and deployment, and load API key
+    openai_endpoint = settings.openai.endpoint
+    openai_api_key = settings.openai.api_key
+    openai_deployment = settings.openai.deployment
     # Mask the API key for security
     openai_api_key_masked = "•" * len(openai_api_key) if openai_api_key else ''
     
@@ -59,9 +67,10 @@ def preferences():
 @login_required
 def test_appinsights_connection():
     """Test connection to Application Insights using direct API approach."""
-    # Get App Insights credentials from environment
-    app_id = os.getenv('APP_INSIGHTS_APPLICATION_ID')
-    api_key = os.getenv('APP_INSIGHTS_API_KEY')
+    # Get App Insights credentials
+    settings = integration_settings()
+    app_id = settings.app_insights.application_id
+    api_key = settings.app_insights.api_key
     
     # Log environment variable values for debugging (with masking for security)
     current_app.logger.info(f"App Insights test connection requested")
@@ -81,7 +90,7 @@ def test_appinsights_connection():
     debug_info = {
         'app_id': app_id[:4] + '...' if app_id and len(app_id) > 4 else 'Not set',
         'api_key_length': len(api_key) if api_key else 0,
-        'env_vars': {k: v[:4] + '...' if v and len(v) > 4 else v for k, v in os.environ.items() if 'APP_INSIGHTS' in k or 'AZURE' in k}
+        'env_vars': dict(settings.azure_env_masked)
     }
 
     try:
@@ -106,13 +115,15 @@ def test_appinsights_connection():
         current_app.logger.info(f"Making App Insights API request with query: {query}")
         
         # Send the request
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        with track_upstream('appinsights', 'test-connection'):
+            response = requests.get(url, headers=headers, params=params, timeout=10)
         current_app.logger.info(f"App Insights API response status: {response.status_code}")
         
         # Check response status
         if response.status_code == 200:
             try:
-                data = response.json()
+                with timing('parse'):
+                    data = response.json()
                 current_app.logger.info("Successfully parsed JSON response")
                 
                 # Format the results for display
@@ -204,7 +215,8 @@ def test_grafana_connection():
         # Get data from request
         try:
             data = request.get_json()
-            current_app.logger.info(f"Request JSON data: {data}")
+            capture('grafana.test-connection.request',
+                    lambda: {k: mask_secret(v) if k == 'api_key' else v for k, v in (data or {}).items()})
         except Exception as e:
             current_app.logger.error(f"Failed to parse JSON: {str(e)}")
             return Response(
@@ -226,11 +238,11 @@ def test_grafana_connection():
         api_key = data.get('api_key')
         
         if not url:
-            url = os.getenv('GRAFANA_URL')
+            url = integration_settings().grafana.url
             current_app.logger.info(f"No URL provided, using environment variable: {url}")
         
         if not api_key:
-            api_key = os.getenv('GRAFANA_API_TOKEN')
+            api_key = integration_settings().grafana.api_token
             current_app.logger.info(f"No API key provided, using environment variable (length: {len(api_key) if api_key else 0})")
         
         if not url:
@@ -269,12 +281,13 @@ def test_grafana_connection():
         endpoint = f"{full_url}/api/datasources"
         current_app.logger.info(f"Testing endpoint: {endpoint}")
         
-        response = requests.get(
-            endpoint,
-            headers=headers,
-            timeout=10,
-            verify=False  # Disable SSL verification for testing
-        )
+        with track_upstream('grafana', 'test-connection'):
+            response = requests.get(
+                endpoint,
+                headers=headers,
+                timeout=10,
+                verify=False  # Disable SSL verification for testing
+            )
         
         current_app.logger.info(f"Response status: {response.status_code}")
         
@@ -317,6 +330,43 @@ def test_grafana_connection():
             status=500
         )
 
+def _masked_headers(headers):
+    """Copy of request headers with the Authorization value masked."""
+    masked = headers.copy()
+    if 'Authorization' in masked:
+        scheme = masked['Authorization'].rpartition(' ')[0]
+        masked['Authorization'] = f"{scheme} ***MASKED***".strip()
+    return masked
+
+def _probe_grafana_datasources(url, api_key):
+    """Call /api/datasources directly and capture the raw response."""
+    try:
+        raw_url = url or integration_settings().grafana.url
+        raw_key = api_key or integration_settings().grafana.api_token
+        
+        if not raw_url.startswith(('http://', 'https://')):
+            raw_url = f"http://{raw_url}"
+        
+        test_endpoint = f"{raw_url}/api/datasources"
+        with track_upstream('grafana', 'datasources'):
+            test_response = requests.get(
+                test_endpoint, 
+                headers={
+                    'Authorization': f'Bearer {raw_key}'
+                },
+                verify=False,
+                timeout=10
+            )
+        
+        capture('grafana.datasources.response', lambda: {
+            'endpoint': test_endpoint,
+            'status': test_response.status_code,
+            'headers': dict(test_response.headers),
+            'body': test_response.text[:500],
+        })
+    except Exception as e:
+        current_app.logger.error(f"DIRECT DEBUG TEST: Exception: {str(e)}")
+
 @settings_bp.route('/api/grafana/test-query', methods=['POST'])
 @login_required
 def test_grafana_query():
@@ -329,52 +379,20 @@ def test_grafana_query():
     api_key = data.get('api_key')
     query = data.get('query')
     
-    current_app.logger.info(f"Received query: {query}")
-    current_app.logger.info(f"URL: {url}")
-    current_app.logger.info(f"API key length: {len(api_key) if api_key else 0}")
-    if api_key:
-        current_app.logger.info(f"API key prefix: {api_key[:10]}...")
+    capture('grafana.query.request', lambda: {'query': query, 'url': url, 'api_key': mask_secret(api_key)})
     
-    # Begin special debugging for API key issue
-    # First, try a raw HTTP call to /api/datasources endpoint as a simple API test
-    try:
-        current_app.logger.info("DIRECT DEBUG TEST: Testing direct Grafana API connection")
-        raw_url = url or os.getenv('GRAFANA_URL')
-        raw_key = api_key or os.getenv('GRAFANA_API_TOKEN')
-        
-        if not raw_url.startswith(('http://', 'https://')):
-            raw_url = f"http://{raw_url}"
-        
-        test_endpoint = f"{raw_url}/api/datasources"
-        current_app.logger.info(f"DIRECT DEBUG TEST: Testing endpoint: {test_endpoint}")
-        
-        test_response = requests.get(
-            test_endpoint, 
-            headers={
-                'Authorization': f'Bearer {raw_key}'
-            },
-            verify=False,
-            timeout=10
-        )
-        
-        current_app.logger.info(f"DIRECT DEBUG TEST: Status code: {test_response.status_code}")
-        current_app.logger.info(f"DIRECT DEBUG TEST: Response headers: {dict(test_response.headers)}")
-        
-        if test_response.status_code == 200:
-            current_app.logger.info(f"DIRECT DEBUG TEST: Success! Response: {test_response.text[:500]}")
-        else:
-            current_app.logger.error(f"DIRECT DEBUG TEST: Failed! Response: {test_response.text[:500]}")
-    except Exception as e:
-        current_app.logger.error(f"DIRECT DEBUG TEST: Exception: {str(e)}")
-    # End special debugging
+    # Raw /api/datasources probe for API key issues; it costs an extra upstream
+    # round trip, so it only runs for captured requests
+    if capture_enabled():
+        _probe_grafana_datasources(url, api_key)
     
     # If URL or API key is not provided in the request, use environment variables
     if not url or not url.strip():
-        url = os.getenv('GRAFANA_URL')
+        url = integration_settings().grafana.url
         current_app.logger.info("Using Grafana URL from environment variables")
     
     if not api_key or not api_key.strip():
-        api_key = os.getenv('GRAFANA_API_TOKEN')
+        api_key = integration_settings().grafana.api_token
         current_app.logger.info("Using Grafana API key from environment variables")
     
     # Check for required parameters
@@ -422,8 +440,6 @@ def test_grafana_query():
     
     for auth_header in auth_methods:
         try:
-            current_app.logger.info(f"Trying auth method: {auth_header}")
-            
             # Set up headers for API request
             headers = auth_header.copy()
             headers.update({
@@ -431,17 +447,6 @@ def test_grafana_query():
                 'Accept': 'application/json'
             })
             
-            # Log the full headers for debugging (without the actual key value)
-            debug_headers = headers.copy()
-            if 'Authorization' in debug_headers:
-                if debug_headers['Authorization'].startswith('Bearer '):
-                    debug_headers['Authorization'] = 'Bearer ***MASKED***'
-                elif debug_headers['Authorization'].startswith('token '):
-                    debug_headers['Authorization'] = 'token ***MASKED***'
-                else:
-                    debug_headers['Authorization'] = '***MASKED***'
-            current_app.logger.info(f"Request headers: {debug_headers}")
-            
             # Execute the query through the Grafana API
             current_time = int(time.time())
             one_hour_ago = current_time - 3600
@@ -460,7 +465,8 @@ def test_grafana_query():
                 'to': str(current_time * 1000)
             }
             
-            current_app.logger.info(f"Request payload: {json.dumps(payload)}")
+            # Headers (without the actual key value) and payload, for captured requests only
+            capture('grafana.query.payload', lambda: {'headers': _masked_headers(headers), 'payload': payload})
             
             # Disable SSL verification in development mode for self-signed certificates
             verify_ssl = False  # Always disable for testing
@@ -470,13 +476,14 @@ def test_grafana_query():
             ds_query_url = f"{full_url}/api/ds/query"
             current_app.logger.info(f"Trying endpoint: {ds_query_url}")
             
-            response = requests.post(
-                ds_query_url,
-                headers=headers,
-                json=payload,
-                timeout=30,
-                verify=verify_ssl
-            )
+            with track_upstream('grafana', 'query'):
+                response = requests.post(
+                    ds_query_url,
+                    headers=headers,
+                    json=payload,
+                    timeout=30,
+                    verify=verify_ssl
+                )
             
             # Log response status
             current_app.logger.info(f"Response status: {response.status_code}")
@@ -484,8 +491,9 @@ def test_grafana_query():
             # If success, return the result
             if response.status_code == 200:
                 response.encoding = 'utf-8'
-                result_data = response.json()
-                current_app.logger.info(f"Response data: {json.dumps(result_data)[:500]}...")
+                with timing('parse'):
+                    result_data = response.json()
+                capture('grafana.query.response', lambda: result_data)
                 
                 # Return success with results
                 return jsonify({
@@ -531,36 +539,20 @@ def test_openai_connection():
                 status=400
             )
         
-        # Print environment debug info before getting API key
-        current_app.logger.info("Environment variables:")
-        env_debug = {}
-        for key, value in os.environ.items():
-            if 'OPENAI' in key:
-                if 'KEY' in key or 'TOKEN' in key:
-                    masked_value = value[:5] + "..." + value[-5:] if value and len(value) > 10 else "(empty)"
-                    env_debug[key] = masked_value
-                else:
-                    env_debug[key] = value
-        current_app.logger.info(f"OpenAI environment variables: {env_debug}")
-            
-        # Print debug info about where the key might be stored
-        current_app.logger.info("Looking for API key in .env files")
-        for env_file in ['.env', '.env.development', '.env.dev', '.env.local']:
-            if os.path.exists(env_file):
-                current_app.logger.info(f"Found {env_file} file")
-            else:
-                current_app.logger.info(f"{env_file} file not found")
+        # OpenAI environment variables and .env files, as found at startup
+        capture('openai.environment', environment_summary)
         
         # Get endpoint and API key from request or environment variables
-        endpoint = data.get('endpoint') or os.getenv('OPENAI_API_ENDPOINT', 'https://api.openai.com/v1')
-        deployment = data.get('deployment') or os.getenv('OPENAI_DEPLOYMENT', 'gpt-3.5-turbo')
+        openai_settings = integration_settings().openai
+        endpoint = data.get('endpoint') or openai_settings.endpoint
+        deployment = data.get('deployment') or openai_settings.deployment
         
         # For the API key, first check if provided in the request
         api_key = data.get('api_key')
         
         # If not provided in request and empty, get from environment as fallback
         if not api_key:
-            api_key = os.getenv('OPENAI_API_KEY', '')
+            api_key = openai_settings.api_key
             current_app.logger.info(f"API key from env length: {len(api_key) if api_key else 0}")
         
         # Log with proper masking for security
@@ -604,9 +596,10 @@ def test_openai_connection():
 @login_required
 def run_appinsights_query():
     """Run a Kusto query against Application Insights."""
-    # Get App Insights credentials from environment
-    app_id = os.getenv('APP_INSIGHTS_APPLICATION_ID')
-    api_key = os.getenv('APP_INSIGHTS_API_KEY')
+    # Get App Insights credentials
+    app_insights = integration_settings().app_insights
+    app_id = app_insights.application_id
+    api_key = app_insights.api_key
     
     # Check if credentials are available
     if not app_id or not api_key:
@@ -647,11 +640,13 @@ def run_appinsights_query():
         }
         
         # Send the request
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        with track_upstream('appinsights', 'query'):
+            response = requests.get(url, headers=headers, params=params, timeout=30)
         
         # Check response status
         if response.status_code == 200:
-            data = response.json()
+            with timing('parse'):
+                data = response.json()
             
             # Format the results for display
             rows_count = 0
@@ -685,4 +680,20 @@ def run_appinsights_query():
         return jsonify({
             'success': False,
             'error': error_msg
-        }), 400 
\ No newline at end of file
+        }), 400 
+
+
+@settings_bp.route('/api/debug-capture', methods=['GET', 'POST'])
+@staff_required
+def debug_capture_opt_in():
+    """Show or set whether this session's upstream payloads are captured in the log."""
+    if request.method == 'POST':
+        if not current_app.config.get('DEBUG_CAPTURE_OPT_IN'):
+            return jsonify({'success': False, 'error': 'Debug capture opt-in is disabled'}), 403
+        data = request.get_json(silent=True) or {}
+        session[SESSION_KEY] = bool(data.get('enabled'))
+    return jsonify({
+        'success': True,
+        'enabled': bool(current_app.config.get('DEBUG_CAPTURE_OPT_IN') and session.get(SESSION_KEY)),
+        'sample_rate': current_app.config.get('DEBUG_CAPTURE_SAMPLE_RATE', 0)
+    })
@@ -0,0 +1 @@
+"""Services package for Taxsale data access and reporting."""
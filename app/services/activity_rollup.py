@@ -0,0 +1,319 @@
+"""
+Materialized user activity rollup.
+Aggregates vg_ActivityLog into per-(UserID, day, ActivityName) counts,
+built incrementally from new ActivityIDs and stored as dictionary-encoded
+NumPy arrays. User activity, daily and funnel reports are served from the
+rollup instead of scanning the raw log; it checks the log for new rows at
+most once per update_interval.
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+
+import numpy as np
+
+from app.services.db import TaxsaleSource
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_LOG_TABLE = 'vg_ActivityLog'
+ACTIVITY_COLUMNS = ('ActivityID', 'ActivityDate', 'UserID', 'ActivityName')
+
+# ActivityID range read per round trip during an update
+DEFAULT_BATCH_SIZE = 100000
+
+# Marks users that have not reached a funnel step
+_NOT_REACHED = np.iinfo(np.int32).max
+
+
+def _to_day(values):
+    """Convert datetimes (or ISO strings) to days since the epoch."""
+    return np.asarray(values, dtype='datetime64[D]').astype(np.int32)
+
+
+def _day_number(value):
+    """Convert a date, datetime or ISO string to a day number (None passes through)."""
+    if value is None:
+        return None
+    return int(np.datetime64(value, 'D').astype(np.int32))
+
+
+def _format_day(day):
+    """Format a day number as an ISO date."""
+    return str(np.datetime64(int(day), 'D'))
+
+
+class StringDictionary:
+    """Encodes strings as dense integer codes."""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: i for i, value in enumerate(self.values)}
+
+    def encode(self, values):
+        out = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            value = str(value).strip() if value is not None else ''
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+            out[i] = code
+        return out
+
+    def lookup(self, value):
+        return self.codes.get(str(value).strip())
+
+
+class ActivityRollup:
+    """Per-user, per-day, per-activity counts over vg_ActivityLog."""
+
+    def __init__(self, source=None, batch_size=DEFAULT_BATCH_SIZE, state_path=None, update_interval=0):
+        """
+        Initialize the rollup.
+
+        Args:
+            source (optional): TaxsaleSource or ReportingStore to read the log from
+            batch_size (int, optional): ActivityID range read per round trip
+            state_path (str, optional): .npz file used to persist the rollup
+                and its ActivityID checkpoint between runs
+            update_interval (int, optional): Seconds between checks for new log rows
+        """
+        self.source = source or TaxsaleSource()
+        self.batch_size = batch_size
+        self.state_path = state_path
+        self.update_interval = update_interval
+        self._last_update = None
+        self._lock = threading.Lock()
+        self.reset()
+        if state_path and os.path.exists(state_path):
+            self.load_state(state_path)
+
+    def reset(self):
+        """Forget all counts and start again from the first activity."""
+        self.checkpoint = 0
+        self.users = StringDictionary()
+        self.activities = StringDictionary()
+        self._user = np.empty(0, dtype=np.int32)
+        self._day = np.empty(0, dtype=np.int32)
+        self._activity = np.empty(0, dtype=np.int32)
+        self._count = np.empty(0, dtype=np.int32)
+
+    @property
+    def size(self):
+        """Number of (user, day, activity) rows held."""
+        return len(self._count)
+
+    def ingest(self, columns):
+        """
+        Merge a batch of activity log rows into the rollup.
+
+        Args:
+            columns (dict): Lists or arrays keyed by ACTIVITY_COLUMNS
+        """
+        if not len(columns['ActivityID']):
+            return
+
+        user = np.concatenate((self._user, self.users.encode(columns['UserID'])))
+        day = np.concatenate((self._day, _to_day(columns['ActivityDate'])))
+        activity = np.concatenate((self._activity, self.activities.encode(columns['ActivityName'])))
+        count = np.concatenate((self._count, np.ones(len(columns['ActivityID']), dtype=np.int32)))
+
+        # Keep rows sorted by (user, day, activity) with duplicates summed
+        order = np.lexsort((activity, day, user))
+        user, day, activity, count = user[order], day[order], activity[order], count[order]
+        boundary = np.ones(len(user), dtype=bool)
+        boundary[1:] = (np.diff(user) != 0) | (np.diff(day) != 0) | (np.diff(activity) != 0)
+        starts = np.flatnonzero(boundary)
+        self._user, self._day, self._activity = user[starts], day[starts], activity[starts]
+        self._count = np.add.reduceat(count, starts).astype(np.int32)
+        self.checkpoint = max(self.checkpoint, int(np.max(np.asarray(columns['ActivityID'], dtype=np.int64))))
+
+    def update(self, force=False):
+        """
+        Roll up activity logged since the last checkpoint.
+
+        Args:
+            force (bool, optional): Check now even if update_interval has not passed
+
+        Returns:
+            int: Number of new log rows processed
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_update is not None and now - self._last_update < self.update_interval:
+                return 0
+            self._last_update = now
+            high_water = self.source.max_key(ACTIVITY_LOG_TABLE, 'ActivityID')
+            processed = 0
+            after = self.checkpoint
+            while after < high_water:
+                upto = min(after + self.batch_size, high_water)
+                columns = self.source.read_columns(
+                    ACTIVITY_LOG_TABLE, ACTIVITY_COLUMNS, key_column='ActivityID', after=after, upto=upto)
+                processed += len(columns['ActivityID'])
+                self.ingest(columns)
+                self.checkpoint = after = upto
+
+            if processed:
+                logger.info(f"Rolled up {processed} activity rows up to ActivityID {self.checkpoint} "
+                            f"({self.size} summary rows)")
+                if self.state_path:
+                    self.save_state(self.state_path)
+            return processed
+
+    def save_state(self, path):
+        """Atomically persist the rollup and checkpoint to an .npz file."""
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, checkpoint=np.int64(self.checkpoint),
+                     users=np.asarray(self.users.values, dtype=np.str_),
+                     activities=np.asarray(self.activities.values, dtype=np.str_),
+                     user=self._user, day=self._day, activity=self._activity, count=self._count)
+        os.replace(tmp_path, path)
+
+    def load_state(self, path):
+        """Restore a rollup saved by save_state()."""
+        with np.load(path) as state:
+            self.checkpoint = int(state['checkpoint'])
+            self.users = StringDictionary(state['users'].tolist())
+            self.activities = StringDictionary(state['activities'].tolist())
+            self._user = state['user']
+            self._day = state['day']
+            self._activity = state['activity']
+            self._count = state['count']
+        logger.info(f"Loaded activity rollup at ActivityID {self.checkpoint}")
+
+    def _day_mask(self, day, start, end):
+        mask = np.ones(len(day), dtype=bool)
+        start, end = _day_number(start), _day_number(end)
+        if start is not None:
+            mask &= day >= start
+        if end is not None:
+            mask &= day <= end
+        return mask
+
+    def user_activity(self, user_id, start=None, end=None):
+        """
+        Activity of one user, per day and in total.
+
+        Args:
+            user_id (str): UserID of the user
+            start (date, optional): First day to include
+            end (date, optional): Last day to include
+
+        Returns:
+            dict: Totals per activity and per-day breakdown
+        """
+        with self._lock:
+            code = self.users.lookup(user_id)
+            if code is None:
+                return {'user_id': user_id, 'totals': {}, 'days': []}
+            # Rows are sorted by user, so the user's rows are one slice
+            lo, hi = np.searchsorted(self._user, [code, code + 1])
+            day, activity, count = self._day[lo:hi], self._activity[lo:hi], self._count[lo:hi]
+            names = list(self.activities.values)
+
+        mask = self._day_mask(day, start, end)
+        day, activity, count = day[mask], activity[mask], count[mask]
+
+        totals = np.bincount(activity, weights=count, minlength=len(names))
+        days = []
+        for d in np.unique(day):
+            in_day = day == d
+            days.append({
+                'day': _format_day(d),
+                'activities': {names[a]: int(c) for a, c in zip(activity[in_day], count[in_day])},
+            })
+        return {
+            'user_id': user_id,
+            'totals': {names[i]: int(t) for i, t in enumerate(totals) if t},
+            'days': days,
+        }
+
+    def daily_summary(self, start=None, end=None, activity_names=None):
+        """
+        Activity counts and distinct active users per day.
+
+        Args:
+            start (date, optional): First day to include
+            end (date, optional): Last day to include
+            activity_names (iterable, optional): Only count these activities
+
+        Returns:
+            list: One row per day
+        """
+        with self._lock:
+            user, day, activity, count = self._user, self._day, self._activity, self._count
+            names = list(self.activities.values)
+            n_users = len(self.users.values)
+            wanted = None
+            if activity_names is not None:
+                wanted = [self.activities.lookup(name) for name in activity_names]
+                wanted = [code for code in wanted if code is not None]
+
+        mask = self._day_mask(day, start, end)
+        if wanted is not None:
+            mask &= np.isin(activity, wanted)
+        user, day, activity, count = user[mask], day[mask], activity[mask], count[mask]
+        if not len(day):
+            return []
+
+        days, day_index = np.unique(day, return_inverse=True)
+        totals = np.bincount(day_index, weights=count, minlength=len(days))
+        per_activity = np.zeros((len(days), len(names)), dtype=np.int64)
+        np.add.at(per_activity, (day_index, activity), count)
+        # Distinct users per day: unique (day, user) pairs
+        pairs = np.unique(day_index.astype(np.int64) * n_users + user)
+        active_users = np.bincount(pairs // n_users, minlength=len(days))
+
+        return [{
+            'day': _format_day(d),
+            'total': int(totals[i]),
+            'active_users': int(active_users[i]),
+            'activities': {names[a]: int(c) for a, c in enumerate(per_activity[i]) if c},
+        } for i, d in enumerate(days)]
+
+    def funnel(self, steps, start=None, end=None):
+        """
+        Count users progressing through an ordered list of activities.
+
+        A user reaches a step when they performed it on or after the day
+        they reached the previous step.
+
+        Args:
+            steps (list): ActivityName of each step, in order
+            start (date, optional): First day to include
+            end (date, optional): Last day to include
+
+        Returns:
+            list: Users reaching each step and the conversion from the previous one
+        """
+        with self._lock:
+            user, day, activity = self._user, self._day, self._activity
+            n_users = len(self.users.values)
+            codes = [self.activities.lookup(step) for step in steps]
+
+        mask = self._day_mask(day, start, end)
+        user, day, activity = user[mask], day[mask], activity[mask]
+
+        # Day each user reached the previous step; everyone starts "reached"
+        reached = np.full(n_users, np.iinfo(np.int32).min, dtype=np.int64)
+        result = []
+        previous = None
+        for step, code in zip(steps, codes):
+            next_reached = np.full(n_users, _NOT_REACHED, dtype=np.int64)
+            if code is not None:
+                rows = (activity == code) & (day >= reached[user])
+                np.minimum.at(next_reached, user[rows], day[rows])
+            reached = next_reached
+            users = int(np.count_nonzero(reached != _NOT_REACHED))
+            result.append({
+                'step': step,
+                'users': users,
+                'conversion': round(users / previous, 4) if previous else None,
+            })
+            previous = users
+        return result
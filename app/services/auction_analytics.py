@@ -0,0 +1,239 @@
+"""
+Auction results analytics.
+Bulk-loads vg_AuctionResults into NumPy arrays and computes the per-county
+and per-queue reports in vectorized passes, cached per VGProductID.
+"""
+import time
+import logging
+import datetime
+import threading
+
+import numpy as np
+
+from app.services.db import TaxsaleSource
+
+logger = logging.getLogger(__name__)
+
+AUCTION_RESULTS_TABLE = 'vg_AuctionResults'
+AUCTION_RESULT_COLUMNS = ('QueueId', 'MinimumBid', 'WinningBid', 'NumberOfBidders', 'UnpaidBalance', 'UserID')
+
+# Florida certificates are bid down from 18%, bucketed in quarter points
+DEFAULT_RATE_BINS = np.linspace(0.0, 18.0, 73)
+
+# Reports are rebuilt at most this often unless explicitly refreshed
+DEFAULT_CACHE_TTL = 300
+
+# Percentiles reported for the county rate distribution
+RATE_PERCENTILES = (10, 25, 50, 75, 90)
+
+# Number of largest winners used for the county top-N share
+TOP_WINNERS = 5
+
+
+def _as_columns(raw):
+    """Convert loaded column lists into typed NumPy arrays."""
+    return {
+        'QueueId': np.asarray(raw['QueueId'], dtype=np.int64),
+        'MinimumBid': np.asarray(raw['MinimumBid'], dtype=np.float64),
+        'WinningBid': np.asarray(raw['WinningBid'], dtype=np.float64),
+        'NumberOfBidders': np.asarray(raw['NumberOfBidders'], dtype=np.int64),
+        'UnpaidBalance': np.asarray(raw['UnpaidBalance'], dtype=np.float64),
+        'UserID': np.asarray([str(u) for u in raw['UserID']], dtype=object),
+    }
+
+
+def _safe_divide(numerator, denominator):
+    """Element-wise division that yields 0 where the denominator is 0."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    out = np.zeros(np.broadcast(numerator, denominator).shape)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+def _grouped_stats(group_index, n_groups, columns, winner_index, n_winners):
+    """
+    Compute the per-group statistics for every group in one pass.
+
+    Args:
+        group_index (ndarray): Dense group number for each row
+        n_groups (int): Number of groups
+        columns (dict): Typed auction result columns
+        winner_index (ndarray): Dense winner number for each row
+        n_winners (int): Number of distinct winners
+
+    Returns:
+        dict: Statistic name to per-group ndarray
+    """
+    rates = columns['WinningBid']
+    bidders = columns['NumberOfBidders']
+    unpaid = columns['UnpaidBalance']
+
+    counts = np.bincount(group_index, minlength=n_groups)
+    unpaid_sum = np.bincount(group_index, weights=unpaid, minlength=n_groups)
+
+    # Medians: sort by group then rate and pick the middle of each run
+    order = np.lexsort((rates, group_index))
+    sorted_rates = rates[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    nonempty = counts > 0
+    median = np.zeros(n_groups)
+    lo = starts[nonempty] + (counts[nonempty] - 1) // 2
+    hi = starts[nonempty] + counts[nonempty] // 2
+    median[nonempty] = (sorted_rates[lo] + sorted_rates[hi]) / 2
+
+    # Bidder concentration: Herfindahl index of each winner's share of the
+    # group's unpaid balance
+    pair_keys = group_index * n_winners + winner_index
+    pairs, pair_index = np.unique(pair_keys, return_inverse=True)
+    pair_unpaid = np.bincount(pair_index, weights=unpaid, minlength=len(pairs))
+    pair_group = pairs // n_winners
+    shares = _safe_divide(pair_unpaid, unpaid_sum[pair_group])
+
+    max_bidders = np.zeros(n_groups, dtype=np.int64)
+    np.maximum.at(max_bidders, group_index, bidders)
+
+    return {
+        'certificates': counts,
+        'total_unpaid': unpaid_sum,
+        'mean_rate': _safe_divide(np.bincount(group_index, weights=rates, minlength=n_groups), counts),
+        'median_rate': median,
+        'weighted_rate': _safe_divide(np.bincount(group_index, weights=rates * unpaid, minlength=n_groups), unpaid_sum),
+        'mean_minimum_bid': _safe_divide(
+            np.bincount(group_index, weights=columns['MinimumBid'], minlength=n_groups), counts),
+        'mean_bidders': _safe_divide(np.bincount(group_index, weights=bidders, minlength=n_groups), counts),
+        'max_bidders': max_bidders,
+        'competitive_share': _safe_divide(np.bincount(group_index, weights=bidders > 1, minlength=n_groups), counts),
+        'zero_rate_share': _safe_divide(np.bincount(group_index, weights=rates == 0, minlength=n_groups), counts),
+        'distinct_winners': np.bincount(pair_group, minlength=n_groups),
+        'hhi': np.bincount(pair_group, weights=shares ** 2, minlength=n_groups),
+    }
+
+
+def _stats_row(stats, i):
+    """Convert one group's statistics into JSON-friendly values."""
+    row = {}
+    for name, values in stats.items():
+        value = values[i]
+        row[name] = int(value) if np.issubdtype(values.dtype, np.integer) else round(float(value), 4)
+    return row
+
+
+def compute_report(columns, rate_bins=DEFAULT_RATE_BINS):
+    """
+    Build the county and per-queue report from typed columns.
+
+    Args:
+        columns (dict): Arrays keyed by AUCTION_RESULT_COLUMNS
+        rate_bins (ndarray, optional): Interest-rate histogram bin edges
+
+    Returns:
+        dict: County summary, rate distribution and per-queue rows
+    """
+    rates = columns['WinningBid']
+    n_rows = len(rates)
+
+    winners, winner_index = np.unique(columns['UserID'], return_inverse=True)
+    n_winners = max(len(winners), 1)
+
+    # The county is a single group covering every row
+    county_stats = _grouped_stats(np.zeros(n_rows, dtype=np.int64), 1, columns, winner_index, n_winners)
+    county = _stats_row(county_stats, 0)
+
+    winner_unpaid = np.bincount(winner_index, weights=columns['UnpaidBalance'], minlength=len(winners))
+    top = np.sort(winner_unpaid)[::-1][:TOP_WINNERS]
+    county['top_winner_share'] = round(float(_safe_divide(top.sum(), winner_unpaid.sum())), 4)
+
+    histogram, edges = np.histogram(np.clip(rates, rate_bins[0], rate_bins[-1]), bins=rate_bins)
+    percentiles = np.percentile(rates, RATE_PERCENTILES) if n_rows else np.zeros(len(RATE_PERCENTILES))
+    county['rate_distribution'] = {
+        'edges': [round(float(e), 4) for e in edges],
+        'counts': histogram.tolist(),
+        'percentiles': {str(p): round(float(v), 4) for p, v in zip(RATE_PERCENTILES, percentiles)},
+    }
+
+    queue_ids, queue_index = np.unique(columns['QueueId'], return_inverse=True)
+    queue_stats = _grouped_stats(queue_index, len(queue_ids), columns, winner_index, n_winners)
+    queues = []
+    for i, queue_id in enumerate(queue_ids):
+        row = {'queue_id': int(queue_id)}
+        row.update(_stats_row(queue_stats, i))
+        queues.append(row)
+
+    return {'county': county, 'queues': queues}
+
+
+class AuctionResultsAnalytics:
+    """Computes and caches auction result reports per VGProductID."""
+
+    def __init__(self, source=None, ttl=DEFAULT_CACHE_TTL, rate_bins=DEFAULT_RATE_BINS):
+        """
+        Initialize the analytics engine.
+
+        Args:
+            source (optional): Column source with a read_columns() method.
+                Defaults to the live Taxsale database.
+            ttl (int, optional): Seconds a cached report stays fresh
+            rate_bins (ndarray, optional): Interest-rate histogram bin edges
+        """
+        self.source = source or TaxsaleSource()
+        self.ttl = ttl
+        self.rate_bins = rate_bins
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def load_columns(self, product_id):
+        """
+        Bulk-load one county's auction results as typed arrays.
+
+        Args:
+            product_id (int): VGProductID of the county
+
+        Returns:
+            dict: Column name to ndarray
+        """
+        raw = self.source.read_columns(
+            AUCTION_RESULTS_TABLE, AUCTION_RESULT_COLUMNS, filters={'VGProductID': product_id})
+        return _as_columns(raw)
+
+    def report(self, product_id, refresh=False):
+        """
+        Return the auction results report for a county.
+
+        Args:
+            product_id (int): VGProductID of the county
+            refresh (bool, optional): Ignore any cached report
+
+        Returns:
+            dict: Report as built by compute_report(), plus metadata
+        """
+        now = time.monotonic()
+        if not refresh:
+            with self._lock:
+                cached = self._cache.get(product_id)
+            if cached and now - cached[0] < self.ttl:
+                return cached[1]
+
+        started = time.perf_counter()
+        report = compute_report(self.load_columns(product_id), self.rate_bins)
+        report['product_id'] = product_id
+        report['generated_at'] = datetime.datetime.now().isoformat()
+        logger.info(f"Built auction results report for product {product_id} "
+                    f"({report['county']['certificates']} rows) in {time.perf_counter() - started:.3f}s")
+
+        with self._lock:
+            self._cache[product_id] = (now, report)
+        return report
+
+    def invalidate(self, product_id=None):
+        """
+        Drop cached reports.
+
+        Args:
+            product_id (int, optional): County to drop. Drops all when omitted.
+        """
+        with self._lock:
+            if product_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(product_id, None)
@@ -0,0 +1,456 @@
+"""
+Batch certificate-bid ingestion.
+Streams an uploaded bid workbook (.xlsx through openpyxl's read-only mode,
+or .csv) row by row, validates each chunk of properties against the
+county's certificate table with one IN query, and writes vg_BatchCerts with
+multi-row INSERT statements. Batches run on a background executor (the
+app's Flask-Executor, or a private thread pool outside Flask) and report
+their progress, so a large upload never ties up a request worker.
+
+Progress is written to a JSON file per batch under progress_dir, so a status
+request answered by any worker process sees the batch, not only the worker
+that loads it.
+"""
+import os
+import csv
+import json
+import time
+import uuid
+import logging
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from app.services.db import SCHEMA, TaxsaleSource, quote_identifier
+from app.services.county_import import read_table_layout, convert_value, PAID_STATUSES
+
+logger = logging.getLogger(__name__)
+
+BATCH_TABLE = 'vg_Batch'
+BATCH_CERTS_TABLE = 'vg_BatchCerts'
+
+# Workbook rows validated against the certificate table per query
+DEFAULT_CHUNK_SIZE = 1000
+
+# Rows per multi-row INSERT (SQL Server allows 2100 parameters and 1000 rows)
+ROWS_PER_INSERT = 400
+
+# Rejected rows tolerated before the whole batch is abandoned
+DEFAULT_MAX_ERRORS = 100
+
+# Rejected rows reported back to the caller
+REPORTED_ERRORS = 100
+
+# Background batches processed at once
+DEFAULT_WORKERS = 2
+
+# Seconds a finished batch's progress file is kept
+PROGRESS_RETENTION = 86400
+
+# Finished batches whose progress stays in memory (the progress file outlives them)
+FINISHED_PROGRESS_KEPT = 50
+
+CERT_COLUMNS = ('SequenceID', 'PropertyNo', 'UnpaidBalance', 'YourBid')
+
+# Header spellings accepted for each vg_BatchCerts column
+HEADER_ALIASES = {
+    'sequenceid': 'SequenceID', 'sequence': 'SequenceID', 'seq': 'SequenceID',
+    'propertyno': 'PropertyNo', 'property': 'PropertyNo', 'parcel': 'PropertyNo', 'parcelid': 'PropertyNo',
+    'unpaidbalance': 'UnpaidBalance', 'balance': 'UnpaidBalance',
+    'yourbid': 'YourBid', 'bid': 'YourBid', 'bidpercent': 'YourBid',
+}
+
+_INSERT_BATCH = {
+    'mssql': f"INSERT INTO {SCHEMA}.{BATCH_TABLE} (UserName, FileName, BatchDesc, Active, BatchDate, VGProductID) "
+             f"OUTPUT INSERTED.BatchID VALUES (?, ?, ?, 0, ?, ?)",
+    'sqlite': f"INSERT INTO {SCHEMA}.{BATCH_TABLE} (UserName, FileName, BatchDesc, Active, BatchDate, VGProductID) "
+              f"VALUES (?, ?, ?, 0, ?, ?)",
+}
+
+
+class BatchValidationError(ValueError):
+    """Raised when a workbook has more invalid rows than allowed."""
+
+    def __init__(self, message, errors):
+        super().__init__(message)
+        self.errors = errors
+
+
+def _header_key(value):
+    return ''.join(ch for ch in str(value or '').lower() if ch.isalnum())
+
+
+def _cell_text(value):
+    """Text of a workbook cell; Excel stores whole numbers as floats."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def read_workbook(path):
+    """
+    Stream the rows of a bid workbook.
+
+    Args:
+        path (str): .xlsx or .csv file
+
+    Yields:
+        tuple: Cell values of each row, header included
+    """
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise RuntimeError('openpyxl not installed, cannot read Excel workbooks. Upload a CSV instead.')
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.reader(f)
+
+
+def map_header(header):
+    """
+    Map workbook columns to vg_BatchCerts columns.
+
+    Args:
+        header (tuple): First row of the workbook
+
+    Returns:
+        dict: vg_BatchCerts column -> cell index
+
+    Raises:
+        ValueError: When the PropertyNo or YourBid column is missing
+    """
+    positions = {}
+    for i, value in enumerate(header):
+        column = HEADER_ALIASES.get(_header_key(value))
+        if column and column not in positions:
+            positions[column] = i
+    missing = [c for c in ('PropertyNo', 'YourBid') if c not in positions]
+    if missing:
+        raise ValueError(f"Workbook is missing column(s): {', '.join(missing)}")
+    return positions
+
+
+class BatchProgress:
+    """Progress of one batch, updated by the worker and read by status requests."""
+
+    def __init__(self, batch_id, file_name):
+        self.batch_id = batch_id
+        self.file_name = file_name
+        self.state = 'queued'
+        self.rows_read = 0
+        self.rows_inserted = 0
+        self.rows_rejected = 0
+        self.errors = []
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    def reject(self, row_number, message):
+        self.rows_rejected += 1
+        if len(self.errors) < REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'error': message})
+
+    def to_dict(self):
+        return {
+            'batch_id': self.batch_id,
+            'file_name': self.file_name,
+            'state': self.state,
+            'rows_read': self.rows_read,
+            'rows_inserted': self.rows_inserted,
+            'rows_rejected': self.rows_rejected,
+            'errors': list(self.errors),
+            'error': self.error,
+            'duration_seconds': round((self.finished or time.time()) - self.started, 2) if self.started else None,
+        }
+
+
+class BatchIngestor:
+    """Loads bid workbooks into vg_Batch / vg_BatchCerts."""
+
+    def __init__(self, source=None, chunk_size=DEFAULT_CHUNK_SIZE, max_errors=DEFAULT_MAX_ERRORS,
+                 workers=DEFAULT_WORKERS, progress_dir=None, executor=None):
+        """
+        Initialize the ingestor.
+
+        Args:
+            source (optional): TaxsaleSource holding the batch and certificate tables
+            chunk_size (int, optional): Rows validated per certificate query
+            max_errors (int, optional): Rejected rows tolerated before the batch is abandoned
+            workers (int, optional): Batches processed in the background at once
+            progress_dir (str, optional): Directory shared by the worker processes for progress files.
+                Without it progress is only visible to this process.
+            executor (optional): Runs the batches, e.g. a flask_executor.Executor. Defaults to a
+                thread pool of `workers` threads, created on first submit.
+        """
+        self.source = source or TaxsaleSource()
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.workers = workers
+        self.progress_dir = progress_dir
+        if progress_dir:
+            os.makedirs(progress_dir, exist_ok=True)
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._progress = {}
+        self._lock = threading.Lock()
+        self._layout = {column[0]: column for column in read_table_layout(BATCH_CERTS_TABLE)}
+
+    def _cert_table(self, product_id):
+        rows = self.source.query(f"SELECT TaxCertTableName FROM {SCHEMA}.vg_CountyInfo WHERE VGProductID = ?",
+                                 (product_id,))
+        if not rows or not rows[0][0]:
+            raise ValueError(f"No certificate table configured for product {product_id}")
+        return rows[0][0]
+
+    def _progress_path(self, batch_id):
+        return os.path.join(self.progress_dir, f"{int(batch_id)}.json")
+
+    def _save_progress(self, progress):
+        """Atomically replace the batch's progress file."""
+        if not self.progress_dir:
+            return
+        path = self._progress_path(progress.batch_id)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(progress.to_dict(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save progress of batch {progress.batch_id}: {str(e)}")
+
+    def _prune_progress(self):
+        """Remove progress files of batches finished more than PROGRESS_RETENTION seconds ago."""
+        cutoff = time.time() - PROGRESS_RETENTION
+        try:
+            names = os.listdir(self.progress_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.progress_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def create_batch(self, user_name, file_name, product_id, description=None):
+        """
+        Insert the vg_Batch row, inactive until its certificates are loaded.
+
+        Returns:
+            int: BatchID
+        """
+        with self.source.transaction() as cursor:
+            cursor.execute(_INSERT_BATCH[self.source.dialect], (
+                user_name, os.path.basename(file_name)[:50], (description or '')[:100] or None,
+                datetime.datetime.now(), product_id))
+            batch_id = cursor.fetchone()[0] if self.source.dialect == 'mssql' else cursor.lastrowid
+        return batch_id
+
+    def _certificates(self, cert_table, property_numbers):
+        """UnpaidBalance and PaidStatus of the given properties, in one query."""
+        placeholders = ', '.join('?' * len(property_numbers))
+        rows = self.source.query(
+            f"SELECT PropertyNo, UnpaidBalance, PaidStatus FROM {SCHEMA}.{quote_identifier(cert_table)} "
+            f"WHERE PropertyNo IN ({placeholders})", list(property_numbers))
+        return {str(row[0]).strip(): (row[1], row[2]) for row in rows}
+
+    def _validate_chunk(self, chunk, cert_table, seen, progress):
+        """Convert a chunk of (row_number, cells) and keep the rows of biddable certificates."""
+        parsed = []
+        for row_number, values in chunk:
+            try:
+                row = {name: convert_value(_cell_text(values.get(name)), self._layout[name]) for name in CERT_COLUMNS}
+                if not row['PropertyNo']:
+                    raise ValueError('PropertyNo is required')
+                if row['YourBid'] is None or Decimal(row['YourBid']) < 0:
+                    raise ValueError('YourBid must be a non-negative number')
+                if row['PropertyNo'] in seen:
+                    raise ValueError(f"PropertyNo {row['PropertyNo']} appears more than once")
+            except ValueError as e:
+                progress.reject(row_number, str(e))
+                continue
+            seen.add(row['PropertyNo'])
+            parsed.append((row_number, row))
+
+        certificates = self._certificates(cert_table, sorted({row['PropertyNo'] for _, row in parsed})) \
+            if parsed else {}
+        valid = []
+        for row_number, row in parsed:
+            certificate = certificates.get(row['PropertyNo'])
+            if certificate is None:
+                progress.reject(row_number, f"PropertyNo {row['PropertyNo']} is not in {cert_table}")
+                continue
+            if (certificate[1] or '').strip().upper() in PAID_STATUSES:
+                progress.reject(row_number, f"PropertyNo {row['PropertyNo']} has been paid")
+                continue
+            if row['UnpaidBalance'] is None:
+                row['UnpaidBalance'] = certificate[0]
+            valid.append((row_number, row))
+        return valid
+
+    def _insert(self, cursor, batch_id, rows):
+        """Write rows with multi-row INSERT statements of ROWS_PER_INSERT rows."""
+        columns = ('BatchID',) + CERT_COLUMNS
+        for start in range(0, len(rows), ROWS_PER_INSERT):
+            part = rows[start:start + ROWS_PER_INSERT]
+            values = ', '.join(f"({', '.join('?' * len(columns))})" for _ in part)
+            params = [value for _, row in part for value in
+                      (batch_id, row['SequenceID'], row['PropertyNo'],
+                       None if row['UnpaidBalance'] is None else str(row['UnpaidBalance']), row['YourBid'])]
+            cursor.execute(f"INSERT INTO {SCHEMA}.{BATCH_CERTS_TABLE} ({', '.join(columns)}) VALUES {values}", params)
+
+    def load(self, path, batch_id, product_id, progress=None):
+        """
+        Validate and insert a workbook's certificates, then activate the batch.
+
+        All certificates go in with one transaction, so a failed batch
+        leaves no partial vg_BatchCerts rows behind.
+
+        Args:
+            path (str): Workbook to load
+            batch_id (int): vg_Batch row created by create_batch()
+            product_id (int): VGProductID whose certificate table validates the properties
+            progress (BatchProgress, optional): Updated as rows are processed
+
+        Returns:
+            BatchProgress: Final progress
+
+        Raises:
+            BatchValidationError: When more than max_errors rows are rejected
+        """
+        progress = progress or BatchProgress(batch_id, os.path.basename(path))
+        progress.state = 'running'
+        progress.started = time.time()
+        self._save_progress(progress)
+        cert_table = self._cert_table(product_id)
+        rows = read_workbook(path)
+        positions = map_header(next(rows, ()))
+
+        seen = set()
+        with self.source.transaction() as cursor:
+            chunk = []
+            for row_number, cells in enumerate(rows, start=2):
+                if not any(cell not in (None, '') for cell in cells):
+                    continue
+                values = {name: cells[i] if i < len(cells) else None for name, i in positions.items()}
+                values.setdefault('SequenceID', row_number - 1)
+                chunk.append((row_number, values))
+                progress.rows_read += 1
+                if len(chunk) >= self.chunk_size:
+                    self._flush(cursor, batch_id, chunk, cert_table, seen, progress)
+                    chunk = []
+            self._flush(cursor, batch_id, chunk, cert_table, seen, progress)
+            cursor.execute(f"UPDATE {SCHEMA}.{BATCH_TABLE} SET Active = 1 WHERE BatchID = ?", (batch_id,))
+
+        progress.state = 'done'
+        progress.finished = time.time()
+        logger.info(f"Loaded batch {batch_id}: {progress.rows_inserted} certificates, "
+                    f"{progress.rows_rejected} rejected in {progress.finished - progress.started:.1f}s")
+        return progress
+
+    def _flush(self, cursor, batch_id, chunk, cert_table, seen, progress):
+        if not chunk:
+            return
+        valid = self._validate_chunk(chunk, cert_table, seen, progress)
+        if progress.rows_rejected > self.max_errors:
+            raise BatchValidationError(f"Batch abandoned after {progress.rows_rejected} invalid rows",
+                                       progress.errors)
+        self._insert(cursor, batch_id, valid)
+        progress.rows_inserted += len(valid)
+        self._save_progress(progress)
+
+    def _run(self, path, batch_id, product_id, progress):
+        try:
+            self.load(path, batch_id, product_id, progress)
+        except Exception as e:
+            progress.state = 'failed'
+            progress.error = str(e)
+            progress.finished = time.time()
+            logger.error(f"Error loading batch {batch_id} from {path}: {str(e)}")
+            try:
+                with self.source.transaction() as cursor:
+                    cursor.execute(f"DELETE FROM {SCHEMA}.{BATCH_TABLE} WHERE BatchID = ?", (batch_id,))
+            except Exception as cleanup_error:
+                logger.error(f"Error removing failed batch {batch_id}: {str(cleanup_error)}")
+        finally:
+            self._save_progress(progress)
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove upload {path} of batch {batch_id}: {str(e)}")
+            self._evict_finished()
+
+    def _evict_finished(self):
+        """Forget the oldest finished batches beyond FINISHED_PROGRESS_KEPT."""
+        with self._lock:
+            finished = [batch_id for batch_id, progress in self._progress.items()
+                        if progress.state in ('done', 'failed')]
+            for batch_id in finished[:max(0, len(finished) - FINISHED_PROGRESS_KEPT)]:
+                del self._progress[batch_id]
+
+    def submit(self, path, product_id, user_name=None, description=None, file_name=None):
+        """
+        Create the batch and load it on a background thread.
+
+        The upload is removed once the batch has been loaded or has failed.
+
+        Args:
+            path (str): Saved upload, owned by the ingestor from here on
+            product_id (int): VGProductID of the batch
+            user_name (str, optional): Uploading staff member
+            description (str, optional): BatchDesc
+            file_name (str, optional): Original file name. Defaults to the name of path.
+
+        Returns:
+            int: BatchID, for polling progress()
+        """
+        file_name = file_name or os.path.basename(path)
+        batch_id = self.create_batch(user_name, file_name, product_id, description)
+        progress = BatchProgress(batch_id, file_name)
+        if self.progress_dir:
+            self._prune_progress()
+            self._save_progress(progress)
+        with self._lock:
+            self._progress[batch_id] = progress
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='batch-ingest')
+        self._executor.submit(self._run, path, batch_id, product_id, progress)
+        return batch_id
+
+    def progress(self, batch_id):
+        """
+        Progress of a submitted batch, whichever worker process loads it.
+
+        Returns:
+            dict: Progress, or None for an unknown batch
+        """
+        with self._lock:
+            progress = self._progress.get(batch_id)
+        if progress:
+            return progress.to_dict()
+        if not self.progress_dir:
+            return None
+        try:
+            with open(self._progress_path(batch_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def shutdown(self, wait=True):
+        """Stop the background workers, unless the executor was passed in."""
+        if not self._owns_executor:
+            return
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,298 @@
+"""
+Bid budget exposure.
+Computes each bidder's committed amount per VGProductID (the UnpaidBalance
+of every property whose latest bid is still active) from vg_BidTransactions
+in one set-based pass, joins it with the bidder's current vg_BidBudget, and
+keeps both up to date from new BidIds / BidBudgetIDs, checked at most once
+per update_interval. Over-budget and near-budget reports are answered from
+memory.
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+
+import numpy as np
+
+from app.services.db import TaxsaleSource
+from app.services.activity_rollup import StringDictionary
+
+logger = logging.getLogger(__name__)
+
+BID_TRANSACTIONS_TABLE = 'vg_BidTransactions'
+BID_BUDGET_TABLE = 'vg_BidBudget'
+BID_COLUMNS = ('BidId', 'UserId', 'PropertyNo', 'TaxYear', 'BidStatus', 'VGProductID', 'UnpaidBalance')
+BUDGET_COLUMNS = ('BidBudgetID', 'UserID', 'BudgetAmount', 'VGProductID')
+
+# vg_BidStatusTypes id of a standing bid
+ACTIVE_BID_STATUS = 1
+
+# Identity range read per round trip during an update
+DEFAULT_BATCH_SIZE = 100000
+
+# Share of the budget at which a bidder counts as near budget
+DEFAULT_NEAR_THRESHOLD = 0.9
+
+# Bids and budgets without a product are grouped under this id
+UNKNOWN_PRODUCT = -1
+
+
+def _ints(values, missing=UNKNOWN_PRODUCT):
+    return np.asarray([missing if v is None else v for v in values], dtype=np.int64)
+
+
+def _floats(values):
+    return np.asarray([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _latest(keys, order_key, *columns):
+    """
+    Keep the row with the highest order_key for every distinct key.
+
+    Args:
+        keys (tuple): Key arrays, most significant first
+        order_key (np.ndarray): Identity deciding which row is latest
+        columns: Further arrays carried along
+
+    Returns:
+        tuple: Key arrays, order_key and columns, sorted by key
+    """
+    arrays = keys + (order_key,) + columns
+    if not len(order_key):
+        return arrays
+    order = np.lexsort((order_key,) + tuple(reversed(keys)))
+    arrays = tuple(a[order] for a in arrays)
+    last = np.ones(len(order_key), dtype=bool)
+    last[:-1] = np.any([np.diff(k) != 0 for k in arrays[:len(keys)]], axis=0)
+    return tuple(a[last] for a in arrays)
+
+
+def _pair_key(user, product):
+    """One sortable int64 per (user, product)."""
+    return user.astype(np.int64) * 2 ** 32 + (product.astype(np.int64) - UNKNOWN_PRODUCT)
+
+
+class BidExposure:
+    """Committed amount versus budget for every bidder and county."""
+
+    def __init__(self, source=None, batch_size=DEFAULT_BATCH_SIZE, state_path=None, update_interval=0):
+        """
+        Initialize the service.
+
+        Args:
+            source (optional): TaxsaleSource or ReportingStore to read from
+            batch_size (int, optional): Identity range read per round trip
+            state_path (str, optional): .npz file used to persist the state between runs
+            update_interval (int, optional): Seconds between checks for new bids and budgets
+        """
+        self.source = source or TaxsaleSource()
+        self.batch_size = batch_size
+        self.state_path = state_path
+        self.update_interval = update_interval
+        self._last_update = None
+        self._lock = threading.Lock()
+        self.reset()
+        if state_path and os.path.exists(state_path):
+            self.load_state(state_path)
+
+    def reset(self):
+        """Forget all bids and budgets."""
+        self.bid_checkpoint = 0
+        self.budget_checkpoint = 0
+        self.users = StringDictionary()
+        self.properties = StringDictionary()
+        empty_int, empty_float = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        # Latest bid per (user, product, property)
+        self._bids = (empty_int, empty_int, empty_int, empty_int, np.empty(0, dtype=bool), empty_float)
+        # Latest budget per (user, product)
+        self._budgets = (empty_int, empty_int, empty_int, empty_float)
+        self._summarize()
+
+    def ingest_bids(self, columns):
+        """Merge a batch of bid rows, keeping the latest bid per bidder and property."""
+        if not len(columns['BidId']):
+            return
+        properties = [f"{p}|{y}" for p, y in zip(columns['PropertyNo'], columns['TaxYear'])]
+        user, product, prop, bid_id, active, balance = self._bids
+        self._bids = _latest(
+            (np.concatenate((user, self.users.encode(columns['UserId']))),
+             np.concatenate((product, _ints(columns['VGProductID']))),
+             np.concatenate((prop, self.properties.encode(properties)))),
+            np.concatenate((bid_id, _ints(columns['BidId']))),
+            np.concatenate((active, _ints(columns['BidStatus'], missing=0) == ACTIVE_BID_STATUS)),
+            np.concatenate((balance, np.nan_to_num(_floats(columns['UnpaidBalance'])))))
+        self.bid_checkpoint = max(self.bid_checkpoint, int(np.max(_ints(columns['BidId']))))
+
+    def ingest_budgets(self, columns):
+        """Merge a batch of budget rows, keeping the latest budget per bidder and product."""
+        if not len(columns['BidBudgetID']):
+            return
+        user, product, budget_id, amount = self._budgets
+        self._budgets = _latest(
+            (np.concatenate((user, self.users.encode(columns['UserID']))),
+             np.concatenate((product, _ints(columns['VGProductID'])))),
+            np.concatenate((budget_id, _ints(columns['BidBudgetID']))),
+            np.concatenate((amount, _floats(columns['BudgetAmount']))))
+        self.budget_checkpoint = max(self.budget_checkpoint, int(np.max(_ints(columns['BidBudgetID']))))
+
+    def _summarize(self):
+        """Aggregate committed amounts per (user, product) and join the budgets."""
+        user, product, _, _, active, balance = self._bids
+        user, product, balance = user[active], product[active], balance[active]
+        keys = _pair_key(user, product)
+        if len(keys):
+            # Bids are sorted by (user, product, property), so each pair is one run
+            starts = np.flatnonzero(np.concatenate(([True], np.diff(keys) != 0)))
+            pair_keys = keys[starts]
+            committed = np.add.reduceat(balance, starts)
+            properties = np.diff(np.append(starts, len(keys)))
+        else:
+            pair_keys, committed, properties = keys, np.empty(0), np.empty(0, dtype=np.int64)
+
+        budget_user, budget_product, _, amount = self._budgets
+        budget_keys = _pair_key(budget_user, budget_product)
+        position = np.clip(np.searchsorted(budget_keys, pair_keys), 0, max(len(budget_keys) - 1, 0))
+        has_budget = budget_keys[position] == pair_keys if len(budget_keys) else np.zeros(len(pair_keys), bool)
+        budget = np.where(has_budget, amount[position] if len(amount) else np.nan, np.nan)
+
+        self._exposure = {
+            'user': (pair_keys // 2 ** 32).astype(np.int64),
+            'product': pair_keys % 2 ** 32 + UNKNOWN_PRODUCT,
+            'committed': committed,
+            'properties': properties,
+            'budget': budget,
+            'utilization': np.divide(committed, budget, out=np.full(len(committed), np.nan),
+                                     where=np.nan_to_num(budget) > 0),
+        }
+
+    def _update_table(self, table, key_column, columns, checkpoint, ingest):
+        high_water = self.source.max_key(table, key_column)
+        processed = 0
+        after = checkpoint
+        while after < high_water:
+            upto = min(after + self.batch_size, high_water)
+            batch = self.source.read_columns(table, columns, key_column=key_column, after=after, upto=upto)
+            processed += len(batch[key_column])
+            ingest(batch)
+            after = upto
+        return processed, high_water
+
+    def update(self, force=False):
+        """
+        Fold in bids and budgets added since the last update.
+
+        Args:
+            force (bool, optional): Check now even if update_interval has not passed
+
+        Returns:
+            int: Number of new rows processed
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_update is not None and now - self._last_update < self.update_interval:
+                return 0
+            self._last_update = now
+            bids, bid_high = self._update_table(BID_TRANSACTIONS_TABLE, 'BidId', BID_COLUMNS,
+                                                self.bid_checkpoint, self.ingest_bids)
+            budgets, budget_high = self._update_table(BID_BUDGET_TABLE, 'BidBudgetID', BUDGET_COLUMNS,
+                                                      self.budget_checkpoint, self.ingest_budgets)
+            self.bid_checkpoint = max(self.bid_checkpoint, bid_high)
+            self.budget_checkpoint = max(self.budget_checkpoint, budget_high)
+            if bids or budgets:
+                self._summarize()
+                logger.info(f"Bid exposure updated with {bids} bids and {budgets} budgets "
+                            f"({len(self._exposure['user'])} bidder/county pairs)")
+                if self.state_path:
+                    self.save_state(self.state_path)
+            return bids + budgets
+
+    def save_state(self, path):
+        """Atomically persist bids, budgets and checkpoints to an .npz file."""
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, bid_checkpoint=np.int64(self.bid_checkpoint),
+                     budget_checkpoint=np.int64(self.budget_checkpoint),
+                     users=np.asarray(self.users.values, dtype=np.str_),
+                     properties=np.asarray(self.properties.values, dtype=np.str_),
+                     bids=np.array(self._bids[:4]), bid_active=self._bids[4], bid_balance=self._bids[5],
+                     budgets=np.array(self._budgets[:3]), budget_amount=self._budgets[3])
+        os.replace(tmp_path, path)
+
+    def load_state(self, path):
+        """Restore state saved by save_state()."""
+        with np.load(path) as state:
+            self.bid_checkpoint = int(state['bid_checkpoint'])
+            self.budget_checkpoint = int(state['budget_checkpoint'])
+            self.users = StringDictionary(state['users'].tolist())
+            self.properties = StringDictionary(state['properties'].tolist())
+            self._bids = tuple(state['bids']) + (state['bid_active'], state['bid_balance'])
+            self._budgets = tuple(state['budgets']) + (state['budget_amount'],)
+        self._summarize()
+        logger.info(f"Loaded bid exposure at BidId {self.bid_checkpoint}")
+
+    def _rows(self, mask, order=None):
+        exposure = self._exposure
+        indices = np.flatnonzero(mask)
+        if order is not None:
+            indices = indices[np.argsort(-order[indices], kind='stable')]
+        return [{
+            'user_id': self.users.values[exposure['user'][i]],
+            'product_id': int(exposure['product'][i]),
+            'committed': round(float(exposure['committed'][i]), 2),
+            'budget': None if np.isnan(exposure['budget'][i]) else round(float(exposure['budget'][i]), 2),
+            'utilization': None if np.isnan(exposure['utilization'][i]) else round(float(exposure['utilization'][i]), 4),
+            'properties': int(exposure['properties'][i]),
+        } for i in indices]
+
+    def _product_mask(self, product_id):
+        if product_id is None:
+            return np.ones(len(self._exposure['user']), dtype=bool)
+        return self._exposure['product'] == product_id
+
+    def user_exposure(self, user_id):
+        """
+        Committed amount and budget of one bidder in every county.
+
+        Args:
+            user_id (str): UserId of the bidder
+
+        Returns:
+            list: One row per county the bidder has standing bids in
+        """
+        with self._lock:
+            code = self.users.lookup(user_id)
+            if code is None:
+                return []
+            return self._rows(self._exposure['user'] == code)
+
+    def over_budget(self, product_id=None):
+        """
+        Bidders whose committed amount exceeds their budget, worst first.
+
+        Args:
+            product_id (int, optional): Restrict to one county
+
+        Returns:
+            list: Exposure rows
+        """
+        with self._lock:
+            utilization = self._exposure['utilization']
+            mask = self._product_mask(product_id) & (np.nan_to_num(utilization) > 1)
+            return self._rows(mask, order=utilization)
+
+    def near_budget(self, threshold=DEFAULT_NEAR_THRESHOLD, product_id=None):
+        """
+        Bidders who have committed at least threshold of their budget without exceeding it.
+
+        Args:
+            threshold (float, optional): Share of the budget, e.g. 0.9
+            product_id (int, optional): Restrict to one county
+
+        Returns:
+            list: Exposure rows, closest to the limit first
+        """
+        with self._lock:
+            utilization = np.nan_to_num(self._exposure['utilization'])
+            mask = self._product_mask(product_id) & (utilization >= threshold) & (utilization <= 1)
+            return self._rows(mask, order=utilization)
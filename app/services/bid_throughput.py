@@ -0,0 +1,307 @@
+"""
+Bid activity throughput.
+Buckets vg_BidTransactions.BidTime into per-second and per-minute counts
+by VGProductID and BidSource, and detects peak load windows. Counts are
+accumulated incrementally from the last processed BidId, at most once per
+update_interval so frequent report requests do not each query for new bids.
+"""
+import os
+import time
+import uuid
+import logging
+import datetime
+import threading
+
+import numpy as np
+
+from app.services.db import TaxsaleSource
+
+logger = logging.getLogger(__name__)
+
+BID_TRANSACTIONS_TABLE = 'vg_BidTransactions'
+BID_COLUMNS = ('BidId', 'BidTime', 'BidSource', 'VGProductID')
+
+# BidId range read per round trip during an update
+DEFAULT_BATCH_SIZE = 50000
+
+# Rolling throughput window in seconds
+DEFAULT_WINDOW = 60
+
+# Bids without a product are grouped under this id
+UNKNOWN_PRODUCT = -1
+
+
+def _to_epoch_seconds(values):
+    """Convert datetimes (or ISO strings) to integer epoch seconds."""
+    return np.asarray(values, dtype='datetime64[s]').astype(np.int64)
+
+
+def _format_second(second):
+    """Format an epoch second as an ISO timestamp."""
+    # BidTime is a naive server-local datetime, so round-trip it without a zone
+    return datetime.datetime.utcfromtimestamp(int(second)).isoformat()
+
+
+def _aggregate(product, source, second, counts):
+    """
+    Sum counts that share the same (product, source, second) key.
+
+    Returns:
+        tuple: Sorted, de-duplicated (product, source, second, counts) arrays
+    """
+    if not len(second):
+        return product, source, second, counts
+
+    order = np.lexsort((second, source, product))
+    product, source, second, counts = product[order], source[order], second[order], counts[order]
+    boundary = np.ones(len(second), dtype=bool)
+    boundary[1:] = (np.diff(product) != 0) | (np.diff(source) != 0) | (np.diff(second) != 0)
+    starts = np.flatnonzero(boundary)
+    return product[starts], source[starts], second[starts], np.add.reduceat(counts, starts)
+
+
+def _rebucket(second, counts, width):
+    """Re-aggregate sorted per-second counts into buckets of the given width."""
+    buckets, index = np.unique(second // width * width, return_inverse=True)
+    return buckets, np.bincount(index, weights=counts).astype(np.int64)
+
+
+def _rolling_peak(second, counts, window):
+    """
+    Find the busiest rolling window over sparse, sorted per-second counts.
+
+    Returns:
+        tuple: (bids in the window, window end second)
+    """
+    cumulative = np.cumsum(counts)
+    # Index of the last second that falls before each window start
+    before = np.searchsorted(second, second - window, side='right') - 1
+    window_sums = cumulative - np.where(before >= 0, cumulative[np.maximum(before, 0)], 0)
+    peak = int(np.argmax(window_sums))
+    return int(window_sums[peak]), int(second[peak])
+
+
+class BidThroughputEngine:
+    """Accumulates bid counts per second and reports throughput and peaks."""
+
+    def __init__(self, source=None, batch_size=DEFAULT_BATCH_SIZE, state_path=None, update_interval=0):
+        """
+        Initialize the engine.
+
+        Args:
+            source (optional): TaxsaleSource (or compatible) to read bids from
+            batch_size (int, optional): BidId range read per round trip
+            state_path (str, optional): .npz file used to persist counts and
+                the BidId checkpoint between runs
+            update_interval (int, optional): Seconds between checks for new bids
+        """
+        self.source = source or TaxsaleSource()
+        self.batch_size = batch_size
+        self.state_path = state_path
+        self.update_interval = update_interval
+        self._last_update = None
+        self._lock = threading.Lock()
+        self.reset()
+        if state_path and os.path.exists(state_path):
+            self.load_state(state_path)
+
+    def reset(self):
+        """Forget all counts and start again from the first bid."""
+        self.checkpoint = 0
+        self.sources = []
+        self._source_codes = {}
+        self._product = np.empty(0, dtype=np.int64)
+        self._source = np.empty(0, dtype=np.int64)
+        self._second = np.empty(0, dtype=np.int64)
+        self._counts = np.empty(0, dtype=np.int64)
+
+    def _encode_sources(self, names):
+        """Map BidSource strings to stable integer codes."""
+        codes = np.empty(len(names), dtype=np.int64)
+        for i, name in enumerate(names):
+            name = (name or '').strip()
+            code = self._source_codes.get(name)
+            if code is None:
+                code = self._source_codes[name] = len(self.sources)
+                self.sources.append(name)
+            codes[i] = code
+        return codes
+
+    def ingest(self, columns):
+        """
+        Merge a batch of bid rows into the accumulated counts.
+
+        Args:
+            columns (dict): Lists or arrays keyed by BID_COLUMNS
+        """
+        if not len(columns['BidId']):
+            return
+
+        product = np.asarray(
+            [UNKNOWN_PRODUCT if p is None else p for p in columns['VGProductID']], dtype=np.int64)
+        source = self._encode_sources(columns['BidSource'])
+        second = _to_epoch_seconds(columns['BidTime'])
+        counts = np.ones(len(second), dtype=np.int64)
+
+        self._product, self._source, self._second, self._counts = _aggregate(
+            np.concatenate((self._product, product)),
+            np.concatenate((self._source, source)),
+            np.concatenate((self._second, second)),
+            np.concatenate((self._counts, counts)))
+        self.checkpoint = max(self.checkpoint, int(np.max(np.asarray(columns['BidId'], dtype=np.int64))))
+
+    def update(self, force=False):
+        """
+        Incremental mode: process only bids above the last checkpoint.
+
+        Args:
+            force (bool, optional): Check now even if update_interval has not passed
+
+        Returns:
+            int: Number of new bids processed
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_update is not None and now - self._last_update < self.update_interval:
+                return 0
+            self._last_update = now
+            high_water = self.source.max_key(BID_TRANSACTIONS_TABLE, 'BidId')
+            processed = 0
+            after = self.checkpoint
+            while after < high_water:
+                upto = min(after + self.batch_size, high_water)
+                columns = self.source.read_columns(
+                    BID_TRANSACTIONS_TABLE, BID_COLUMNS, key_column='BidId', after=after, upto=upto)
+                processed += len(columns['BidId'])
+                self.ingest(columns)
+                # Identity gaps can leave a window empty, so always advance
+                self.checkpoint = after = upto
+
+            if processed:
+                logger.info(f"Processed {processed} bids up to BidId {self.checkpoint}")
+                if self.state_path:
+                    self.save_state(self.state_path)
+            return processed
+
+    def rebuild(self):
+        """
+        Batch mode: recompute all counts from the full bid history.
+
+        Returns:
+            int: Number of bids processed
+        """
+        with self._lock:
+            self.reset()
+        return self.update()
+
+    def save_state(self, path):
+        """Atomically persist counts and the checkpoint to an .npz file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, checkpoint=np.int64(self.checkpoint), sources=np.asarray(self.sources, dtype=np.str_),
+                     product=self._product, source=self._source, second=self._second, counts=self._counts)
+        os.replace(tmp_path, path)
+
+    def load_state(self, path):
+        """Restore counts and the checkpoint saved by save_state()."""
+        with np.load(path) as state:
+            self.checkpoint = int(state['checkpoint'])
+            self.sources = state['sources'].tolist()
+            self._source_codes = {name: i for i, name in enumerate(self.sources)}
+            self._product = state['product']
+            self._source = state['source']
+            self._second = state['second']
+            self._counts = state['counts']
+        logger.info(f"Loaded bid throughput state at BidId {self.checkpoint}")
+
+    def _select(self, product_id=None, bid_source=None):
+        mask = np.ones(len(self._second), dtype=bool)
+        if product_id is not None:
+            mask &= self._product == product_id
+        if bid_source is not None:
+            code = self._source_codes.get(bid_source)
+            if code is None:
+                mask[:] = False
+            else:
+                mask &= self._source == code
+        return mask
+
+    def _series_summary(self, second, counts, window):
+        """Throughput and peak figures for one set of per-second counts."""
+        # Several series can share a second, so collapse before measuring
+        second, counts = _rebucket(second, counts, 1)
+        minutes, minute_counts = _rebucket(second, counts, 60)
+        busiest_second = int(np.argmax(counts))
+        busiest_minute = int(np.argmax(minute_counts))
+        rolling_bids, rolling_end = _rolling_peak(second, counts, window)
+        total = int(counts.sum())
+        return {
+            'bids': total,
+            'first_bid': _format_second(second[0]),
+            'last_bid': _format_second(second[-1]),
+            'active_seconds': int(len(second)),
+            'mean_per_active_second': round(total / len(second), 4),
+            'peak_per_second': {'bids': int(counts[busiest_second]), 'at': _format_second(second[busiest_second])},
+            'peak_per_minute': {'bids': int(minute_counts[busiest_minute]),
+                                'at': _format_second(minutes[busiest_minute])},
+            'peak_rolling': {'window_seconds': window, 'bids': rolling_bids,
+                             'bids_per_second': round(rolling_bids / window, 4),
+                             'start': _format_second(rolling_end - window + 1),
+                             'end': _format_second(rolling_end)},
+        }
+
+    def report(self, product_id=None, window=DEFAULT_WINDOW):
+        """
+        Throughput and peak-load report, overall and per (product, source).
+
+        Args:
+            product_id (int, optional): Restrict to one VGProductID
+            window (int, optional): Rolling window in seconds
+
+        Returns:
+            dict: Overall summary and one row per series
+        """
+        with self._lock:
+            mask = self._select(product_id)
+            product, source = self._product[mask], self._source[mask]
+            second, counts = self._second[mask], self._counts[mask]
+            checkpoint = self.checkpoint
+            sources = list(self.sources)
+
+        result = {'checkpoint': checkpoint, 'product_id': product_id, 'overall': None, 'series': []}
+        if not len(second):
+            return result
+
+        order = np.argsort(second, kind='stable')
+        result['overall'] = self._series_summary(second[order], counts[order], window)
+
+        # Rows are sorted by (product, source, second), so series are contiguous
+        boundary = np.ones(len(second), dtype=bool)
+        boundary[1:] = (np.diff(product) != 0) | (np.diff(source) != 0)
+        starts = np.flatnonzero(boundary)
+        ends = np.append(starts[1:], len(second))
+        for start, end in zip(starts, ends):
+            row = {'product_id': int(product[start]), 'bid_source': sources[source[start]]}
+            row.update(self._series_summary(second[start:end], counts[start:end], window))
+            result['series'].append(row)
+        return result
+
+    def timeline(self, product_id=None, bid_source=None, resolution=60):
+        """
+        Bids per bucket over time, for charting.
+
+        Args:
+            product_id (int, optional): Restrict to one VGProductID
+            bid_source (str, optional): Restrict to one BidSource
+            resolution (int, optional): Bucket width in seconds
+
+        Returns:
+            list: [timestamp, bids] pairs in time order
+        """
+        with self._lock:
+            mask = self._select(product_id, bid_source)
+            second, counts = self._second[mask], self._counts[mask]
+
+        buckets, bucket_counts = _rebucket(second, counts, resolution)
+        return [[_format_second(b), int(c)] for b, c in zip(buckets, bucket_counts)]
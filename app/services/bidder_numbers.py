@@ -0,0 +1,277 @@
+"""
+Bidder numbers.
+Keeps vg_BidderNumbers warm in memory, indexed by (VGProductID, UserId), so
+bid placement can resolve a bidder number without a database round trip.
+Users without a number, or with only a pending request, are remembered for
+a few seconds, so a burst of lookups for them queries once while a number
+issued by another worker is still seen almost at once.
+Numbers are allocated to a county's pending requests (rows whose
+BidderNumber is NULL) in one locked transaction, and pending requests are
+purged in bulk with an IS NULL predicate.
+"""
+import logging
+import threading
+import time
+
+from app.services.db import TaxsaleSource, SCHEMA
+from app.utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+BIDDER_NUMBERS_TABLE = 'vg_BidderNumbers'
+
+# Seconds before the whole table is reloaded to pick up changes made elsewhere
+DEFAULT_RELOAD_INTERVAL = 300
+
+# Seconds a user without an issued number is answered from memory
+DEFAULT_MISS_TTL = 5
+
+# Bidder numbers are allocated upwards from here in a county with none yet
+FIRST_BIDDER_NUMBER = 1000
+
+# UserIds per DELETE / INSERT statement
+WRITE_BATCH_SIZE = 500
+
+_NUMBERS_FOR_UPDATE = {
+    # Hold a range lock so concurrent allocations in the same county serialize
+    'mssql': f"SELECT BidderNumber FROM {SCHEMA}.{BIDDER_NUMBERS_TABLE} WITH (UPDLOCK, HOLDLOCK) "
+             f"WHERE VGProductID = ?",
+    'sqlite': f"SELECT BidderNumber FROM {SCHEMA}.{BIDDER_NUMBERS_TABLE} WHERE VGProductID = ?",
+}
+
+
+def _user_key(user_id):
+    """vg_BidderNumbers.UserId is a uniqueidentifier: compare it case-insensitively."""
+    return str(user_id).strip().lower()
+
+
+def _next_number(numbers):
+    """First bidder number above every numeric number already issued."""
+    issued = [int(n) for n in numbers if n is not None and str(n).strip().isdigit()]
+    return max(issued) + 1 if issued else FIRST_BIDDER_NUMBER
+
+
+def _chunks(values, size=WRITE_BATCH_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class BidderNumberService:
+    """In-memory bidder number index with batch allocation and pending purges."""
+
+    def __init__(self, source=None, reload_interval=DEFAULT_RELOAD_INTERVAL, miss_ttl=DEFAULT_MISS_TTL,
+                 clock=time.monotonic):
+        """
+        Initialize the service.
+
+        Args:
+            source (optional): TaxsaleSource holding vg_BidderNumbers
+            reload_interval (int, optional): Seconds between full reloads
+            miss_ttl (int, optional): Seconds a user without an issued number is answered from memory
+            clock (callable, optional): Monotonic time source
+        """
+        self.source = source or TaxsaleSource()
+        self.reload_interval = reload_interval
+        self.miss_ttl = miss_ttl
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._numbers = {}
+        # Key -> when it was last seen without an issued number (no row, or only a pending one)
+        self._unissued = {}
+        self._loaded_at = None
+
+    def reload(self):
+        """
+        Replace the index with the current contents of vg_BidderNumbers.
+
+        Returns:
+            int: Number of rows loaded
+        """
+        rows = self.source.query(f"SELECT VGProductID, UserId, BidderNumber FROM {SCHEMA}.{BIDDER_NUMBERS_TABLE}")
+        numbers = {}
+        for product_id, user_id, bidder_number in rows:
+            key = (product_id, _user_key(user_id))
+            # A user with both an issued number and a pending request keeps the issued number
+            if bidder_number is not None or key not in numbers:
+                numbers[key] = bidder_number
+        now = self.clock()
+        with self._lock:
+            self._numbers = numbers
+            self._unissued = {key: now for key, number in numbers.items() if number is None}
+            self._loaded_at = now
+        logger.info(f"Loaded {len(numbers)} bidder numbers")
+        return len(numbers)
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or self.clock() - self._loaded_at >= self.reload_interval:
+            self.reload()
+
+    def lookup(self, user_id, product_id):
+        """
+        Bidder number of a user in a county.
+
+        Args:
+            user_id: UserId of the bidder
+            product_id (int): VGProductID
+
+        Returns:
+            str: BidderNumber, or None when the user has none or only a pending request
+        """
+        self._ensure_loaded()
+        key = (product_id, _user_key(user_id))
+        with self._lock:
+            bidder_number = self._numbers.get(key)
+            if bidder_number is not None:
+                record_cache('bidder_numbers', True)
+                return bidder_number
+            checked_at = self._unissued.get(key)
+            if checked_at is not None and self.clock() - checked_at < self.miss_ttl:
+                record_cache('bidder_numbers', True)
+                return None
+
+        record_cache('bidder_numbers', False)
+        # No issued number in memory: it may have been issued since
+        rows = self.source.query(
+            f"SELECT BidderNumber FROM {SCHEMA}.{BIDDER_NUMBERS_TABLE} WHERE VGProductID = ? AND UserId = ?",
+            (product_id, user_id))
+        numbers = [row[0] for row in rows]
+        bidder_number = next((n for n in numbers if n is not None), None)
+        with self._lock:
+            if numbers:
+                self._numbers[key] = bidder_number
+            else:
+                self._numbers.pop(key, None)
+            if bidder_number is None:
+                self._unissued[key] = self.clock()
+            else:
+                self._unissued.pop(key, None)
+        return bidder_number
+
+    def is_pending(self, user_id, product_id):
+        """Whether a user has requested a bidder number in a county that has not been issued yet."""
+        if self.lookup(user_id, product_id) is not None:
+            return False
+        with self._lock:
+            return (product_id, _user_key(user_id)) in self._numbers
+
+    def request(self, user_id, product_id):
+        """
+        Record a pending bidder number request.
+
+        Args:
+            user_id: UserId of the bidder
+            product_id (int): VGProductID
+
+        Returns:
+            bool: False when the user already has a number or a pending request
+        """
+        self._ensure_loaded()
+        key = (product_id, _user_key(user_id))
+        with self._lock:
+            if key in self._numbers:
+                return False
+        with self.source.transaction() as cursor:
+            cursor.execute(f"INSERT INTO {SCHEMA}.{BIDDER_NUMBERS_TABLE} (VGProductID, UserId, BidderNumber) "
+                           f"VALUES (?, ?, NULL)", (product_id, user_id))
+        with self._lock:
+            self._numbers[key] = None
+            self._unissued[key] = self.clock()
+        return True
+
+    def allocate(self, product_id, user_ids=None):
+        """
+        Issue bidder numbers in a county.
+
+        Every pending request (or only those of user_ids) gets the next free
+        number; user_ids without any row are given a number directly. The
+        county's numbers are read under an update lock so concurrent
+        allocations cannot issue the same number twice.
+
+        Args:
+            product_id (int): VGProductID
+            user_ids (list, optional): Users to allocate for. Defaults to all pending requests.
+
+        Returns:
+            dict: UserId -> newly issued BidderNumber
+        """
+        wanted = None if user_ids is None else {_user_key(u): u for u in user_ids}
+        with self.source.transaction() as cursor:
+            cursor.execute(_NUMBERS_FOR_UPDATE[self.source.dialect], (product_id,))
+            next_number = _next_number(row[0] for row in cursor.fetchall())
+            cursor.execute(f"SELECT BidderId, UserId, BidderNumber FROM {SCHEMA}.{BIDDER_NUMBERS_TABLE} "
+                           f"WHERE VGProductID = ? ORDER BY BidderId", (product_id,))
+            rows = cursor.fetchall()
+
+            issued_users = {_user_key(user_id) for _, user_id, number in rows if number is not None}
+            updates, allocated = [], {}
+            for bidder_id, user_id, number in rows:
+                key = _user_key(user_id)
+                if number is not None or key in issued_users or key in allocated:
+                    continue
+                if wanted is not None and key not in wanted:
+                    continue
+                allocated[key] = (user_id, str(next_number))
+                updates.append((str(next_number), bidder_id))
+                next_number += 1
+
+            inserts = []
+            for key, user_id in (wanted or {}).items():
+                if key in issued_users or key in allocated:
+                    continue
+                allocated[key] = (user_id, str(next_number))
+                inserts.append((product_id, user_id, str(next_number)))
+                next_number += 1
+
+            if updates:
+                cursor.executemany(f"UPDATE {SCHEMA}.{BIDDER_NUMBERS_TABLE} SET BidderNumber = ? "
+                                   f"WHERE BidderId = ? AND BidderNumber IS NULL", updates)
+            if inserts:
+                cursor.executemany(f"INSERT INTO {SCHEMA}.{BIDDER_NUMBERS_TABLE} (VGProductID, UserId, BidderNumber) "
+                                   f"VALUES (?, ?, ?)", inserts)
+
+        with self._lock:
+            for key, (_, number) in allocated.items():
+                self._numbers[(product_id, key)] = number
+                self._unissued.pop((product_id, key), None)
+        logger.info(f"Allocated {len(allocated)} bidder numbers for product {product_id}")
+        return {user_id: number for user_id, number in allocated.values()}
+
+    def purge_pending(self, product_id=None, user_ids=None):
+        """
+        Delete pending bidder number requests.
+
+        Args:
+            product_id (int, optional): Restrict to one county
+            user_ids (list, optional): Restrict to these users
+
+        Returns:
+            int: Number of requests deleted
+        """
+        sql = f"DELETE FROM {SCHEMA}.{BIDDER_NUMBERS_TABLE} WHERE BidderNumber IS NULL"
+        params = []
+        if product_id is not None:
+            sql += " AND VGProductID = ?"
+            params.append(product_id)
+
+        deleted = 0
+        with self.source.transaction() as cursor:
+            if user_ids is None:
+                cursor.execute(sql, params)
+                deleted = cursor.rowcount
+            else:
+                for chunk in _chunks(list(user_ids)):
+                    cursor.execute(f"{sql} AND UserId IN ({', '.join('?' * len(chunk))})", params + chunk)
+                    deleted += cursor.rowcount
+
+        users = None if user_ids is None else {_user_key(u) for u in user_ids}
+        with self._lock:
+            for key in [k for k, number in self._numbers.items() if number is None]:
+                if (product_id is None or key[0] == product_id) and (users is None or key[1] in users):
+                    del self._numbers[key]
+                    self._unissued[key] = self.clock()
+        logger.info(f"Purged {deleted} pending bidder number requests")
+        return deleted
+
+    def remove_pending(self, user_id, product_id):
+        """Delete one user's pending request in a county (vg_RemovePendingBidderIDRequest)."""
+        return self.purge_pending(product_id=product_id, user_ids=[user_id]) > 0
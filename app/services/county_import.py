@@ -0,0 +1,362 @@
+"""
+County tax-certificate bulk loader.
+Streams a county import file in chunks, parses and validates each chunk
+against the table's DDL column widths in a process pool, bulk-inserts the
+valid rows into a staging copy of the county's vg_TaxCertificateFileNN table
+and swaps it in atomically, recording the import in vg_DTSImport.
+"""
+import os
+import csv
+import time
+import logging
+import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+from app.services.db import SCHEMA, TaxsaleSource, quote_identifier
+from app.services.schema_catalog import SQL_DIR, get_catalog
+
+logger = logging.getLogger(__name__)
+
+# Lines handed to a worker at a time
+DEFAULT_CHUNK_SIZE = 20000
+
+# Rows per executemany into the staging table
+DEFAULT_INSERT_BATCH_SIZE = 5000
+
+# Rejected rows tolerated before the whole import is abandoned
+DEFAULT_MAX_ERRORS = 100
+
+# Rejected rows reported back to the caller
+REPORTED_ERRORS = 100
+
+# PaidStatus values counted as paid in vg_DTSImport
+PAID_STATUSES = ('P', 'Y')
+
+# Field widths of fixed-width files for types without a declared length
+FIXED_WIDTHS = {'int': 11, 'smallint': 6, 'tinyint': 3, 'bigint': 20, 'bit': 1, 'date': 10,
+                'datetime': 19, 'smalldatetime': 19}
+
+INTEGER_RANGES = {
+    'tinyint': (0, 255),
+    'smallint': (-2 ** 15, 2 ** 15 - 1),
+    'int': (-2 ** 31, 2 ** 31 - 1),
+    'bigint': (-2 ** 63, 2 ** 63 - 1),
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%Y%m%d', '%Y-%m-%d %H:%M:%S', '%m/%d/%Y %H:%M:%S')
+
+BIT_VALUES = {'1': True, '0': False, 'y': True, 'n': False, 't': True, 'f': False, 'true': True, 'false': False}
+
+# Statements that differ between SQL Server and the SQLite test database
+_DIALECT_SQL = {
+    'mssql': {
+        'create_staging': "SELECT * INTO {schema}.{staging} FROM {schema}.{table} WHERE 1 = 0",
+        'rename': "EXEC sp_rename '{schema}.{old}', '{new}'",
+        'record_import': "INSERT INTO {schema}.vg_DTSImport (VGProductID, ImportDate, ItemCount, PaidCount, "
+                         "UnpaidCount, UnpaidSum, FileName) OUTPUT INSERTED.ImportID VALUES (?, ?, ?, ?, ?, ?, ?)",
+    },
+    'sqlite': {
+        'create_staging': "CREATE TABLE {schema}.{staging} AS SELECT * FROM {schema}.{table} WHERE 0",
+        'rename': "ALTER TABLE {schema}.{old} RENAME TO {new}",
+        'record_import': "INSERT INTO {schema}.vg_DTSImport (VGProductID, ImportDate, ItemCount, PaidCount, "
+                         "UnpaidCount, UnpaidSum, FileName) VALUES (?, ?, ?, ?, ?, ?, ?)",
+    },
+}
+
+
+class ImportValidationError(ValueError):
+    """Raised when an import file has more invalid rows than allowed."""
+
+    def __init__(self, message, errors):
+        super().__init__(message)
+        self.errors = errors
+
+
+def read_table_layout(table, sql_dir=SQL_DIR):
+    """
+    Look up a table's columns in the schema catalog built from sql/.
+
+    Args:
+        table (str): Table name without schema
+        sql_dir (str, optional): Directory holding the UTF-16 DDL scripts
+
+    Returns:
+        list: (name, type, length, scale, nullable) per column, in table order
+    """
+    return [(c.name, c.type, c.length, c.scale, c.nullable) for c in get_catalog(sql_dir).columns(table)]
+
+
+def field_width(sql_type, length, scale):
+    """Width of a column in a fixed-width import file."""
+    if sql_type in ('decimal', 'numeric'):
+        # Digits plus sign and decimal point
+        return length + 2
+    return length or FIXED_WIDTHS.get(sql_type, 30)
+
+
+def convert_value(raw, column):
+    """
+    Validate one raw field and convert it to the value bound into the insert.
+
+    Args:
+        raw (str): Field text from the file
+        column (tuple): (name, type, length, scale, nullable) from read_table_layout
+
+    Returns:
+        The converted value (None for an empty field)
+
+    Raises:
+        ValueError: When the field does not fit the column
+    """
+    name, sql_type, length, scale, nullable = column
+    value = raw.strip() if raw is not None else ''
+    if value == '':
+        if not nullable:
+            raise ValueError(f"{name} is required")
+        return None
+
+    if sql_type in ('varchar', 'char', 'nvarchar', 'nchar'):
+        if length is not None and len(value) > length:
+            raise ValueError(f"{name} is {len(value)} characters, column allows {length}")
+        return value
+    if sql_type in INTEGER_RANGES:
+        low, high = INTEGER_RANGES[sql_type]
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValueError(f"{name} is not an integer: {value!r}")
+        if not low <= number <= high:
+            raise ValueError(f"{name} value {number} out of range for {sql_type}")
+        return number
+    if sql_type in ('decimal', 'numeric'):
+        try:
+            number = Decimal(value.replace(',', '').replace('$', ''))
+        except InvalidOperation:
+            raise ValueError(f"{name} is not a number: {value!r}")
+        number = number.quantize(Decimal(1).scaleb(-scale))
+        if len(number.as_tuple().digits) - scale > length - scale and number != 0:
+            raise ValueError(f"{name} value {value} exceeds decimal({length}, {scale})")
+        # Strings keep the exact value and bind on every driver
+        return str(number)
+    if sql_type == 'bit':
+        if value.lower() not in BIT_VALUES:
+            raise ValueError(f"{name} is not a bit: {value!r}")
+        return BIT_VALUES[value.lower()]
+    if sql_type in ('date', 'datetime', 'smalldatetime', 'datetime2'):
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            return parsed.date() if sql_type == 'date' else parsed
+        raise ValueError(f"{name} is not a date: {value!r}")
+    return value
+
+
+def split_fields(lines, layout, file_format, delimiter):
+    """Split raw lines into field lists in layout order."""
+    if file_format == 'fixed':
+        widths = [field_width(sql_type, length, scale) for _, sql_type, length, scale, _ in layout]
+        fields = []
+        for line in lines:
+            row, position = [], 0
+            for width in widths:
+                row.append(line[position:position + width])
+                position += width
+            fields.append(row)
+        return fields
+    return list(csv.reader(lines, delimiter=delimiter))
+
+
+def parse_chunk(task):
+    """
+    Parse and validate one chunk of lines. Runs in a worker process.
+
+    Args:
+        task (tuple): (line numbers, lines, layout, file_format, delimiter)
+
+    Returns:
+        tuple: (valid rows, [(line number, error message)])
+    """
+    line_numbers, lines, layout, file_format, delimiter = task
+    rows = []
+    errors = []
+    for line_no, fields in zip(line_numbers, split_fields(lines, layout, file_format, delimiter)):
+        if len(fields) != len(layout):
+            errors.append((line_no, f"Expected {len(layout)} fields, found {len(fields)}"))
+            continue
+        try:
+            rows.append(tuple(convert_value(raw, column) for raw, column in zip(fields, layout)))
+        except ValueError as e:
+            errors.append((line_no, str(e)))
+    return rows, errors
+
+
+class CountyImporter:
+    """Loads county certificate files into vg_TaxCertificateFileNN tables."""
+
+    def __init__(self, source=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 insert_batch_size=DEFAULT_INSERT_BATCH_SIZE, max_errors=DEFAULT_MAX_ERRORS, sql_dir=SQL_DIR):
+        """
+        Initialize the importer.
+
+        Args:
+            source (optional): TaxsaleSource to load into
+            workers (int, optional): Parser processes. Defaults to the CPU count;
+                0 parses in the calling process.
+            chunk_size (int, optional): Lines handed to a worker at a time
+            insert_batch_size (int, optional): Rows per staging insert
+            max_errors (int, optional): Rejected rows tolerated before aborting
+            sql_dir (str, optional): Directory holding the DDL scripts
+        """
+        self.source = source or TaxsaleSource()
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = chunk_size
+        self.insert_batch_size = insert_batch_size
+        self.max_errors = max_errors
+        self.sql_dir = sql_dir
+
+    def _county_table(self, product_id):
+        rows = self.source.query(f"SELECT TaxCertTableName FROM {SCHEMA}.vg_CountyInfo WHERE VGProductID = ?",
+                                 [product_id])
+        if not rows or not rows[0][0]:
+            raise ValueError(f"No certificate table configured for product {product_id}")
+        return quote_identifier(rows[0][0].strip())
+
+    def _read_chunks(self, path, encoding, skip_header):
+        """Yield (line numbers, lines) chunks of the file's non-blank lines."""
+        with open(path, 'r', encoding=encoding, newline='') as f:
+            if skip_header:
+                f.readline()
+            line_numbers, chunk = [], []
+            for line_no, line in enumerate(f, 2 if skip_header else 1):
+                line = line.rstrip('\r\n')
+                # Blank lines are skipped but still counted, so errors point at the right line
+                if not line.strip():
+                    continue
+                line_numbers.append(line_no)
+                chunk.append(line)
+                if len(chunk) >= self.chunk_size:
+                    yield line_numbers, chunk
+                    line_numbers, chunk = [], []
+            if chunk:
+                yield line_numbers, chunk
+
+    def _parsed_chunks(self, tasks):
+        """Parse chunks in order, keeping at most two per worker in flight."""
+        if not self.workers:
+            for task in tasks:
+                yield parse_chunk(task)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for task in tasks:
+                pending.append(executor.submit(parse_chunk, task))
+                if len(pending) >= self.workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def load(self, path, product_id, table=None, file_format='delimited', delimiter='|', has_header=False,
+             encoding='latin-1'):
+        """
+        Load a county file, replacing the contents of the county table.
+
+        Args:
+            path (str): Import file
+            product_id (int): VGProductID of the county
+            table (str, optional): Target table. Defaults to vg_CountyInfo.TaxCertTableName.
+            file_format (str, optional): 'delimited' or 'fixed' (DDL column widths)
+            delimiter (str, optional): Field separator of delimited files
+            has_header (bool, optional): Skip the first line
+            encoding (str, optional): File encoding
+
+        Returns:
+            dict: Load statistics, including the vg_DTSImport values written
+
+        Raises:
+            ImportValidationError: When more than max_errors rows are rejected.
+                The live table is left untouched.
+        """
+        started = time.perf_counter()
+        table = quote_identifier(table) if table else self._county_table(product_id)
+        layout = read_table_layout(table, self.sql_dir)
+        columns = [column[0] for column in layout]
+        staging, previous = f"{table}_Staging", f"{table}_Previous"
+        statements = _DIALECT_SQL[self.source.dialect]
+        insert_sql = (f"INSERT INTO {SCHEMA}.{staging} ({', '.join(columns)}) "
+                      f"VALUES ({', '.join('?' for _ in columns)})")
+
+        paid_index = columns.index('PaidStatus') if 'PaidStatus' in columns else None
+        unpaid_index = columns.index('UnpaidBalance') if 'UnpaidBalance' in columns else None
+        stats = {'rows_loaded': 0, 'rows_rejected': 0, 'paid_count': 0, 'unpaid_count': 0, 'unpaid_sum': Decimal(0)}
+        errors = []
+
+        tasks = ((line_numbers, lines, layout, file_format, delimiter)
+                 for line_numbers, lines in self._read_chunks(path, encoding, has_header))
+
+        with self.source.connection() as conn:
+            cursor = conn.cursor()
+            if hasattr(cursor, 'fast_executemany'):
+                # pyodbc sends each batch as one bulk parameter array
+                cursor.fast_executemany = True
+            try:
+                cursor.execute(f"DROP TABLE IF EXISTS {SCHEMA}.{staging}")
+                cursor.execute(statements['create_staging'].format(schema=SCHEMA, staging=staging, table=table))
+                conn.commit()
+
+                for rows, chunk_errors in self._parsed_chunks(tasks):
+                    stats['rows_rejected'] += len(chunk_errors)
+                    errors.extend(chunk_errors[:REPORTED_ERRORS - len(errors)])
+                    if stats['rows_rejected'] > self.max_errors:
+                        raise ImportValidationError(
+                            f"{stats['rows_rejected']} invalid rows in {os.path.basename(path)}", errors)
+
+                    for start in range(0, len(rows), self.insert_batch_size):
+                        cursor.executemany(insert_sql, rows[start:start + self.insert_batch_size])
+                    conn.commit()
+
+                    stats['rows_loaded'] += len(rows)
+                    for row in rows:
+                        if paid_index is not None and row[paid_index] in PAID_STATUSES:
+                            stats['paid_count'] += 1
+                        else:
+                            stats['unpaid_count'] += 1
+                            if unpaid_index is not None and row[unpaid_index] is not None:
+                                stats['unpaid_sum'] += Decimal(row[unpaid_index])
+
+                # Swap: record the import and rename both tables in one transaction
+                cursor.execute(f"DROP TABLE IF EXISTS {SCHEMA}.{previous}")
+                cursor.execute(statements['record_import'].format(schema=SCHEMA), [
+                    product_id, datetime.datetime.now(), stats['rows_loaded'], stats['paid_count'],
+                    stats['unpaid_count'], str(stats['unpaid_sum']), os.path.basename(path)[:30]])
+                import_id = cursor.fetchone()[0] if self.source.dialect == 'mssql' else cursor.lastrowid
+                cursor.execute(statements['rename'].format(schema=SCHEMA, old=table, new=previous))
+                cursor.execute(statements['rename'].format(schema=SCHEMA, old=staging, new=table))
+                conn.commit()
+                cursor.execute(f"DROP TABLE IF EXISTS {SCHEMA}.{previous}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                cursor.execute(f"DROP TABLE IF EXISTS {SCHEMA}.{staging}")
+                conn.commit()
+                raise
+            finally:
+                cursor.close()
+
+        duration = time.perf_counter() - started
+        logger.info(f"Loaded {stats['rows_loaded']} rows into {table} from {os.path.basename(path)} "
+                    f"({stats['rows_rejected']} rejected, {duration:.2f}s)")
+        stats['unpaid_sum'] = float(stats['unpaid_sum'])
+        stats.update({
+            'table': table,
+            'product_id': product_id,
+            'import_id': import_id,
+            'file_name': os.path.basename(path),
+            'duration_seconds': round(duration, 3),
+            'errors': [{'line': line, 'error': message} for line, message in errors],
+        })
+        return stats
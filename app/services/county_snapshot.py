@@ -0,0 +1,218 @@
+"""
+County snapshot cache.
+Loads the small, rarely changing tables every page needs (vg_CountyInfo,
+vg_Dates and vg_AuctionConfiguration) in one batch into an immutable
+snapshot of namedtuples. The snapshot is shared read-only across threads and
+replaced wholesale when its TTL passes or its version is bumped, so
+requests never query these tables themselves.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from app.services.db import TaxsaleSource, SCHEMA
+from app.utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Seconds a snapshot is served before it is reloaded
+DEFAULT_TTL = 300
+
+County = namedtuple('County', (
+    'VGProductID', 'CountyName', 'CountyWebSite', 'Title', 'Slogan', 'TaxCertTableName', 'CSSFile',
+    'HostAddress', 'TaxYear', 'TaxViewTableName', 'AuctionLiveDate', 'PropertyLink', 'ExemptTable',
+    'RequestorName', 'QueueStartID', 'LastOnlineDepositDate', 'AuctionResultsStatus', 'SiteEnabled',
+    'MobileEnabled', 'MobileTheme'))
+
+SaleDates = namedtuple('SaleDates', (
+    'VGProductID', 'RegistrationBegins', 'BiddingBegins', 'LastDepositDate', 'LastCertDepositDate',
+    'BiddingEnds', 'TaxSaleDate', 'LastPayDate', 'RegistrationDeadline'))
+
+AuctionSettings = namedtuple('AuctionSettings', (
+    'AuctionId', 'AuctionName', 'AuctionStartDate', 'BiddingType', 'AuctionType', 'BidIncrement',
+    'MaximumBid', 'MinimumBid', 'AuctionActive', 'AuctionDeleted', 'NumberOfQueues', 'AuctionValue',
+    'VGProductId'))
+
+_TABLES = (
+    ('vg_CountyInfo', County),
+    ('vg_Dates', SaleDates),
+    ('vg_AuctionConfiguration', AuctionSettings),
+)
+
+
+def _select(table, record_type):
+    return f"SELECT {', '.join(record_type._fields)} FROM {SCHEMA}.{table}"
+
+
+class CountySnapshot:
+    """One immutable load of the county tables."""
+
+    __slots__ = ('version', 'loaded_at', 'counties', 'dates', 'auctions', '_product_auctions')
+
+    def __init__(self, version, counties, dates, auctions):
+        """
+        Build a snapshot from loaded rows.
+
+        Args:
+            version (int): Cache version the snapshot was loaded at
+            counties (list): County records
+            dates (list): SaleDates records
+            auctions (list): AuctionSettings records
+        """
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.counties = MappingProxyType({c.VGProductID: c for c in counties})
+        self.dates = MappingProxyType({d.VGProductID: d for d in dates})
+        self.auctions = MappingProxyType({a.AuctionId: a for a in auctions})
+        product_auctions = {}
+        for auction in sorted(auctions, key=lambda a: a.AuctionId):
+            product_auctions.setdefault(auction.VGProductId, []).append(auction)
+        self._product_auctions = MappingProxyType({p: tuple(a) for p, a in product_auctions.items()})
+
+    def county(self, product_id):
+        """County record of a VGProductID, or None."""
+        return self.counties.get(product_id)
+
+    def sale_dates(self, product_id):
+        """vg_Dates record of a VGProductID, or None."""
+        return self.dates.get(product_id)
+
+    def auctions_for(self, product_id, include_deleted=False):
+        """
+        Auction configurations of a county.
+
+        Args:
+            product_id (int): VGProductID
+            include_deleted (bool, optional): Include auctions flagged AuctionDeleted
+
+        Returns:
+            tuple: AuctionSettings records ordered by AuctionId
+        """
+        auctions = self._product_auctions.get(product_id, ())
+        if include_deleted:
+            return auctions
+        return tuple(a for a in auctions if not a.AuctionDeleted)
+
+    def enabled_counties(self):
+        """Counties with SiteEnabled set, ordered by name."""
+        return sorted((c for c in self.counties.values() if c.SiteEnabled),
+                      key=lambda c: (c.CountyName or '', c.VGProductID))
+
+
+class CountySnapshotCache:
+    """Process-wide holder of the current CountySnapshot."""
+
+    def __init__(self, source=None, ttl=DEFAULT_TTL):
+        """
+        Initialize the cache.
+
+        Args:
+            source (optional): TaxsaleSource holding the county tables
+            ttl (int, optional): Seconds a snapshot is served before it is reloaded
+        """
+        self.source = source or TaxsaleSource()
+        self.ttl = ttl
+        self.version = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _load(self, version):
+        rows = []
+        with self.source.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if self.source.dialect == 'mssql':
+                    # One round trip: the three SELECTs come back as consecutive result sets
+                    cursor.execute(';\n'.join(_select(table, record) for table, record in _TABLES))
+                    rows.append(cursor.fetchall())
+                    while cursor.nextset():
+                        rows.append(cursor.fetchall())
+                else:
+                    for table, record in _TABLES:
+                        cursor.execute(_select(table, record))
+                        rows.append(cursor.fetchall())
+            finally:
+                cursor.close()
+
+        counties, dates, auctions = ([record._make(row) for row in result]
+                                     for (_, record), result in zip(_TABLES, rows))
+        logger.info(f"Loaded county snapshot v{version}: {len(counties)} counties, {len(auctions)} auctions")
+        return CountySnapshot(version, counties, dates, auctions)
+
+    def _fresh(self, snapshot):
+        return (snapshot is not None and snapshot.version == self.version
+                and time.monotonic() - snapshot.loaded_at < self.ttl)
+
+    def get(self):
+        """
+        Return the current snapshot, reloading it when stale.
+
+        While one thread reloads, the others keep serving the previous
+        snapshot instead of waiting.
+
+        Returns:
+            CountySnapshot: The current snapshot
+        """
+        snapshot = self._snapshot
+        if self._fresh(snapshot):
+            record_cache('county_snapshot', True)
+            return snapshot
+        if not self._lock.acquire(blocking=snapshot is None):
+            record_cache('county_snapshot', True)
+            return snapshot
+        try:
+            fresh = self._fresh(self._snapshot)
+            if not fresh:
+                self._snapshot = self._load(self.version)
+            record_cache('county_snapshot', fresh)
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+    def bump(self):
+        """
+        Mark the current snapshot stale, e.g. after editing a county.
+
+        Returns:
+            int: The new version
+        """
+        with self._lock:
+            self.version += 1
+        return self.version
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_county_snapshot(ttl=DEFAULT_TTL, source=None):
+    """
+    Return the current county snapshot from the process-wide cache.
+
+    Args:
+        ttl (int, optional): Seconds a snapshot is served, used when the cache is created
+        source (optional): TaxsaleSource, used when the cache is created
+
+    Returns:
+        CountySnapshot: The current snapshot
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CountySnapshotCache(source=source, ttl=ttl)
+    return _cache.get()
+
+
+def bump_county_snapshot():
+    """
+    Invalidate the process-wide county snapshot.
+
+    Only this process reloads; other worker processes keep their snapshot
+    until its TTL passes.
+
+    Returns:
+        int: The new version, or 0 when nothing was cached yet
+    """
+    return _cache.bump() if _cache is not None else 0
@@ -0,0 +1,255 @@
+"""
+Database access helpers for the Taxsale reporting services.
+Provides a thin DB-API wrapper so services can bulk-load columns
+without depending on a particular driver.
+"""
+import os
+import re
+import logging
+from contextlib import contextmanager
+
+from app.utils.metrics import track_upstream
+
+logger = logging.getLogger(__name__)
+
+# Schema that owns all Taxsale tables
+SCHEMA = 'dbo'
+
+# Rows pulled per round trip when streaming large result sets
+DEFAULT_FETCH_SIZE = 5000
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def get_connection(dsn=None):
+    """
+    Open a connection to the Taxsale SQL Server database.
+
+    Args:
+        dsn (str, optional): ODBC connection string. Defaults to the
+            TAXSALE_DATABASE_DSN environment variable.
+
+    Returns:
+        A DB-API 2.0 connection.
+    """
+    dsn = dsn or os.getenv('TAXSALE_DATABASE_DSN')
+    if not dsn:
+        raise RuntimeError('Taxsale database not configured. Set TAXSALE_DATABASE_DSN.')
+
+    try:
+        import pyodbc
+    except ImportError as e:
+        # Also raised when pyodbc is installed but the unixODBC library (libodbc) is missing
+        raise RuntimeError(f'pyodbc could not be loaded ({str(e)}), cannot connect to the Taxsale database. '
+                           f'Install pyodbc, unixODBC and the SQL Server ODBC driver.')
+
+    return pyodbc.connect(dsn)
+
+
+def quote_identifier(name):
+    """
+    Validate a table or column name before it is interpolated into SQL.
+
+    Args:
+        name (str): Identifier to check
+
+    Returns:
+        str: The identifier, unchanged
+    """
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return name
+
+
+def paginate(sql, offset, limit, dialect='mssql'):
+    """
+    Append a pagination clause to an ordered query.
+
+    Args:
+        sql (str): Query ending in an ORDER BY clause
+        offset (int): Rows to skip
+        limit (int): Rows to return
+        dialect (str, optional): 'mssql' or 'sqlite'
+
+    Returns:
+        tuple: (sql, params) where params are appended after the query's own
+    """
+    if dialect == 'sqlite':
+        return f"{sql} LIMIT ? OFFSET ?", [limit, offset]
+    return f"{sql} OFFSET ? ROWS FETCH NEXT ? ROWS ONLY", [offset, limit]
+
+
+def build_select(table, columns, filters=None, key_column=None, after=None, upto=None):
+    """
+    Build a parameterized SELECT against a Taxsale table.
+
+    Args:
+        table (str): Table name without schema
+        columns (iterable): Columns to select
+        filters (dict, optional): Column equality filters. List or tuple
+            values become IN predicates.
+        key_column (str, optional): Identity column used for range reads
+        after (int, optional): Exclusive lower bound on key_column
+        upto (int, optional): Inclusive upper bound on key_column
+
+    Returns:
+        tuple: (sql, params)
+    """
+    select_list = ', '.join(quote_identifier(c) for c in columns)
+    sql = f"SELECT {select_list} FROM {SCHEMA}.{quote_identifier(table)}"
+
+    clauses = []
+    params = []
+    for column, value in (filters or {}).items():
+        column = quote_identifier(column)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            values = list(value)
+            if not values:
+                # An empty IN list can never match
+                clauses.append('1 = 0')
+                continue
+            clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+        elif value is None:
+            clauses.append(f"{column} IS NULL")
+        else:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+
+    if key_column:
+        key_column = quote_identifier(key_column)
+        if after is not None:
+            clauses.append(f"{key_column} > ?")
+            params.append(after)
+        if upto is not None:
+            clauses.append(f"{key_column} <= ?")
+            params.append(upto)
+
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    if key_column:
+        sql += f" ORDER BY {key_column}"
+
+    return sql, params
+
+
+class TaxsaleSource:
+    """Reads rows and columns from Taxsale tables through a DB-API connection."""
+
+    def __init__(self, connection_factory=None, connection=None, fetch_size=DEFAULT_FETCH_SIZE, dialect='mssql'):
+        """
+        Initialize the source.
+
+        Args:
+            connection_factory (callable, optional): Returns a new connection
+                per unit of work. Defaults to get_connection.
+            connection (optional): Shared connection to reuse instead. It is
+                never closed by the source.
+            fetch_size (int, optional): Rows fetched per round trip
+            dialect (str, optional): SQL dialect of the connection, 'mssql' or 'sqlite'
+        """
+        self.connection_factory = connection_factory or get_connection
+        self.shared_connection = connection
+        self.fetch_size = fetch_size
+        self.dialect = dialect
+
+    @contextmanager
+    def connection(self):
+        """Yield a connection, closing it afterwards unless it is shared."""
+        if self.shared_connection is not None:
+            yield self.shared_connection
+            return
+
+        conn = self.connection_factory()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor whose work is committed on success and rolled back on error."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def iter_batches(self, sql, params=(), batch_size=None):
+        """
+        Stream a query result in batches of rows.
+
+        Args:
+            sql (str): Query to run
+            params (sequence, optional): Query parameters
+            batch_size (int, optional): Rows per batch
+
+        Yields:
+            list: Row tuples
+        """
+        batch_size = batch_size or self.fetch_size
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, list(params))
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield [tuple(row) for row in rows]
+            finally:
+                cursor.close()
+
+    def query(self, sql, params=()):
+        """Run a query and return all rows as tuples."""
+        rows = []
+        with track_upstream('db', 'query'):
+            for batch in self.iter_batches(sql, params):
+                rows.extend(batch)
+        return rows
+
+    def max_key(self, table, key_column):
+        """
+        Return the current high-water mark of an identity column.
+
+        Args:
+            table (str): Table name without schema
+            key_column (str): Identity column
+
+        Returns:
+            int: Largest key, or 0 for an empty table
+        """
+        rows = self.query(f"SELECT MAX({quote_identifier(key_column)}) FROM {SCHEMA}.{quote_identifier(table)}")
+        return int(rows[0][0]) if rows and rows[0][0] is not None else 0
+
+    def read_columns(self, table, columns, filters=None, key_column=None, after=None, upto=None):
+        """
+        Bulk-load columns from a table in a single query.
+
+        Args:
+            table (str): Table name without schema
+            columns (iterable): Columns to load
+            filters (dict, optional): Column equality filters
+            key_column (str, optional): Identity column used for range reads
+            after (int, optional): Exclusive lower bound on key_column
+            upto (int, optional): Inclusive upper bound on key_column
+
+        Returns:
+            dict: Column name to list of values
+        """
+        columns = list(columns)
+        sql, params = build_select(table, columns, filters, key_column, after, upto)
+        result = {column: [] for column in columns}
+
+        with track_upstream('db', 'read_columns'):
+            for batch in self.iter_batches(sql, params):
+                for column, values in zip(columns, zip(*batch)):
+                    result[column].extend(values)
+
+        logger.debug(f"Loaded {len(result[columns[0]]) if columns else 0} rows from {table}")
+        return result
@@ -0,0 +1,325 @@
+"""
+Unread message index.
+Keeps the county messages of vg_Messages as one bitset per VGProductId (a bit
+per live message) and each user's vg_ReadMessages as matching bitsets, so a
+user's unread count is a popcount of live & ~read instead of an anti-join per
+page view. The index follows new MessageIds and ReadIds incrementally, and
+messages drop out when their ExpirationDate passes.
+"""
+import heapq
+import logging
+import datetime
+import threading
+import time
+
+from app.services.db import TaxsaleSource, SCHEMA
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_TABLE = 'vg_Messages'
+READ_MESSAGES_TABLE = 'vg_ReadMessages'
+
+# Seconds between checks for messages and reads written by other processes
+DEFAULT_REFRESH_INTERVAL = 30
+
+_INSERT_MESSAGE = {
+    'mssql': f"INSERT INTO {SCHEMA}.{MESSAGES_TABLE} (VGProductId, Message, ExpirationDate) "
+             f"OUTPUT INSERTED.MessageId VALUES (?, ?, ?)",
+    'sqlite': f"INSERT INTO {SCHEMA}.{MESSAGES_TABLE} (VGProductId, Message, ExpirationDate) VALUES (?, ?, ?)",
+}
+
+# Expired slots tolerated per county before its bit positions are compacted
+MIN_COMPACT_SLOTS = 64
+
+
+def _user_key(user_id):
+    """vg_ReadMessages.UserId is a uniqueidentifier: compare it case-insensitively."""
+    return str(user_id).strip().lower()
+
+
+def _popcount(mask):
+    """Number of set bits; int.bit_count() needs Python 3.10 and the image runs 3.9."""
+    return bin(mask).count('1')
+
+
+def _datetime(value):
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(str(value))
+
+
+def _bits(mask):
+    """Positions of the set bits of an int, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class _County:
+    """Bit positions of one county's messages."""
+
+    def __init__(self):
+        self.slots = {}
+        self.message_ids = []
+        self.live = 0
+
+    def add(self, message_id):
+        slot = self.slots.get(message_id)
+        if slot is None:
+            slot = self.slots[message_id] = len(self.message_ids)
+            self.message_ids.append(message_id)
+        self.live |= 1 << slot
+        return slot
+
+    @property
+    def dead_slots(self):
+        return len(self.message_ids) - _popcount(self.live)
+
+
+class UnreadMessageIndex:
+    """Per-user unread message bitsets for every county."""
+
+    def __init__(self, source=None, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        """
+        Initialize the index.
+
+        Args:
+            source (optional): TaxsaleSource to read messages and reads from
+            refresh_interval (int, optional): Seconds between checks for new rows
+        """
+        self.source = source or TaxsaleSource()
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Forget every message and read."""
+        with self._lock:
+            self.message_checkpoint = 0
+            self.read_checkpoint = 0
+            self._counties = {}
+            self._message_county = {}
+            self._read = {}
+            self._expiry = []
+            self._last_refresh = None
+
+    def publish(self, message_id, product_id, expiration_date=None, now=None):
+        """
+        Add a message to its county's bitset.
+
+        Args:
+            message_id (int): MessageId
+            product_id (int): VGProductId the message is shown in
+            expiration_date (datetime, optional): When the message stops being shown
+            now (datetime, optional): Current time, for testing
+
+        Returns:
+            bool: False when the message had already expired
+        """
+        expiration_date = _datetime(expiration_date)
+        if expiration_date is not None and expiration_date <= (now or datetime.datetime.now()):
+            return False
+        with self._lock:
+            self._counties.setdefault(product_id, _County()).add(message_id)
+            self._message_county[message_id] = product_id
+            if expiration_date is not None:
+                heapq.heappush(self._expiry, (expiration_date, message_id))
+        return True
+
+    def mark_read(self, user_id, message_id):
+        """
+        Record that a user has read a message.
+
+        Args:
+            user_id: UserId of the reader
+            message_id (int): MessageId
+
+        Returns:
+            bool: False when the message is not live
+        """
+        with self._lock:
+            product_id = self._message_county.get(message_id)
+            if product_id is None:
+                return False
+            slot = self._counties[product_id].slots[message_id]
+            reads = self._read.setdefault(_user_key(user_id), {})
+            reads[product_id] = reads.get(product_id, 0) | 1 << slot
+        return True
+
+    def post_message(self, product_id, message, expiration_date=None):
+        """
+        Insert a message into vg_Messages and publish it to the index.
+
+        Args:
+            product_id (int): VGProductId the message is shown in
+            message (str): Message text (up to 250 characters)
+            expiration_date (datetime, optional): When the message stops being shown
+
+        Returns:
+            int: MessageId of the new message
+        """
+        with self.source.transaction() as cursor:
+            cursor.execute(_INSERT_MESSAGE[self.source.dialect], (product_id, message, expiration_date))
+            message_id = cursor.fetchone()[0] if self.source.dialect == 'mssql' else cursor.lastrowid
+        self.publish(message_id, product_id, expiration_date)
+        return message_id
+
+    def record_read(self, user_id, message_id):
+        """
+        Insert a vg_ReadMessages row unless the user has already read the message.
+
+        Args:
+            user_id: UserId of the reader
+            message_id (int): MessageId
+
+        Returns:
+            bool: False when the message is not live
+        """
+        with self._lock:
+            product_id = self._message_county.get(message_id)
+            if product_id is None:
+                return False
+            county = self._counties[product_id]
+            already_read = self._read.get(_user_key(user_id), {}).get(product_id, 0) >> county.slots[message_id] & 1
+        if not already_read:
+            with self.source.transaction() as cursor:
+                cursor.execute(f"INSERT INTO {SCHEMA}.{READ_MESSAGES_TABLE} (MessageId, UserId) VALUES (?, ?)",
+                               (message_id, user_id))
+        return self.mark_read(user_id, message_id)
+
+    def expire(self, now=None):
+        """
+        Drop messages whose ExpirationDate has passed.
+
+        Args:
+            now (datetime, optional): Current time, for testing
+
+        Returns:
+            int: Number of messages expired
+        """
+        now = now or datetime.datetime.now()
+        expired = 0
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                _, message_id = heapq.heappop(self._expiry)
+                product_id = self._message_county.pop(message_id, None)
+                if product_id is None:
+                    continue
+                county = self._counties[product_id]
+                county.live &= ~(1 << county.slots[message_id])
+                expired += 1
+                if county.dead_slots > max(MIN_COMPACT_SLOTS, _popcount(county.live)):
+                    self._compact(product_id)
+        return expired
+
+    def _compact(self, product_id):
+        """Renumber a county's live messages from bit 0 and remap every user's read bits."""
+        county = self._counties[product_id]
+        live = [county.message_ids[slot] for slot in _bits(county.live)]
+        remap = {county.slots[message_id]: slot for slot, message_id in enumerate(live)}
+
+        compacted = _County()
+        for message_id in live:
+            compacted.add(message_id)
+        self._counties[product_id] = compacted
+
+        for reads in self._read.values():
+            mask = reads.pop(product_id, 0) & county.live
+            if mask:
+                reads[product_id] = sum(1 << remap[slot] for slot in _bits(mask))
+        logger.info(f"Compacted message bitset of product {product_id} to {len(live)} slots")
+
+    def refresh(self, force=False, now=None):
+        """
+        Fold in messages and reads written since the last refresh, then expire.
+
+        Args:
+            force (bool, optional): Check now even if refresh_interval has not passed
+            now (datetime, optional): Current time, for testing
+
+        Returns:
+            int: Number of new rows processed
+        """
+        monotonic = time.monotonic()
+        if not force and self._last_refresh is not None and monotonic - self._last_refresh < self.refresh_interval:
+            self.expire(now)
+            return 0
+
+        with self._lock:
+            self._last_refresh = monotonic
+            messages = self.source.query(
+                f"SELECT MessageId, VGProductId, ExpirationDate FROM {SCHEMA}.{MESSAGES_TABLE} "
+                f"WHERE MessageId > ? ORDER BY MessageId", (self.message_checkpoint,))
+            for message_id, product_id, expiration_date in messages:
+                self.publish(message_id, product_id, expiration_date, now=now)
+                self.message_checkpoint = message_id
+
+            reads = self.source.query(
+                f"SELECT ReadId, UserId, MessageId FROM {SCHEMA}.{READ_MESSAGES_TABLE} "
+                f"WHERE ReadId > ? ORDER BY ReadId", (self.read_checkpoint,))
+            # Reads of messages that are no longer live are ignored by mark_read
+            for read_id, user_id, message_id in reads:
+                self.mark_read(user_id, message_id)
+                self.read_checkpoint = read_id
+
+            self.expire(now)
+        if messages or reads:
+            logger.info(f"Message index refreshed with {len(messages)} messages and {len(reads)} reads")
+        return len(messages) + len(reads)
+
+    def _unread_mask(self, reads, product_id):
+        county = self._counties.get(product_id)
+        if county is None:
+            return 0
+        return county.live & ~reads.get(product_id, 0)
+
+    def unread_count(self, user_id, product_id=None):
+        """
+        Number of live messages a user has not read.
+
+        Args:
+            user_id: UserId of the reader
+            product_id (int, optional): Restrict to one county. Defaults to all.
+
+        Returns:
+            int: Unread messages
+        """
+        with self._lock:
+            reads = self._read.get(_user_key(user_id), {})
+            if product_id is not None:
+                return _popcount(self._unread_mask(reads, product_id))
+            return sum(_popcount(self._unread_mask(reads, product)) for product in self._counties)
+
+    def unread_counts(self, user_id):
+        """
+        Unread messages per county, for counties with any.
+
+        Args:
+            user_id: UserId of the reader
+
+        Returns:
+            dict: VGProductId -> unread count
+        """
+        with self._lock:
+            reads = self._read.get(_user_key(user_id), {})
+            counts = {product: _popcount(self._unread_mask(reads, product)) for product in self._counties}
+        return {product: count for product, count in counts.items() if count}
+
+    def unread_messages(self, user_id, product_id):
+        """
+        MessageIds of a county's live messages a user has not read.
+
+        Args:
+            user_id: UserId of the reader
+            product_id (int): VGProductId
+
+        Returns:
+            list: MessageIds, oldest first
+        """
+        with self._lock:
+            mask = self._unread_mask(self._read.get(_user_key(user_id), {}), product_id)
+            if not mask:
+                return []
+            message_ids = self._counties[product_id].message_ids
+            return sorted(message_ids[slot] for slot in _bits(mask))
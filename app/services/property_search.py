@@ -0,0 +1,383 @@
+"""
+Property search index.
+Keeps a local SQLite FTS5 index over the per-county certificate tables
+(vg_TaxCertificateFileNN joined to vg_TaxCertificateViewNN) so owner, address,
+use code and legal description searches no longer LIKE-scan the database.
+Supports prefix and fuzzy text search plus numeric-range facets.
+
+Searches only read the index. A single refresher, the ``index-properties
+--follow`` command, reindexes a county whenever vg_DTSImport records a new
+import for it; the file is in WAL mode so searches in every worker keep
+reading while it writes.
+"""
+import os
+import re
+import time
+import logging
+import sqlite3
+import datetime
+import threading
+
+from app.services.db import SCHEMA, TaxsaleSource, build_select, quote_identifier
+
+logger = logging.getLogger(__name__)
+
+CERTIFICATE_COLUMNS = ('PropertyNo', 'CertificateNo', 'Name', 'Addr1', 'Addr2', 'Addr3', 'City', 'LocHouseNr',
+                       'LocStreet', 'LocCity', 'UseCode', 'DescriptionLine1', 'DescriptionLine2',
+                       'DescriptionLine3', 'DescriptionLine4', 'DescriptionLine5', 'DescriptionLine6',
+                       'JustValue', 'AssessedValue', 'Acres', 'UnpaidBalance')
+VIEW_COLUMNS = ('PropertyNumber', 'PropertyUseCodeDesc', 'BuildingTypeDesc')
+
+# Index column -> bucket edges used for its facet counts
+NUMERIC_FACETS = {
+    'just_value': (0, 25000, 50000, 100000, 250000, 500000, 1000000),
+    'acres': (0, 0.25, 1, 5, 20, 100),
+    'unpaid_balance': (0, 500, 1000, 2500, 5000, 10000),
+}
+
+# Seconds between checks of vg_DTSImport for new county imports
+DEFAULT_REFRESH_INTERVAL = 60
+
+# Milliseconds a connection waits for the refresher's write lock
+BUSY_TIMEOUT_MS = 5000
+
+# Rows written per executemany while indexing a county
+INDEX_BATCH_SIZE = 5000
+
+DEFAULT_LIMIT = 50
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS properties (
+    id INTEGER PRIMARY KEY,
+    product_id INTEGER NOT NULL,
+    property_no TEXT,
+    certificate_no TEXT,
+    name TEXT,
+    address TEXT,
+    location TEXT,
+    use_code TEXT,
+    just_value REAL,
+    assessed_value REAL,
+    acres REAL,
+    unpaid_balance REAL
+);
+CREATE INDEX IF NOT EXISTS ix_properties_product ON properties (product_id, property_no);
+CREATE INDEX IF NOT EXISTS ix_properties_just_value ON properties (product_id, just_value);
+CREATE INDEX IF NOT EXISTS ix_properties_acres ON properties (product_id, acres);
+CREATE INDEX IF NOT EXISTS ix_properties_unpaid ON properties (product_id, unpaid_balance);
+CREATE VIRTUAL TABLE IF NOT EXISTS property_text USING fts5 (
+    property_no, name, address, location, use_code, description, prefix = '2 3 4'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS property_terms USING fts5vocab (property_text, 'row');
+CREATE TABLE IF NOT EXISTS county_imports (
+    product_id INTEGER PRIMARY KEY,
+    import_id INTEGER,
+    import_date TEXT,
+    row_count INTEGER,
+    indexed_at TEXT
+);
+"""
+
+
+def _join(*parts):
+    return ' '.join(str(part).strip() for part in parts if part is not None and str(part).strip())
+
+
+def _buckets(edges):
+    """(low, high) facet buckets for a tuple of edges; the last bucket is open-ended."""
+    return list(zip(edges, edges[1:])) + [(edges[-1], None)]
+
+
+def _number(value):
+    return float(value) if value is not None else None
+
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance between two terms, giving up once it exceeds limit.
+
+    Returns:
+        int: The distance, or limit + 1 when it is larger than limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class PropertySearchIndex:
+    """Full-text and faceted search over the county certificate tables."""
+
+    def __init__(self, path, source=None, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        """
+        Initialize the index.
+
+        Args:
+            path (str): SQLite file holding the index, or ':memory:'
+            source (optional): TaxsaleSource the county tables are read from
+            refresh_interval (int, optional): Seconds between vg_DTSImport checks
+        """
+        self.path = path
+        self.source = source or TaxsaleSource()
+        self.refresh_interval = refresh_interval
+        self._last_refresh = None
+        self._lock = threading.RLock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Autocommit mode: reindex() manages its own transaction
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        if path != ':memory:':
+            # Readers in other processes are not blocked while the refresher reindexes
+            self.conn.execute('PRAGMA journal_mode = WAL')
+        try:
+            self.conn.executescript(_SCHEMA_SQL)
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"SQLite FTS5 not available, cannot build the property search index: {e}")
+
+    def close(self):
+        self.conn.close()
+
+    def _county_tables(self, product_id):
+        rows = self.source.query(
+            f"SELECT TaxCertTableName, TaxViewTableName FROM {SCHEMA}.vg_CountyInfo WHERE VGProductID = ?",
+            [product_id])
+        if not rows or not rows[0][0]:
+            raise ValueError(f"No certificate table configured for product {product_id}")
+        cert, view = rows[0]
+        return quote_identifier(cert.strip()), quote_identifier(view.strip()) if view else None
+
+    def _view_details(self, view_table):
+        """PropertyNumber -> extra descriptive text from the county's property view."""
+        if not view_table:
+            return {}
+        sql, params = build_select(view_table, VIEW_COLUMNS)
+        details = {}
+        for batch in self.source.iter_batches(sql, params):
+            for property_number, use_desc, building_desc in batch:
+                details[(property_number or '').strip()] = _join(use_desc, building_desc)
+        return details
+
+    def reindex(self, product_id, import_id=None, import_date=None):
+        """
+        Rebuild the index rows of one county in a single transaction.
+
+        Args:
+            product_id (int): VGProductID of the county
+            import_id (int, optional): vg_DTSImport row the rebuild reflects
+            import_date (optional): When that import ran
+
+        Returns:
+            int: Number of properties indexed
+        """
+        started = time.perf_counter()
+        cert_table, view_table = self._county_tables(product_id)
+        details = self._view_details(view_table)
+        sql, params = build_select(cert_table, CERTIFICATE_COLUMNS)
+
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute('BEGIN')
+                cursor.execute('DELETE FROM property_text WHERE rowid IN '
+                               '(SELECT id FROM properties WHERE product_id = ?)', (product_id,))
+                cursor.execute('DELETE FROM properties WHERE product_id = ?', (product_id,))
+
+                count = 0
+                for batch in self.source.iter_batches(sql, params, INDEX_BATCH_SIZE):
+                    rows = [dict(zip(CERTIFICATE_COLUMNS, values)) for values in batch]
+                    first_id = self._next_id(cursor)
+                    ids = range(first_id, first_id + len(rows))
+                    cursor.executemany(
+                        'INSERT INTO properties (id, product_id, property_no, certificate_no, name, address, '
+                        'location, use_code, just_value, assessed_value, acres, unpaid_balance) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        [(i, product_id, (r['PropertyNo'] or '').strip(),
+                          str(r['CertificateNo']) if r['CertificateNo'] is not None else None,
+                          _join(r['Name']), _join(r['Addr1'], r['Addr2'], r['Addr3'], r['City']),
+                          _join(r['LocHouseNr'], r['LocStreet'], r['LocCity']), _join(r['UseCode']),
+                          _number(r['JustValue']), _number(r['AssessedValue']), _number(r['Acres']),
+                          _number(r['UnpaidBalance'])) for i, r in zip(ids, rows)])
+                    cursor.executemany(
+                        'INSERT INTO property_text (rowid, property_no, name, address, location, use_code, '
+                        'description) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        [(i, r['PropertyNo'], r['Name'], _join(r['Addr1'], r['Addr2'], r['Addr3'], r['City']),
+                          _join(r['LocHouseNr'], r['LocStreet'], r['LocCity']), r['UseCode'],
+                          _join(*(r[f'DescriptionLine{n}'] for n in range(1, 7)),
+                                details.get((r['PropertyNo'] or '').strip())))
+                         for i, r in zip(ids, rows)])
+                    count += len(rows)
+
+                cursor.execute(
+                    'INSERT OR REPLACE INTO county_imports (product_id, import_id, import_date, row_count, indexed_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (product_id, import_id, str(import_date) if import_date is not None else None, count,
+                     datetime.datetime.now().isoformat()))
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            finally:
+                cursor.close()
+
+        logger.info(f"Indexed {count} properties for product {product_id} "
+                    f"({time.perf_counter() - started:.2f}s)")
+        return count
+
+    def _next_id(self, cursor):
+        cursor.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM properties')
+        return cursor.fetchone()[0]
+
+    def refresh(self, force=False):
+        """
+        Reindex every county with a vg_DTSImport row newer than its indexed one.
+
+        Args:
+            force (bool, optional): Check now even if refresh_interval has not passed
+
+        Returns:
+            list: VGProductIDs that were reindexed
+        """
+        now = time.monotonic()
+        if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+            return []
+        self._last_refresh = now
+
+        latest = self.source.query(
+            f"SELECT VGProductID, MAX(ImportID), MAX(ImportDate) FROM {SCHEMA}.vg_DTSImport GROUP BY VGProductID")
+        with self._lock:
+            indexed = dict(self.conn.execute('SELECT product_id, import_id FROM county_imports').fetchall())
+
+        reindexed = []
+        for product_id, import_id, import_date in latest:
+            if indexed.get(product_id) is not None and indexed[product_id] >= import_id:
+                continue
+            try:
+                self.reindex(product_id, import_id=import_id, import_date=import_date)
+                reindexed.append(product_id)
+            except Exception as e:
+                logger.error(f"Error indexing properties for product {product_id}: {str(e)}")
+        return reindexed
+
+    def run_forever(self):
+        """Keep the index up to date, checking vg_DTSImport every refresh_interval seconds."""
+        logger.info(f"Refreshing the property search index every {self.refresh_interval}s")
+        while True:
+            try:
+                self.refresh(force=True)
+            except Exception as e:
+                logger.error(f"Error refreshing the property search index: {str(e)}")
+            time.sleep(self.refresh_interval)
+
+    def _expand(self, token, fuzzy):
+        """FTS5 expression for one query token: a prefix match, plus close terms when fuzzy."""
+        alternatives = [f'"{token}"*']
+        if fuzzy and len(token) >= 4:
+            limit = 1 if len(token) < 8 else 2
+            # Only terms sharing the first two letters and within limit of the token's length are
+            # compared, so the vocabulary read is one narrow range
+            prefix = token[:2]
+            with self._lock:
+                rows = self.conn.execute(
+                    'SELECT term FROM property_terms WHERE term >= ? AND term < ? AND length(term) BETWEEN ? AND ?',
+                    (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1), len(token) - limit,
+                     len(token) + limit)).fetchall()
+            # The edit distances are computed without holding the connection
+            alternatives.extend(f'"{term}"' for (term,) in rows
+                                if term != token and edit_distance(token, term, limit) <= limit)
+        return alternatives[0] if len(alternatives) == 1 else f"({' OR '.join(alternatives)})"
+
+    def _match_expression(self, text, fuzzy):
+        tokens = [token.lower() for token in _TOKEN.findall(text or '')]
+        return ' AND '.join(self._expand(token, fuzzy) for token in tokens)
+
+    def search(self, text=None, product_id=None, ranges=None, fuzzy=False, limit=DEFAULT_LIMIT, offset=0,
+               facets=True):
+        """
+        Search the index.
+
+        Args:
+            text (str, optional): Words to match; each matches as a prefix
+            product_id (int, optional): Restrict to one county
+            ranges (dict, optional): Facet name -> (minimum, maximum); either bound may be None
+            fuzzy (bool, optional): Also match terms one or two edits away that share the first two letters
+            limit (int, optional): Rows to return
+            offset (int, optional): Rows to skip
+            facets (bool, optional): Include bucket counts for the numeric facets
+
+        Returns:
+            dict: Matching properties, total and facet counts
+        """
+        clauses = []
+        params = []
+        match = self._match_expression(text, fuzzy)
+        with self._lock:
+            if match:
+                source_sql = 'FROM property_text JOIN properties p ON p.id = property_text.rowid'
+                clauses.append('property_text MATCH ?')
+                params.append(match)
+                order = 'bm25(property_text), p.id'
+            else:
+                source_sql = 'FROM properties p'
+                order = 'p.product_id, p.property_no'
+
+            if product_id is not None:
+                clauses.append('p.product_id = ?')
+                params.append(product_id)
+            for facet, (low, high) in (ranges or {}).items():
+                if facet not in NUMERIC_FACETS:
+                    raise ValueError(f"Unknown facet {facet!r}")
+                if low is not None:
+                    clauses.append(f"p.{facet} >= ?")
+                    params.append(low)
+                if high is not None:
+                    clauses.append(f"p.{facet} <= ?")
+                    params.append(high)
+            if clauses:
+                source_sql += ' WHERE ' + ' AND '.join(clauses)
+
+            cursor = self.conn.execute(
+                f"SELECT p.product_id, p.property_no, p.certificate_no, p.name, p.address, p.location, p.use_code, "
+                f"p.just_value, p.assessed_value, p.acres, p.unpaid_balance {source_sql} "
+                f"ORDER BY {order} LIMIT ? OFFSET ?", params + [limit, offset])
+            names = [d[0] for d in cursor.description]
+            rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+
+            # One aggregate pass yields the total and every facet bucket
+            aggregates = ['COUNT(*)']
+            if facets:
+                for facet, edges in NUMERIC_FACETS.items():
+                    for low, high in _buckets(edges):
+                        condition = f"p.{facet} >= {low}" + (f" AND p.{facet} < {high}" if high is not None else '')
+                        aggregates.append(f"SUM(CASE WHEN {condition} THEN 1 ELSE 0 END)")
+            counts = self.conn.execute(f"SELECT {', '.join(aggregates)} {source_sql}", params).fetchone()
+
+        result = {'total': counts[0], 'rows': rows, 'query': match or None, 'facets': None}
+        if facets:
+            result['facets'] = {}
+            position = 1
+            for facet, edges in NUMERIC_FACETS.items():
+                buckets = []
+                for low, high in _buckets(edges):
+                    buckets.append({'min': low, 'max': high, 'count': counts[position] or 0})
+                    position += 1
+                result['facets'][facet] = buckets
+        return result
+
+    def status(self):
+        """Indexed counties with the import each one reflects."""
+        with self._lock:
+            cursor = self.conn.execute('SELECT product_id, import_id, import_date, row_count, indexed_at '
+                                       'FROM county_imports ORDER BY product_id')
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
@@ -0,0 +1,342 @@
+"""
+Queue-closing load simulator.
+Expands a vg_QueueConfiguration into the full closing timeline of an
+auction's vg_Queues and convolves it with the historical bid-arrival curve
+(bids per item in the minutes before a queue closes, learned from
+vg_BidTransactions joined through vg_QueueLinks). The result is the expected
+bid and request rate for every minute of the sale, for capacity planning.
+Learned curves are kept for a while, since the bid history only grows when a
+sale closes. The curve over every county's history reads all of
+vg_BidTransactions, so it is learned offline and saved with save_curve().
+"""
+import os
+import time
+import uuid
+import logging
+import datetime
+import threading
+
+import numpy as np
+
+from app.services.db import TaxsaleSource
+
+logger = logging.getLogger(__name__)
+
+CONFIGURATION_TABLE = 'vg_QueueConfiguration'
+QUEUES_TABLE = 'vg_Queues'
+QUEUE_LINKS_TABLE = 'vg_QueueLinks'
+AUCTIONS_TABLE = 'vg_AuctionConfiguration'
+BID_TRANSACTIONS_TABLE = 'vg_BidTransactions'
+
+# Minutes before a close covered by the arrival curve
+DEFAULT_LOOKBACK = 60
+
+# Web requests generated per bid (bid page, confirmation, polling)
+DEFAULT_REQUESTS_PER_BID = 1.0
+
+# Seconds a learned arrival curve is reused
+DEFAULT_CURVE_TTL = 3600
+
+# Learned curves kept, one per set of history counties and lookback
+CURVE_CACHE_SIZE = 32
+
+_WEEKDAYS = '1111100'
+
+
+def curve_path(directory, lookback=DEFAULT_LOOKBACK):
+    """Where the arrival curve learned from every county's history is saved."""
+    return os.path.join(directory, f"arrival_curve_{lookback}.npy")
+
+
+def save_curve(curve, path):
+    """Atomically save an arrival curve."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.asarray(curve, dtype=np.float64))
+    os.replace(tmp_path, path)
+
+
+def load_curve(path):
+    """
+    Load an arrival curve saved by save_curve().
+
+    Returns:
+        np.ndarray: The curve, or None when it has not been learned yet
+    """
+    try:
+        return np.load(path)
+    except FileNotFoundError:
+        return None
+_ALL_DAYS = '1111111'
+
+
+def _minute_of_day(value):
+    """Minutes past midnight of a datetime, time or ISO string."""
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    return value.hour * 60 + value.minute
+
+
+def _to_minutes(values):
+    """Convert datetimes (or ISO strings) to integer epoch minutes."""
+    return np.asarray(values, dtype='datetime64[m]').astype(np.int64)
+
+
+def _format_minute(minute):
+    return str(np.datetime64(int(minute), 'm'))
+
+
+def expand_closing_times(first_closing, minutes, count, allow_weekends, window_start, window_end):
+    """
+    Closing time of each of count queues.
+
+    Queues close every `minutes` starting at first_closing, only inside the
+    daily [window_start, window_end] window; when a day is full the next
+    queue closes at window_start of the next allowed day.
+
+    Args:
+        first_closing: FirstQueueClosingDate
+        minutes (int): Minutes between closes
+        count (int): Number of queues
+        allow_weekends (bool): Whether queues close on Saturday and Sunday
+        window_start: ClosingStartTime (only the time of day is used)
+        window_end: ClosingEndTime (only the time of day is used)
+
+    Returns:
+        np.ndarray: Epoch minutes, one per queue, in closing order
+    """
+    if count <= 0:
+        return np.empty(0, dtype=np.int64)
+    minutes = max(int(minutes), 1)
+    start, end = _minute_of_day(window_start), _minute_of_day(window_end)
+    weekmask = _ALL_DAYS if allow_weekends else _WEEKDAYS
+
+    first = int(_to_minutes([first_closing])[0])
+    first_day = np.datetime64(first // 1440, 'D')
+    first_offset = max(first % 1440, start)
+    if not np.is_busday(first_day, weekmask=weekmask) or first_offset > end:
+        # The first close falls outside the schedule: start on the next allowed day
+        first_day = np.busday_offset(first_day + 1, 0, roll='forward', weekmask=weekmask)
+        first_offset = start
+
+    per_day = (end - start) // minutes + 1
+    on_first_day = min((end - first_offset) // minutes + 1, count)
+    later_days = -(-(count - on_first_day) // per_day)
+
+    days = np.busday_offset(first_day, np.arange(1, later_days + 1), roll='forward', weekmask=weekmask)
+    first_slots = first_day.astype(np.int64) * 1440 + first_offset + np.arange(on_first_day) * minutes
+    later_slots = (days.astype(np.int64)[:, None] * 1440 + start + np.arange(per_day)[None, :] * minutes).ravel()
+    return np.concatenate((first_slots, later_slots))[:count]
+
+
+def forecast_load(close_minutes, items, curve, requests_per_bid=DEFAULT_REQUESTS_PER_BID):
+    """
+    Expected bids per minute over a closing schedule.
+
+    Args:
+        close_minutes (np.ndarray): Epoch minute each queue closes
+        items (np.ndarray): Items in each queue
+        curve (np.ndarray): Bids per item at each minute from -lookback to the close
+        requests_per_bid (float, optional): Requests generated per bid
+
+    Returns:
+        tuple: (first epoch minute of the timeline, bids per minute, requests per second)
+    """
+    lookback = len(curve) - 1
+    origin = int(close_minutes.min())
+    impulses = np.bincount(close_minutes - origin, weights=items)
+    # Each close spreads its items along the curve that ends at the closing minute
+    bids = np.convolve(impulses, curve)
+    return origin - lookback, bids, bids * requests_per_bid / 60.0
+
+
+class QueueLoadSimulator:
+    """Forecasts bid load for every minute of an auction's queue closings."""
+
+    def __init__(self, source=None, lookback=DEFAULT_LOOKBACK, requests_per_bid=DEFAULT_REQUESTS_PER_BID,
+                 history_source=None, curve_ttl=DEFAULT_CURVE_TTL, clock=time.monotonic):
+        """
+        Initialize the simulator.
+
+        Args:
+            source (optional): TaxsaleSource to read queue and auction configuration from
+            lookback (int, optional): Minutes before a close covered by the arrival curve
+            requests_per_bid (float, optional): Requests generated per bid
+            history_source (optional): TaxsaleSource or ReportingStore to read vg_BidTransactions
+                from. Defaults to source.
+            curve_ttl (int, optional): Seconds a learned arrival curve is reused
+            clock (callable, optional): Monotonic time source
+        """
+        self.source = source or TaxsaleSource()
+        self.history_source = history_source or self.source
+        self.lookback = lookback
+        self.requests_per_bid = requests_per_bid
+        self.curve_ttl = curve_ttl
+        self.clock = clock
+        self._curves = {}
+        self._lock = threading.Lock()
+
+    def closing_schedule(self, auction_id):
+        """
+        Expand an auction's queue configuration into closing times.
+
+        Args:
+            auction_id (int): AuctionId of vg_QueueConfiguration / vg_Queues
+
+        Returns:
+            dict: queue_ids, items and close_minutes arrays in closing order
+        """
+        config = self.source.read_columns(
+            CONFIGURATION_TABLE,
+            ('Minutes', 'FirstQueueClosingDate', 'AllowWeekends', 'ClosingStartTime', 'ClosingEndTime'),
+            filters={'AuctionId': auction_id})
+        if not len(config['Minutes']):
+            raise ValueError(f"No queue configuration for auction {auction_id}")
+        config = {name: values[0] for name, values in config.items()}
+
+        queues = self.source.read_columns(QUEUES_TABLE, ('QueueID', 'ItemCount'), filters={'AuctionId': auction_id},
+                                          key_column='QueueID')
+        queue_ids = np.asarray(queues['QueueID'], dtype=np.int64)
+        items = np.asarray(queues['ItemCount'], dtype=np.float64)
+        if not len(queue_ids):
+            raise ValueError(f"Auction {auction_id} has no queues")
+
+        close_minutes = expand_closing_times(
+            config['FirstQueueClosingDate'], config['Minutes'], len(queue_ids), bool(config['AllowWeekends']),
+            config['ClosingStartTime'], config['ClosingEndTime'])
+        return {'queue_ids': queue_ids, 'items': items, 'close_minutes': close_minutes,
+                'minutes_between': int(config['Minutes'])}
+
+    def arrival_curve(self, product_ids=None, lookback=None):
+        """
+        Learn bids per item for each minute before a queue closes.
+
+        Bids are tied to their queue through vg_QueueLinks (SequenceNo ->
+        SequenceID) within the bid's county, and a queue's close is its
+        recorded vg_Queues.AuctionEndDate.
+
+        Args:
+            product_ids (list, optional): VGProductIDs whose history is used. Defaults to all.
+            lookback (int, optional): Minutes before a close covered. Defaults to the simulator's.
+
+        Returns:
+            np.ndarray: lookback + 1 rates, from -lookback minutes to the closing minute
+        """
+        lookback = lookback or self.lookback
+        auctions = self.source.read_columns(AUCTIONS_TABLE, ('AuctionId', 'VGProductId'))
+        queues = self.source.read_columns(QUEUES_TABLE, ('QueueID', 'ItemCount', 'AuctionEndDate', 'AuctionId'))
+        links = self.source.read_columns(QUEUE_LINKS_TABLE, ('QueueID', 'SequenceID'))
+        bids = self.history_source.read_columns(BID_TRANSACTIONS_TABLE, ('BidTime', 'SequenceNo', 'VGProductID'),
+                                        filters={'VGProductID': list(product_ids)} if product_ids else None)
+
+        # Queue -> product and closing minute, for queues that have closed
+        auction_product = dict(zip(auctions['AuctionId'], auctions['VGProductId']))
+        closed = [i for i, end in enumerate(queues['AuctionEndDate']) if end is not None]
+        queue_ids = np.asarray([queues['QueueID'][i] for i in closed], dtype=np.int64)
+        queue_products = np.asarray([auction_product.get(queues['AuctionId'][i], -1) for i in closed], dtype=np.int64)
+        queue_close = _to_minutes([queues['AuctionEndDate'][i] for i in closed])
+        queue_items = np.asarray([queues['ItemCount'][i] for i in closed], dtype=np.float64)
+        if product_ids:
+            keep = np.isin(queue_products, list(product_ids))
+            queue_ids, queue_products, queue_close, queue_items = (
+                queue_ids[keep], queue_products[keep], queue_close[keep], queue_items[keep])
+
+        order = np.argsort(queue_ids)
+        queue_ids, queue_products, queue_close = queue_ids[order], queue_products[order], queue_close[order]
+        if not len(queue_ids) or not len(links['QueueID']) or not len(bids['BidTime']):
+            raise ValueError('No closed queues with bids to learn an arrival curve from')
+
+        # (product, SequenceID) -> index of the link's queue; both columns are NULLable
+        link_pairs = [(queue_id, sequence_id) for queue_id, sequence_id in zip(links['QueueID'], links['SequenceID'])
+                      if queue_id is not None and sequence_id is not None]
+        link_queue = np.asarray([queue_id for queue_id, _ in link_pairs], dtype=np.int64)
+        link_sequence = np.asarray([sequence_id for _, sequence_id in link_pairs], dtype=np.int64)
+        position = np.clip(np.searchsorted(queue_ids, link_queue), 0, len(queue_ids) - 1)
+        valid = queue_ids[position] == link_queue
+        link_keys = queue_products[position[valid]] * 2 ** 32 + link_sequence[valid]
+        link_queue_index = position[valid]
+        key_order = np.argsort(link_keys)
+        link_keys, link_queue_index = link_keys[key_order], link_queue_index[key_order]
+
+        bid_products = np.asarray([p if p is not None else -1 for p in bids['VGProductID']], dtype=np.int64)
+        bid_sequences = np.asarray([s if s is not None else -1 for s in bids['SequenceNo']], dtype=np.int64)
+        bid_keys = bid_products * 2 ** 32 + bid_sequences
+        found = np.clip(np.searchsorted(link_keys, bid_keys), 0, max(len(link_keys) - 1, 0))
+        matched = link_keys[found] == bid_keys if len(link_keys) else np.zeros(len(bid_keys), dtype=bool)
+
+        offsets = _to_minutes(bids['BidTime'])[matched] - queue_close[link_queue_index[found[matched]]]
+        in_window = (offsets >= -lookback) & (offsets <= 0)
+        counts = np.bincount(offsets[in_window] + lookback, minlength=lookback + 1)
+        logger.info(f"Learned arrival curve from {int(in_window.sum())} bids over {len(queue_ids)} queues")
+        return counts / queue_items.sum()
+
+    def learned_curve(self, product_ids=None, lookback=None):
+        """
+        arrival_curve(), reused for curve_ttl seconds.
+
+        Args:
+            product_ids (list, optional): VGProductIDs whose history is used. Defaults to all.
+            lookback (int, optional): Minutes before a close covered. Defaults to the simulator's.
+
+        Returns:
+            np.ndarray: lookback + 1 rates, from -lookback minutes to the closing minute
+        """
+        key = (tuple(sorted(set(product_ids))) if product_ids else None, lookback or self.lookback)
+        with self._lock:
+            entry = self._curves.get(key)
+            if entry is not None and self.clock() - entry[1] < self.curve_ttl:
+                return entry[0]
+
+        curve = self.arrival_curve(key[0], key[1])
+        with self._lock:
+            if len(self._curves) >= CURVE_CACHE_SIZE and key not in self._curves:
+                # Dicts keep insertion order: drop the oldest curve
+                del self._curves[next(iter(self._curves))]
+            self._curves[key] = (curve, self.clock())
+        return curve
+
+    def simulate(self, auction_id, history_product_ids=None, curve=None, lookback=None, requests_per_bid=None):
+        """
+        Forecast the load of an auction's whole sale.
+
+        Args:
+            auction_id (int): Auction to forecast
+            history_product_ids (list, optional): Counties whose past sales shape the curve
+            curve (np.ndarray, optional): Precomputed arrival curve
+            lookback (int, optional): Minutes before a close covered. Defaults to the simulator's.
+            requests_per_bid (float, optional): Requests generated per bid. Defaults to the simulator's.
+
+        Returns:
+            dict: Per-queue closes, per-minute expected load and the peak
+        """
+        schedule = self.closing_schedule(auction_id)
+        if curve is None:
+            curve = self.learned_curve(history_product_ids, lookback)
+        if requests_per_bid is None:
+            requests_per_bid = self.requests_per_bid
+        origin, bids, rps = forecast_load(schedule['close_minutes'], schedule['items'], curve, requests_per_bid)
+
+        busy = np.flatnonzero(bids > 0)
+        peak = int(np.argmax(bids))
+        return {
+            'auction_id': auction_id,
+            'queues': [{
+                'queue_id': int(queue_id),
+                'items': int(items),
+                'closes_at': _format_minute(close),
+            } for queue_id, items, close in zip(schedule['queue_ids'], schedule['items'], schedule['close_minutes'])],
+            'timeline': [{
+                'minute': _format_minute(origin + i),
+                'expected_bids': round(float(bids[i]), 3),
+                'requests_per_second': round(float(rps[i]), 4),
+            } for i in busy],
+            'peak': {
+                'minute': _format_minute(origin + peak),
+                'expected_bids': round(float(bids[peak]), 3),
+                'requests_per_second': round(float(rps[peak]), 4),
+            },
+            'total_expected_bids': round(float(bids.sum()), 1),
+            'sale_starts': _format_minute(schedule['close_minutes'].min()),
+            'sale_ends': _format_minute(schedule['close_minutes'].max()),
+        }
@@ -0,0 +1,252 @@
+"""
+Payment transaction reconciliation.
+Hash-joins vg_Transactions with vg_TransactionResponse, vg_TransactionErrors
+and vg_TransactionRefund in InvoiceKey-range chunks, so a whole sale season
+can be reconciled in bounded memory. Transactions are flagged as unmatched,
+retried, refunded, errored or declined and summarized per VGProductID.
+
+InvoiceKey has no index in the Taxsale database, so every chunk would scan
+the live tables; reconciliation runs offline against the reporting replica
+and its results are saved for the report route to serve.
+"""
+import os
+import time
+import uuid
+import json
+import logging
+import datetime
+from collections import defaultdict
+
+from app.services.db import TaxsaleSource
+
+logger = logging.getLogger(__name__)
+
+TRANSACTIONS_TABLE = 'vg_Transactions'
+RESPONSE_TABLE = 'vg_TransactionResponse'
+REFUND_TABLE = 'vg_TransactionRefund'
+ERRORS_TABLE = 'vg_TransactionErrors'
+
+TRANSACTION_COLUMNS = ('TransID', 'InvoiceKey', 'TransactionTry', 'TransDate', 'UserId', 'EngineResponse',
+                       'Amount', 'TransactionType', 'VGProductID')
+RESPONSE_COLUMNS = ('InvoiceKey', 'PNRef', 'Result', 'ResponseMessage')
+REFUND_COLUMNS = ('TransID', 'PaymentTransID')
+ERROR_COLUMNS = ('InvoiceKey', 'ErrResponse', 'ErrMsg')
+
+# Gateway result code for an approved transaction
+APPROVED_RESULT = 0
+
+# Invoice keys reconciled per pass
+DEFAULT_CHUNK_SIZE = 50000
+
+# Flagged transactions listed per flag; the counts always cover everything
+DEFAULT_EXCEPTION_LIMIT = 500
+
+FLAGS = ('unmatched', 'retried', 'refunded', 'errored', 'declined')
+
+
+def _rows(columns):
+    """Turn a column dict into an iterator of row dicts."""
+    names = list(columns)
+    return (dict(zip(names, values)) for values in zip(*(columns[name] for name in names)))
+
+
+def result_path(directory, product_id=None):
+    """Where the result of reconciling one product, or the whole season, is saved."""
+    name = 'all' if product_id is None else str(product_id)
+    return os.path.join(directory, f"{name}.json")
+
+
+def save_result(result, directory):
+    """
+    Atomically save a reconciliation result.
+
+    Args:
+        result (dict): Result of ReconciliationEngine.reconcile()
+        directory (str): Directory results are kept in
+
+    Returns:
+        str: Path of the saved result
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = result_path(directory, result['product_id'])
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_result(directory, product_id=None):
+    """
+    Load the last saved reconciliation result.
+
+    Args:
+        directory (str): Directory results are kept in
+        product_id (int, optional): VGProductID the result was restricted to
+
+    Returns:
+        dict: The saved result, or None if that reconciliation has not been run
+    """
+    try:
+        with open(result_path(directory, product_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _group_by_invoice(columns):
+    """Build the hash side of a join: InvoiceKey -> list of rows."""
+    table = defaultdict(list)
+    for row in _rows(columns):
+        table[int(row['InvoiceKey'])].append(row)
+    return table
+
+
+class ReconciliationEngine:
+    """Reconciles payment transactions against gateway responses, errors and refunds."""
+
+    def __init__(self, source=None, chunk_size=DEFAULT_CHUNK_SIZE, exception_limit=DEFAULT_EXCEPTION_LIMIT):
+        """
+        Initialize the engine.
+
+        Args:
+            source (optional): TaxsaleSource or ReportingStore to read from
+            chunk_size (int, optional): Invoice keys reconciled per pass
+            exception_limit (int, optional): Flagged transactions listed per flag
+        """
+        self.source = source or TaxsaleSource()
+        self.chunk_size = chunk_size
+        self.exception_limit = exception_limit
+
+    def _load_refunds(self):
+        """
+        Build the refund hash table. Refunds are rare, so the whole table
+        fits in memory and every chunk probes it.
+
+        Returns:
+            dict: Payment TransID -> list of refund TransIDs
+        """
+        refunds = defaultdict(list)
+        for row in _rows(self.source.read_columns(REFUND_TABLE, REFUND_COLUMNS)):
+            refunds[int(row['PaymentTransID'])].append(int(row['TransID']))
+        return refunds
+
+    def _empty_summary(self):
+        summary = {'transactions': 0, 'amount': 0.0, 'matched': 0, 'refund_amount': 0.0}
+        summary.update({flag: 0 for flag in FLAGS})
+        return summary
+
+    def reconcile(self, product_id=None):
+        """
+        Reconcile every transaction, chunk by chunk.
+
+        Args:
+            product_id (int, optional): Restrict to one VGProductID
+
+        Returns:
+            dict: Per-product summary, flagged transactions and run metadata
+        """
+        started = time.perf_counter()
+        refunds = self._load_refunds()
+        refund_ids = {trans_id for ids in refunds.values() for trans_id in ids}
+        refund_amounts = {}
+        refunded_payments = []
+
+        summary = defaultdict(self._empty_summary)
+        exceptions = {flag: [] for flag in FLAGS}
+        orphan_responses = 0
+        chunks = 0
+
+        filters = {'VGProductID': product_id} if product_id is not None else None
+        high_water = self.source.max_key(TRANSACTIONS_TABLE, 'InvoiceKey')
+        if product_id is None:
+            # Orphan responses can sit above the last transaction's invoice
+            high_water = max(high_water, self.source.max_key(RESPONSE_TABLE, 'InvoiceKey'))
+        after = 0
+        while after < high_water:
+            upto = min(after + self.chunk_size, high_water)
+            chunks += 1
+
+            transactions = self.source.read_columns(
+                TRANSACTIONS_TABLE, TRANSACTION_COLUMNS, filters=filters,
+                key_column='InvoiceKey', after=after, upto=upto)
+            if not len(transactions['TransID']) and product_id is not None:
+                after = upto
+                continue
+
+            # Build side: the response and error rows of this invoice range
+            responses = _group_by_invoice(self.source.read_columns(
+                RESPONSE_TABLE, RESPONSE_COLUMNS, key_column='InvoiceKey', after=after, upto=upto))
+            errors = _group_by_invoice(self.source.read_columns(
+                ERRORS_TABLE, ERROR_COLUMNS, key_column='InvoiceKey', after=after, upto=upto))
+
+            # Probe side: the transactions, grouped so retries are visible
+            by_invoice = _group_by_invoice(transactions)
+            for invoice_key, attempts in by_invoice.items():
+                invoice_responses = responses.get(invoice_key, [])
+                invoice_errors = errors.get(invoice_key, [])
+                approved = any(int(r['Result']) == APPROVED_RESULT for r in invoice_responses)
+
+                for txn in attempts:
+                    trans_id = int(txn['TransID'])
+                    amount = float(txn['Amount'])
+                    product = int(txn['VGProductID'])
+                    if trans_id in refund_ids:
+                        refund_amounts[trans_id] = amount
+
+                    flags = []
+                    if not invoice_responses:
+                        flags.append('unmatched')
+                    if int(txn['TransactionTry']) > 1 or len(attempts) > 1:
+                        flags.append('retried')
+                    if trans_id in refunds:
+                        flags.append('refunded')
+                        refunded_payments.append((trans_id, product))
+                    if invoice_errors:
+                        flags.append('errored')
+                    if invoice_responses and not approved:
+                        flags.append('declined')
+
+                    totals = summary[product]
+                    totals['transactions'] += 1
+                    totals['amount'] += amount
+                    if not flags:
+                        totals['matched'] += 1
+                    for flag in flags:
+                        totals[flag] += 1
+                        if len(exceptions[flag]) < self.exception_limit:
+                            exceptions[flag].append({
+                                'trans_id': trans_id,
+                                'invoice_key': invoice_key,
+                                'product_id': product,
+                                'amount': amount,
+                                'transaction_try': int(txn['TransactionTry']),
+                                'trans_date': str(txn['TransDate']),
+                                'flags': flags,
+                                'errors': [e['ErrMsg'] for e in invoice_errors][:5],
+                            })
+
+            if product_id is None:
+                orphan_responses += sum(len(rows) for key, rows in responses.items() if key not in by_invoice)
+            after = upto
+
+        # Refund transactions can sit in a later chunk than their payment
+        for trans_id, product in refunded_payments:
+            summary[product]['refund_amount'] += sum(
+                refund_amounts.get(refund_id, 0.0) for refund_id in refunds[trans_id])
+
+        duration = time.perf_counter() - started
+        logger.info(f"Reconciled {sum(s['transactions'] for s in summary.values())} transactions "
+                    f"in {chunks} chunks ({duration:.2f}s)")
+        return {
+            'product_id': product_id,
+            'generated_at': datetime.datetime.now().isoformat(),
+            'duration_seconds': round(duration, 3),
+            'chunks': chunks,
+            'summary': {
+                str(product): {k: round(v, 2) if isinstance(v, float) else v for k, v in totals.items()}
+                for product, totals in sorted(summary.items())
+            },
+            'orphan_responses': orphan_responses if product_id is None else None,
+            'exceptions': exceptions,
+        }
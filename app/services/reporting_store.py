@@ -0,0 +1,390 @@
+"""
+Local columnar reporting store.
+Holds replicated Taxsale tables as append-only segments of NumPy column
+arrays, so reports can run off the replica instead of the live database.
+The store exposes the same read_columns()/max_key() interface as
+TaxsaleSource.
+
+Compaction does not delete the segments it merged right away: they stay on
+disk for SEGMENT_GRACE_PERIOD seconds, so a reader in another process that
+loaded the previous manifest can still open them.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import datetime
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Segments per table before they are merged into one
+MAX_SEGMENTS = 32
+
+# Seconds a segment superseded by compaction is kept for readers of the old manifest
+SEGMENT_GRACE_PERIOD = 300
+
+# Stand-in stored for NULL integers
+NULL_INT = -1
+
+# Column kinds and replication keys for the replicated tables
+REPLICATED_TABLES = {
+    'vg_BidTransactions': {
+        'key': 'BidId',
+        'timestamp': 'BidTime',
+        'columns': {
+            'BidId': 'int', 'UserId': 'str', 'PropertyNo': 'str', 'TaxYear': 'int', 'BidPercent': 'float',
+            'BidTime': 'datetime', 'BidSource': 'str', 'BidStatus': 'int', 'VGProductID': 'int',
+            'SequenceNo': 'int', 'UnpaidBalance': 'float',
+        },
+    },
+    'vg_Transactions': {
+        'key': 'TransID',
+        'timestamp': 'TransDate',
+        'columns': {
+            'TransID': 'int', 'InvoiceKey': 'int', 'TransactionIndicator': 'str', 'TransactionTry': 'int',
+            'TransDate': 'datetime', 'UserId': 'str', 'EngineResponse': 'int', 'Amount': 'float',
+            'TenderID': 'int', 'AccountType': 'str', 'PaymentType': 'str', 'ReferenceNumber': 'str',
+            'TransactionType': 'int', 'VGProductID': 'int',
+        },
+    },
+    'vg_TransactionResponse': {
+        'key': 'TransactionResponseID',
+        'timestamp': 'ResponseDate',
+        'columns': {
+            'TransactionResponseID': 'int', 'InvoiceKey': 'int', 'PNRef': 'str', 'Result': 'int',
+            'CVV2Match': 'str', 'ResponseMessage': 'str', 'AuthCode': 'str', 'AVSAddr': 'str', 'AVSZip': 'str',
+            'IAVS': 'str', 'ResponseDate': 'datetime', 'HostCode': 'str', 'RespText': 'str',
+            'SettleDate': 'datetime', 'BatchID': 'int',
+        },
+    },
+    # No identity of its own; TransID is the refund's vg_Transactions identity
+    'vg_TransactionRefund': {
+        'key': 'TransID',
+        'timestamp': None,
+        'columns': {
+            'TransID': 'int', 'PaymentTransID': 'int', 'Notes': 'str', 'Authorizer': 'str',
+        },
+    },
+    'vg_TransactionErrors': {
+        'key': 'ErrID',
+        'timestamp': 'ErrDateTime',
+        'columns': {
+            'ErrID': 'int', 'InvoiceKey': 'int', 'ErrResponse': 'str', 'ErrMsg': 'str',
+            'ErrDateTime': 'datetime', 'ErrTypeID': 'int',
+        },
+    },
+    'vg_ActivityLog': {
+        'key': 'ActivityID',
+        'timestamp': 'ActivityDate',
+        'columns': {
+            'ActivityID': 'int', 'ActivityDate': 'datetime', 'UserID': 'str', 'ActivityName': 'str',
+            'ActivityDetails': 'str',
+        },
+    },
+    'vg_AuctionResults': {
+        'key': 'SaleId',
+        'timestamp': None,
+        'columns': {
+            'SaleId': 'int', 'QueueId': 'int', 'PropertyNo': 'str', 'TaxYear': 'int', 'VGProductID': 'int',
+            'MinimumBid': 'float', 'NumberOfBidders': 'int', 'WinningBid': 'float', 'UnpaidBalance': 'float',
+            'UserID': 'str', 'BidderNumber': 'str', 'SequenceNo': 'int',
+        },
+    },
+    'vg_BidBudget': {
+        'key': 'BidBudgetID',
+        'timestamp': 'ActivityDate',
+        'columns': {
+            'BidBudgetID': 'int', 'UserID': 'str', 'ActivityDate': 'datetime', 'BudgetAmount': 'float',
+            'VGProductID': 'int',
+        },
+    },
+}
+
+
+def to_array(values, kind):
+    """
+    Convert DB-API values into a typed column array.
+
+    Args:
+        values (iterable): Column values, possibly containing None
+        kind (str): One of 'int', 'float', 'datetime' or 'str'
+
+    Returns:
+        ndarray: Typed column
+    """
+    if kind == 'int':
+        return np.asarray([NULL_INT if v is None else int(v) for v in values], dtype=np.int64)
+    if kind == 'float':
+        return np.asarray([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+    if kind == 'datetime':
+        return np.asarray(['NaT' if v is None else v for v in values], dtype='datetime64[us]')
+    if kind == 'str':
+        return np.asarray(['' if v is None else str(v) for v in values], dtype=np.str_)
+    raise ValueError(f"Unknown column kind: {kind}")
+
+
+def _null_mask(array):
+    """Rows holding the stored stand-in for NULL."""
+    if array.dtype.kind == 'i':
+        return array == NULL_INT
+    if array.dtype.kind == 'f':
+        return np.isnan(array)
+    if array.dtype.kind == 'M':
+        return np.isnat(array)
+    return array == ''
+
+
+def _filter_mask(array, value):
+    """Rows of a column matching an equality or IN filter."""
+    if value is None:
+        return _null_mask(array)
+    # Fixed-width string columns would truncate longer filter values
+    dtype = None if array.dtype.kind == 'U' else array.dtype
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return np.isin(array, np.asarray(list(value), dtype=dtype))
+    return array == np.asarray(value, dtype=dtype)
+
+
+class ReportingStore:
+    """Append-only columnar replica of Taxsale tables on local disk."""
+
+    def __init__(self, root, tables=None):
+        """
+        Initialize the store.
+
+        Args:
+            root (str): Directory holding one sub-directory per table
+            tables (dict, optional): Table specs. Defaults to REPLICATED_TABLES.
+        """
+        self.root = root
+        self.tables = tables or REPLICATED_TABLES
+        self._lock = threading.Lock()
+        # (table, column) -> (manifest version, array)
+        self._column_cache = {}
+        os.makedirs(root, exist_ok=True)
+
+    def _table_dir(self, table):
+        if table not in self.tables:
+            raise KeyError(f"Table {table} is not replicated")
+        return os.path.join(self.root, table)
+
+    def _write_json(self, path, data):
+        """Atomically replace a JSON file."""
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def manifest(self, table):
+        """
+        Return the manifest of a table.
+
+        Returns:
+            dict: Segments, row count, high-water mark and sync metadata
+        """
+        path = os.path.join(self._table_dir(table), 'manifest.json')
+        if not os.path.exists(path):
+            return {
+                'table': table,
+                'key': self.tables[table]['key'],
+                'version': 0,
+                'high_water': 0,
+                'row_count': 0,
+                'segments': [],
+                'retired': [],
+                'last_sync_at': None,
+                'newest_timestamp': None,
+            }
+        with open(path) as f:
+            return json.load(f)
+
+    def high_water(self, table):
+        """Largest replicated key of a table."""
+        return self.manifest(table)['high_water']
+
+    def append(self, table, rows, high_water):
+        """
+        Append a batch of rows as a new segment.
+
+        The segment file is written before the manifest is replaced, so a
+        crash leaves the previous high-water mark intact and the batch is
+        simply copied again.
+
+        Args:
+            table (str): Replicated table
+            rows (dict): Column name to list of values
+            high_water (int): Key the replica is now complete up to
+
+        Returns:
+            int: Rows appended
+        """
+        spec = self.tables[table]
+        table_dir = self._table_dir(table)
+        os.makedirs(table_dir, exist_ok=True)
+
+        with self._lock:
+            manifest = self.manifest(table)
+            count = len(rows[spec['key']]) if rows else 0
+            if count:
+                arrays = {name: to_array(rows[name], kind) for name, kind in spec['columns'].items()}
+                segment = f"{manifest['high_water'] + 1:012d}-{high_water:012d}.npz"
+                tmp_path = os.path.join(table_dir, f"{segment}.{uuid.uuid4().hex}.tmp")
+                with open(tmp_path, 'wb') as f:
+                    np.savez(f, **arrays)
+                os.replace(tmp_path, os.path.join(table_dir, segment))
+                manifest['segments'].append(segment)
+                manifest['row_count'] += count
+
+                timestamp = spec.get('timestamp')
+                if timestamp:
+                    newest = arrays[timestamp].max()
+                    if not np.isnat(newest):
+                        newest = str(newest)
+                        if not manifest['newest_timestamp'] or newest > manifest['newest_timestamp']:
+                            manifest['newest_timestamp'] = newest
+
+            manifest['high_water'] = max(manifest['high_water'], int(high_water))
+            manifest['last_sync_at'] = datetime.datetime.now().isoformat()
+            manifest['version'] += 1
+            self._remove_retired(table, manifest)
+            self._write_json(os.path.join(table_dir, 'manifest.json'), manifest)
+
+            if len(manifest['segments']) > MAX_SEGMENTS:
+                self._compact(table, manifest)
+        return count
+
+    def _load_segments(self, table, manifest, names=None):
+        """Concatenate every segment of a table into full column arrays."""
+        spec = self.tables[table]
+        table_dir = self._table_dir(table)
+        parts = {name: [] for name in (names or spec['columns'])}
+        for segment in manifest['segments']:
+            with np.load(os.path.join(table_dir, segment)) as data:
+                for name in parts:
+                    parts[name].append(data[name])
+        return {
+            name: np.concatenate(arrays) if arrays else to_array([], spec['columns'][name])
+            for name, arrays in parts.items()
+        }
+
+    def _compact(self, table, manifest):
+        """Merge all segments of a table into a single segment."""
+        table_dir = self._table_dir(table)
+        arrays = self._load_segments(table, manifest)
+        old_segments = manifest['segments']
+        segment = f"{1:012d}-{manifest['high_water']:012d}.npz"
+        tmp_path = os.path.join(table_dir, f"{segment}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, os.path.join(table_dir, segment))
+
+        manifest['segments'] = [segment]
+        manifest['version'] += 1
+        # Readers of the previous manifest may still open the merged segments
+        retired_at = time.time()
+        manifest.setdefault('retired', []).extend([old, retired_at] for old in old_segments if old != segment)
+        self._write_json(os.path.join(table_dir, 'manifest.json'), manifest)
+        logger.info(f"Compacted {len(old_segments)} segments of {table}")
+
+    def _remove_retired(self, table, manifest):
+        """Delete segments retired by compaction more than SEGMENT_GRACE_PERIOD seconds ago."""
+        table_dir = self._table_dir(table)
+        cutoff = time.time() - SEGMENT_GRACE_PERIOD
+        kept = []
+        for segment, retired_at in manifest.get('retired', []):
+            if retired_at > cutoff or segment in manifest['segments']:
+                kept.append([segment, retired_at])
+                continue
+            try:
+                os.remove(os.path.join(table_dir, segment))
+            except FileNotFoundError:
+                pass
+        manifest['retired'] = kept
+
+    def max_key(self, table, key_column=None):
+        """
+        Largest value of a key column, matching TaxsaleSource.max_key().
+
+        Args:
+            table (str): Replicated table
+            key_column (str, optional): Column to take the maximum of. Defaults to
+                the replication key, answered from the manifest.
+
+        Returns:
+            int: Largest key, or 0 for an empty table
+        """
+        if key_column is None or key_column == self.tables[table]['key']:
+            return self.high_water(table)
+        values = self._columns(table, {key_column})[key_column]
+        values = values[~_null_mask(values)]
+        return int(values.max()) if len(values) else 0
+
+    def read_columns(self, table, columns, filters=None, key_column=None, after=None, upto=None):
+        """
+        Read columns from the replica, matching TaxsaleSource.read_columns().
+
+        Args:
+            table (str): Replicated table
+            columns (iterable): Columns to load
+            filters (dict, optional): Column equality filters. List or tuple
+                values match any of their items; None matches NULLs.
+            key_column (str, optional): Key column used for range reads
+            after (int, optional): Exclusive lower bound on key_column
+            upto (int, optional): Inclusive upper bound on key_column
+
+        Returns:
+            dict: Column name to ndarray
+        """
+        columns = list(columns)
+        needed = set(columns) | set(filters or {})
+        if key_column:
+            needed.add(key_column)
+        loaded = self._columns(table, needed)
+
+        mask = None
+        for column, value in (filters or {}).items():
+            column_mask = _filter_mask(loaded[column], value)
+            mask = column_mask if mask is None else mask & column_mask
+        if key_column and after is not None:
+            column_mask = loaded[key_column] > after
+            mask = column_mask if mask is None else mask & column_mask
+        if key_column and upto is not None:
+            column_mask = loaded[key_column] <= upto
+            mask = column_mask if mask is None else mask & column_mask
+
+        if mask is None:
+            return {column: loaded[column] for column in columns}
+        return {column: loaded[column][mask] for column in columns}
+
+    def _columns(self, table, names):
+        """Return full column arrays, reloading only after the table changes."""
+        spec = self.tables[table]
+        unknown = set(names) - set(spec['columns'])
+        if unknown:
+            raise KeyError(f"Columns {sorted(unknown)} are not replicated for {table}")
+        try:
+            return self._cached_columns(table, names, self.manifest(table))
+        except FileNotFoundError:
+            # The manifest was read more than a grace period before its segments: read the new one
+            return self._cached_columns(table, names, self.manifest(table))
+
+    def _cached_columns(self, table, names, manifest):
+        with self._lock:
+            result = {}
+            stale = []
+            for name in names:
+                entry = self._column_cache.get((table, name))
+                if entry and entry[0] == manifest['version']:
+                    result[name] = entry[1]
+                else:
+                    stale.append(name)
+
+            if stale:
+                for name, array in self._load_segments(table, manifest, stale).items():
+                    self._column_cache[(table, name)] = (manifest['version'], array)
+                    result[name] = array
+            return result
@@ -0,0 +1,342 @@
+"""
+Compiled saved searches.
+Compiles a saved search (vg_SavedSearches / vg_SavedSearchCriteria) once into
+a parameterized query over the county certificate tables and keeps it in an
+LRU keyed by SavedSearchID. Every run reuses the same SQL text with typed
+parameters, so the server can reuse its plan, and returns one page.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from app.services.db import SCHEMA, TaxsaleSource, paginate, quote_identifier
+
+logger = logging.getLogger(__name__)
+
+# Compiled searches kept in the LRU and how long they stay valid
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_CACHE_TTL = 600
+
+# Result pages are reused for this long, which absorbs repeat clicks
+DEFAULT_RESULT_TTL = 30
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Certificate columns returned by every search
+RESULT_COLUMNS = ('PropertyNo', 'Name', 'LocHouseNr', 'LocStreet', 'LocCity', 'UseCode', 'Acres',
+                  'JustValue', 'AssessedValue', 'UnpaidBalance', 'CertificateNo')
+
+# Search functions (as stored, or as vg_SearchType.sqlConditionValue) -> operator
+FUNCTION_ALIASES = {
+    '=': '=', 'equals': '=', 'equal to': '=', 'is': '=',
+    '<>': '<>', '!=': '<>', 'not equal': '<>', 'not equals': '<>', 'not equal to': '<>',
+    '>': '>', 'greater than': '>',
+    '>=': '>=', 'greater than or equal to': '>=', 'at least': '>=',
+    '<': '<', 'less than': '<',
+    '<=': '<=', 'less than or equal to': '<=', 'at most': '<=',
+    'starts with': 'starts', 'begins with': 'starts',
+    'contains': 'contains', 'like': 'contains',
+    'ends with': 'ends',
+    'between': 'between',
+    'in': 'in', 'one of': 'in',
+}
+
+_COMPARISONS = ('=', '<>', '>', '>=', '<', '<=')
+
+# vg_SearchCriteria.SearchType values holding numbers
+_NUMERIC_TYPES = ('num', 'int', 'dec', 'money', 'currency', 'amount', 'value')
+
+
+class SearchCompileError(ValueError):
+    """Raised when a saved search cannot be compiled into a safe query."""
+
+
+class CompiledSearch:
+    """A saved search compiled into SQL with bound parameters."""
+
+    __slots__ = ('search_id', 'product_id', 'sql', 'count_sql', 'params', 'columns', 'compiled_at')
+
+    def __init__(self, search_id, product_id, sql, count_sql, params, columns):
+        self.search_id = search_id
+        self.product_id = product_id
+        self.sql = sql
+        self.count_sql = count_sql
+        self.params = tuple(params)
+        self.columns = tuple(columns)
+        self.compiled_at = time.monotonic()
+
+
+def _escape_like(value):
+    """Escape LIKE wildcards so user input is matched literally."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_').replace('[', '\\[')
+
+
+def _coerce(value, numeric):
+    """Type a search value so every run binds the same parameter types."""
+    value = (value or '').strip()
+    if not numeric:
+        return value
+    try:
+        return float(value.replace(',', '').replace('$', ''))
+    except ValueError:
+        raise SearchCompileError(f"Expected a number, got {value!r}")
+
+
+def _split_values(value):
+    """Split a multi-value search value on commas or ' and '."""
+    separator = ',' if ',' in value else ' and '
+    return [part.strip() for part in value.split(separator) if part.strip()]
+
+
+def build_predicate(column, operator, value, numeric):
+    """
+    Build one sargable predicate.
+
+    Args:
+        column (str): Qualified column, e.g. c.JustValue
+        operator (str): Canonical operator from FUNCTION_ALIASES
+        value (str): Raw search value
+        numeric (bool): Whether the column holds numbers
+
+    Returns:
+        tuple: (sql fragment, params)
+    """
+    if operator in _COMPARISONS:
+        return f"{column} {operator} ?", [_coerce(value, numeric)]
+    if operator in ('starts', 'contains', 'ends'):
+        if numeric:
+            raise SearchCompileError(f"Text match on numeric column {column}")
+        text = _escape_like((value or '').strip())
+        pattern = {'starts': f"{text}%", 'contains': f"%{text}%", 'ends': f"%{text}"}[operator]
+        return f"{column} LIKE ? ESCAPE '\\'", [pattern]
+    if operator == 'between':
+        bounds = _split_values(value or '')
+        if len(bounds) != 2:
+            raise SearchCompileError(f"Between needs two values, got {value!r}")
+        return f"{column} BETWEEN ? AND ?", [_coerce(b, numeric) for b in bounds]
+    if operator == 'in':
+        values = _split_values(value or '')
+        if not values:
+            raise SearchCompileError(f"No values given for {column}")
+        return f"{column} IN ({', '.join('?' for _ in values)})", [_coerce(v, numeric) for v in values]
+    raise SearchCompileError(f"Unsupported operator {operator!r}")
+
+
+class SavedSearchEngine:
+    """Compiles, caches and runs saved searches."""
+
+    def __init__(self, source=None, cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL,
+                 result_ttl=DEFAULT_RESULT_TTL):
+        """
+        Initialize the engine.
+
+        Args:
+            source (optional): TaxsaleSource to compile against and query
+            cache_size (int, optional): Compiled searches (and result pages) kept
+            cache_ttl (int, optional): Seconds a compiled search stays valid
+            result_ttl (int, optional): Seconds a result page is reused; 0 disables
+        """
+        self.source = source or TaxsaleSource()
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.result_ttl = result_ttl
+        self.hits = 0
+        self.misses = 0
+        self._compiled = OrderedDict()
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self._columns = None
+        self._functions = None
+        self._county_tables = {}
+
+    def _load_metadata(self):
+        """Load the search column and function lookup tables once."""
+        if self._columns is not None:
+            return
+
+        columns = {}
+        rows = self.source.query(
+            f"SELECT TableColumn, TableName, SearchType, ColumnDescription FROM {SCHEMA}.vg_SearchCriteria")
+        for table_column, table_name, search_type, description in rows:
+            if not table_column:
+                continue
+            entry = {
+                'column': quote_identifier(table_column.strip()),
+                'view': 'view' in (table_name or '').lower(),
+                'numeric': any(t in (search_type or '').lower() for t in _NUMERIC_TYPES),
+            }
+            columns[table_column.strip().lower()] = entry
+            if description:
+                columns.setdefault(description.strip().lower(), entry)
+
+        functions = {}
+        rows = self.source.query(f"SELECT Condition, sqlConditionValue FROM {SCHEMA}.vg_SearchType")
+        for condition, sql_value in rows:
+            operator = FUNCTION_ALIASES.get((sql_value or '').strip().lower())
+            if condition and operator:
+                functions[condition.strip().lower()] = operator
+
+        self._columns = columns
+        self._functions = functions
+
+    def _county_table_names(self, product_id):
+        """Certificate and view table names of a county."""
+        tables = self._county_tables.get(product_id)
+        if tables is None:
+            rows = self.source.query(
+                f"SELECT TaxCertTableName, TaxViewTableName FROM {SCHEMA}.vg_CountyInfo WHERE VGProductID = ?",
+                [product_id])
+            if not rows or not rows[0][0]:
+                raise SearchCompileError(f"No certificate table configured for product {product_id}")
+            cert, view = rows[0]
+            tables = (quote_identifier(cert.strip()), quote_identifier(view.strip()) if view else None)
+            self._county_tables[product_id] = tables
+        return tables
+
+    def _resolve_operator(self, function):
+        name = (function or '').strip().lower()
+        operator = FUNCTION_ALIASES.get(name) or self._functions.get(name)
+        if not operator:
+            raise SearchCompileError(f"Unknown search function {function!r}")
+        return operator
+
+    def compile(self, search_id):
+        """
+        Compile a saved search, or return it from the LRU.
+
+        Args:
+            search_id (int): SavedSearchID
+
+        Returns:
+            CompiledSearch
+        """
+        now = time.monotonic()
+        with self._lock:
+            compiled = self._compiled.get(search_id)
+            if compiled and now - compiled.compiled_at < self.cache_ttl:
+                self._compiled.move_to_end(search_id)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        self._load_metadata()
+        rows = self.source.query(f"SELECT VGProductID FROM {SCHEMA}.vg_SavedSearches WHERE SearchID = ?",
+                                 [search_id])
+        if not rows:
+            raise SearchCompileError(f"Saved search {search_id} not found")
+        product_id = rows[0][0]
+        cert_table, view_table = self._county_table_names(product_id)
+
+        criteria = self.source.query(
+            f"SELECT SearchColumn, SearchFunction, SearchValue FROM {SCHEMA}.vg_SavedSearchCriteria "
+            f"WHERE SavedSearchID = ? ORDER BY SavedSearchCriteriaID", [search_id])
+
+        predicates = []
+        params = []
+        uses_view = False
+        for search_column, search_function, search_value in criteria:
+            meta = self._columns.get((search_column or '').strip().lower())
+            if not meta:
+                raise SearchCompileError(f"Unknown search column {search_column!r}")
+            if meta['view']:
+                if not view_table:
+                    raise SearchCompileError(f"Product {product_id} has no property view table")
+                uses_view = True
+            column = f"{'v' if meta['view'] else 'c'}.{meta['column']}"
+            fragment, values = build_predicate(
+                column, self._resolve_operator(search_function), search_value, meta['numeric'])
+            predicates.append(fragment)
+            params.extend(values)
+
+        source_sql = f"FROM {SCHEMA}.{cert_table} c"
+        if uses_view:
+            source_sql += f" LEFT JOIN {SCHEMA}.{view_table} v ON v.PropertyNumber = c.PropertyNo"
+        if predicates:
+            source_sql += ' WHERE ' + ' AND '.join(predicates)
+
+        select_list = ', '.join(f"c.{column}" for column in RESULT_COLUMNS)
+        compiled = CompiledSearch(
+            search_id, product_id,
+            sql=f"SELECT {select_list} {source_sql} ORDER BY c.PropertyNo",
+            count_sql=f"SELECT COUNT(*) {source_sql}",
+            params=params,
+            columns=RESULT_COLUMNS)
+        logger.debug(f"Compiled saved search {search_id}: {compiled.sql}")
+
+        with self._lock:
+            self._compiled[search_id] = compiled
+            self._compiled.move_to_end(search_id)
+            while len(self._compiled) > self.cache_size:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def run(self, search_id, page=1, page_size=DEFAULT_PAGE_SIZE, include_total=False):
+        """
+        Run a saved search and return one page of results.
+
+        Args:
+            search_id (int): SavedSearchID
+            page (int, optional): 1-based page number
+            page_size (int, optional): Rows per page, capped at MAX_PAGE_SIZE
+            include_total (bool, optional): Also count all matching rows
+
+        Returns:
+            dict: Rows of the page plus paging metadata
+        """
+        page = max(int(page), 1)
+        page_size = min(max(int(page_size), 1), MAX_PAGE_SIZE)
+        key = (search_id, page, page_size, include_total)
+
+        now = time.monotonic()
+        if self.result_ttl:
+            with self._lock:
+                cached = self._results.get(key)
+                if cached and now - cached[0] < self.result_ttl:
+                    return cached[1]
+
+        started = time.perf_counter()
+        compiled = self.compile(search_id)
+        # Fetch one extra row to learn whether another page exists
+        sql, paging = paginate(compiled.sql, (page - 1) * page_size, page_size + 1, self.source.dialect)
+        rows = self.source.query(sql, list(compiled.params) + paging)
+
+        result = {
+            'search_id': search_id,
+            'product_id': compiled.product_id,
+            'page': page,
+            'page_size': page_size,
+            'has_more': len(rows) > page_size,
+            'rows': [dict(zip(compiled.columns, row)) for row in rows[:page_size]],
+            'total': None,
+        }
+        if include_total:
+            result['total'] = self.source.query(compiled.count_sql, compiled.params)[0][0]
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+        if self.result_ttl:
+            with self._lock:
+                self._results[key] = (now, result)
+                while len(self._results) > self.cache_size:
+                    self._results.popitem(last=False)
+        return result
+
+    def invalidate(self, search_id=None):
+        """
+        Drop compiled searches and cached pages, e.g. after a search is edited.
+
+        Args:
+            search_id (int, optional): Search to drop. Drops everything when omitted.
+        """
+        with self._lock:
+            if search_id is None:
+                self._compiled.clear()
+                self._results.clear()
+                self._columns = None
+                self._functions = None
+                self._county_tables = {}
+                return
+            self._compiled.pop(search_id, None)
+            for key in [k for k in self._results if k[0] == search_id]:
+                del self._results[key]
@@ -0,0 +1,329 @@
+"""
+Taxsale schema catalog.
+Parses the UTF-16 SSMS scripts in sql/ once into a catalog of tables,
+columns, types, primary and foreign keys, defaults, indexes and views.
+The catalog is serialized to JSON next to a fingerprint of the scripts, so
+later processes load it instead of re-parsing, and lookups are dict hits.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'sql')
+
+# Bump when the serialized layout changes so stale caches are rebuilt
+CATALOG_FORMAT = 1
+
+Column = namedtuple('Column', ('name', 'type', 'length', 'scale', 'nullable', 'identity', 'default'))
+
+_NAME = r'\[([^\]]+)\]'
+_OBJECT = rf'(?:{_NAME}\.)?{_NAME}'
+_GO = re.compile(r'^\s*GO\s*$', re.MULTILINE | re.IGNORECASE)
+_CREATE_TABLE = re.compile(rf'CREATE\s+TABLE\s+{_OBJECT}\s*\(', re.IGNORECASE)
+_CREATE_VIEW = re.compile(rf'CREATE\s+VIEW\s+{_OBJECT}\s*(?:WITH\s+\w+\s*)?AS\b', re.IGNORECASE)
+_CREATE_PROCEDURE = re.compile(rf'CREATE\s+PROC(?:EDURE)?\s+{_OBJECT}', re.IGNORECASE)
+_CREATE_INDEX = re.compile(
+    rf'CREATE\s+(UNIQUE\s+)?(?:(?:NON)?CLUSTERED\s+)?INDEX\s+{_NAME}\s+ON\s+{_OBJECT}\s*\(([^)]*)\)', re.IGNORECASE)
+_COLUMN = re.compile(
+    rf'^\s*{_NAME}\s+(?:\[\w+\]\.)?\[(\w+)\](?:\((\w+)(?:,\s*(\d+))?\))?(\s+IDENTITY\([^)]*\))?'
+    r'(?:\s+COLLATE\s+\w+)?(?:\s+ROWGUIDCOL)?\s+(NOT\s+NULL|NULL)', re.IGNORECASE)
+_KEY = re.compile(r'CONSTRAINT\s+\[[^\]]+\]\s+(PRIMARY\s+KEY|UNIQUE)\s+(?:(?:NON)?CLUSTERED\s*)?\(([^)]*)\)',
+                  re.IGNORECASE)
+_DEFAULT = re.compile(
+    rf'ALTER\s+TABLE\s+{_OBJECT}\s+ADD\s+CONSTRAINT\s+{_NAME}\s+DEFAULT\s+(.+?)\s+FOR\s+{_NAME}',
+    re.IGNORECASE | re.DOTALL)
+_FOREIGN_KEY = re.compile(
+    rf'ALTER\s+TABLE\s+{_OBJECT}\s+(?:WITH\s+(?:NO)?CHECK\s+)?ADD\s+CONSTRAINT\s+{_NAME}\s+FOREIGN\s+KEY\s*\(([^)]*)\)'
+    rf'\s*REFERENCES\s+{_OBJECT}\s*\(([^)]*)\)', re.IGNORECASE)
+_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+(?:\[?\w+\]?\.)?\[?(\w+)\]?', re.IGNORECASE)
+_ASSIGNED_ALIAS = re.compile(r'^\[?(\w+)\]?\s*=')
+_AS_ALIAS = re.compile(r'\bAS\s+\[?(\w+)\]?$', re.IGNORECASE)
+_TRAILING_NAME = re.compile(r'\[?(\w+)\]?$')
+
+
+def _names(text):
+    """Column names out of a bracketed list such as '[A] ASC, [B] DESC'."""
+    return re.findall(_NAME, text)
+
+
+def _split_top_level(text):
+    """Split a select list on commas outside parentheses."""
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == ',' and depth == 0:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append(''.join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _view_columns(definition):
+    """Best-effort output column names of a view's SELECT list."""
+    match = re.search(r'\bSELECT\s+(?:TOP\s*\(?\s*\d+\s*\)?\s*(?:PERCENT\s+)?)?(?:DISTINCT\s+)?(.*?)\s+FROM\b',
+                      definition, re.IGNORECASE | re.DOTALL)
+    if not match:
+        return []
+    columns = []
+    for expression in _split_top_level(match.group(1)):
+        expression = ' '.join(expression.split())
+        # [Name] = expr, expr AS Name, or a plain (possibly qualified) column
+        alias = (_ASSIGNED_ALIAS.match(expression) or _AS_ALIAS.search(expression)
+                 or _TRAILING_NAME.search(expression))
+        columns.append(alias.group(1) if alias else expression)
+    return columns
+
+
+def _table_body(batch, start):
+    """Text between the opening parenthesis of CREATE TABLE and its match."""
+    depth = 0
+    for position in range(start, len(batch)):
+        if batch[position] == '(':
+            depth += 1
+        elif batch[position] == ')':
+            depth -= 1
+            if depth == 0:
+                return batch[start + 1:position]
+    return batch[start + 1:]
+
+
+def _empty_table(name):
+    return {'name': name, 'columns': [], 'primary_key': [], 'unique': [], 'foreign_keys': [], 'indexes': []}
+
+
+def parse_script(text, catalog):
+    """
+    Add the objects defined by one SSMS script to a catalog dict.
+
+    Args:
+        text (str): Decoded script
+        catalog (dict): {'tables': {}, 'views': {}, 'procedures': {}} being built
+    """
+    for batch in _GO.split(text):
+        table_match = _CREATE_TABLE.search(batch)
+        if table_match:
+            name = table_match.group(2)
+            table = catalog['tables'].setdefault(name, _empty_table(name))
+            body = _table_body(batch, table_match.end() - 1)
+            for line in body.splitlines():
+                column = _COLUMN.match(line)
+                if column:
+                    column_name, sql_type, length, scale, identity, nullability = column.groups()
+                    table['columns'].append(Column(
+                        column_name, sql_type.lower(),
+                        None if length is None or length.lower() == 'max' else int(length),
+                        int(scale or 0), nullability.upper() == 'NULL', bool(identity), None)._asdict())
+            for kind, columns in _KEY.findall(body):
+                if kind.upper().startswith('PRIMARY'):
+                    table['primary_key'] = _names(columns)
+                else:
+                    table['unique'].append(_names(columns))
+            continue
+
+        view_match = _CREATE_VIEW.search(batch)
+        if view_match:
+            name = view_match.group(2)
+            definition = batch[view_match.end():].strip()
+            catalog['views'][name] = {
+                'name': name,
+                'columns': _view_columns(definition),
+                'references': sorted(set(_REFERENCE.findall(definition))),
+                'definition': definition,
+            }
+            continue
+
+        procedure_match = _CREATE_PROCEDURE.search(batch)
+        if procedure_match:
+            name = procedure_match.group(2)
+            catalog['procedures'][name] = {'name': name, 'definition': batch[procedure_match.start():].strip()}
+            continue
+
+        default = _DEFAULT.search(batch)
+        if default:
+            table_name, expression, column_name = default.group(2), default.group(4), default.group(5)
+            table = catalog['tables'].setdefault(table_name, _empty_table(table_name))
+            for column in table['columns']:
+                if column['name'] == column_name:
+                    column['default'] = expression.strip()
+            continue
+
+        foreign_key = _FOREIGN_KEY.search(batch)
+        if foreign_key:
+            table_name = foreign_key.group(2)
+            table = catalog['tables'].setdefault(table_name, _empty_table(table_name))
+            table['foreign_keys'].append({
+                'name': foreign_key.group(3),
+                'columns': _names(foreign_key.group(4)),
+                'ref_table': foreign_key.group(6),
+                'ref_columns': _names(foreign_key.group(7)),
+            })
+            continue
+
+        for unique, index_name, _, table_name, columns in _CREATE_INDEX.findall(batch):
+            table = catalog['tables'].setdefault(table_name, _empty_table(table_name))
+            table['indexes'].append({'name': index_name, 'columns': _names(columns), 'unique': bool(unique)})
+
+
+def fingerprint(sql_dir):
+    """Hash of the script names, sizes and modification times in sql_dir."""
+    digest = hashlib.sha1(f"{CATALOG_FORMAT}:{os.path.abspath(sql_dir)}".encode())
+    for entry in sorted(os.scandir(sql_dir), key=lambda e: e.name):
+        if entry.name.lower().endswith('.sql'):
+            stat = entry.stat()
+            digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+class SchemaCatalog:
+    """Read-only lookups over the parsed Taxsale schema. Names are case-insensitive."""
+
+    def __init__(self, data):
+        """
+        Initialize the catalog.
+
+        Args:
+            data (dict): Parsed catalog as produced by build_catalog() or loaded from JSON
+        """
+        self.data = data
+        self.fingerprint = data.get('fingerprint')
+        self._tables = {name.lower(): table for name, table in data['tables'].items()}
+        self._views = {name.lower(): view for name, view in data['views'].items()}
+        self._columns = {
+            name: tuple(Column(**column) for column in table['columns'])
+            for name, table in self._tables.items()
+        }
+        self._column_index = {
+            name: {column.name.lower(): column for column in columns}
+            for name, columns in self._columns.items()
+        }
+        self._referenced_by = {}
+        for table in data['tables'].values():
+            for key in table['foreign_keys']:
+                self._referenced_by.setdefault(key['ref_table'].lower(), []).append(
+                    dict(key, table=table['name']))
+
+    @property
+    def table_names(self):
+        return sorted(self.data['tables'])
+
+    @property
+    def view_names(self):
+        return sorted(self.data['views'])
+
+    def has_table(self, name):
+        return name.lower() in self._tables
+
+    def table(self, name):
+        """Full definition of a table."""
+        try:
+            return self._tables[name.lower()]
+        except KeyError:
+            raise KeyError(f"Table {name} is not in the schema catalog")
+
+    def columns(self, table):
+        """Columns of a table, in table order."""
+        self.table(table)
+        return self._columns[table.lower()]
+
+    def column(self, table, column):
+        """One column of a table, or None when the table has no such column."""
+        return self._column_index.get(table.lower(), {}).get(column.lower())
+
+    def primary_key(self, table):
+        return list(self.table(table)['primary_key'])
+
+    def foreign_keys(self, table):
+        return list(self.table(table)['foreign_keys'])
+
+    def referenced_by(self, table):
+        """Foreign keys in other tables pointing at this one."""
+        return list(self._referenced_by.get(table.lower(), []))
+
+    def view(self, name):
+        try:
+            return self._views[name.lower()]
+        except KeyError:
+            raise KeyError(f"View {name} is not in the schema catalog")
+
+    def tables_matching(self, pattern):
+        """Tables whose name fully matches a regular expression, e.g. vg_TaxCertificateFile\\d+."""
+        regex = re.compile(pattern, re.IGNORECASE)
+        return [name for name in self.table_names if regex.fullmatch(name)]
+
+
+def build_catalog(sql_dir=SQL_DIR):
+    """
+    Parse every script in sql_dir.
+
+    Returns:
+        dict: Serializable catalog data
+    """
+    data = {'format': CATALOG_FORMAT, 'fingerprint': fingerprint(sql_dir), 'tables': {}, 'views': {},
+            'procedures': {}}
+    for name in sorted(os.listdir(sql_dir)):
+        if not name.lower().endswith('.sql'):
+            continue
+        with open(os.path.join(sql_dir, name), 'rb') as f:
+            raw = f.read()
+        # SSMS exports UTF-16 with a BOM; anything else is read as UTF-8
+        text = raw.decode('utf-16') if raw[:2] in (b'\xff\xfe', b'\xfe\xff') else raw.decode('utf-8-sig')
+        parse_script(text, data)
+    return data
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(sql_dir=SQL_DIR, cache_path=None, rebuild=False):
+    """
+    Return the schema catalog of sql_dir, parsing the scripts at most once per process.
+
+    Args:
+        sql_dir (str, optional): Directory holding the DDL scripts
+        cache_path (str, optional): JSON file the parsed catalog is stored in.
+            It is reused while the scripts' fingerprint matches.
+        rebuild (bool, optional): Ignore both caches and re-parse
+
+    Returns:
+        SchemaCatalog
+    """
+    key = os.path.abspath(sql_dir)
+    with _catalogs_lock:
+        if not rebuild and key in _catalogs:
+            return _catalogs[key]
+
+        current = fingerprint(sql_dir)
+        data = None
+        if cache_path and not rebuild and os.path.exists(cache_path):
+            try:
+                with open(cache_path) as f:
+                    cached = json.load(f)
+                if cached.get('fingerprint') == current:
+                    data = cached
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable schema catalog cache {cache_path}: {str(e)}")
+
+        if data is None:
+            data = build_catalog(sql_dir)
+            logger.info(f"Parsed schema catalog: {len(data['tables'])} tables, {len(data['views'])} views")
+            if cache_path:
+                os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+                temp_path = f"{cache_path}.tmp"
+                with open(temp_path, 'w') as f:
+                    json.dump(data, f)
+                os.replace(temp_path, cache_path)
+
+        catalog = _catalogs[key] = SchemaCatalog(data)
+        return catalog
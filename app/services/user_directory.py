@@ -0,0 +1,248 @@
+"""
+Authenticated user directory.
+Resolves a UserId to its ASP.NET membership record, vg_UserDetails name and
+role names in one query, and keeps the result in a short-TTL cache shared
+by every thread of the process; other worker processes see a change once
+their entry expires. Each request resolves its user at most once
+(app.routes.auth.current_user), so login_required and the handler behind it
+cost no database round trip while the entry is fresh.
+
+Role changes invalidate in bulk: every cached member of a role, a list of
+users, or the whole cache (a generation bump) in one call. A lookup that was
+reading while an invalidation ran is not cached, so it cannot write back the
+roles the invalidation revoked. Role edits made outside this app reach it
+when the entry expires; signing out drops the user's own entry, so the next
+sign-in reads their current roles.
+
+Ids that are not uniqueidentifiers resolve to None without a query.
+"""
+import re
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from app.services.db import TaxsaleSource, SCHEMA
+from app.utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Seconds a resolved user is served before it is read again
+DEFAULT_TTL = 60
+
+# UserIds per lookup query
+LOOKUP_BATCH_SIZE = 500
+
+_USER_ID_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+class AuthenticatedUser(namedtuple('AuthenticatedUser', (
+        'UserId', 'UserName', 'Email', 'IsApproved', 'IsLockedOut', 'FirstName', 'LastName', 'Company',
+        'roles'))):
+    """A resolved user; roles is a frozenset of lowered role names."""
+
+    __slots__ = ()
+
+    @property
+    def active(self):
+        """Whether the user may sign in: approved and not locked out."""
+        return bool(self.IsApproved) and not self.IsLockedOut
+
+    def has_role(self, *role_names):
+        """Whether the user is in any of role_names (case-insensitive)."""
+        return any(name.lower() in self.roles for name in role_names)
+
+
+def _user_key(user_id):
+    """UserId is a uniqueidentifier: compare it case-insensitively."""
+    return str(user_id).strip().lower()
+
+
+def is_user_id(user_id):
+    """Whether user_id is a uniqueidentifier, the only kind of id vw_aspnet_MembershipUsers can hold."""
+    return bool(_USER_ID_PATTERN.match(_user_key(user_id)))
+
+
+def _lookup_sql(count):
+    return (f"SELECT m.UserId, m.UserName, m.Email, m.IsApproved, m.IsLockedOut, "
+            f"d.FirstName, d.LastName, d.Company, r.LoweredRoleName "
+            f"FROM {SCHEMA}.vw_aspnet_MembershipUsers m "
+            f"LEFT JOIN {SCHEMA}.vg_UserDetails d ON d.UserId = m.UserId "
+            f"LEFT JOIN {SCHEMA}.vw_aspnet_UsersInRoles ur ON ur.UserId = m.UserId "
+            f"LEFT JOIN {SCHEMA}.vw_aspnet_Roles r ON r.RoleId = ur.RoleId "
+            f"WHERE m.UserId IN ({', '.join('?' for _ in range(count))})")
+
+
+class UserDirectory:
+    """Process-wide cache of resolved users."""
+
+    def __init__(self, source=None, ttl=DEFAULT_TTL, clock=time.monotonic):
+        """
+        Initialize the directory.
+
+        Args:
+            source (optional): TaxsaleSource holding the membership views
+            ttl (int, optional): Seconds a resolved user is served
+            clock (callable, optional): Monotonic time source
+        """
+        self.source = source or TaxsaleSource()
+        self.ttl = ttl
+        self.clock = clock
+        self.generation = 0
+        # Bumped by every invalidation; lookups that overlap one are not cached
+        self._invalidations = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _load(self, user_ids):
+        users = {}
+        for start in range(0, len(user_ids), LOOKUP_BATCH_SIZE):
+            batch = user_ids[start:start + LOOKUP_BATCH_SIZE]
+            rows = self.source.query(_lookup_sql(len(batch)), batch)
+            roles = {}
+            for row in rows:
+                key = _user_key(row[0])
+                roles.setdefault(key, set())
+                if row[-1] is not None:
+                    roles[key].add(row[-1].lower())
+                users[key] = row[:-1]
+            for key, role_names in roles.items():
+                users[key] = AuthenticatedUser(*users[key], roles=frozenset(role_names))
+        return users
+
+    def get_many(self, user_ids):
+        """
+        Resolve users, reading the ones not cached in one query.
+
+        Args:
+            user_ids (iterable): UserIds
+
+        Returns:
+            dict: Lowered UserId -> AuthenticatedUser, or None for unknown users
+        """
+        keys, found, missing = {}, {}, []
+        for user_id in user_ids:
+            # Binding anything else to the uniqueidentifier column fails the whole query
+            if is_user_id(user_id):
+                keys[_user_key(user_id)] = user_id
+            else:
+                found[_user_key(user_id)] = None
+        now = self.clock()
+        with self._lock:
+            generation = self.generation
+            invalidations = self._invalidations
+            for key, user_id in keys.items():
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] == generation and now - entry[2] < self.ttl:
+                    found[key] = entry[0]
+                else:
+                    missing.append(user_id)
+        for _ in range(len(keys) - len(missing)):
+            record_cache('user_directory', True)
+
+        if missing:
+            for _ in missing:
+                record_cache('user_directory', False)
+            loaded = self._load(missing)
+            with self._lock:
+                for user_id in missing:
+                    key = _user_key(user_id)
+                    # Unknown users are cached too, so a stale session cannot hit the database every request
+                    found[key] = loaded.get(key)
+                    # Rows read before an invalidation may hold the roles it revoked
+                    if self._invalidations == invalidations:
+                        self._entries[key] = (found[key], generation, now)
+        return found
+
+    def get(self, user_id):
+        """
+        Resolve one user.
+
+        Args:
+            user_id: UserId
+
+        Returns:
+            AuthenticatedUser: The user, or None when unknown
+        """
+        return self.get_many([user_id])[_user_key(user_id)]
+
+    def invalidate_users(self, user_ids):
+        """
+        Drop cached users, e.g. after they were added to a role or locked out.
+
+        Args:
+            user_ids (iterable): UserIds
+
+        Returns:
+            int: Number of entries dropped
+        """
+        with self._lock:
+            self._invalidations += 1
+            dropped = [self._entries.pop(_user_key(user_id), None) for user_id in user_ids]
+        return sum(1 for entry in dropped if entry is not None)
+
+    def invalidate_role(self, role_name):
+        """
+        Drop every cached member of a role, e.g. after the role was edited or removed.
+
+        Args:
+            role_name (str): RoleName
+
+        Returns:
+            int: Number of entries dropped
+        """
+        role = role_name.lower()
+        with self._lock:
+            self._invalidations += 1
+            members = [key for key, (user, _, _) in self._entries.items() if user is not None and role in user.roles]
+            for key in members:
+                del self._entries[key]
+        return len(members)
+
+    def invalidate_all(self):
+        """
+        Mark every cached user stale.
+
+        Returns:
+            int: The new generation
+        """
+        with self._lock:
+            self.generation += 1
+            self._invalidations += 1
+            self._entries.clear()
+        return self.generation
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def get_user_directory(ttl=DEFAULT_TTL, source=None):
+    """
+    Return the process-wide user directory.
+
+    Args:
+        ttl (int, optional): Seconds a resolved user is served, used when the directory is created
+        source (optional): TaxsaleSource, used when the directory is created
+
+    Returns:
+        UserDirectory: The shared directory
+    """
+    global _directory
+    with _directory_lock:
+        if _directory is None:
+            _directory = UserDirectory(source=source, ttl=ttl)
+    return _directory
+
+
+def invalidate_role(role_name):
+    """
+    Drop every cached member of a role from the process-wide directory.
+
+    Args:
+        role_name (str): RoleName
+
+    Returns:
+        int: Number of entries dropped
+    """
+    return _directory.invalidate_role(role_name) if _directory is not None else 0
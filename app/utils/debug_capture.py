@@ -0,0 +1,122 @@
+"""
+Sampled debug capture for upstream payloads.
+The settings handlers used to log request headers, payloads and response
+bodies on every call. capture() takes a function that builds the dump and
+only calls it for requests chosen for capture: one in every
+DEBUG_CAPTURE_SAMPLE_RATE requests, or every request of a session that opted
+in. Requests that are not captured pay for one flag lookup, with no string
+formatting or serialization.
+
+Environment introspection (which OPENAI_* variables and .env files exist)
+is done once at startup and served from environment_summary().
+"""
+import os
+import json
+import logging
+import itertools
+from functools import lru_cache
+
+from flask import current_app, has_request_context, request, session
+
+# Logger captures are written to; it keeps INFO even where the app logs only errors
+logger = logging.getLogger('app.debug_capture')
+
+# Session key of the per-session opt-in
+SESSION_KEY = 'debug_capture'
+
+# environ key holding the current request's decision
+ENVIRON_KEY = 'performance_reporting.debug_capture'
+
+# .env files reported by environment_summary()
+ENV_FILES = ('.env', '.env.development', '.env.dev', '.env.local')
+
+# Longest dump written
+MAX_CAPTURE_CHARS = 2000
+
+_request_counter = itertools.count(1)
+
+
+def mask_secret(value):
+    """Keep the first and last few characters of a secret."""
+    if not value:
+        return '(empty)'
+    if len(value) <= 10:
+        return '***'
+    return f"{value[:4]}...{value[-4:]}"
+
+
+def capture_enabled():
+    """
+    Whether the current request is being captured.
+
+    Decided once per request and remembered in the WSGI environ.
+
+    Returns:
+        bool: True for sampled requests and opted-in sessions
+    """
+    if not has_request_context():
+        return False
+    enabled = request.environ.get(ENVIRON_KEY)
+    if enabled is None:
+        enabled = bool(current_app.config.get('DEBUG_CAPTURE_OPT_IN') and session.get(SESSION_KEY))
+        if not enabled:
+            sample_rate = current_app.config.get('DEBUG_CAPTURE_SAMPLE_RATE', 0)
+            enabled = bool(sample_rate) and next(_request_counter) % sample_rate == 0
+        request.environ[ENVIRON_KEY] = enabled
+    return enabled
+
+
+def capture(label, build):
+    """
+    Log a debug dump if the current request is captured.
+
+    Args:
+        label (str): What is being dumped, e.g. 'grafana.request'
+        build (callable): Returns the dump (str, or anything JSON serializable); only called when captured
+
+    Returns:
+        bool: Whether the dump was written
+    """
+    if not capture_enabled():
+        return False
+    try:
+        dump = build()
+        if not isinstance(dump, str):
+            dump = json.dumps(dump, default=str)
+    except Exception as e:
+        dump = f"<capture failed: {e}>"
+    if len(dump) > MAX_CAPTURE_CHARS:
+        dump = f"{dump[:MAX_CAPTURE_CHARS]}... [{len(dump) - MAX_CAPTURE_CHARS} chars truncated]"
+    logger.info(f"{label}: {dump}")
+    return True
+
+
+@lru_cache(maxsize=1)
+def environment_summary():
+    """
+    OPENAI_* variables (secrets masked) and which .env files exist, read once.
+
+    Returns:
+        dict: {'openai_env': {...}, 'env_files': {name: exists}}
+    """
+    openai_env = {}
+    for key, value in os.environ.items():
+        if 'OPENAI' in key:
+            openai_env[key] = mask_secret(value) if ('KEY' in key or 'TOKEN' in key) else value
+    return {
+        'openai_env': openai_env,
+        'env_files': {name: os.path.exists(name) for name in ENV_FILES},
+    }
+
+
+def init_debug_capture(app):
+    """
+    Prepare debug capture for an app: cache the environment summary and,
+    when anything can be captured, let captures through at INFO.
+
+    Args:
+        app: Flask application
+    """
+    environment_summary()
+    if app.config.get('DEBUG_CAPTURE_SAMPLE_RATE') or app.config.get('DEBUG_CAPTURE_OPT_IN'):
+        logger.setLevel(logging.INFO)
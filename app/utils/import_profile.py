@@ -0,0 +1,142 @@
+"""
+Import-time profiler.
+Runs a fresh interpreter with ``-X importtime`` that imports the app package
+and then each blueprint module in turn, and attributes every newly imported
+module to the blueprint that pulled it in. The result shows which blueprint,
+and which dependency under it, a cold start is paying for.
+"""
+import os
+import re
+import sys
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Heaviest dependencies listed per module in the report
+DEFAULT_TOP = 8
+
+_LINE = re.compile(r'^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)\s*$')
+
+
+def parse_importtime(output):
+    """
+    Parse ``-X importtime`` stderr.
+
+    Args:
+        output (str): stderr of the profiled interpreter
+
+    Returns:
+        list: (depth, module, self_us, cumulative_us) in the order reported
+    """
+    entries = []
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            # One leading space, then two more per nesting level
+            entries.append(((len(indent) - 1) // 2, name, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def attribute_imports(entries, targets, baseline=()):
+    """
+    Group imports under the target module that triggered them.
+
+    A target's parents and dependencies finish importing before the target
+    itself, so every import is charged to the next target reported after
+    it. A target already pulled in by an earlier one is reported with no
+    time of its own.
+
+    Args:
+        entries (list): Output of parse_importtime()
+        targets (list): Module names imported, in order
+        baseline (iterable, optional): Modules imported by interpreter startup, left out
+
+    Returns:
+        list: One dict per target with its total time and heaviest imports
+    """
+    baseline = set(baseline)
+    results = []
+    block = []
+    imported = 0
+    seen = set()
+    remaining = list(targets)
+    for depth, name, self_us, cumulative_us in entries:
+        seen.add(name)
+        if name in baseline:
+            continue
+        imported += 1
+        if depth > 1:
+            continue
+        block.append((depth, name, cumulative_us))
+        if depth != 0:
+            continue
+        while remaining and remaining[0] in seen:
+            target = remaining.pop(0)
+            if target != name:
+                results.append({'module': target, 'total_ms': 0.0, 'modules_imported': 0, 'heaviest': [],
+                                'imported_by': results[-1]['module'] if results else None})
+                continue
+            top_level = [(n, c) for d, n, c in block if d == 0]
+            dependencies = [(n, c) for d, n, c in block if n != target]
+            results.append({
+                'module': target,
+                'total_ms': round(sum(c for _, c in top_level) / 1000, 2),
+                'modules_imported': imported,
+                'heaviest': [{'module': n, 'ms': round(c / 1000, 2)}
+                             for n, c in sorted(dependencies, key=lambda d: d[1], reverse=True)],
+                'imported_by': None,
+            })
+            block = []
+            imported = 0
+    return results
+
+
+def _importtime(python, code, env):
+    result = subprocess.run([python, '-X', 'importtime', '-c', code], cwd=PROJECT_ROOT, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Profiled import failed: {result.stderr.strip().splitlines()[-1]}")
+    return parse_importtime(result.stderr)
+
+
+def profile_imports(modules, python=None, env=None):
+    """
+    Import modules in a fresh interpreter and time them.
+
+    Args:
+        modules (list): Module names, imported in this order
+        python (str, optional): Interpreter to run. Defaults to the current one.
+        env (dict, optional): Environment of the child. Defaults to the current one.
+
+    Returns:
+        list: attribute_imports() result, one entry per module
+    """
+    python = python or sys.executable
+    baseline = [name for _, name, _, _ in _importtime(python, 'pass', env)]
+    entries = _importtime(python, '; '.join(f"import {module}" for module in modules), env)
+    return attribute_imports(entries, modules, baseline)
+
+
+def format_report(results, top=DEFAULT_TOP):
+    """
+    Text report of profile_imports(), one block per module.
+
+    Args:
+        results (list): profile_imports() result
+        top (int, optional): Dependencies listed per module
+
+    Returns:
+        str: Report text
+    """
+    lines = []
+    for result in results:
+        if result['imported_by']:
+            lines.append(f"{result['module']:<48}{'-':>10}     (imported by {result['imported_by']})")
+            continue
+        lines.append(f"{result['module']:<48}{result['total_ms']:>10.1f} ms  "
+                     f"({result['modules_imported']} modules)")
+        for dependency in result['heaviest'][:top]:
+            lines.append(f"    {dependency['module']:<44}{dependency['ms']:>10.1f} ms")
+    lines.append(f"{'total':<48}{sum(r['total_ms'] for r in results):>10.1f} ms")
+    return '\n'.join(lines)
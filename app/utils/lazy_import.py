@@ -0,0 +1,48 @@
+"""
+Lazy imports for optional integrations.
+lazy_import() returns a module whose code only runs on first attribute
+access, so integrations that are configured off (Sentry without a DSN,
+outbound HTTP to Grafana / App Insights) cost nothing at startup.
+"""
+import sys
+import importlib.util
+
+
+def lazy_import(name):
+    """
+    Import a module lazily.
+
+    The module is registered in sys.modules straight away, so later plain
+    imports share it; its body executes the first time an attribute is read.
+
+    Args:
+        name (str): Absolute module name
+
+    Returns:
+        module: The (possibly not yet executed) module
+
+    Raises:
+        ImportError: If the module cannot be found
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def is_loaded(name):
+    """Whether a module has been imported and its body has actually run."""
+    module = sys.modules.get(name)
+    if module is None:
+        return False
+    # LazyLoader swaps the module's class back to ModuleType once it has loaded
+    return type(module) is not importlib.util._LazyModule
@@ -0,0 +1,332 @@
+"""
+Asynchronous, batched logging.
+Request threads only put records on a bounded queue (RateLimitedQueueHandler);
+a single background thread (LogPipeline) drains the queue in batches and
+writes each batch to the file and console handlers with one write per
+handler. File output is one JSON object per line. Each logger is rate
+limited below ERROR so a chatty handler cannot flood the queue, and if the
+queue is ever full records are dropped and counted instead of blocking the
+request.
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import datetime
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+from app.utils.trace_sampling import TokenBucket
+
+# Longest message written; the rest is replaced by a marker
+MAX_MESSAGE_CHARS = 4000
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, location, message and exception."""
+
+    def format(self, record):
+        message = record.getMessage()
+        if len(message) > MAX_MESSAGE_CHARS:
+            message = f"{message[:MAX_MESSAGE_CHARS]}... [{len(message) - MAX_MESSAGE_CHARS} chars truncated]"
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'message': message,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class BatchWriteMixin:
+    """Adds handle_batch() to StreamHandler subclasses: one write and flush per batch."""
+
+    def handle_batch(self, records):
+        lines = []
+        for record in records:
+            if record.levelno >= self.level and self.filter(record):
+                try:
+                    lines.append(self.format(record))
+                except Exception:
+                    self.handleError(record)
+        if not lines:
+            return
+        text = self.terminator.join(lines) + self.terminator
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            if getattr(self, 'maxBytes', 0) and self.stream.tell() + len(text) >= self.maxBytes:
+                self.doRollover()
+            self.stream.write(text)
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+
+class BatchStreamHandler(BatchWriteMixin, logging.StreamHandler):
+    """
+    Console handler written to in batches.
+
+    Without a stream it writes to whatever sys.stdout is at write time, so
+    a replaced (and closed) stdout, as under pytest, is never written to.
+
+    Args:
+        stream (optional): Stream to write to. Defaults to the current sys.stdout.
+    """
+
+    def __init__(self, stream=None):
+        self._follow_stdout = stream is None
+        super().__init__(stream)
+
+    @property
+    def stream(self):
+        return sys.stdout if self._follow_stdout else self._stream
+
+    @stream.setter
+    def stream(self, value):
+        self._stream = value
+
+
+class BatchRotatingFileHandler(BatchWriteMixin, RotatingFileHandler):
+    """Rotating file handler written to in batches."""
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Per-logger token bucket for records below ``exempt_level``.
+
+    The number of records dropped is attached, as ``suppressed``, to the
+    next record the logger is allowed to emit.
+
+    Args:
+        rate (float): Records per second per logger
+        burst (int, optional): Records a logger may emit at once
+        exempt_level (int, optional): Records at or above this level always pass
+    """
+
+    def __init__(self, rate, burst=None, exempt_level=logging.ERROR):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.exempt_level = exempt_level
+        self._buckets = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= self.exempt_level:
+            return True
+        bucket = self._buckets.get(record.name)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(record.name, TokenBucket(self.rate, self.burst))
+        if not bucket.take():
+            with self._lock:
+                self._suppressed[record.name] = self._suppressed.get(record.name, 0) + 1
+            return False
+        if self._suppressed.get(record.name):
+            with self._lock:
+                record.suppressed = self._suppressed.pop(record.name, 0)
+        return True
+
+
+class RateLimitedQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks: records that do not fit are counted as dropped.
+
+    Only the message is rendered on the calling thread; formatting and I/O
+    happen on the pipeline thread.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render what may change after the call returns (args, the live exception)
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    Background thread writing queued records to handlers in batches.
+
+    Args:
+        handlers (list): Handlers to write to; BatchWriteMixin handlers get whole batches
+        batch_size (int, optional): Most records written per batch
+        flush_interval (float, optional): Seconds between checks for dropped records while idle
+        queue_size (int, optional): Records buffered before new ones are dropped
+        rate (float, optional): Records per second per logger below ERROR; 0 disables the limit
+        burst (int, optional): Records a logger may emit at once
+    """
+
+    def __init__(self, handlers, batch_size=200, flush_interval=1.0, queue_size=10000, rate=50, burst=200):
+        self.handlers = list(handlers)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(queue_size)
+        self.queue_handler = RateLimitedQueueHandler(self.queue)
+        if rate:
+            self.queue_handler.addFilter(RateLimitFilter(rate, burst))
+        self._reported_drops = 0
+        self._thread = None
+
+    def start(self):
+        """Start the writer thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='log-pipeline', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Write everything queued so far and stop the writer thread."""
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except (ValueError, OSError):
+                # The stream was closed before the interpreter exit that called stop()
+                pass
+
+    def _run(self):
+        # Whatever has queued up while the last batch was written becomes the next batch
+        while True:
+            batch = []
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._report_drops()
+                continue
+            while record is not None:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write(batch)
+            self._report_drops()
+            if record is None:
+                return
+
+    def _report_drops(self):
+        dropped = self.queue_handler.dropped - self._reported_drops
+        if dropped:
+            self._reported_drops += dropped
+            self._write([logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"Log queue full, dropped {dropped} records"})])
+
+    def _write(self, records):
+        if not records:
+            return
+        for handler in self.handlers:
+            if hasattr(handler, 'handle_batch'):
+                handler.handle_batch(records)
+            else:
+                for record in records:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+
+def init_logging(app):
+    """
+    Route the process's logging through a LogPipeline, once per process.
+
+    The root logger gets the queue handler, so app.logger and every module
+    logger share the pipeline. Disabled with LOG_PIPELINE_ENABLED.
+
+    Args:
+        app: Flask application whose LOG_* settings are used
+
+    Returns:
+        LogPipeline: The process's pipeline, or None when disabled
+    """
+    global _pipeline
+    config = app.config
+    if not config.get('LOG_PIPELINE_ENABLED', True):
+        return None
+
+    with _pipeline_lock:
+        if _pipeline is None:
+            env = os.getenv('FLASK_ENV', 'development')
+            os.makedirs(config['LOG_DIR'], exist_ok=True)
+            file_handler = BatchRotatingFileHandler(
+                os.path.join(config['LOG_DIR'], f"app_{env}{config.get('LOG_FILE_EXTENSION', '.log.txt')}"),
+                maxBytes=config.get('LOG_MAX_BYTES', 10485760), backupCount=config.get('LOG_BACKUP_COUNT', 10))
+            file_handler.setFormatter(JsonFormatter())
+            handlers = [file_handler]
+            if config.get('LOG_CONSOLE', True):
+                console_handler = BatchStreamHandler()
+                console_handler.setFormatter(logging.Formatter(config.get('LOG_FORMAT')))
+                handlers.append(console_handler)
+
+            pipeline = LogPipeline(handlers,
+                                   batch_size=config.get('LOG_BATCH_SIZE', 200),
+                                   flush_interval=config.get('LOG_FLUSH_INTERVAL', 1.0),
+                                   queue_size=config.get('LOG_QUEUE_SIZE', 10000),
+                                   rate=config.get('LOG_RATE_LIMIT', 50),
+                                   burst=config.get('LOG_RATE_BURST', 200))
+            install_pipeline(pipeline, level=config.get('LOG_LEVEL', 'INFO'))
+            _pipeline = pipeline
+
+    # Flask gives app.logger its own stderr handler if it logged before the pipeline existed
+    from flask.logging import default_handler
+    app.logger.removeHandler(default_handler)
+    app.logger.setLevel(config.get('LOG_LEVEL', 'INFO'))
+    return _pipeline
+
+
+def install_pipeline(pipeline, logger=None, level=None):
+    """
+    Start a pipeline and attach it to a logger in place of any pipeline installed before.
+
+    Handlers added by others, such as a test runner's capture handler, are left alone.
+
+    Args:
+        pipeline (LogPipeline): Pipeline to install
+        logger (logging.Logger, optional): Logger to attach to. Defaults to the root logger.
+        level (optional): Level to set on the logger
+    """
+    logger = logger or logging.getLogger()
+    for handler in list(logger.handlers):
+        if isinstance(handler, RateLimitedQueueHandler):
+            logger.removeHandler(handler)
+    logger.addHandler(pipeline.queue_handler)
+    if level is not None:
+        logger.setLevel(level)
+    pipeline.start()
+    atexit.register(pipeline.stop)
@@ -0,0 +1,207 @@
+"""
+Prometheus metrics for the portal itself.
+MetricsMiddleware wraps the WSGI app and records per-endpoint latency and
+in-flight requests; track_upstream() times calls to App Insights, Grafana and
+the Taxsale database, and record_cache() counts cache hits and misses.
+Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+(see gunicorn.conf.py) and render_metrics() aggregates them, so a scrape of
+/metrics sees the whole server rather than whichever worker answered.
+
+prometheus_client is optional: without it every helper is a no-op and
+/metrics reports that metrics are unavailable.
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from app.utils.server_timing import timing
+
+# Latency buckets in seconds, from cache hits to slow report queries
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# environ key the request hook stores the matched endpoint under
+ENDPOINT_ENVIRON_KEY = 'performance_reporting.endpoint'
+
+# Endpoint label for requests that matched no route, keeping label cardinality bounded
+UNMATCHED_ENDPOINT = 'unmatched'
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+class _Metrics:
+    """The process's metric objects, created once the multiprocess directory is known."""
+
+    def __init__(self):
+        from prometheus_client import Counter, Gauge, Histogram
+
+        self.request_latency = Histogram(
+            'portal_request_duration_seconds', 'Time spent handling a request',
+            ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS)
+        self.in_flight = Gauge(
+            'portal_requests_in_flight', 'Requests currently being handled',
+            multiprocess_mode='livesum')
+        self.upstream_latency = Histogram(
+            'portal_upstream_duration_seconds', 'Time spent waiting on an upstream system',
+            ['service', 'operation', 'outcome'], buckets=LATENCY_BUCKETS)
+        self.cache_requests = Counter(
+            'portal_cache_requests_total', 'Cache lookups by result',
+            ['cache', 'result'])
+
+
+def metrics_enabled():
+    """Whether metrics are being recorded in this process."""
+    return _metrics is not None
+
+
+def init_metrics(app):
+    """
+    Start recording metrics for an app.
+
+    Args:
+        app: Flask application. Its wsgi_app is wrapped in MetricsMiddleware.
+
+    Returns:
+        bool: False if metrics are disabled or prometheus_client is not installed
+    """
+    global _metrics
+    if not app.config.get('METRICS_ENABLED', True):
+        return False
+
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                multiproc_dir = app.config.get('PROMETHEUS_MULTIPROC_DIR')
+                if multiproc_dir and 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+                    # prometheus_client picks its storage when first imported
+                    os.makedirs(multiproc_dir, exist_ok=True)
+                    os.environ['PROMETHEUS_MULTIPROC_DIR'] = multiproc_dir
+                try:
+                    _metrics = _Metrics()
+                except ImportError:
+                    app.logger.warning('prometheus_client not installed, /metrics is disabled')
+                    return False
+
+    @app.before_request
+    def _remember_endpoint():
+        from flask import request
+        request.environ[ENDPOINT_ENVIRON_KEY] = request.endpoint or UNMATCHED_ENDPOINT
+
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app)
+    return True
+
+
+class MetricsMiddleware:
+    """
+    WSGI middleware recording request latency and in-flight requests.
+
+    The endpoint label comes from the Flask request hook; the time includes
+    streaming the response body.
+
+    Args:
+        wsgi_app: Application to wrap
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        metrics = _metrics
+        started = time.perf_counter()
+        status = []
+
+        def _start_response(status_line, headers, exc_info=None):
+            status[:] = [status_line.split(' ', 1)[0]]
+            return start_response(status_line, headers, exc_info)
+
+        def _finish():
+            metrics.in_flight.dec()
+            metrics.request_latency.labels(
+                environ.get(ENDPOINT_ENVIRON_KEY, UNMATCHED_ENDPOINT),
+                environ.get('REQUEST_METHOD', ''),
+                status[0] if status else '500',
+            ).observe(time.perf_counter() - started)
+
+        metrics.in_flight.inc()
+        try:
+            body = self.wsgi_app(environ, _start_response)
+        except Exception:
+            _finish()
+            raise
+        return _ClosingBody(body, _finish)
+
+
+class _ClosingBody:
+    """Response iterable that calls a callback once, when the server closes it."""
+
+    def __init__(self, body, callback):
+        self._body = body
+        self._callback = callback
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            callback, self._callback = self._callback, None
+            if callback is not None:
+                callback()
+
+
+@contextmanager
+def track_upstream(service, operation):
+    """
+    Time a call to an upstream system.
+
+    The call is also reported as a Server-Timing step named after the service.
+
+    Args:
+        service (str): System called, e.g. 'appinsights', 'grafana', 'db'
+        operation (str): What was asked of it
+    """
+    metrics = _metrics
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        with timing(service, operation):
+            yield
+        outcome = 'ok'
+    finally:
+        if metrics is not None:
+            metrics.upstream_latency.labels(service, operation, outcome).observe(time.perf_counter() - started)
+
+
+def record_cache(cache, hit):
+    """
+    Count a cache lookup.
+
+    Args:
+        cache (str): Cache name
+        hit (bool): Whether the lookup was served from the cache
+    """
+    metrics = _metrics
+    if metrics is not None:
+        metrics.cache_requests.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def render_metrics():
+    """
+    Current metrics in the Prometheus text format.
+
+    Returns:
+        tuple: (body bytes, content type), aggregated across workers when
+        PROMETHEUS_MULTIPROC_DIR is set
+    """
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
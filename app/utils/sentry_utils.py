@@ -3,30 +3,85 @@ Utility functions for Sentry integration
 """
 import os
 import sys
-import sentry_sdk
+import logging
 from flask import current_app, request, session
 import traceback
-from sentry_sdk.integrations.flask import FlaskIntegration
+from app.utils.lazy_import import lazy_import
 
-def init_sentry(app):
+# Every helper returns early until init_sentry() has run, so the SDK is only loaded when enabled
+sentry_sdk = lazy_import('sentry_sdk')
+
+logger = logging.getLogger(__name__)
+
+_sampler = None
+_client_options = {}
+
+def _sentry_settings(app):
+    """SENTRY_* settings from the app, or from the environment's config class before an app exists."""
+    if app is not None:
+        return app.config
+    from config import get_config
+    config_class = get_config()
+    return {name: getattr(config_class, name) for name in dir(config_class) if name.startswith('SENTRY_')}
+
+def _sentry_integration(app, config):
+    """Sentry DSN, environment and release from the app's settings snapshot, or the environment."""
+    from config.integrations import EXTENSION_KEY, build_settings
+    if app is not None and EXTENSION_KEY in app.extensions:
+        return app.extensions[EXTENSION_KEY].current.sentry
+    return build_settings(config, dict(os.environ)).sentry
+
+def init_sentry(app=None):
     """
-    Initialize Sentry for the Flask application.
+    Initialize Sentry once per process.
+    
+    The first call initializes the SDK; calling it again with an app (e.g.
+    after start_with_logging.py initialized Sentry before importing the app)
+    only lets the trace sampler learn the app's routes and request timings.
     
     Args:
-        app: Flask application instance
+        app (optional): Flask application instance
     """
-    if not os.getenv('SENTRY_DSN'):
-        app.logger.warning('SENTRY_DSN not set, skipping Sentry initialization')
+    global _sampler
+    config = _sentry_settings(app)
+    sentry = _sentry_integration(app, config)
+    if not sentry.dsn:
+        if app is not None:
+            app.logger.warning('SENTRY_DSN not set, skipping Sentry initialization')
         return
-        
-    sentry_sdk.init(
-        dsn=os.getenv('SENTRY_DSN'),
-        integrations=[FlaskIntegration()],
-        environment=os.getenv('FLASK_ENV', 'development'),
-        traces_sample_rate=1.0,
-        send_default_pii=True
-    )
-    app.logger.info('Sentry initialized in %s environment', os.getenv('FLASK_ENV', 'development'))
+    
+    if _sampler is None:
+        from sentry_sdk.integrations.flask import FlaskIntegration
+        from app.utils.trace_sampling import TraceSampler
+        env = sentry.environment
+        _client_options.update(environment=env, release=sentry.release)
+        _sampler = TraceSampler.from_config(config)
+        sentry_sdk.init(
+            dsn=sentry.dsn,
+            integrations=[FlaskIntegration()],
+            environment=env,
+            
+            # Every error event is sent; only performance traces are sampled
+            sample_rate=1.0,
+            traces_sampler=_sampler,
+            
+            # Fraction of sampled transactions that are also profiled
+            profiles_sample_rate=config.get('SENTRY_PROFILES_SAMPLE_RATE', 0.0),
+            
+            # Enable release tracking for better versioning
+            release=sentry.release,
+            
+            # Record user information on errors
+            send_default_pii=True,
+            
+            # Configure before_send to filter sensitive information
+            before_send=lambda event, hint: event
+        )
+        logger.info(f"Sentry initialized in {env} environment")
+    
+    if app is not None and 'sentry_sampler' not in app.extensions:
+        _sampler.init_app(app)
+        app.extensions['sentry_sampler'] = _sampler
 
 def set_user_context(user_id=None, username=None, email=None):
     """
@@ -37,7 +92,7 @@ def set_user_context(user_id=None, username=None, email=None):
         username (str, optional): Username
         email (str, optional): User email
     """
-    if not os.getenv('SENTRY_DSN'):
+    if _sampler is None:
         return
         
     user_data = {}
@@ -62,7 +117,7 @@ def set_tag(key, value):
         key (str): Tag key
         value (str): Tag value
     """
-    if not os.getenv('SENTRY_DSN'):
+    if _sampler is None:
         return
         
     sentry_sdk.set_tag(key, value)
@@ -75,7 +130,7 @@ def capture_message(message, level="info"):
         message (str): Message to capture
         level (str, optional): Message level (debug, info, warning, error)
     """
-    if not os.getenv('SENTRY_DSN'):
+    if _sampler is None:
         return
         
     sentry_sdk.capture_message(message, level=level)
@@ -87,7 +142,7 @@ def capture_exception(exc_info=None):
     Args:
         exc_info (tuple, optional): Exception info as returned by sys.exc_info()
     """
-    if not os.getenv('SENTRY_DSN'):
+    if _sampler is None:
         print("Sentry not configured, exception not captured:", file=sys.stderr)
         traceback.print_exc()
         return
@@ -102,15 +157,15 @@ def configure_scope(with_request=True, with_session=True):
         with_request (bool, optional): Include request data
         with_session (bool, optional): Include session data
     """
-    if not os.getenv('SENTRY_DSN'):
+    if _sampler is None:
         return
         
     with sentry_sdk.configure_scope() as scope:
         # Add environment info
-        scope.set_tag("environment", os.getenv('FLASK_ENV', 'development'))
+        scope.set_tag("environment", _client_options['environment'])
         
         # Add application version
-        scope.set_tag("version", os.getenv('APP_VERSION', '0.1.0'))
+        scope.set_tag("version", _client_options['release'])
         
         # Add request data if available
         if with_request and request:
@@ -0,0 +1,182 @@
+"""
+Server-Timing instrumentation.
+timing() / timed() measure a named step of the current request (upstream
+fetch, JSON parse, serialize, render, auth). Every step is reported in the
+response's ``Server-Timing`` header, so browser devtools and load tests can
+see where a request spent its time, and becomes a child span of the Sentry
+transaction when the request is being traced.
+
+Enabled with SERVER_TIMING_ENABLED. When it is off, timing() does a single
+flag check and yields.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context
+from flask import before_render_template, template_rendered
+from flask.json.provider import DefaultJSONProvider
+
+from app.utils.lazy_import import is_loaded
+
+_enabled = False
+
+
+def server_timing_enabled():
+    """Whether any app in this process reports Server-Timing."""
+    return _enabled
+
+
+def record(name, duration_ms, description=None):
+    """
+    Add an already measured step to the current request's timings.
+
+    Args:
+        name (str): Metric name, a header token such as 'db' or 'render'
+        duration_ms (float): Time taken
+        description (str, optional): Human readable detail
+    """
+    if not _enabled or not has_request_context():
+        return
+    timings = g.get('_server_timings')
+    if timings is not None:
+        timings.append((name, duration_ms, description))
+
+
+@contextmanager
+def timing(name, description=None):
+    """
+    Time a step of the current request.
+
+    Args:
+        name (str): Metric name, a header token such as 'upstream' or 'parse'
+        description (str, optional): Human readable detail
+    """
+    if not _enabled or not has_request_context() or g.get('_server_timings') is None:
+        yield
+        return
+
+    span = _start_span(name, description)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        if span is not None:
+            span.finish()
+        g._server_timings.append((name, duration_ms, description))
+
+
+def timed(name, description=None):
+    """Decorator form of timing()."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            with timing(name, description):
+                return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def _start_span(name, description):
+    # Only when the SDK is already in use; timing never loads it
+    if not is_loaded('sentry_sdk'):
+        return None
+    import sentry_sdk
+    parent = sentry_sdk.Hub.current.scope.span
+    if parent is None:
+        return None
+    return parent.start_child(op=name, description=description)
+
+
+def format_header(timings, total_ms=None):
+    """
+    Build a Server-Timing header value.
+
+    Repeated steps are summed into one entry so the header stays short.
+
+    Args:
+        timings (list): (name, duration_ms, description) tuples in the order recorded
+        total_ms (float, optional): Whole request, reported as ``total``
+
+    Returns:
+        str: Header value
+    """
+    merged = {}
+    for name, duration_ms, description in timings:
+        entry = merged.get(name)
+        if entry is None:
+            merged[name] = [duration_ms, description, 1]
+        else:
+            entry[0] += duration_ms
+            entry[2] += 1
+
+    parts = []
+    for name, (duration_ms, description, count) in merged.items():
+        if count > 1:
+            description = f"{count} calls"
+        part = f"{name};dur={duration_ms:.1f}"
+        if description:
+            part += ';desc="' + description.replace('\\', '').replace('"', "'") + '"'
+        parts.append(part)
+    if total_ms is not None:
+        parts.append(f"total;dur={total_ms:.1f}")
+    return ', '.join(parts)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider whose jsonify() and request-body parsing are reported as serialize / parse."""
+
+    def response(self, *args, **kwargs):
+        with timing('serialize'):
+            return super().response(*args, **kwargs)
+
+    def loads(self, s, **kwargs):
+        with timing('parse'):
+            return super().loads(s, **kwargs)
+
+
+def _render_started(sender, template, context, **extra):
+    if has_request_context() and g.get('_server_timings') is not None:
+        g.setdefault('_render_started', []).append(time.perf_counter())
+
+
+def _render_finished(sender, template, context, **extra):
+    stack = g.get('_render_started') if has_request_context() else None
+    if stack:
+        record('render', (time.perf_counter() - stack.pop()) * 1000, template.name)
+
+
+def init_server_timing(app):
+    """
+    Add Server-Timing headers to an app's responses.
+
+    Args:
+        app: Flask application
+
+    Returns:
+        bool: Whether SERVER_TIMING_ENABLED is set for the app
+    """
+    global _enabled
+    if not app.config.get('SERVER_TIMING_ENABLED', False):
+        return False
+    _enabled = True
+
+    app.json = TimedJSONProvider(app)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+
+    @app.before_request
+    def _start_server_timing():
+        g._server_timings = []
+        g._server_timing_started = time.perf_counter()
+
+    @app.after_request
+    def _add_server_timing_header(response):
+        timings = g.pop('_server_timings', None)
+        if timings is not None:
+            total_ms = (time.perf_counter() - g.pop('_server_timing_started')) * 1000
+            response.headers['Server-Timing'] = format_header(timings, total_ms)
+        return response
+
+    return True
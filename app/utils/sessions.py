@@ -0,0 +1,330 @@
+"""
+Server-side sessions.
+The session cookie only carries a (signed) session id; the data lives in
+Redis, reached through one connection pool per process, or in an in-process
+store for tests. Session data is Flask's tagged JSON, zlib-compressed once
+it grows past SESSION_COMPRESS_THRESHOLD. Without Redis the app keeps
+Flask's signed cookie session, which every worker process can read.
+
+Sessions are loaded lazily: a request that never touches ``session`` (static
+files, /health, /metrics) does not reach the store. They are saved only when
+modified, so reading a session costs one GET and no write.
+
+Signing in moves the session to a new id (regenerate_session()), so an id an
+attacker planted before the sign-in never becomes authenticated.
+"""
+import time
+import zlib
+import logging
+import secrets
+import threading
+from functools import wraps
+
+from flask import session as current_session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from app.utils.metrics import track_upstream
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = 'session_store'
+
+
+class SessionSerializer:
+    """
+    Session data to bytes and back.
+
+    Args:
+        compress_threshold (int, optional): Payloads of at least this many bytes are compressed
+    """
+
+    RAW = b'j'
+    COMPRESSED = b'z'
+
+    def __init__(self, compress_threshold=512):
+        self.compress_threshold = compress_threshold
+        self._tagged = TaggedJSONSerializer()
+
+    def dumps(self, data):
+        payload = self._tagged.dumps(dict(data)).encode('utf-8')
+        if len(payload) >= self.compress_threshold:
+            compressed = zlib.compress(payload)
+            if len(compressed) < len(payload):
+                return self.COMPRESSED + compressed
+        return self.RAW + payload
+
+    def loads(self, raw):
+        marker, payload = raw[:1], raw[1:]
+        if marker == self.COMPRESSED:
+            payload = zlib.decompress(payload)
+        return self._tagged.loads(payload.decode('utf-8'))
+
+
+class LocalSessionStore:
+    """
+    In-process store with expiry, for tests.
+
+    Sessions are not shared between worker processes.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, self._clock() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisSessionStore:
+    """
+    Redis store. Redis being unreachable costs the user their session, not the request.
+
+    Args:
+        client: redis.Redis built on a shared connection pool
+    """
+
+    def __init__(self, client):
+        import redis
+        self.client = client
+        self._errors = redis.RedisError
+
+    def get(self, key):
+        try:
+            with track_upstream('redis', 'session_get'):
+                return self.client.get(key)
+        except self._errors as e:
+            logger.warning(f"Session read failed, continuing without session: {e}")
+            return None
+
+    def set(self, key, value, ttl):
+        try:
+            with track_upstream('redis', 'session_set'):
+                self.client.set(key, value, ex=ttl)
+        except self._errors as e:
+            logger.error(f"Session write failed: {e}")
+
+    def delete(self, key):
+        try:
+            with track_upstream('redis', 'session_delete'):
+                self.client.delete(key)
+        except self._errors as e:
+            logger.error(f"Session delete failed: {e}")
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """
+    Session whose data is fetched on first use.
+
+    Args:
+        sid (str): Session id
+        loader (callable, optional): Returns the stored data; None for a new session
+    """
+
+    def __init__(self, sid, loader=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(None, on_update)
+        self.sid = sid
+        self.new = loader is None
+        self.modified = False
+        self.accessed = False
+        # Id the data was stored under before regenerate(); deleted when the session is saved
+        self.stale_sid = None
+        self._loader = loader
+
+    def _load(self):
+        self.accessed = True
+        if self._loader is not None:
+            loader, self._loader = self._loader, None
+            dict.update(self, loader(self))
+
+    def regenerate(self):
+        """Keep the data but move it to a new session id."""
+        self._load()
+        if self.stale_sid is None:
+            self.stale_sid = self.sid
+        self.sid = _new_sid()
+        self.modified = True
+
+
+def _new_sid():
+    return secrets.token_urlsafe(32)
+
+
+def regenerate_session():
+    """Give the current server-side session a new id; call it when a user signs in."""
+    if isinstance(current_session, ServerSession):
+        current_session.regenerate()
+
+
+def _loads_first(name):
+    method = getattr(CallbackDict, name)
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._load()
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+for _name in ('__getitem__', '__setitem__', '__delitem__', '__contains__', '__iter__', '__len__', '__eq__',
+              '__repr__', 'get', 'setdefault', 'pop', 'popitem', 'update', 'clear', 'keys', 'values',
+              'items', 'copy'):
+    setattr(ServerSession, _name, _loads_first(_name))
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Keeps session data in a store, keyed by the id in the session cookie.
+
+    Args:
+        store: LocalSessionStore or RedisSessionStore
+        key_prefix (str, optional): Prefix of the store keys
+        use_signer (bool, optional): Sign the session id in the cookie with the app's secret key
+        serializer (SessionSerializer, optional): Session data encoding
+    """
+
+    def __init__(self, store, key_prefix='session:', use_signer=True, serializer=None):
+        self.store = store
+        self.key_prefix = key_prefix
+        self.use_signer = use_signer
+        self.serializer = serializer or SessionSerializer()
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-session', key_derivation='hmac')
+
+    def _new_sid(self):
+        return _new_sid()
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return ServerSession(self._new_sid())
+        if self.use_signer:
+            if not app.secret_key:
+                return None
+            try:
+                cookie = self._signer(app).unsign(cookie).decode('utf-8')
+            except BadSignature:
+                return ServerSession(self._new_sid())
+        return ServerSession(cookie, loader=self._load)
+
+    def _load(self, session):
+        raw = self.store.get(self.key_prefix + session.sid)
+        if raw is None:
+            # Expired or unknown id: never adopt an id the client picked
+            session.sid = self._new_sid()
+            session.new = True
+            return {}
+        try:
+            return self.serializer.loads(raw)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable session: {e}")
+            return {}
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        # Unchanged sessions are not written back
+        if not session.modified:
+            return
+
+        if session.stale_sid is not None:
+            self.store.delete(self.key_prefix + session.stale_sid)
+            session.stale_sid = None
+
+        if not session:
+            if not session.new:
+                self.store.delete(self.key_prefix + session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite,
+                                       httponly=httponly)
+            return
+
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        self.store.set(self.key_prefix + session.sid, self.serializer.dumps(session), ttl)
+        cookie = session.sid
+        if self.use_signer:
+            cookie = self._signer(app).sign(cookie).decode('utf-8')
+        response.set_cookie(name, cookie, expires=self.get_expiration_time(app, session), httponly=httponly,
+                            domain=domain, path=path, secure=secure, samesite=samesite)
+
+
+def _redis_store(app):
+    url = app.config.get('SESSION_REDIS')
+    if not url:
+        logger.warning("SESSION_TYPE is 'redis' but SESSION_REDIS is not set; using cookie sessions")
+        return None
+    try:
+        import redis
+    except ImportError:
+        logger.warning("redis is not installed; using cookie sessions")
+        return None
+    timeout = app.config.get('SESSION_REDIS_TIMEOUT', 0.5)
+    pool = redis.ConnectionPool.from_url(url, max_connections=app.config.get('SESSION_REDIS_MAX_CONNECTIONS', 20),
+                                         socket_timeout=timeout, socket_connect_timeout=timeout,
+                                         health_check_interval=30)
+    return RedisSessionStore(redis.Redis(connection_pool=pool))
+
+
+def init_sessions(app):
+    """
+    Serve an app's sessions from SESSION_TYPE: 'redis', 'local' for the in-process
+    store (tests only), or 'cookie' for Flask's signed cookie session.
+
+    Falls back to cookie sessions when Redis is not configured, so sessions
+    are still shared by every worker process.
+
+    Args:
+        app: Flask application
+
+    Returns:
+        The session store, or None for cookie sessions
+    """
+    session_type = app.config.get('SESSION_TYPE')
+    store = None
+    if session_type == 'redis':
+        store = _redis_store(app)
+    elif session_type == 'local':
+        store = LocalSessionStore()
+    if store is None:
+        app.session_interface = SecureCookieSessionInterface()
+        app.extensions.pop(EXTENSION_KEY, None)
+        return None
+    app.session_interface = ServerSessionInterface(
+        store,
+        key_prefix=app.config.get('SESSION_KEY_PREFIX', 'session:'),
+        use_signer=app.config.get('SESSION_USE_SIGNER', True),
+        serializer=SessionSerializer(app.config.get('SESSION_COMPRESS_THRESHOLD', 512)),
+    )
+    app.extensions[EXTENSION_KEY] = store
+    return store
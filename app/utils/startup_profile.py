@@ -0,0 +1,63 @@
+"""
+Startup profiling for the application factory.
+Times each phase of create_app() so slow worker boots can be traced to
+configuration, blueprint imports or extension setup.
+"""
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    """Wall-clock durations of the named phases of one app construction."""
+
+    def __init__(self):
+        self.phases = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a block of the factory.
+
+        Args:
+            name (str): Phase name shown in the report
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def finish(self):
+        """Mark the construction as complete."""
+        self.finished = time.perf_counter()
+
+    @property
+    def total(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def to_dict(self):
+        return {
+            'total_ms': round(self.total * 1000, 2),
+            'phases': [{'name': name, 'ms': round(seconds * 1000, 2)} for name, seconds in self.phases],
+        }
+
+    def summary(self):
+        """One-line summary for the log."""
+        phases = ', '.join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in self.phases)
+        return f"App created in {self.total * 1000:.1f}ms ({phases})"
+
+    def report(self):
+        """
+        Multi-line report, slowest phase first.
+
+        Returns:
+            str: Report text
+        """
+        total = self.total or 1e-9
+        lines = [f"{'phase':<24}{'ms':>10}{'share':>8}"]
+        for name, seconds in sorted(self.phases, key=lambda p: p[1], reverse=True):
+            lines.append(f"{name:<24}{seconds * 1000:>10.1f}{seconds / total:>8.0%}")
+        lines.append(f"{'total':<24}{self.total * 1000:>10.1f}")
+        return '\n'.join(lines)
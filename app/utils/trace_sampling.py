@@ -0,0 +1,207 @@
+"""
+Adaptive Sentry trace sampling.
+TraceSampler is passed to sentry_sdk.init() as traces_sampler. Each request's
+sampling rate depends on its path: static files and health checks get low
+rates, and configured path prefixes get their own rates. A route whose recent
+requests were slow, or which recently raised an error, is sampled in full
+until it recovers. A token bucket caps how many traces per second the process
+sends, so a traffic spike cannot multiply the tracing overhead.
+"""
+import time
+import random
+import threading
+
+# Path prefixes sampled at a low rate unless configured otherwise
+LOW_VALUE_PREFIXES = {
+    '/static/': 0.0,
+    '/favicon.ico': 0.0,
+    '/health': 0.01,
+}
+
+# Weight of the newest request in a route's moving average duration
+DURATION_SMOOTHING = 0.2
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, at most ``burst`` saved up."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Take one token if one is available.
+
+        Returns:
+            bool: Whether a token was taken
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _RouteStats:
+    __slots__ = ('average_ms', 'error_at')
+
+    def __init__(self):
+        self.average_ms = None
+        self.error_at = None
+
+
+class TraceSampler:
+    """
+    Per-route, load-aware traces_sampler.
+
+    Args:
+        default_rate (float): Rate for requests no other rule matches
+        route_rates (dict, optional): Path prefix -> rate; the longest matching prefix wins
+        max_per_second (float, optional): Cap on sampled traces per second; 0 disables the cap
+        slow_ms (float, optional): Routes averaging more than this are sampled in full
+        error_boost_seconds (float, optional): How long a route is sampled in full after an error
+        clock (callable, optional): Monotonic clock, for tests
+        rand (callable, optional): Uniform [0, 1) source, for tests
+    """
+
+    def __init__(self, default_rate=0.1, route_rates=None, max_per_second=10, slow_ms=1000,
+                 error_boost_seconds=300, clock=time.monotonic, rand=random.random):
+        self.default_rate = default_rate
+        self.route_rates = dict(LOW_VALUE_PREFIXES)
+        self.route_rates.update(route_rates or {})
+        # Longest prefix first, so the most specific rule wins
+        self._prefixes = sorted(self.route_rates, key=len, reverse=True)
+        self.slow_ms = slow_ms
+        self.error_boost_seconds = error_boost_seconds
+        self._bucket = TokenBucket(max_per_second, clock=clock) if max_per_second else None
+        self._clock = clock
+        self._random = rand
+        self._stats = {}
+        self._url_map = None
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a sampler from the SENTRY_TRACES_* settings.
+
+        Args:
+            config: Mapping such as app.config
+
+        Returns:
+            TraceSampler: The sampler
+        """
+        return cls(default_rate=config.get('SENTRY_TRACES_SAMPLE_RATE', 0.1),
+                   route_rates=config.get('SENTRY_TRACES_ROUTE_RATES'),
+                   max_per_second=config.get('SENTRY_TRACES_PER_SECOND', 10),
+                   slow_ms=config.get('SENTRY_SLOW_REQUEST_MS', 1000),
+                   error_boost_seconds=config.get('SENTRY_ERROR_BOOST_SECONDS', 300))
+
+    def init_app(self, app):
+        """
+        Feed request durations and errors back into the sampler.
+
+        Args:
+            app: Flask application whose url_map is used to group paths into routes
+        """
+        from flask import g, request
+
+        self._url_map = app.url_map
+
+        @app.before_request
+        def _start_trace_timer():
+            g._trace_started = time.perf_counter()
+
+        @app.after_request
+        def _record_trace_status(response):
+            # Most API routes turn exceptions into a 500 response themselves
+            g._trace_failed = response.status_code >= 500
+            return response
+
+        @app.teardown_request
+        def _record_trace_timing(error=None):
+            started = g.pop('_trace_started', None)
+            if started is None or request.url_rule is None:
+                return
+            failed = error is not None or g.pop('_trace_failed', False)
+            self.record(request.url_rule.rule, (time.perf_counter() - started) * 1000, failed)
+
+    def record(self, route, duration_ms, failed=False):
+        """
+        Record a finished request.
+
+        Args:
+            route (str): URL rule of the request
+            duration_ms (float): Time the request took
+            failed (bool, optional): Whether it raised an error
+        """
+        stats = self._stats.get(route)
+        if stats is None:
+            stats = self._stats.setdefault(route, _RouteStats())
+        if stats.average_ms is None:
+            stats.average_ms = duration_ms
+        else:
+            stats.average_ms += DURATION_SMOOTHING * (duration_ms - stats.average_ms)
+        if failed:
+            stats.error_at = self._clock()
+
+    def _route(self, path, method):
+        if self._url_map is None:
+            return None
+        try:
+            rule, _ = self._url_map.bind('').match(path, method, return_rule=True)
+        except Exception:
+            return None
+        return rule.rule
+
+    def rate_for(self, path, method='GET'):
+        """
+        Sampling rate for a request, before the per-second cap.
+
+        Args:
+            path (str): Request path
+            method (str, optional): Request method
+
+        Returns:
+            float: Rate between 0 and 1
+        """
+        stats = self._stats.get(self._route(path, method))
+        if stats is not None:
+            if stats.error_at is not None and self._clock() - stats.error_at < self.error_boost_seconds:
+                return 1.0
+            if stats.average_ms is not None and stats.average_ms > self.slow_ms:
+                return 1.0
+        for prefix in self._prefixes:
+            if path.startswith(prefix):
+                return self.route_rates[prefix]
+        return self.default_rate
+
+    def __call__(self, sampling_context):
+        """
+        Sentry traces_sampler hook.
+
+        Args:
+            sampling_context (dict): Context from the Sentry SDK
+
+        Returns:
+            float: 0 or 1 once the cap is applied
+        """
+        # Continue the caller's decision for distributed traces
+        parent_sampled = sampling_context.get('parent_sampled')
+        if parent_sampled is not None:
+            return float(parent_sampled)
+
+        environ = sampling_context.get('wsgi_environ') or {}
+        rate = self.rate_for(environ.get('PATH_INFO', ''), environ.get('REQUEST_METHOD', 'GET'))
+        if rate <= 0 or self._random() >= rate:
+            return 0.0
+        if self._bucket is not None and not self._bucket.take():
+            return 0.0
+        return 1.0
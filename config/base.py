@@ -26,25 +26,90 @@ class BaseConfig:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', f"sqlite:///{os.path.join(BASE_DIR, 'instance', 'app.db')}")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Reporting replica settings
+    REPORTING_STORE_DIR = os.path.join(BASE_DIR, 'instance', 'reporting_store')
+    REPORTING_USE_REPLICA = os.getenv('REPORTING_USE_REPLICA', 'false').lower() == 'true'
+    # Seconds between the reports' checks for new rows
+    REPORTING_UPDATE_INTERVAL = int(os.getenv('REPORTING_UPDATE_INTERVAL', '30'))
+    
+    # Bid workbooks loaded at once by each worker (Flask-Executor 'batch_ingest')
+    BATCH_INGEST_EXECUTOR_MAX_WORKERS = int(os.getenv('BATCH_INGEST_EXECUTOR_MAX_WORKERS', '2'))
+    
+    # Seconds the county/date/auction snapshot is served before reloading
+    COUNTY_SNAPSHOT_TTL = int(os.getenv('COUNTY_SNAPSHOT_TTL', '300'))
+    
+    # Parsed sql/ schema, reused until the scripts change
+    SCHEMA_CATALOG_PATH = os.path.join(BASE_DIR, 'instance', 'schema_catalog.json')
+    
     # Logging settings
     LOG_DIR = os.path.join(BASE_DIR, 'instance', 'logs')
     LOG_LEVEL = 'INFO'
     LOG_FORMAT = '%(asctime)s [%(levelname)s] %(module)s: %(message)s'
     LOG_FILE_EXTENSION = '.log.txt'  # Enforced by our logging rules
     
+    # Queued, batched log writing (app/utils/log_pipeline.py); the file gets one JSON object per line
+    LOG_PIPELINE_ENABLED = True
+    LOG_CONSOLE = True
+    LOG_MAX_BYTES = 10485760  # 10MB
+    LOG_BACKUP_COUNT = 10
+    LOG_BATCH_SIZE = 200
+    LOG_FLUSH_INTERVAL = 1.0
+    LOG_QUEUE_SIZE = 10000
+    # Records per second each logger may write below ERROR, and the burst allowed
+    LOG_RATE_LIMIT = int(os.getenv('LOG_RATE_LIMIT', '50'))
+    LOG_RATE_BURST = int(os.getenv('LOG_RATE_BURST', '200'))
+    
     # Cache configuration
     CACHE_TYPE = 'SimpleCache'
     CACHE_DEFAULT_TIMEOUT = 300
     
-    # Session settings
-    SESSION_TYPE = 'filesystem'
-    SESSION_FILE_DIR = os.path.join(BASE_DIR, 'instance', 'sessions')
+    # Sessions (app/utils/sessions.py): 'redis' for server-side sessions, else Flask's signed cookie.
+    # 'local' is an in-process store that is not shared between workers, for tests only.
+    SESSION_TYPE = os.getenv('SESSION_TYPE', 'redis' if os.getenv('REDIS_URL') else 'cookie')
+    SESSION_REDIS = os.getenv('REDIS_URL')
+    SESSION_REDIS_MAX_CONNECTIONS = int(os.getenv('SESSION_REDIS_MAX_CONNECTIONS', '20'))
+    SESSION_REDIS_TIMEOUT = float(os.getenv('SESSION_REDIS_TIMEOUT', '0.5'))
+    SESSION_KEY_PREFIX = 'session:'
+    SESSION_USE_SIGNER = True
+    SESSION_COMPRESS_THRESHOLD = 512  # bytes
     SESSION_PERMANENT = True
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     
+    # Resolve signed-in users through the ASP.NET membership views (app/services/user_directory.py);
+    # off until auth.login checks real credentials
+    USER_DIRECTORY_ENABLED = os.getenv('USER_DIRECTORY_ENABLED', 'false').lower() == 'true'
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '60'))
+    # Roles of the demo sign-in used while the directory is off; staff endpoints need a staff role
+    DEMO_USER_ROLES = ()
+    
     # Error tracking with Sentry
     SENTRY_DSN = os.getenv('SENTRY_DSN', None)
     
+    # Trace sampling (see app/utils/trace_sampling.py); errors are always sent
+    SENTRY_TRACES_SAMPLE_RATE = float(os.getenv('SENTRY_TRACES_SAMPLE_RATE', '0.1'))
+    SENTRY_TRACES_ROUTE_RATES = {
+        '/reports/api/': float(os.getenv('SENTRY_TRACES_API_RATE', '0.2')),
+    }
+    SENTRY_TRACES_PER_SECOND = float(os.getenv('SENTRY_TRACES_PER_SECOND', '10'))
+    SENTRY_SLOW_REQUEST_MS = float(os.getenv('SENTRY_SLOW_REQUEST_MS', '1000'))
+    SENTRY_ERROR_BOOST_SECONDS = float(os.getenv('SENTRY_ERROR_BOOST_SECONDS', '300'))
+    SENTRY_PROFILES_SAMPLE_RATE = float(os.getenv('SENTRY_PROFILES_SAMPLE_RATE', '0.1'))
+    
+    # Prometheus /metrics; gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at a directory shared by the workers
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    # Refuse every scrape while METRICS_TOKEN is unset
+    METRICS_REQUIRE_TOKEN = False
+    PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    
+    # Server-Timing response headers (app/utils/server_timing.py); they expose internal timings to clients
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+    
+    # Upstream payload dumps (app/utils/debug_capture.py): 1 in N requests, 0 for none;
+    # with DEBUG_CAPTURE_OPT_IN a staff session can also opt in through /settings/api/debug-capture
+    DEBUG_CAPTURE_SAMPLE_RATE = int(os.getenv('DEBUG_CAPTURE_SAMPLE_RATE', '0'))
+    DEBUG_CAPTURE_OPT_IN = os.getenv('DEBUG_CAPTURE_OPT_IN', 'false').lower() == 'true'
+    
     # Build report settings
     BUILD_REPORTS_DIR = os.path.join(BASE_DIR, 'build_reports')
     
@@ -67,5 +132,4 @@ class BaseConfig:
         """Initialize the Flask application with this configuration."""
         # Ensure required directories exist
         os.makedirs(cls.LOG_DIR, exist_ok=True)
-        os.makedirs(cls.SESSION_FILE_DIR, exist_ok=True)
         os.makedirs(cls.BUILD_REPORTS_DIR, exist_ok=True) 
\ No newline at end of file
@@ -27,6 +27,19 @@ class DevelopmentConfig(BaseConfig):
     # Enable SQL query logging
     SQLALCHEMY_ECHO = True
     
+    # Trace every request locally
+    SENTRY_TRACES_SAMPLE_RATE = float(os.getenv('SENTRY_TRACES_SAMPLE_RATE', '1.0'))
+    
+    # Show where each request spends its time in browser devtools
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+    
+    # Let the demo sign-in reach the staff endpoints locally
+    DEMO_USER_ROLES = ('Administrator',)
+    
+    # Capture every upstream payload locally
+    DEBUG_CAPTURE_SAMPLE_RATE = int(os.getenv('DEBUG_CAPTURE_SAMPLE_RATE', '1'))
+    DEBUG_CAPTURE_OPT_IN = os.getenv('DEBUG_CAPTURE_OPT_IN', 'true').lower() == 'true'
+    
     # Set shorter cache timeout for development
     CACHE_DEFAULT_TIMEOUT = 60
     
@@ -0,0 +1,229 @@
+"""
+Integration settings snapshot.
+Credentials and endpoints of the external systems the portal talks to
+(Sentry, Application Insights, Grafana, Azure DevOps, OpenAI) are read once,
+when the app is created, into an immutable IntegrationSettings snapshot.
+Handlers read attributes from it instead of calling os.getenv on every
+request. Sending the process SIGHUP (or calling reload_integration_settings)
+re-reads the environment and the .env file and swaps in a new snapshot.
+Variables set in the real environment keep precedence over .env on reload,
+as they do at startup.
+
+Sentry is initialized once per process: a reload that changes SENTRY_DSN,
+FLASK_ENV or APP_VERSION only takes effect after a restart, and is logged.
+"""
+import os
+import signal
+import logging
+import weakref
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+SentrySettings = namedtuple('SentrySettings', ['dsn', 'environment', 'release'])
+AppInsightsSettings = namedtuple('AppInsightsSettings', ['application_id', 'api_key', 'url', 'azure_api_key'])
+GrafanaSettings = namedtuple('GrafanaSettings', ['url', 'api_token'])
+DevOpsSettings = namedtuple('DevOpsSettings', ['org', 'pat'])
+OpenAISettings = namedtuple('OpenAISettings', ['endpoint', 'api_key', 'deployment'])
+
+IntegrationSettings = namedtuple('IntegrationSettings', [
+    'sentry', 'app_insights', 'grafana', 'devops', 'openai',
+    # APP_INSIGHTS* / AZURE* variables with values shortened, for connection diagnostics
+    'azure_env_masked',
+    'version',
+])
+
+# Defaults for settings that have one
+DEFAULTS = {
+    'FLASK_ENV': 'development',
+    'APP_VERSION': '0.1.0',
+    'AZURE_DEVOPS_ORG': 'supercomputing2020',
+    'OPENAI_API_ENDPOINT': 'https://api.openai.com/v1',
+    'OPENAI_DEPLOYMENT': 'gpt-3.5-turbo',
+}
+
+EXTENSION_KEY = 'integration_settings'
+
+_holders = weakref.WeakSet()
+_signal_installed = False
+
+
+def _mask(value):
+    return value[:4] + '...' if value and len(value) > 4 else value
+
+
+def _env_file():
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return next((path for path in (os.path.join(os.getcwd(), '.env'), os.path.join(base_dir, '.env'))
+                 if os.path.isfile(path)), None)
+
+
+def read_env_file():
+    """
+    Values in the .env file.
+
+    Returns:
+        dict: Variable name to value; empty without a .env file
+    """
+    env_file = _env_file()
+    if not env_file:
+        return {}
+    from dotenv import dotenv_values
+    return {k: v for k, v in dotenv_values(env_file).items() if v is not None}
+
+
+def read_environment(include_env_file=False, loaded_env_file=None):
+    """
+    Current environment, optionally with the .env file laid over it.
+
+    A .env value only replaces a variable that is not in the real
+    environment, or whose value was itself loaded from .env at startup.
+
+    Args:
+        include_env_file (bool, optional): Overlay the values in .env, as a reload does
+        loaded_env_file (dict, optional): .env values loaded into os.environ at startup
+
+    Returns:
+        dict: Variable name to value
+    """
+    environ = dict(os.environ)
+    if include_env_file:
+        loaded_env_file = loaded_env_file or {}
+        for name, value in read_env_file().items():
+            if name not in os.environ or loaded_env_file.get(name) == os.environ[name]:
+                environ[name] = value
+    return environ
+
+
+def build_settings(config, environ, version=1):
+    """
+    Build a snapshot.
+
+    Environment variables win over the config class, which wins over DEFAULTS.
+
+    Args:
+        config: Mapping of config values, such as app.config
+        environ (dict): Environment variables
+        version (int, optional): Snapshot number, increased on every reload
+
+    Returns:
+        IntegrationSettings: The snapshot
+    """
+    def get(name):
+        if environ.get(name) is not None:
+            return environ[name]
+        if config.get(name) is not None:
+            return config[name]
+        return DEFAULTS.get(name, '')
+
+    return IntegrationSettings(
+        sentry=SentrySettings(dsn=get('SENTRY_DSN') or None, environment=get('FLASK_ENV'),
+                              release=get('APP_VERSION')),
+        app_insights=AppInsightsSettings(application_id=get('APP_INSIGHTS_APPLICATION_ID'),
+                                         api_key=get('APP_INSIGHTS_API_KEY'),
+                                         url=get('AZURE_APP_INSIGHTS_URL'),
+                                         azure_api_key=get('AZURE_APP_INSIGHTS_API_KEY')),
+        grafana=GrafanaSettings(url=get('GRAFANA_URL'), api_token=get('GRAFANA_API_TOKEN')),
+        devops=DevOpsSettings(org=get('AZURE_DEVOPS_ORG'), pat=get('AZURE_DEVOPS_PAT')),
+        openai=OpenAISettings(endpoint=get('OPENAI_API_ENDPOINT'), api_key=get('OPENAI_API_KEY'),
+                              deployment=get('OPENAI_DEPLOYMENT')),
+        azure_env_masked=MappingProxyType({k: _mask(v) for k, v in sorted(environ.items())
+                                           if 'APP_INSIGHTS' in k or 'AZURE' in k}),
+        version=version,
+    )
+
+
+class SettingsHolder:
+    """
+    Holds an app's current snapshot; reload() replaces it in one assignment.
+
+    Args:
+        config: The app's config mapping
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        # What load_dotenv() put into os.environ, told apart from real environment variables on reload
+        self._loaded_env_file = read_env_file()
+        self.current = build_settings(config, read_environment())
+
+    def reload(self):
+        """
+        Re-read the environment and .env file.
+
+        Returns:
+            IntegrationSettings: The new snapshot
+        """
+        with self._lock:
+            previous = self.current
+            self.current = build_settings(
+                self.config, read_environment(include_env_file=True, loaded_env_file=self._loaded_env_file),
+                version=previous.version + 1)
+        if self.current.sentry != previous.sentry:
+            logger.warning("Sentry settings changed; restart the process for Sentry to use them")
+        return self.current
+
+
+def init_integration_settings(app):
+    """
+    Build an app's snapshot and reload it on SIGHUP.
+
+    Args:
+        app: Flask application
+
+    Returns:
+        SettingsHolder: The app's holder
+    """
+    global _signal_installed
+    holder = SettingsHolder(app.config)
+    app.extensions[EXTENSION_KEY] = holder
+    _holders.add(holder)
+
+    # Signal handlers can only be installed from the main thread, and SIGHUP does not exist on Windows
+    if (not _signal_installed and hasattr(signal, 'SIGHUP')
+            and threading.current_thread() is threading.main_thread()):
+        signal.signal(signal.SIGHUP, _reload_on_signal)
+        _signal_installed = True
+    return holder
+
+
+def _reload_on_signal(signum, frame):
+    # Reading files and logging are not safe inside a signal handler; do them on a thread
+    threading.Thread(target=_reload_all, name='settings-reload', daemon=True).start()
+
+
+def _reload_all():
+    for holder in list(_holders):
+        reload_integration_settings(holder)
+
+
+def reload_integration_settings(app_or_holder):
+    """
+    Replace an app's snapshot with a freshly read one.
+
+    Args:
+        app_or_holder: Flask application, or its SettingsHolder
+
+    Returns:
+        IntegrationSettings: The new snapshot
+    """
+    holder = app_or_holder
+    if not isinstance(holder, SettingsHolder):
+        holder = app_or_holder.extensions[EXTENSION_KEY]
+    settings = holder.reload()
+    logger.info(f"Integration settings reloaded (version {settings.version})")
+    return settings
+
+
+def integration_settings():
+    """
+    The current app's snapshot.
+
+    Returns:
+        IntegrationSettings: The snapshot in effect for this request
+    """
+    from flask import current_app
+    return current_app.extensions[EXTENSION_KEY].current
@@ -48,6 +48,9 @@ class ProductionConfig(BaseConfig):
     # Ensure Sentry is configured
     SENTRY_DSN = os.getenv('SENTRY_DSN')
     
+    # /metrics is closed until a scrape token is configured
+    METRICS_REQUIRE_TOKEN = True
+    
     # Disable development features
     FEATURES = {
         **BaseConfig.FEATURES,
@@ -80,27 +83,11 @@ class ProductionConfig(BaseConfig):
             response.headers['Content-Security-Policy'] = csp_string
             return response
             
-        # Configure production logging
-        import logging
-        from logging.handlers import RotatingFileHandler
-        
-        # Create secure file logger
-        if not os.path.exists(cls.LOG_DIR):
-            os.makedirs(cls.LOG_DIR)
-            
-        file_handler = RotatingFileHandler(
-            os.path.join(cls.LOG_DIR, f'app_production{cls.LOG_FILE_EXTENSION}'),
-            maxBytes=10485760,  # 10MB
-            backupCount=10
-        )
-        
-        file_handler.setFormatter(logging.Formatter(cls.LOG_FORMAT))
-        file_handler.setLevel(logging.ERROR)
-        
-        app.logger.addHandler(file_handler)
-        app.logger.setLevel(logging.ERROR)
+        # Production logging (rotating app_production.log.txt at LOG_LEVEL) is set up by
+        # app.utils.log_pipeline.init_logging, off the request thread
         
         # Validate critical configuration
         assert cls.SECRET_KEY != 'set-this-in-production', 'Production SECRET_KEY not set!'
         assert cls.SENTRY_DSN is not None, 'Sentry DSN not configured for production!'
-        assert cls.SQLALCHEMY_DATABASE_URI is not None, 'Production database URL not set!' 
\ No newline at end of file
+        assert cls.SQLALCHEMY_DATABASE_URI is not None, 'Production database URL not set!'
+        assert cls.SESSION_REDIS is not None, 'Production REDIS_URL not set; sessions would not be shared between workers!' 
\ No newline at end of file
@@ -29,9 +29,16 @@ class TestingConfig(BaseConfig):
     LOG_DIR = os.path.join(tempfile.gettempdir(), 'performance_reporting_test_logs')
     BUILD_REPORTS_DIR = os.path.join(tempfile.gettempdir(), 'performance_reporting_test_reports')
     
-    # Session and cache
-    SESSION_TYPE = 'filesystem'
-    SESSION_FILE_DIR = os.path.join(tempfile.gettempdir(), 'performance_reporting_test_sessions')
+    # Reporting replica kept out of the working tree
+    REPORTING_STORE_DIR = os.path.join(tempfile.gettempdir(), 'performance_reporting_test_store')
+    REPORTING_USE_REPLICA = False
+    SCHEMA_CATALOG_PATH = os.path.join(tempfile.gettempdir(), 'performance_reporting_test_schema_catalog.json')
+    
+    # Sessions in process memory
+    SESSION_TYPE = 'local'
+    
+    # Log synchronously through Flask's default handler
+    LOG_PIPELINE_ENABLED = False
     
     # Disable Sentry in tests
     SENTRY_DSN = None
@@ -61,7 +68,7 @@ class TestingConfig(BaseConfig):
         app.logger.setLevel(logging.ERROR)
         
         # Create clean test directories
-        for test_dir in [cls.LOG_DIR, cls.BUILD_REPORTS_DIR, cls.SESSION_FILE_DIR]:
+        for test_dir in [cls.LOG_DIR, cls.BUILD_REPORTS_DIR]:
             if not os.path.exists(test_dir):
                 os.makedirs(test_dir)
                 
@@ -0,0 +1,26 @@
+"""
+Gunicorn settings picked up automatically from the working directory.
+Gives the workers a shared PROMETHEUS_MULTIPROC_DIR so /metrics reports the
+whole server, and cleans up after workers that exit.
+"""
+import os
+import glob
+import tempfile
+
+multiproc_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'performance_reporting_metrics'))
+
+
+def on_starting(server):
+    # Samples left by a previous server would be counted again
+    os.makedirs(multiproc_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(multiproc_dir, '*.db')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
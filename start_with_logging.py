@@ -16,27 +16,14 @@ load_dotenv()
 # Initialize Sentry immediately, before any other imports
 try:
     import sentry_sdk
+    from app.utils.sentry_utils import init_sentry
     
     # Get Sentry DSN from environment
     SENTRY_DSN = os.getenv('SENTRY_DSN')
     
     if SENTRY_DSN:
-        sentry_sdk.init(
-            dsn=SENTRY_DSN,
-            # A higher sample rate means potentially more events will be captured
-            traces_sample_rate=1.0,
-            # Send all errors, even in development
-            environment=os.getenv('FLASK_ENV', 'development'),
-            # Enable performance monitoring 
-            profiles_sample_rate=1.0,
-            # Release tracking
-            release=os.getenv('BUILD_VERSION', 'BUILD-DEVELOPMENT'),
-            # Enable PII if you need user context
-            send_default_pii=True,
-            # Make sure we capture everything, even early failures
-            auto_enabling_integrations=True,
-            debug=True
-        )
+        # Same settings and trace sampler as the app; create_app() reuses this client
+        init_sentry()
         print(f"Sentry initialized for early error capture")
     else:
         print("WARNING: Sentry DSN not configured. Error monitoring to Sentry is disabled.")
@@ -53,14 +40,14 @@ os.makedirs(logs_dir, exist_ok=True)
 current_date = datetime.datetime.now().strftime('%Y%m%d')
 log_file = logs_dir / f'app_{current_date}.log.txt'
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Written by a background thread in batches; the file gets one JSON object per line
+from app.utils.log_pipeline import LogPipeline, BatchRotatingFileHandler, BatchStreamHandler, JsonFormatter, install_pipeline
+
+file_handler = BatchRotatingFileHandler(log_file)
+file_handler.setFormatter(JsonFormatter())
+console_handler = BatchStreamHandler(sys.stdout)
+console_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(name)s: %(message)s'))
+install_pipeline(LogPipeline([file_handler, console_handler]), level=os.getenv('LOG_LEVEL', 'DEBUG'))
 
 logger = logging.getLogger('startup')
 logger.info('=============================================')
@@ -2,6 +2,7 @@ import pytest
 import os
 import json
 from unittest.mock import patch, MagicMock
+from config.integrations import reload_integration_settings
 
 
 class TestAppInsightsConnection:
@@ -13,6 +14,8 @@ class TestAppInsightsConnection:
         # Set test environment variables
         os.environ['APP_INSIGHTS_APPLICATION_ID'] = 'test-app-id'
         os.environ['APP_INSIGHTS_API_KEY'] = 'test-api-key'
+        # Handlers read a snapshot of the environment taken when the app is created
+        reload_integration_settings(app)
         
         # Assign fixtures to self
         self.app = app
@@ -24,12 +27,14 @@ class TestAppInsightsConnection:
         # Tear down after test
         os.environ.pop('APP_INSIGHTS_APPLICATION_ID', None)
         os.environ.pop('APP_INSIGHTS_API_KEY', None)
+        reload_integration_settings(app)
 
     def test_missing_credentials(self):
         """Test the endpoint when credentials are missing"""
         # Remove credentials for this test
         os.environ.pop('APP_INSIGHTS_APPLICATION_ID', None)
         os.environ.pop('APP_INSIGHTS_API_KEY', None)
+        reload_integration_settings(self.app)
         
         # Test the endpoint
         response = self.client.post('/settings/api/appinsights/test-connection')
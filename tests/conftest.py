@@ -10,8 +10,10 @@ from app import create_app
 from flask import Flask
 from config.testing import TestingConfig
 import logging
+import sqlite3
 import sys
 from werkzeug.serving import make_server
+from app.services.schema_catalog import SQL_DIR, get_catalog
 
 # Set up logging
 logging.basicConfig(
@@ -129,4 +131,54 @@ def selenium_config(flask_server):
     """Configure Selenium to work with the Flask server"""
     return {
         "base_url": f"http://{flask_server.host}:{flask_server.port}"
-    } 
\ No newline at end of file
+    } 
+
+
+@pytest.fixture
+def taxsale_db():
+    """An in-memory SQLite stand-in for the Taxsale database.
+
+    Tables live in an attached ``dbo`` schema so service SQL written for
+    SQL Server (``dbo.vg_...``) runs unchanged.
+    """
+    conn = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    conn.execute("ATTACH DATABASE ':memory:' AS dbo")
+    yield conn
+    conn.close()
+
+
+# SQLite declared types for the SQL Server types in sql/; TIMESTAMP and DATE
+# columns are read back as datetime and date through detect_types
+SQLITE_TYPES = {
+    'bigint': 'INTEGER', 'int': 'INTEGER', 'smallint': 'INTEGER', 'tinyint': 'INTEGER', 'bit': 'INTEGER',
+    'decimal': 'REAL', 'numeric': 'REAL', 'money': 'REAL', 'smallmoney': 'REAL', 'float': 'REAL', 'real': 'REAL',
+    'datetime': 'TIMESTAMP', 'smalldatetime': 'TIMESTAMP', 'datetime2': 'TIMESTAMP', 'date': 'DATE',
+}
+
+
+def taxsale_table_ddl(name, sql_dir=SQL_DIR):
+    """SQLite CREATE TABLE for a Taxsale table or view, built from its script in sql_dir.
+
+    Columns keep their names, order and nearest SQLite type, and the identity
+    column becomes the INTEGER PRIMARY KEY. Constraints and defaults are left
+    out so fixtures only fill in the columns a test needs. Views become
+    tables of untyped columns.
+    """
+    catalog = get_catalog(sql_dir)
+    if catalog.has_table(name):
+        columns = [f'"{column.name}" INTEGER PRIMARY KEY' if column.identity
+                   else f'"{column.name}" {SQLITE_TYPES.get(column.type.lower(), "TEXT")}'
+                   for column in catalog.columns(name)]
+    else:
+        columns = [f'"{column}"' for column in catalog.view(name)['columns']]
+    return f"CREATE TABLE dbo.{name} ({', '.join(columns)})"
+
+
+@pytest.fixture
+def taxsale_tables(taxsale_db):
+    """Create Taxsale tables in taxsale_db from their sql/ scripts, e.g. taxsale_tables('vg_Queues')."""
+    def create(*names, sql_dir=SQL_DIR):
+        for name in names:
+            taxsale_db.execute(taxsale_table_ddl(name, sql_dir))
+        return taxsale_db
+    return create
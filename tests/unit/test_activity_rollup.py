@@ -0,0 +1,88 @@
+"""
+Unit tests for the activity rollup
+"""
+import os
+import pytest
+from app.services.db import TaxsaleSource
+from app.services.activity_rollup import ActivityRollup
+
+
+def log(conn, rows):
+    """Insert (ActivityDate, UserID, ActivityName) rows."""
+    conn.executemany(
+        "INSERT INTO dbo.vg_ActivityLog (ActivityDate, UserID, ActivityName) VALUES (?, ?, ?)", rows)
+
+
+@pytest.fixture
+def activity_db(taxsale_db, taxsale_tables):
+    """Activity log for three users over two days."""
+    taxsale_tables('vg_ActivityLog')
+    log(taxsale_db, [
+        ('2024-05-01 09:00:00', 'alice', 'Login'),
+        ('2024-05-01 09:05:00', 'alice', 'Search'),
+        ('2024-05-01 09:06:00', 'alice', 'Search'),
+        ('2024-05-02 10:00:00', 'alice', 'Bid'),
+        ('2024-05-01 11:00:00', 'bob', 'Login'),
+        ('2024-05-01 11:00:00', 'bob', 'Bid'),
+        ('2024-05-01 08:00:00', 'carol', 'Search'),
+        ('2024-05-02 08:30:00', 'carol', 'Login'),
+    ])
+    return taxsale_db
+
+
+@pytest.fixture
+def rollup(activity_db):
+    rollup = ActivityRollup(source=TaxsaleSource(connection=activity_db), batch_size=3)
+    rollup.update()
+    return rollup
+
+
+def test_rollup_is_compact(rollup):
+    """Repeated activity on the same day collapses to one row."""
+    assert rollup.checkpoint == 8
+    assert rollup.size == 7
+
+
+def test_user_activity(rollup):
+    """Per-user totals and per-day breakdown."""
+    report = rollup.user_activity('alice')
+    assert report['totals'] == {'Login': 1, 'Search': 2, 'Bid': 1}
+    assert report['days'][0] == {'day': '2024-05-01', 'activities': {'Login': 1, 'Search': 2}}
+    assert rollup.user_activity('alice', start='2024-05-02')['totals'] == {'Bid': 1}
+    assert rollup.user_activity('nobody')['days'] == []
+
+
+def test_daily_summary(rollup):
+    """Daily totals and distinct active users."""
+    days = rollup.daily_summary()
+    assert [(d['day'], d['total'], d['active_users']) for d in days] == [
+        ('2024-05-01', 6, 3), ('2024-05-02', 2, 2)]
+    assert rollup.daily_summary(activity_names=['Bid'])[1]['active_users'] == 1
+
+
+def test_funnel_respects_step_order(rollup):
+    """Carol searched before logging in, so she does not reach the Search step."""
+    funnel = rollup.funnel(['Login', 'Search', 'Bid'])
+    assert [step['users'] for step in funnel] == [3, 1, 1]
+    assert funnel[1]['conversion'] == pytest.approx(1 / 3, abs=1e-4)
+
+
+def test_incremental_update_with_saved_state(activity_db, tmp_path):
+    """New ActivityIDs are merged into a restored rollup."""
+    state = str(tmp_path / 'rollup.npz')
+    ActivityRollup(source=TaxsaleSource(connection=activity_db), state_path=state).update()
+    assert os.listdir(tmp_path) == ['rollup.npz']
+
+    log(activity_db, [('2024-05-02 12:00:00', 'bob', 'Bid')])
+    restored = ActivityRollup(source=TaxsaleSource(connection=activity_db), state_path=state)
+    assert restored.update() == 1
+    assert restored.user_activity('bob')['totals'] == {'Login': 1, 'Bid': 2}
+
+
+def test_updates_are_throttled(activity_db):
+    """Within update_interval an update does not read the log unless forced."""
+    rollup = ActivityRollup(source=TaxsaleSource(connection=activity_db), update_interval=30)
+    rollup.update()
+    log(activity_db, [('2024-05-02 12:00:00', 'bob', 'Bid')])
+    assert rollup.update() == 0
+    assert rollup.update(force=True) == 1
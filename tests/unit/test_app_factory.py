@@ -0,0 +1,42 @@
+"""
+Unit tests for the lazy application factory
+"""
+import sys
+import subprocess
+import threading
+import app as app_package
+from config.testing import TestingConfig
+
+
+def test_package_import_defers_blueprints():
+    """Importing the package does not import the routes or build an app."""
+    code = ("import sys, app; "
+            "print('app.routes.reports' in sys.modules, app._app is None, 'sentry_sdk' in sys.modules)")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ['False', 'True', 'False']
+
+
+def test_create_app_records_startup_profile():
+    """Every app gets its blueprints and a profile of how long each phase took."""
+    app = app_package.create_app(TestingConfig)
+    assert {'home', 'auth', 'settings', 'reports'} <= set(app.blueprints)
+    profile = app.extensions['startup_profile']
+    assert [name for name, _ in profile.phases] == ['environment', 'config', 'blueprints', 'handlers', 'process']
+    assert profile.to_dict()['total_ms'] > 0
+    assert 'blueprints' in profile.report()
+
+
+def test_shared_app_is_built_once(monkeypatch):
+    """Concurrent first access constructs the shared app a single time."""
+    built = []
+    monkeypatch.setattr(app_package, '_app', None)
+    monkeypatch.setattr(app_package, 'create_app', lambda: built.append(object()) or built[-1])
+
+    threads = [threading.Thread(target=app_package.get_app) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1
+    assert app_package.app is built[0]
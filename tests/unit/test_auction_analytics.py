@@ -0,0 +1,60 @@
+"""
+Unit tests for the auction results analytics service
+"""
+import pytest
+from app.services.db import TaxsaleSource
+from app.services.auction_analytics import AuctionResultsAnalytics
+
+
+@pytest.fixture
+def analytics(taxsale_db, taxsale_tables):
+    """Analytics engine over a small auction results table."""
+    taxsale_tables('vg_AuctionResults')
+    rows = [
+        # QueueId, VGProductID, MinimumBid, NumberOfBidders, WinningBid, UnpaidBalance, UserID
+        (1, 27, 0.25, 5, 0.25, 100.0, 'a'),
+        (1, 27, 0.25, 3, 4.00, 300.0, 'b'),
+        (2, 27, 0.25, 1, 18.0, 600.0, 'a'),
+        (2, 27, 0.25, 4, 0.00, 0.0, 'c'),
+        (1, 93, 0.25, 9, 1.00, 999.0, 'z'),
+    ]
+    taxsale_db.executemany(
+        "INSERT INTO dbo.vg_AuctionResults (QueueId, PropertyNo, TaxYear, VGProductID, MinimumBid, "
+        "NumberOfBidders, WinningBid, UnpaidBalance, UserID) VALUES (?, 'P', 2024, ?, ?, ?, ?, ?, ?)",
+        [(q, p, m, n, w, u, user) for q, p, m, n, w, u, user in rows])
+    return AuctionResultsAnalytics(source=TaxsaleSource(connection=taxsale_db))
+
+
+def test_county_summary(analytics):
+    """County figures cover only the requested product."""
+    county = analytics.report(27)['county']
+    assert county['certificates'] == 4
+    assert county['total_unpaid'] == 1000.0
+    assert county['median_rate'] == pytest.approx(2.125)
+    assert county['competitive_share'] == 0.75
+    assert county['zero_rate_share'] == 0.25
+    assert county['distinct_winners'] == 3
+    # Winner a holds 700 of 1000, b holds 300
+    assert county['hhi'] == pytest.approx(0.7 ** 2 + 0.3 ** 2)
+    assert sum(county['rate_distribution']['counts']) == 4
+
+
+def test_queue_breakdown(analytics):
+    """Each queue gets its own row with the same statistics."""
+    queues = {q['queue_id']: q for q in analytics.report(27)['queues']}
+    assert set(queues) == {1, 2}
+    assert queues[1]['certificates'] == 2
+    assert queues[1]['weighted_rate'] == pytest.approx((0.25 * 100 + 4.0 * 300) / 400)
+    assert queues[2]['max_bidders'] == 4
+    assert queues[2]['hhi'] == pytest.approx(1.0)
+
+
+def test_report_is_cached_per_product(analytics, taxsale_db):
+    """Reports are served from cache until refreshed or invalidated."""
+    first = analytics.report(27)
+    taxsale_db.execute("DELETE FROM dbo.vg_AuctionResults WHERE VGProductID = 27")
+    assert analytics.report(27) is first
+
+    analytics.invalidate(27)
+    assert analytics.report(27)['county']['certificates'] == 0
+    assert analytics.report(93)['county']['certificates'] == 1
@@ -0,0 +1,115 @@
+"""
+Unit tests for batch certificate-bid ingestion
+"""
+import os
+import pytest
+from flask_executor import Executor
+from app import create_app
+from app.services import batch_ingest
+from app.services.db import TaxsaleSource
+from app.services.batch_ingest import BatchIngestor, map_header
+from config.testing import TestingConfig
+
+
+@pytest.fixture
+def batch_db(taxsale_db, taxsale_tables):
+    """County 27 with three unpaid certificates and one paid."""
+    taxsale_tables('vg_CountyInfo', 'vg_TaxCertificateFile27', 'vg_Batch', 'vg_BatchCerts')
+    taxsale_db.executescript("""
+        INSERT INTO dbo.vg_CountyInfo (VGProductID, TaxCertTableName) VALUES (27, 'vg_TaxCertificateFile27');
+        INSERT INTO dbo.vg_TaxCertificateFile27 (PropertyNo, UnpaidBalance, PaidStatus) VALUES
+            ('A-1', 100.50, 'N'), ('A-2', 200, NULL), ('A-3', 300, 'N'), ('A-4', 400, 'P');
+    """)
+    return taxsale_db
+
+
+@pytest.fixture
+def ingestor(batch_db):
+    ingestor = BatchIngestor(source=TaxsaleSource(connection=batch_db, dialect='sqlite'), chunk_size=2)
+    yield ingestor
+    ingestor.shutdown()
+
+
+def write(tmp_path, text):
+    path = tmp_path / 'bids.csv'
+    path.write_text(text)
+    return str(path)
+
+
+def test_map_header_accepts_aliases():
+    assert map_header(['Seq', 'Parcel ID', 'Balance', 'Your Bid']) == {
+        'SequenceID': 0, 'PropertyNo': 1, 'UnpaidBalance': 2, 'YourBid': 3}
+    with pytest.raises(ValueError, match='YourBid'):
+        map_header(['PropertyNo', 'Amount'])
+
+
+def test_load_validates_and_inserts(batch_db, ingestor, tmp_path, monkeypatch):
+    """Unknown, paid, duplicate and malformed rows are rejected; the rest land in multi-row inserts."""
+    monkeypatch.setattr(batch_ingest, 'ROWS_PER_INSERT', 1)
+    path = write(tmp_path, "PropertyNo,YourBid,UnpaidBalance\n"
+                           "A-1,18,\nA-2,5.25,199\n,,\nA-9,3,\nA-4,1,\nA-1,2,\nA-3,abc,\nA-3,0.25,\n")
+    batch_id = ingestor.create_batch('staff@example.com', path, 27, 'May batch')
+    progress = ingestor.load(path, batch_id, 27).to_dict()
+
+    assert progress['state'] == 'done'
+    assert (progress['rows_read'], progress['rows_inserted'], progress['rows_rejected']) == (7, 3, 4)
+    assert [e['row'] for e in progress['errors']] == [5, 6, 7, 8]
+    assert 'has been paid' in progress['errors'][1]['error']
+    assert batch_db.execute('SELECT SequenceID, PropertyNo, UnpaidBalance, YourBid FROM dbo.vg_BatchCerts '
+                            'ORDER BY CertsID').fetchall() == [(1, 'A-1', 100.5, 18), (2, 'A-2', 199, 5.25),
+                                                               (8, 'A-3', 300, 0.25)]
+    assert batch_db.execute('SELECT Active, FileName FROM dbo.vg_Batch').fetchone() == (1, 'bids.csv')
+
+
+def test_submit_runs_in_background(batch_db, ingestor, tmp_path):
+    """Submitted batches report progress; an abandoned batch leaves no rows behind."""
+    path = write(tmp_path, "PropertyNo,YourBid\nA-1,10\nA-2,11\n")
+    good = ingestor.submit(path, 27)
+    ingestor.shutdown()
+    assert ingestor.progress(good)['rows_inserted'] == 2
+    assert not os.path.exists(path)
+
+    ingestor.max_errors = 0
+    bad = ingestor.submit(write(tmp_path, "PropertyNo,YourBid\nA-3,10\nNOPE,11\n"), 27)
+    ingestor.shutdown()
+    progress = ingestor.progress(bad)
+    assert progress['state'] == 'failed' and 'abandoned' in progress['error']
+    assert batch_db.execute('SELECT BatchID FROM dbo.vg_Batch').fetchall() == [(good,)]
+    assert batch_db.execute('SELECT COUNT(*) FROM dbo.vg_BatchCerts').fetchone()[0] == 2
+    assert ingestor.progress(999) is None
+
+
+def test_only_recent_finished_batches_stay_in_memory(ingestor, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_ingest, 'FINISHED_PROGRESS_KEPT', 1)
+    first = ingestor.submit(write(tmp_path, "PropertyNo,YourBid\nA-1,10\n"), 27)
+    ingestor.shutdown()
+    second = ingestor.submit(write(tmp_path, "PropertyNo,YourBid\nA-2,10\n"), 27)
+    ingestor.shutdown()
+    assert ingestor.progress(first) is None
+    assert ingestor.progress(second)['state'] == 'done'
+
+
+def test_progress_is_visible_to_other_workers(batch_db, tmp_path):
+    """A worker that did not load the batch reads its progress from the shared directory."""
+    source = TaxsaleSource(connection=batch_db, dialect='sqlite')
+    progress_dir = str(tmp_path / 'progress')
+    loader = BatchIngestor(source=source, progress_dir=progress_dir)
+    batch_id = loader.submit(write(tmp_path, "PropertyNo,YourBid\nA-1,10\nA-2,11\n"), 27)
+    loader.shutdown()
+
+    other = BatchIngestor(source=source, progress_dir=progress_dir)
+    progress = other.progress(batch_id)
+    assert (progress['state'], progress['rows_inserted']) == ('done', 2)
+    assert other.progress(batch_id + 1) is None
+
+
+def test_batches_run_on_the_app_executor(batch_db, tmp_path):
+    app = create_app(TestingConfig)
+    executor = Executor(app, name='batch_ingest')
+    ingestor = BatchIngestor(source=TaxsaleSource(connection=batch_db, dialect='sqlite'), executor=executor)
+    with app.test_request_context():
+        batch_id = ingestor.submit(write(tmp_path, "PropertyNo,YourBid\nA-1,10\n"), 27)
+    ingestor.shutdown()
+    executor.shutdown(wait=True)
+    assert ingestor.progress(batch_id)['state'] == 'done'
+    assert app.config['BATCH_INGEST_EXECUTOR_MAX_WORKERS'] == 2
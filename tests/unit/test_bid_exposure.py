@@ -0,0 +1,97 @@
+"""
+Unit tests for the bid budget exposure service
+"""
+import os
+import pytest
+from app.services.db import TaxsaleSource
+from app.services.bid_exposure import BidExposure
+
+
+def bid(conn, rows):
+    """Insert (UserId, PropertyNo, TaxYear, BidStatus, VGProductID, UnpaidBalance) rows."""
+    conn.executemany("""
+        INSERT INTO dbo.vg_BidTransactions (UserId, PropertyNo, TaxYear, BidStatus, VGProductID, UnpaidBalance)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+
+
+def budget(conn, rows):
+    """Insert (UserID, BudgetAmount, VGProductID) rows."""
+    conn.executemany("INSERT INTO dbo.vg_BidBudget (UserID, BudgetAmount, VGProductID) VALUES (?, ?, ?)", rows)
+
+
+@pytest.fixture
+def bids_db(taxsale_db, taxsale_tables):
+    """Two bidders in county 27, one of them also in county 93."""
+    taxsale_tables('vg_BidTransactions', 'vg_BidBudget')
+    bid(taxsale_db, [
+        ('alice', 'P1', 2023, 1, 27, 400.0),
+        ('alice', 'P2', 2023, 1, 27, 300.0),
+        ('alice', 'P3', 2023, 1, 27, 500.0),
+        ('alice', 'P3', 2023, 2, 27, 500.0),   # withdrawn: no longer committed
+        ('bob', 'P1', 2023, 1, 27, 400.0),
+        ('bob', 'P9', 2023, 1, 93, 950.0),
+    ])
+    budget(taxsale_db, [
+        ('alice', 500.0, 27),
+        ('alice', 600.0, 27),                  # raised: the latest budget wins
+        ('bob', 1000.0, 27),
+        ('bob', 1000.0, 93),
+    ])
+    return taxsale_db
+
+
+@pytest.fixture
+def exposure(bids_db):
+    exposure = BidExposure(source=TaxsaleSource(connection=bids_db), batch_size=4)
+    exposure.update()
+    return exposure
+
+
+def test_committed_uses_latest_bid_per_property(exposure):
+    """Only properties whose latest bid is active count towards the committed amount."""
+    assert exposure.bid_checkpoint == 6
+    assert exposure.user_exposure('alice') == [
+        {'user_id': 'alice', 'product_id': 27, 'committed': 700.0, 'budget': 600.0, 'utilization': 1.1667,
+         'properties': 2},
+    ]
+    assert [row['product_id'] for row in exposure.user_exposure('bob')] == [27, 93]
+    assert exposure.user_exposure('nobody') == []
+
+
+def test_over_and_near_budget(exposure):
+    """Over-budget is strictly above the budget; near-budget is between the threshold and it."""
+    assert [row['user_id'] for row in exposure.over_budget()] == ['alice']
+    assert exposure.over_budget(product_id=93) == []
+    near = exposure.near_budget()
+    assert [(row['user_id'], row['product_id']) for row in near] == [('bob', 93)]
+    assert [row['product_id'] for row in exposure.near_budget(threshold=0.3)] == [93, 27]
+
+
+def test_incremental_update_and_state(bids_db, exposure, tmp_path):
+    """New bids and budgets fold in without a rescan, and the state survives a restart."""
+    bid(bids_db, [('alice', 'P2', 2023, 3, 27, 300.0)])
+    budget(bids_db, [('bob', 900.0, 93)])
+    assert exposure.update() == 2
+    assert exposure.over_budget() == [
+        {'user_id': 'bob', 'product_id': 93, 'committed': 950.0, 'budget': 900.0, 'utilization': 1.0556,
+         'properties': 1},
+    ]
+    assert exposure.user_exposure('alice')[0]['utilization'] == pytest.approx(0.6667)
+
+    path = str(tmp_path / 'exposure.npz')
+    exposure.save_state(path)
+    assert os.listdir(tmp_path) == ['exposure.npz']
+    restored = BidExposure(source=exposure.source, state_path=path)
+    assert restored.budget_checkpoint == 5
+    assert restored.update() == 0
+    assert restored.over_budget() == exposure.over_budget()
+
+
+def test_updates_are_throttled(bids_db):
+    """Within update_interval an update does not look for new rows unless forced."""
+    exposure = BidExposure(source=TaxsaleSource(connection=bids_db), update_interval=30)
+    exposure.update()
+    budget(bids_db, [('bob', 900.0, 93)])
+    assert exposure.update() == 0
+    assert exposure.update(force=True) == 1
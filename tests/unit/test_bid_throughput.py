@@ -0,0 +1,74 @@
+"""
+Unit tests for the bid throughput engine
+"""
+import os
+import datetime
+import pytest
+from app.services.db import TaxsaleSource
+from app.services.bid_throughput import BidThroughputEngine
+
+START = datetime.datetime(2024, 5, 1, 10, 0, 0)
+
+
+def insert_bids(conn, bids):
+    """Insert (seconds after START, BidSource, VGProductID) rows."""
+    conn.executemany(
+        "INSERT INTO dbo.vg_BidTransactions (UserId, PropertyNo, TaxYear, BidTime, BidSource, BidStatus, VGProductID) "
+        "VALUES ('u', 'P', 2024, ?, ?, 1, ?)",
+        [(START + datetime.timedelta(seconds=s), source, product) for s, source, product in bids])
+
+
+@pytest.fixture
+def bids_db(taxsale_db, taxsale_tables):
+    """Bid transactions table with a burst at 10:01."""
+    taxsale_tables('vg_BidTransactions')
+    insert_bids(taxsale_db, [(0, 'Web', 27), (5, 'Web', 27), (30, 'Batch', 27)]
+                + [(60, 'Web', 27)] * 4 + [(61, 'Batch', 27)] * 2 + [(10, 'Web', 93)])
+    return taxsale_db
+
+
+def test_batch_report_detects_peaks(bids_db):
+    """Per-second, per-minute and rolling peaks are found across sources."""
+    engine = BidThroughputEngine(source=TaxsaleSource(connection=bids_db), batch_size=3)
+    assert engine.rebuild() == 10
+
+    overall = engine.report(product_id=27, window=2)['overall']
+    assert overall['bids'] == 9
+    assert overall['peak_per_second'] == {'bids': 4, 'at': '2024-05-01T10:01:00'}
+    assert overall['peak_per_minute']['bids'] == 6
+    assert overall['peak_rolling']['bids'] == 6
+    assert overall['peak_rolling']['end'] == '2024-05-01T10:01:01'
+
+
+def test_series_split_by_source_and_product(bids_db):
+    """Each (product, source) pair is reported separately."""
+    engine = BidThroughputEngine(source=TaxsaleSource(connection=bids_db))
+    engine.update()
+
+    series = {(s['product_id'], s['bid_source']): s['bids'] for s in engine.report()['series']}
+    assert series == {(27, 'Batch'): 3, (27, 'Web'): 6, (93, 'Web'): 1}
+
+
+def test_incremental_update_only_reads_new_bids(bids_db, tmp_path):
+    """Updates resume from the persisted BidId checkpoint."""
+    state = str(tmp_path / 'throughput.npz')
+    engine = BidThroughputEngine(source=TaxsaleSource(connection=bids_db), state_path=state)
+    engine.update()
+    assert engine.checkpoint == 10
+    assert os.listdir(tmp_path) == ['throughput.npz']
+
+    insert_bids(bids_db, [(60, 'Web', 27)])
+    restored = BidThroughputEngine(source=TaxsaleSource(connection=bids_db), state_path=state)
+    assert restored.update() == 1
+    assert restored.report(product_id=27)['overall']['peak_per_second']['bids'] == 5
+    assert restored.timeline(product_id=27, bid_source='Web') == [
+        ['2024-05-01T10:00:00', 2], ['2024-05-01T10:01:00', 5]]
+
+
+def test_updates_are_throttled(bids_db):
+    """Within update_interval an update does not query for new bids unless forced."""
+    engine = BidThroughputEngine(source=TaxsaleSource(connection=bids_db), update_interval=30)
+    assert engine.update() == 10
+    insert_bids(bids_db, [(60, 'Web', 27)])
+    assert engine.update() == 0
+    assert engine.update(force=True) == 1
@@ -0,0 +1,92 @@
+"""
+Unit tests for the bidder number service
+"""
+import pytest
+from app.services.db import TaxsaleSource
+from app.services.bidder_numbers import BidderNumberService, FIRST_BIDDER_NUMBER, DEFAULT_MISS_TTL
+
+ALICE = 'AAAAAAAA-0000-0000-0000-000000000001'
+BOB = 'BBBBBBBB-0000-0000-0000-000000000002'
+CAROL = 'CCCCCCCC-0000-0000-0000-000000000003'
+
+
+@pytest.fixture
+def numbers_db(taxsale_db, taxsale_tables):
+    """Alice holds 1005 in county 27; Bob and Carol have pending requests there, Carol also in 93."""
+    taxsale_tables('vg_BidderNumbers')
+    taxsale_db.executescript(f"""
+        INSERT INTO dbo.vg_BidderNumbers (VGProductID, UserId, BidderNumber) VALUES
+            (27, '{ALICE}', '1005'), (27, '{BOB}', NULL), (27, '{CAROL}', NULL), (93, '{CAROL}', NULL);
+    """)
+    return taxsale_db
+
+
+@pytest.fixture
+def service(numbers_db):
+    return BidderNumberService(source=TaxsaleSource(connection=numbers_db, dialect='sqlite'))
+
+
+def pending(conn):
+    return conn.execute('SELECT VGProductID, UserId FROM dbo.vg_BidderNumbers WHERE BidderNumber IS NULL '
+                        'ORDER BY BidderId').fetchall()
+
+
+def test_lookup_is_served_from_memory(numbers_db, service):
+    """After the first load lookups are answered without querying, including users with no number."""
+    assert service.lookup(ALICE.lower(), 27) == '1005'
+    assert service.lookup(BOB, 27) is None and service.is_pending(BOB, 27)
+    assert service.lookup(ALICE, 93) is None and not service.is_pending(ALICE, 93)
+
+    numbers_db.execute(f"UPDATE dbo.vg_BidderNumbers SET BidderNumber = '2000' WHERE UserId = '{ALICE}'")
+    assert service.lookup(ALICE, 27) == '1005'
+    numbers_db.execute(f"INSERT INTO dbo.vg_BidderNumbers (VGProductID, UserId, BidderNumber) VALUES (93, '{ALICE}', '7')")
+    assert service.lookup(ALICE, 93) is None
+    service.reload()
+    assert service.lookup(ALICE, 27) == '2000'
+    assert service.lookup(ALICE, 93) == '7'
+
+
+def test_miss_on_a_new_row_is_read_once(numbers_db, service):
+    """A row added since the last reload is read on the first lookup, then cached."""
+    service.reload()
+    numbers_db.execute(f"INSERT INTO dbo.vg_BidderNumbers (VGProductID, UserId, BidderNumber) VALUES (93, '{BOB}', '8')")
+    assert service.lookup(BOB, 93) == '8'
+    numbers_db.execute(f"DELETE FROM dbo.vg_BidderNumbers WHERE VGProductID = 93 AND UserId = '{BOB}'")
+    assert service.lookup(BOB, 93) == '8'
+
+
+def test_users_without_a_number_are_rechecked_after_the_miss_ttl(numbers_db):
+    """Misses and pending requests are only answered from memory for a few seconds."""
+    now = [0.0]
+    service = BidderNumberService(source=TaxsaleSource(connection=numbers_db, dialect='sqlite'), clock=lambda: now[0])
+    assert service.lookup(ALICE, 93) is None and service.is_pending(BOB, 27)
+
+    # Issued by another worker
+    numbers_db.execute(f"INSERT INTO dbo.vg_BidderNumbers (VGProductID, UserId, BidderNumber) VALUES (93, '{ALICE}', '7')")
+    numbers_db.execute(f"UPDATE dbo.vg_BidderNumbers SET BidderNumber = '1010' WHERE UserId = '{BOB}'")
+    assert service.lookup(ALICE, 93) is None and service.is_pending(BOB, 27)
+    now[0] += DEFAULT_MISS_TTL
+    assert service.lookup(ALICE, 93) == '7'
+    assert not service.is_pending(BOB, 27) and service.lookup(BOB, 27) == '1010'
+
+
+def test_allocate_issues_consecutive_numbers(numbers_db, service):
+    """Pending requests and new users get the next numbers in one batch, never reusing one."""
+    assert service.allocate(27) == {BOB: '1006', CAROL: '1007'}
+    assert service.allocate(93, user_ids=[ALICE]) == {ALICE: str(FIRST_BIDDER_NUMBER)}
+    assert pending(numbers_db) == [(93, CAROL)]
+    assert service.allocate(27, user_ids=[BOB]) == {}
+    assert service.lookup(CAROL, 27) == '1007'
+    assert service.request(BOB, 93)
+    assert not service.request(BOB, 93)
+
+
+def test_purge_pending(numbers_db, service):
+    """Only NULL BidderNumbers are deleted, scoped by county and users."""
+    assert service.remove_pending(BOB, 27)
+    assert pending(numbers_db) == [(27, CAROL), (93, CAROL)]
+    assert service.purge_pending(product_id=93) == 1
+    assert service.purge_pending() == 1
+    assert pending(numbers_db) == []
+    assert service.lookup(ALICE, 27) == '1005'
+    assert not service.is_pending(CAROL, 27)
@@ -0,0 +1,104 @@
+"""
+Unit tests for the county certificate bulk loader
+"""
+import pytest
+from app.services.db import TaxsaleSource
+from app.services.county_import import CountyImporter, ImportValidationError, read_table_layout
+
+DDL = """CREATE TABLE [dbo].[vg_TaxCertificateFile27](
+\t[PropertyNo] [varchar](10) NULL,
+\t[PaidStatus] [varchar](1) NULL,
+\t[Acres] [decimal](5, 2) NULL,
+\t[UnpaidBalance] [decimal](9, 2) NULL,
+\t[TaxYear] [int] NOT NULL,
+\t[Homestead] [bit] NULL
+) ON [PRIMARY]
+GO
+"""
+
+
+@pytest.fixture
+def sql_dir(tmp_path):
+    """A DDL script in the UTF-16 encoding SSMS exports."""
+    (tmp_path / 'dbo.vg_TaxCertificateFile27.Table.sql').write_bytes(DDL.encode('utf-16'))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def source(taxsale_db, taxsale_tables, sql_dir):
+    """County 27 with last year's certificates loaded."""
+    taxsale_tables('vg_CountyInfo', 'vg_DTSImport')
+    taxsale_tables('vg_TaxCertificateFile27', sql_dir=sql_dir)
+    taxsale_db.executescript("""
+        INSERT INTO dbo.vg_CountyInfo (VGProductID, TaxCertTableName) VALUES (27, 'vg_TaxCertificateFile27');
+        INSERT INTO dbo.vg_TaxCertificateFile27 VALUES ('OLD-1', 'N', 1, 10, 2023, 0);
+    """)
+    return TaxsaleSource(connection=taxsale_db, dialect='sqlite')
+
+
+def write_file(tmp_path, lines):
+    path = tmp_path / 'marion_2024.txt'
+    path.write_text('\n'.join(lines) + '\n', encoding='latin-1')
+    return str(path)
+
+
+def test_reads_layout_from_repo_ddl():
+    """Column types and widths come from the scripts in sql/."""
+    layout = read_table_layout('vg_TaxCertificateFile27')
+    assert layout[1] == ('PropertyNo', 'varchar', 30, 0, True)
+    assert ('Acres', 'decimal', 7, 2, True) in layout
+    assert read_table_layout('vg_DTSImport')[0] == ('ImportID', 'int', None, 0, False)
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_load_swaps_table_and_records_import(source, sql_dir, tmp_path, taxsale_db, workers):
+    """Valid rows replace the table in one swap and the import stats are recorded."""
+    path = write_file(tmp_path, [
+        'P-1|P|1.5|0|2024|Y',
+        'P-2|N|0.25|1,200.50|2024|0',
+        'P-3|N||99.5|2024|',
+        'P-4-TOO-LONG|N|1|1|2024|0',
+        'P-5|N|1|1||0',
+    ])
+    importer = CountyImporter(source=source, workers=workers, chunk_size=2, sql_dir=sql_dir)
+    result = importer.load(path, 27)
+
+    assert result['rows_loaded'] == 3
+    assert result['rows_rejected'] == 2
+    assert [e['line'] for e in result['errors']] == [4, 5]
+    assert 'allows 10' in result['errors'][0]['error']
+
+    rows = taxsale_db.execute(
+        "SELECT PropertyNo, Acres, UnpaidBalance, Homestead FROM dbo.vg_TaxCertificateFile27 ORDER BY PropertyNo"
+    ).fetchall()
+    assert rows == [('P-1', 1.5, 0.0, 1), ('P-2', 0.25, 1200.5, 0), ('P-3', None, 99.5, None)]
+
+    stats = taxsale_db.execute("SELECT ImportID, VGProductID, ItemCount, PaidCount, UnpaidCount, UnpaidSum, "
+                               "FileName FROM dbo.vg_DTSImport").fetchall()
+    assert stats == [(result['import_id'], 27, 3, 1, 2, 1300.0, 'marion_2024.txt')]
+
+
+def test_too_many_errors_keeps_live_table(source, sql_dir, tmp_path, taxsale_db):
+    """An abandoned import leaves the live table and vg_DTSImport untouched."""
+    path = write_file(tmp_path, ['P-1|N|1|1|2024|0', '', 'P-2|N|abc|1|2024|0', '  ', 'P-3|N|1|1|2024|maybe'])
+    importer = CountyImporter(source=source, workers=0, max_errors=1, chunk_size=2, sql_dir=sql_dir)
+    with pytest.raises(ImportValidationError) as excinfo:
+        importer.load(path, 27)
+
+    # Blank lines count towards the reported line numbers
+    assert [line for line, _ in excinfo.value.errors] == [3, 5]
+    assert taxsale_db.execute("SELECT PropertyNo FROM dbo.vg_TaxCertificateFile27").fetchall() == [('OLD-1',)]
+    assert taxsale_db.execute("SELECT COUNT(*) FROM dbo.vg_DTSImport").fetchone()[0] == 0
+    staging = taxsale_db.execute(
+        "SELECT COUNT(*) FROM dbo.sqlite_master WHERE name = 'vg_TaxCertificateFile27_Staging'").fetchone()[0]
+    assert staging == 0
+
+
+def test_fixed_width_file(source, sql_dir, tmp_path, taxsale_db):
+    """Fixed-width fields are sliced using the DDL widths."""
+    line = 'P-9'.ljust(10) + 'N' + '12.50'.rjust(7) + '300.00'.rjust(11) + '2024'.ljust(11) + '1'
+    importer = CountyImporter(source=source, workers=0, sql_dir=sql_dir)
+    result = importer.load(write_file(tmp_path, [line]), 27, file_format='fixed')
+    assert result['rows_loaded'] == 1
+    assert taxsale_db.execute("SELECT PropertyNo, Acres, UnpaidBalance, TaxYear FROM dbo.vg_TaxCertificateFile27"
+                              ).fetchall() == [('P-9', 12.5, 300.0, 2024)]
@@ -0,0 +1,59 @@
+"""
+Unit tests for the county snapshot cache
+"""
+import datetime
+import pytest
+from app.services.db import TaxsaleSource
+from app.services.county_snapshot import CountySnapshotCache
+
+
+@pytest.fixture
+def counties_db(taxsale_db, taxsale_tables):
+    """Two enabled counties and one disabled, with dates and auctions."""
+    taxsale_tables('vg_CountyInfo', 'vg_Dates', 'vg_AuctionConfiguration')
+    taxsale_db.executescript("""
+        INSERT INTO dbo.vg_CountyInfo (VGProductID, CountyName, TaxCertTableName, TaxYear, SiteEnabled) VALUES
+            (27, 'Volusia', 'vg_TaxCertificateFile27', 2024, 1), (93, 'Alachua', 'vg_TaxCertificateFile93', 2024, 1),
+            (50, 'Baker', NULL, 2023, 0);
+        INSERT INTO dbo.vg_Dates (VGProductID, BiddingBegins, TaxSaleDate) VALUES
+            (27, '2024-05-01 08:00:00', '2024-06-01 00:00:00');
+        INSERT INTO dbo.vg_AuctionConfiguration (AuctionId, AuctionName, VGProductId, AuctionDeleted) VALUES
+            (2, 'Volusia 2024', 27, 0), (1, 'Volusia test', 27, 1), (3, 'Alachua 2024', 93, 0);
+    """)
+    return taxsale_db
+
+
+@pytest.fixture
+def cache(counties_db):
+    return CountySnapshotCache(source=TaxsaleSource(connection=counties_db, dialect='sqlite'), ttl=60)
+
+
+def test_snapshot_contents(cache):
+    """Counties, dates and auctions are indexed and read-only."""
+    snapshot = cache.get()
+    assert [c.CountyName for c in snapshot.enabled_counties()] == ['Alachua', 'Volusia']
+    assert snapshot.county(27).TaxCertTableName == 'vg_TaxCertificateFile27'
+    assert snapshot.sale_dates(27).TaxSaleDate == datetime.datetime(2024, 6, 1)
+    assert snapshot.sale_dates(93) is None
+    assert [a.AuctionId for a in snapshot.auctions_for(27)] == [2]
+    assert [a.AuctionId for a in snapshot.auctions_for(27, include_deleted=True)] == [1, 2]
+
+    with pytest.raises(TypeError):
+        snapshot.counties[99] = None
+    with pytest.raises(AttributeError):
+        snapshot.extra = 1
+
+
+def test_reload_on_version_bump_and_ttl(counties_db, cache):
+    """The same snapshot is served until it is bumped or expires."""
+    snapshot = cache.get()
+    counties_db.execute("UPDATE dbo.vg_CountyInfo SET SiteEnabled = 1 WHERE VGProductID = 50")
+    assert cache.get() is snapshot
+
+    assert cache.bump() == 1
+    bumped = cache.get()
+    assert bumped.version == 1 and len(bumped.enabled_counties()) == 3
+
+    counties_db.execute("UPDATE dbo.vg_CountyInfo SET TaxYear = 2025")
+    bumped.loaded_at -= 61
+    assert cache.get().county(27).TaxYear == 2025
@@ -0,0 +1,78 @@
+"""
+Unit tests for sampled debug capture
+"""
+import itertools
+import logging
+import pytest
+from app import create_app
+from app.utils import debug_capture
+from app.utils.debug_capture import capture, environment_summary, mask_secret
+from config.testing import TestingConfig
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(debug_capture, '_request_counter', itertools.count(1))
+    app = create_app(TestingConfig)
+    app.config['DEBUG_CAPTURE_SAMPLE_RATE'] = 3
+    return app
+
+
+def test_one_in_n_requests_is_captured_and_dumps_are_built_lazily(app):
+    built = []
+
+    def build():
+        built.append(1)
+        return {'payload': 'x'}
+
+    captured = []
+    for _ in range(9):
+        with app.test_request_context('/settings/api/grafana/test-query'):
+            captured.append(capture('grafana.query.payload', build))
+            # The decision holds for the rest of the request
+            assert capture('grafana.query.response', lambda: 'ok') == captured[-1]
+    assert captured == [False, False, True] * 3
+    assert len(built) == 3
+
+
+def test_session_opt_in_captures_every_request(app, caplog):
+    app.config.update(DEBUG_CAPTURE_SAMPLE_RATE=0, DEBUG_CAPTURE_OPT_IN=True, DEMO_USER_ROLES=('Staff',))
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    caplog.set_level(logging.INFO, logger='app.debug_capture')
+    client.post('/settings/api/settings/openai/test-connection', json={'api_key': 'k'})
+    assert 'openai.environment' not in caplog.text
+
+    response = client.post('/settings/api/debug-capture', json={'enabled': True})
+    assert response.get_json()['enabled'] is True
+    for _ in range(2):
+        client.post('/settings/api/settings/openai/test-connection', json={'api_key': 'k'})
+    assert caplog.text.count('openai.environment') == 2
+
+    # Turning the opt-in off stops capturing sessions that already opted in
+    app.config['DEBUG_CAPTURE_OPT_IN'] = False
+    client.post('/settings/api/settings/openai/test-connection', json={'api_key': 'k'})
+    assert caplog.text.count('openai.environment') == 2
+    assert client.post('/settings/api/debug-capture', json={'enabled': True}).status_code == 403
+
+
+def test_opt_in_is_staff_only(app):
+    app.config['DEBUG_CAPTURE_OPT_IN'] = True
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    assert client.post('/settings/api/debug-capture', json={'enabled': True}).status_code == 403
+
+
+def test_environment_summary_is_read_once(monkeypatch):
+    environment_summary.cache_clear()
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-1234567890abcdef')
+    summary = environment_summary()
+    assert summary['openai_env']['OPENAI_API_KEY'] == mask_secret('sk-1234567890abcdef') == 'sk-1...cdef'
+    assert set(summary['env_files']) == {'.env', '.env.development', '.env.dev', '.env.local'}
+
+    monkeypatch.setenv('OPENAI_API_KEY', 'changed')
+    assert environment_summary() is summary
+    environment_summary.cache_clear()
@@ -0,0 +1,51 @@
+"""
+Unit tests for the import-time profiler and lazy imports
+"""
+import sys
+import pytest
+from app.utils.import_profile import parse_importtime, attribute_imports
+from app.utils.lazy_import import lazy_import, is_loaded
+
+IMPORTTIME = """import time: self [us] | cumulative | imported package
+import time:       100 |        100 | encodings
+import time:       500 |        500 |     markupsafe
+import time:      2000 |       2500 |   jinja2
+import time:      1000 |       4000 | flask
+import time:        50 |         50 |   app.routes.auth
+import time:       200 |        250 | app.routes.home
+import time:       300 |        300 |   numpy
+import time:        40 |        340 | app.routes.reports
+"""
+
+
+def test_imports_are_charged_to_the_blueprint_that_pulled_them_in():
+    """Top-level imports count towards the next target; nested targets are marked as such."""
+    entries = parse_importtime(IMPORTTIME)
+    assert entries[1] == (2, 'markupsafe', 500, 500)
+
+    home, auth, reports = attribute_imports(entries, ['app.routes.home', 'app.routes.auth', 'app.routes.reports'],
+                                            baseline=['encodings'])
+    assert home['total_ms'] == 4.25
+    assert home['modules_imported'] == 5
+    assert [d['module'] for d in home['heaviest']] == ['flask', 'jinja2', 'app.routes.auth']
+    assert auth['imported_by'] == 'app.routes.home' and auth['total_ms'] == 0
+    assert reports['heaviest'] == [{'module': 'numpy', 'ms': 0.3}]
+
+
+def test_lazy_import_defers_module_body(tmp_path, monkeypatch):
+    """The module body runs on first attribute access, once."""
+    (tmp_path / 'lazy_probe.py').write_text("import builtins\nbuiltins.lazy_probe_runs = "
+                                            "getattr(builtins, 'lazy_probe_runs', 0) + 1\nVALUE = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'lazy_probe', raising=False)
+    import builtins
+    monkeypatch.setattr(builtins, 'lazy_probe_runs', 0, raising=False)
+
+    module = lazy_import('lazy_probe')
+    assert builtins.lazy_probe_runs == 0 and not is_loaded('lazy_probe')
+    assert module.VALUE == 42
+    import lazy_probe
+    assert lazy_probe is module and builtins.lazy_probe_runs == 1 and is_loaded('lazy_probe')
+
+    with pytest.raises(ImportError):
+        lazy_import('no_such_module_for_lazy_import')
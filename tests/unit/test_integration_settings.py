@@ -0,0 +1,68 @@
+"""
+Unit tests for the integration settings snapshot
+"""
+import os
+import time
+import signal
+import pytest
+from app import create_app
+from config.integrations import build_settings, reload_integration_settings, SettingsHolder, EXTENSION_KEY
+from config.testing import TestingConfig
+
+
+def test_environment_wins_over_config_and_snapshot_is_immutable():
+    settings = build_settings({'GRAFANA_URL': 'http://config:3000', 'SENTRY_DSN': None},
+                              {'GRAFANA_URL': 'http://env:3000', 'AZURE_DEVOPS_PAT': 'pat-123456',
+                               'APP_INSIGHTS_API_KEY': 'abcdefgh'})
+    assert settings.grafana.url == 'http://env:3000'
+    assert settings.sentry.dsn is None
+    assert settings.openai.deployment == 'gpt-3.5-turbo'
+    assert dict(settings.azure_env_masked) == {'APP_INSIGHTS_API_KEY': 'abcd...', 'AZURE_DEVOPS_PAT': 'pat-...'}
+
+    with pytest.raises(AttributeError):
+        settings.grafana.url = 'http://other'
+    with pytest.raises(TypeError):
+        settings.azure_env_masked['AZURE_DEVOPS_PAT'] = 'leak'
+
+
+def test_handlers_read_the_snapshot_until_it_is_reloaded(monkeypatch):
+    monkeypatch.delenv('APP_INSIGHTS_APPLICATION_ID', raising=False)
+    monkeypatch.delenv('APP_INSIGHTS_API_KEY', raising=False)
+    app = create_app(TestingConfig)
+    client = app.test_client()
+
+    monkeypatch.setenv('APP_INSIGHTS_APPLICATION_ID', 'app-123456')
+    monkeypatch.setenv('APP_INSIGHTS_API_KEY', 'key')
+    assert b'not properly configured' in client.get('/debug-appinsights').data
+
+    assert reload_integration_settings(app).version == 2
+    assert client.get('/debug-appinsights').get_json()['app_id'] == 'app-12...'
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGHUP'), reason='SIGHUP is POSIX only')
+def test_sighup_reloads_every_app(monkeypatch):
+    app = create_app(TestingConfig)
+    holder = app.extensions[EXTENSION_KEY]
+    monkeypatch.setenv('GRAFANA_URL', 'http://reloaded:3000')
+
+    os.kill(os.getpid(), signal.SIGHUP)
+    deadline = time.monotonic() + 5
+    while holder.current.version == 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert holder.current.grafana.url == 'http://reloaded:3000'
+
+
+def test_reload_keeps_real_environment_over_env_file(monkeypatch, tmp_path):
+    env_file = tmp_path / '.env'
+    env_file.write_text('GRAFANA_URL=http://dotenv:3000\nGRAFANA_API_TOKEN=token-1\n')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('GRAFANA_URL', 'http://real:3000')
+    # As load_dotenv() leaves it: only variables missing from the real environment are loaded
+    monkeypatch.setenv('GRAFANA_API_TOKEN', 'token-1')
+    monkeypatch.delenv('OPENAI_DEPLOYMENT', raising=False)
+    holder = SettingsHolder({})
+
+    env_file.write_text('GRAFANA_URL=http://dotenv:3000\nGRAFANA_API_TOKEN=token-2\nOPENAI_DEPLOYMENT=gpt-4\n')
+    settings = holder.reload()
+    assert settings.grafana == ('http://real:3000', 'token-2')
+    assert settings.openai.deployment == 'gpt-4'
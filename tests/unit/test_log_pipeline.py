@@ -0,0 +1,116 @@
+"""
+Unit tests for the queued, batched log pipeline
+"""
+import io
+import sys
+import json
+import logging
+from app.utils.log_pipeline import (LogPipeline, BatchStreamHandler, JsonFormatter, RateLimitFilter,
+                                    install_pipeline)
+
+
+class CountingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+
+def make_pipeline(name, **kwargs):
+    stream = CountingStream()
+    handler = BatchStreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    pipeline = LogPipeline([handler], **kwargs)
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(pipeline.queue_handler)
+    return pipeline, logger, stream
+
+
+def lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_written_as_json_in_batches():
+    """Records queued while the writer is busy go out in one write; args and exceptions are captured."""
+    pipeline, logger, stream = make_pipeline('tests.pipeline.batch', rate=0)
+    for i in range(50):
+        logger.info("bid %s accepted", i)
+    try:
+        raise ValueError('bad bid')
+    except ValueError:
+        logger.exception("bid rejected")
+
+    pipeline.start()
+    pipeline.stop()
+    entries = lines(stream)
+    assert stream.writes == 1
+    assert len(entries) == 51
+    assert entries[7]['message'] == 'bid 7 accepted' and entries[7]['level'] == 'INFO'
+    assert entries[-1]['logger'] == 'tests.pipeline.batch'
+    assert 'ValueError: bad bid' in entries[-1]['exception']
+
+
+def test_rate_limit_is_per_logger_and_spares_errors():
+    rate_limit = RateLimitFilter(rate=0.001, burst=3)
+
+    def record(name, level=logging.INFO):
+        return logging.makeLogRecord({'name': name, 'levelno': level, 'msg': 'm'})
+
+    assert [rate_limit.filter(record('chatty')) for _ in range(10)] == [True] * 3 + [False] * 7
+    assert rate_limit.filter(record('quiet'))
+    assert rate_limit.filter(record('chatty', logging.ERROR))
+
+    # Once the logger may write again, the next record says how many were dropped
+    rate_limit._buckets['chatty']._tokens = 1
+    allowed = record('chatty')
+    assert rate_limit.filter(allowed) and allowed.suppressed == 7
+
+
+def test_full_queue_drops_instead_of_blocking():
+    pipeline, logger, stream = make_pipeline('tests.pipeline.full', queue_size=2, rate=0)
+    for i in range(5):
+        logger.warning("retrying %s", i)
+    assert pipeline.queue_handler.dropped == 3
+
+    pipeline.start()
+    pipeline.stop()
+    messages = [entry['message'] for entry in lines(stream)]
+    assert messages == ['retrying 0', 'retrying 1', 'Log queue full, dropped 3 records']
+
+
+def test_install_pipeline_replaces_only_earlier_pipelines():
+    logger = logging.getLogger('tests.pipeline.install')
+    logger.propagate = False
+    foreign = logging.StreamHandler(io.StringIO())
+    logger.addHandler(foreign)
+    first = LogPipeline([BatchStreamHandler(io.StringIO())])
+    second = LogPipeline([BatchStreamHandler(io.StringIO())])
+    install_pipeline(first, logger)
+    install_pipeline(second, logger, level=logging.INFO)
+    try:
+        assert logger.handlers == [foreign, second.queue_handler]
+        assert logger.level == logging.INFO
+    finally:
+        first.stop()
+        second.stop()
+        logger.removeHandler(foreign)
+
+
+def test_console_handler_writes_to_the_current_stdout(monkeypatch):
+    """A stdout replaced and closed after install is neither written to nor flushed."""
+    old_stdout = io.StringIO()
+    monkeypatch.setattr(sys, 'stdout', old_stdout)
+    pipeline = LogPipeline([BatchStreamHandler()], rate=0)
+    pipeline.start()
+    old_stdout.close()
+    new_stdout = io.StringIO()
+    monkeypatch.setattr(sys, 'stdout', new_stdout)
+
+    pipeline.queue_handler.handle(logging.makeLogRecord({'msg': 'after the swap', 'levelno': logging.INFO}))
+    pipeline.stop()
+    assert new_stdout.getvalue() == 'after the swap\n'
@@ -0,0 +1,90 @@
+"""
+Unit tests for the unread message index
+"""
+import datetime
+import pytest
+from app import create_app
+from app.services import message_index
+from app.services.db import TaxsaleSource
+from app.services.message_index import UnreadMessageIndex
+from config.testing import TestingConfig
+
+NOW = datetime.datetime(2024, 5, 1, 12, 0)
+USER = 'A1B2C3D4-0000-0000-0000-000000000001'
+
+
+@pytest.fixture
+def messages_db(taxsale_db, taxsale_tables):
+    """Three live messages in county 27, one in county 93 and one already expired."""
+    taxsale_tables('vg_Messages', 'vg_ReadMessages')
+    taxsale_db.executescript("""
+        INSERT INTO dbo.vg_Messages (VGProductId, Message, ExpirationDate) VALUES
+            (27, 'Sale opens', NULL), (27, 'Deposit reminder', '2024-05-02 00:00:00'),
+            (93, 'Welcome', NULL), (27, 'Old notice', '2024-04-01 00:00:00'), (27, 'Queue 3 moved', NULL);
+        INSERT INTO dbo.vg_ReadMessages (MessageId, UserId) VALUES
+            (1, 'a1b2c3d4-0000-0000-0000-000000000001'), (4, 'a1b2c3d4-0000-0000-0000-000000000001');
+    """)
+    return taxsale_db
+
+
+@pytest.fixture
+def index(messages_db):
+    index = UnreadMessageIndex(source=TaxsaleSource(connection=messages_db, dialect='sqlite'))
+    index.refresh(now=NOW)
+    return index
+
+
+def test_unread_counts(index):
+    """Reads are matched case-insensitively and expired messages never count."""
+    assert index.unread_counts(USER) == {27: 2, 93: 1}
+    assert index.unread_count(USER) == 3
+    assert index.unread_messages(USER, 27) == [2, 5]
+    assert index.unread_count('someone-else', product_id=27) == 3
+
+
+def test_publish_read_and_expiry(messages_db, index):
+    """Posting, reading and expiry update the bitsets without a rescan."""
+    message_id = index.post_message(93, 'Results posted')
+    assert index.unread_messages(USER, 93) == [3, message_id]
+
+    assert index.record_read(USER.lower(), 2)
+    assert index.record_read(USER, 2)
+    assert messages_db.execute('SELECT COUNT(*) FROM dbo.vg_ReadMessages WHERE MessageId = 2').fetchone()[0] == 1
+    assert not index.record_read(USER, 4)
+
+    index.publish(7, 27, NOW + datetime.timedelta(hours=1), now=NOW)
+    assert index.unread_count(USER, 27) == 2
+    assert index.expire(now=NOW + datetime.timedelta(days=1)) == 2
+    assert index.unread_messages(USER, 27) == [5]
+
+    # Another process's rows are picked up on the next refresh
+    messages_db.execute("INSERT INTO dbo.vg_ReadMessages (MessageId, UserId) VALUES (5, ?)", (USER,))
+    index.refresh(force=True, now=NOW)
+    assert index.unread_counts(USER) == {93: 2}
+
+
+def test_compaction_keeps_reads(index, monkeypatch):
+    """Expired slots are reclaimed and surviving read bits are remapped."""
+    monkeypatch.setattr(message_index, 'MIN_COMPACT_SLOTS', 0)
+    for message_id in range(100, 110):
+        index.publish(message_id, 27, NOW + datetime.timedelta(minutes=message_id % 2), now=NOW)
+    index.mark_read(USER, 5)
+    index.mark_read(USER, 101)
+    index.expire(now=NOW + datetime.timedelta(seconds=30))
+    assert index._counties[27].message_ids == [1, 2, 5, 101, 103, 105, 107, 109]
+    assert index.unread_messages(USER, 27) == [2, 103, 105, 107, 109]
+
+
+def test_routes_act_for_the_signed_in_user_only(index):
+    app = create_app(TestingConfig)
+    app.extensions.setdefault('reporting_services', {})['message_index'] = index
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = USER
+
+    assert client.get('/reports/api/messages/unread').get_json()['counties']['93'] == 1
+    assert client.post('/reports/api/messages/3/read', json={'user_id': 'someone-else'}).status_code == 200
+    assert index.unread_count(USER, 93) == 0
+    assert index.unread_count('someone-else', 93) == 1
+
+    assert client.post('/reports/api/messages', json={'product_id': 93, 'message': 'x'}).status_code == 403
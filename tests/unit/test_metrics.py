@@ -0,0 +1,67 @@
+"""
+Unit tests for the request timing middleware and /metrics endpoint
+"""
+import os
+import sys
+import subprocess
+import pytest
+from app import create_app
+from app.utils.metrics import track_upstream, record_cache
+from config.testing import TestingConfig
+
+WORKER = """
+from app import create_app
+from config.testing import TestingConfig
+create_app(TestingConfig).test_client().get('/metrics', buffered=True)
+"""
+
+SCRAPE = """
+from app.utils.metrics import render_metrics
+print(render_metrics()[0].decode())
+"""
+
+
+@pytest.fixture
+def client():
+    app = create_app(TestingConfig)
+    return app.test_client()
+
+
+def test_requests_upstream_calls_and_cache_lookups_are_exported(client):
+    """Per-endpoint latency, upstream timings and cache results appear in the scrape."""
+    client.get('/no-such-page', buffered=True)
+    with pytest.raises(RuntimeError):
+        with track_upstream('grafana', 'query'):
+            raise RuntimeError('timeout')
+    record_cache('county_snapshot', True)
+
+    client.get('/metrics', buffered=True)
+    response = client.get('/metrics', buffered=True)
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    body = response.get_data(as_text=True)
+    assert 'portal_request_duration_seconds_count{endpoint="metrics.metrics",method="GET",status="200"}' in body
+    assert 'portal_request_duration_seconds_count{endpoint="unmatched",method="GET",status="404"}' in body
+    assert 'portal_upstream_duration_seconds_count{operation="query",outcome="error",service="grafana"}' in body
+    assert 'portal_cache_requests_total{cache="county_snapshot",result="hit"}' in body
+    assert 'portal_requests_in_flight ' in body
+
+
+def test_metrics_token_is_required_when_configured(client):
+    client.application.config['METRICS_TOKEN'] = 'scrape-secret'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+
+
+def test_metrics_are_closed_without_a_token_when_one_is_required(client):
+    client.application.config.update(METRICS_TOKEN=None, METRICS_REQUIRE_TOKEN=True)
+    assert client.get('/metrics').status_code == 403
+
+
+def test_samples_are_aggregated_across_worker_processes(tmp_path):
+    """Each worker writes to the shared directory; a scrape from any process sees all of them."""
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    for _ in range(2):
+        subprocess.run([sys.executable, '-c', WORKER], env=env, check=True, capture_output=True)
+    result = subprocess.run([sys.executable, '-c', SCRAPE], env=env, check=True, capture_output=True, text=True)
+    assert 'portal_request_duration_seconds_count{endpoint="metrics.metrics",method="GET",status="200"} 2.0' in result.stdout
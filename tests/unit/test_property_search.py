@@ -0,0 +1,103 @@
+"""
+Unit tests for the property search index
+"""
+import pytest
+from app.services.db import TaxsaleSource
+from app.services.property_search import PropertySearchIndex, edit_distance
+
+
+def insert_properties(conn, table, rows):
+    """Insert (PropertyNo, Name, LocStreet, JustValue, Acres, UnpaidBalance) rows."""
+    conn.executemany(
+        f"INSERT INTO dbo.{table} (PropertyNo, Name, LocStreet, JustValue, Acres, UnpaidBalance, "
+        f"DescriptionLine1) VALUES (?, ?, ?, ?, ?, ?, 'LOT 1 BLK A')", rows)
+
+
+@pytest.fixture
+def source(taxsale_db, taxsale_tables):
+    """Two counties, each with an import recorded in vg_DTSImport."""
+    taxsale_tables('vg_CountyInfo', 'vg_DTSImport', 'vg_TaxCertificateFile27', 'vg_TaxCertificateView27',
+                   'vg_TaxCertificateFile93')
+    taxsale_db.executescript("""
+        INSERT INTO dbo.vg_CountyInfo (VGProductID, TaxCertTableName, TaxViewTableName) VALUES
+            (27, 'vg_TaxCertificateFile27', 'vg_TaxCertificateView27'), (93, 'vg_TaxCertificateFile93', NULL);
+        INSERT INTO dbo.vg_DTSImport (VGProductID, ImportDate, ItemCount, UnpaidSum, FileName) VALUES
+            (27, '2024-04-01', 3, 0, 'marion.txt'), (93, '2024-04-01', 1, 0, 'walton.txt');
+        INSERT INTO dbo.vg_TaxCertificateView27 (PropertyNumber, PropertyUseCodeDesc, BuildingTypeDesc) VALUES
+            ('27-001', 'CONDO', 'MASONRY');
+    """)
+    insert_properties(taxsale_db, 'vg_TaxCertificateFile27', [
+        ('27-001', 'SMITH JOHN', 'OAK RIDGE', 45000, 0.2, 800.5),
+        ('27-002', 'SMYTHE MARY', 'PINE ST', 120000, 2.5, 3100),
+        ('27-003', 'JONES ROBERT', 'OAKWOOD DR', 600000, 40, 12000),
+    ])
+    insert_properties(taxsale_db, 'vg_TaxCertificateFile93', [('93-001', 'SMITH ANNA', 'BAY DR', 90000, 1, 400)])
+    return TaxsaleSource(connection=taxsale_db, dialect='sqlite')
+
+
+@pytest.fixture
+def index(source):
+    """Index built from every county with an import."""
+    index = PropertySearchIndex(':memory:', source=source)
+    assert sorted(index.refresh()) == [27, 93]
+    yield index
+    index.close()
+
+
+def property_numbers(result):
+    return sorted(row['property_no'] for row in result['rows'])
+
+
+def test_prefix_search(index):
+    """Words match as prefixes across owner, address, description and view text."""
+    assert property_numbers(index.search('oak')) == ['27-001', '27-003']
+    assert property_numbers(index.search('smi', product_id=93)) == ['93-001']
+    assert property_numbers(index.search('condo')) == ['27-001']
+
+
+def test_fuzzy_search(index):
+    """Fuzzy search tolerates a typo per short word."""
+    assert property_numbers(index.search('jomes')) == []
+    assert property_numbers(index.search('jomes', fuzzy=True)) == ['27-003']
+    # Candidates must share the first two letters
+    assert property_numbers(index.search('hones', fuzzy=True)) == []
+    assert edit_distance('smith', 'smyth', 1) == 1
+    assert edit_distance('smith', 'jones', 1) == 2
+
+
+def test_numeric_ranges_and_facets(index):
+    """Ranges filter the matches and facets count them per bucket."""
+    result = index.search(ranges={'just_value': (50000, None), 'acres': (None, 10)})
+    assert property_numbers(result) == ['27-002', '93-001']
+    assert result['total'] == 2
+
+    facets = index.search('smith')['facets']
+    just_value = {bucket['min']: bucket['count'] for bucket in facets['just_value']}
+    assert just_value[25000] == 1 and just_value[50000] == 1
+    assert sum(bucket['count'] for bucket in facets['unpaid_balance']) == 2
+
+
+def test_reindexes_on_new_import(index, taxsale_db):
+    """Only counties with a newer vg_DTSImport row are rebuilt."""
+    assert index.refresh(force=True) == []
+    insert_properties(taxsale_db, 'vg_TaxCertificateFile93', [('93-002', 'SMITH CARL', 'BAY DR', 10, 1, 1)])
+    taxsale_db.execute("INSERT INTO dbo.vg_DTSImport (VGProductID, ImportDate, ItemCount, UnpaidSum, FileName) "
+                       "VALUES (93, '2024-05-01', 2, 0, 'walton2.txt')")
+    assert index.refresh() == []
+    assert index.refresh(force=True) == [93]
+    assert property_numbers(index.search('smith', product_id=93)) == ['93-001', '93-002']
+    assert [c['row_count'] for c in index.status()] == [3, 2]
+
+
+def test_workers_read_what_the_refresher_wrote(source, tmp_path):
+    """The refresher writes a shared WAL-mode file that other processes search without reindexing."""
+    path = str(tmp_path / 'property_search.db')
+    refresher = PropertySearchIndex(path, source=source)
+    worker = PropertySearchIndex(path, source=source)
+    assert worker.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    assert worker.search('smith')['total'] == 0
+    refresher.refresh(force=True)
+    assert property_numbers(worker.search('smith')) == ['27-001', '93-001']
+    refresher.close()
+    worker.close()
@@ -0,0 +1,105 @@
+"""
+Unit tests for the queue-closing load simulator
+"""
+import datetime
+import numpy as np
+import pytest
+from app.services.db import TaxsaleSource
+from app.services.queue_simulator import (QueueLoadSimulator, expand_closing_times, forecast_load, curve_path,
+                                          save_curve, load_curve)
+
+
+def minutes(*values):
+    return [str(np.datetime64(int(m), 'm')) for m in values]
+
+
+def test_expand_skips_weekends_and_wraps_days():
+    """Closes stop at the end of the daily window and resume on the next weekday."""
+    closes = expand_closing_times(datetime.datetime(2024, 5, 31, 16, 0), 15, 5, False,
+                                  datetime.datetime(1900, 1, 1, 9, 0), datetime.datetime(1900, 1, 1, 16, 30))
+    assert minutes(*closes) == ['2024-05-31T16:00', '2024-05-31T16:15', '2024-05-31T16:30',
+                                '2024-06-03T09:00', '2024-06-03T09:15']
+
+    weekend = expand_closing_times(datetime.datetime(2024, 6, 1, 8, 0), 30, 2, True,
+                                   datetime.datetime(1900, 1, 1, 9, 0), datetime.datetime(1900, 1, 1, 17, 0))
+    assert minutes(*weekend) == ['2024-06-01T09:00', '2024-06-01T09:30']
+
+
+def test_forecast_convolves_curve():
+    """Each queue's items spread along the curve ending at its close."""
+    curve = np.array([0.5, 1.0, 2.0])
+    origin, bids, rps = forecast_load(np.array([100, 101]), np.array([10.0, 20.0]), curve)
+    assert origin == 98
+    assert bids.tolist() == [5.0, 20.0, 40.0, 40.0]
+    assert rps[2] == pytest.approx(40 / 60)
+
+
+@pytest.fixture
+def source(taxsale_db, taxsale_tables):
+    """A past auction with bids before its closes (and two half-NULL links) and a future auction to forecast."""
+    taxsale_tables('vg_AuctionConfiguration', 'vg_QueueConfiguration', 'vg_Queues', 'vg_QueueLinks',
+                   'vg_BidTransactions')
+    taxsale_db.executescript("""
+        INSERT INTO dbo.vg_AuctionConfiguration (AuctionId, VGProductId) VALUES (1, 27), (2, 27);
+        INSERT INTO dbo.vg_Queues (QueueID, ItemCount, AuctionEndDate, AuctionId) VALUES
+            (10, 2, '2023-06-01 10:00:00', 1), (11, 2, '2023-06-01 10:30:00', 1);
+        INSERT INTO dbo.vg_QueueLinks (QueueID, SequenceID) VALUES (10, 1), (10, 2), (11, 3), (11, 4),
+            (NULL, 5), (11, NULL);
+        INSERT INTO dbo.vg_BidTransactions (BidTime, SequenceNo, VGProductID) VALUES
+            ('2023-06-01 09:59:10', 1, 27), ('2023-06-01 09:59:40', 2, 27), ('2023-06-01 10:00:00', 2, 27),
+            ('2023-06-01 10:29:30', 3, 27), ('2023-06-01 10:30:00', 4, 27),
+            ('2023-06-01 09:00:00', 4, 27), ('2023-06-01 10:05:00', 1, 27), ('2023-06-01 09:59:00', 1, 93);
+
+        INSERT INTO dbo.vg_QueueConfiguration (
+            AuctionId, ItemsPerQueue, Minutes, FirstQueueClosingDate, AllowWeekends, ClosingStartTime,
+            ClosingEndTime) VALUES
+            (2, 100, 10, '2024-06-03 09:00:00', 0, '1900-01-01 09:00:00', '1900-01-01 09:10:00');
+        INSERT INTO dbo.vg_Queues (QueueID, ItemCount, AuctionEndDate, AuctionId) VALUES
+            (20, 100, NULL, 2), (21, 100, NULL, 2), (22, 50, NULL, 2);
+    """)
+    return TaxsaleSource(connection=taxsale_db, dialect='sqlite')
+
+
+def test_arrival_curve_from_history(source):
+    """Bids are placed relative to their queue's close and normalised per item."""
+    curve = QueueLoadSimulator(source=source, lookback=2).arrival_curve()
+    # Four items; bids land at -1 minute (three) and at the close (two)
+    assert curve.tolist() == [0.0, 0.75, 0.5]
+
+
+def test_simulate_whole_sale(source):
+    """The forecast covers every close, including the wrap to the next day."""
+    result = QueueLoadSimulator(source=source, lookback=2).simulate(2, history_product_ids=[27])
+    assert [q['closes_at'] for q in result['queues']] == ['2024-06-03T09:00', '2024-06-03T09:10',
+                                                          '2024-06-04T09:00']
+    assert result['peak'] == {'minute': '2024-06-03T08:59', 'expected_bids': 75.0, 'requests_per_second': 1.25}
+    assert result['total_expected_bids'] == 312.5
+    assert result['timeline'][-1]['minute'] == '2024-06-04T09:00'
+
+
+def test_learned_curves_are_reused(source):
+    """Forecasts reuse the curve learned for the same counties and lookback until it expires."""
+    now = [0.0]
+    simulator = QueueLoadSimulator(source=source, lookback=2, curve_ttl=60, clock=lambda: now[0])
+    learned = []
+    arrival_curve = simulator.arrival_curve
+    simulator.arrival_curve = lambda *args: learned.append(args) or arrival_curve(*args)
+
+    simulator.simulate(2, history_product_ids=[27])
+    simulator.simulate(2, history_product_ids=[27, 27])
+    simulator.simulate(2, history_product_ids=[27], lookback=3)
+    assert learned == [((27,), 2), ((27,), 3)]
+
+    now[0] = 61
+    simulator.simulate(2, history_product_ids=[27])
+    assert len(learned) == 3
+
+
+def test_saved_curve_drives_the_forecast(source, tmp_path):
+    """The curve over every county is learned once, saved, and reused by forecasts."""
+    simulator = QueueLoadSimulator(source=source, lookback=2)
+    path = curve_path(str(tmp_path), 2)
+    assert load_curve(path) is None
+    save_curve(simulator.arrival_curve(), path)
+    assert load_curve(path).tolist() == [0.0, 0.75, 0.5]
+    assert simulator.simulate(2, curve=load_curve(path)) == simulator.simulate(2, history_product_ids=[27])
@@ -0,0 +1,100 @@
+"""
+Unit tests for the payment reconciliation engine
+"""
+import pytest
+from app.services.db import TaxsaleSource
+from app.services.reconciliation import (ReconciliationEngine, TRANSACTION_COLUMNS, RESPONSE_COLUMNS,
+                                         REFUND_COLUMNS, ERROR_COLUMNS, save_result, load_result)
+from app.services.replication import ReplicationPipeline
+from app.services.reporting_store import ReportingStore, REPLICATED_TABLES
+
+
+@pytest.fixture
+def source(taxsale_db, taxsale_tables):
+    """Four transaction tables covering each reconciliation outcome."""
+    taxsale_tables('vg_Transactions', 'vg_TransactionResponse', 'vg_TransactionRefund', 'vg_TransactionErrors')
+    transactions = [
+        # TransID, InvoiceKey, TransactionTry, Amount, VGProductID
+        (2000, 1, 1, 100.0, 27),   # clean
+        (2001, 2, 1, 50.0, 27),    # declined, then retried
+        (2002, 2, 2, 50.0, 27),
+        (2003, 3, 1, 75.0, 27),    # no gateway response
+        (2004, 4, 1, 200.0, 93),   # later refunded
+        (2005, 5, 1, -200.0, 93),  # the refund itself
+    ]
+    taxsale_db.executemany(
+        "INSERT INTO dbo.vg_Transactions (TransID, InvoiceKey, TransactionIndicator, TransactionTry, TransDate, "
+        "UserId, EngineResponse, Amount, TenderID, AccountType, PaymentType, ReferenceNumber, TransactionType, "
+        "VGProductID) VALUES (?, ?, 'P', ?, '2024-06-01 10:00:00', 'u', 0, ?, 1, 'VISA', 'CC', 'ref', 1, ?)",
+        transactions)
+    taxsale_db.executemany(
+        "INSERT INTO dbo.vg_TransactionResponse (InvoiceKey, PNRef, Result, ResponseMessage) VALUES (?, 'pn', ?, '')",
+        [(1, 0), (2, 12), (4, 0), (5, 0), (99, 0)])
+    taxsale_db.execute("INSERT INTO dbo.vg_TransactionRefund VALUES (2005, 2004, 'duplicate', 'staff')")
+    taxsale_db.execute("INSERT INTO dbo.vg_TransactionErrors (InvoiceKey, ErrResponse, ErrMsg) "
+                       "VALUES (2, '12', 'Declined')")
+    return TaxsaleSource(connection=taxsale_db)
+
+
+def test_flags_and_summary(source):
+    """Each transaction is flagged and totalled under its product."""
+    result = ReconciliationEngine(source=source, chunk_size=2).reconcile()
+    assert result['chunks'] == 50
+
+    county = result['summary']['27']
+    assert county['transactions'] == 4
+    assert county['matched'] == 1
+    assert county['retried'] == 2
+    assert county['declined'] == 2
+    assert county['errored'] == 2
+    assert county['unmatched'] == 1
+
+    refunded = result['summary']['93']
+    assert refunded['refunded'] == 1
+    assert refunded['refund_amount'] == -200.0
+    assert result['orphan_responses'] == 1
+    assert [e['trans_id'] for e in result['exceptions']['unmatched']] == [2003]
+
+
+def test_product_filter_and_exception_limit(source):
+    """Filtering by product and capping the listed exceptions."""
+    result = ReconciliationEngine(source=source, exception_limit=1).reconcile(product_id=27)
+    assert list(result['summary']) == ['27']
+    assert result['summary']['27']['retried'] == 2
+    assert len(result['exceptions']['retried']) == 1
+    assert result['orphan_responses'] is None
+
+
+def test_replica_reconciles_invoice_keys_above_the_replication_key(source, taxsale_db, tmp_path):
+    """InvoiceKey ranges come from InvoiceKey itself, not the TransID high-water mark."""
+    taxsale_db.execute(
+        "INSERT INTO dbo.vg_Transactions (TransID, InvoiceKey, TransactionTry, TransDate, UserId, EngineResponse, "
+        "Amount, TransactionType, VGProductID) VALUES (2006, 900000, 1, '2024-06-02 10:00:00', 'u', 0, 10.0, 1, 50)")
+    columns = {
+        'vg_Transactions': TRANSACTION_COLUMNS,
+        'vg_TransactionResponse': ('TransactionResponseID',) + RESPONSE_COLUMNS,
+        'vg_TransactionRefund': REFUND_COLUMNS,
+        'vg_TransactionErrors': ('ErrID',) + ERROR_COLUMNS,
+    }
+    tables = {table: dict(REPLICATED_TABLES[table], timestamp=None,
+                          columns={c: REPLICATED_TABLES[table]['columns'][c] for c in names})
+              for table, names in columns.items()}
+    store = ReportingStore(str(tmp_path / 'store'), tables=tables)
+    ReplicationPipeline(store, source=source).sync()
+
+    live = ReconciliationEngine(source=source, chunk_size=100000).reconcile()
+    replica = ReconciliationEngine(source=store, chunk_size=100000).reconcile()
+    assert replica['summary']['50']['transactions'] == 1
+    assert replica['summary'] == live['summary']
+
+
+def test_saved_results_are_kept_per_product(source, tmp_path):
+    directory = str(tmp_path / 'reconciliation')
+    assert load_result(directory, product_id=27) is None
+    save_result(ReconciliationEngine(source=source).reconcile(product_id=27), directory)
+    save_result(ReconciliationEngine(source=source).reconcile(), directory)
+
+    assert load_result(directory, product_id=27)['summary'].keys() == {'27'}
+    assert load_result(directory)['summary'].keys() == {'27', '93'}
+    assert load_result(directory, product_id=93) is None
+    assert sorted(p.name for p in (tmp_path / 'reconciliation').iterdir()) == ['27.json', 'all.json']
@@ -0,0 +1,100 @@
+"""
+Unit tests for the reporting store and replication pipeline
+"""
+import datetime
+import pytest
+from app.services.db import TaxsaleSource
+from app.services import reporting_store
+from app.services.reporting_store import ReportingStore
+from app.services.replication import ReplicationPipeline, replication_lag
+from app.services.bid_throughput import BidThroughputEngine
+
+START = datetime.datetime(2024, 5, 1, 10, 0, 0)
+
+
+def insert_bids(conn, bids):
+    """Insert (seconds after START, BidSource, VGProductID) rows."""
+    conn.executemany(
+        "INSERT INTO dbo.vg_BidTransactions (UserId, PropertyNo, TaxYear, BidTime, BidSource, BidStatus, VGProductID) "
+        "VALUES ('u', 'P-100', 2024, ?, ?, 1, ?)",
+        [(START + datetime.timedelta(seconds=s), source, product) for s, source, product in bids])
+
+
+@pytest.fixture
+def source(taxsale_db, taxsale_tables):
+    """Taxsale source with a bid transactions table."""
+    taxsale_tables('vg_BidTransactions')
+    insert_bids(taxsale_db, [(0, 'Web', 27), (1, 'Web', 27), (2, 'Batch', None), (3, 'Web', 93)])
+    return TaxsaleSource(connection=taxsale_db)
+
+
+@pytest.fixture
+def pipeline(source, tmp_path):
+    """Pipeline replicating bids in batches of two identities."""
+    store = ReportingStore(str(tmp_path / 'store'))
+    return ReplicationPipeline(store, source=source, tables=['vg_BidTransactions'], batch_size=2)
+
+
+def test_sync_copies_in_bounded_batches(pipeline):
+    """All rows are copied and the high-water mark advances."""
+    result = pipeline.sync_table('vg_BidTransactions')
+    assert result['rows_copied'] == 4
+    assert result['batches'] == 2
+    assert pipeline.store.high_water('vg_BidTransactions') == 4
+
+    columns = pipeline.store.read_columns('vg_BidTransactions', ['BidId', 'VGProductID'], filters={'VGProductID': 27})
+    assert columns['BidId'].tolist() == [1, 2]
+    nulls = pipeline.store.read_columns('vg_BidTransactions', ['BidId'], filters={'VGProductID': None})
+    assert nulls['BidId'].tolist() == [3]
+
+
+def test_sync_is_incremental(pipeline, taxsale_db):
+    """A second pass only copies rows above the high-water mark."""
+    pipeline.sync()
+    insert_bids(taxsale_db, [(60, 'Web', 27)])
+    assert pipeline.sync()[0]['rows_copied'] == 1
+    assert pipeline.store.manifest('vg_BidTransactions')['row_count'] == 5
+
+
+def test_reports_run_off_replica(pipeline):
+    """Services read the replica through the same interface as the database."""
+    pipeline.sync()
+    engine = BidThroughputEngine(source=pipeline.store)
+    assert engine.update() == 4
+    series = {(s['product_id'], s['bid_source']): s['bids'] for s in engine.report()['series']}
+    assert series == {(-1, 'Batch'): 1, (27, 'Web'): 2, (93, 'Web'): 1}
+
+
+def test_lag_metrics(pipeline, source, taxsale_db):
+    """Lag reports how far the replica trails the source."""
+    pipeline.sync()
+    insert_bids(taxsale_db, [(60, 'Web', 27)] * 3)
+
+    metrics = replication_lag(pipeline.store, source=source, tables=['vg_BidTransactions'])[0]
+    assert metrics['high_water'] == 4
+    assert metrics['keys_behind'] == 3
+    assert metrics['newest_timestamp'].startswith('2024-05-01T10:00:03')
+    assert metrics['seconds_since_sync'] >= 0
+
+
+def test_compacted_segments_outlive_readers_of_the_old_manifest(pipeline, taxsale_db, monkeypatch):
+    """A reader holding the pre-compaction manifest can still load its segments until the grace period ends."""
+    monkeypatch.setattr(reporting_store, 'MAX_SEGMENTS', 2)
+    store = pipeline.store
+    pipeline.sync()
+    reader = ReportingStore(store.root)
+    stale = reader.manifest('vg_BidTransactions')
+
+    insert_bids(taxsale_db, [(60, 'Web', 27)])
+    pipeline.sync()
+    assert len(store.manifest('vg_BidTransactions')['segments']) == 1
+    assert reader._load_segments('vg_BidTransactions', stale, ['BidId'])['BidId'].tolist() == [1, 2, 3, 4]
+
+    monkeypatch.setattr(reporting_store, 'SEGMENT_GRACE_PERIOD', -1)
+    insert_bids(taxsale_db, [(61, 'Web', 27)])
+    pipeline.sync()
+    manifest = store.manifest('vg_BidTransactions')
+    assert manifest['retired'] == []
+    with pytest.raises(FileNotFoundError):
+        reader._load_segments('vg_BidTransactions', stale, ['BidId'])
+    assert reader.read_columns('vg_BidTransactions', ['BidId'])['BidId'].tolist() == [1, 2, 3, 4, 5, 6]
@@ -0,0 +1,80 @@
+"""
+Unit tests for the compiled saved-search engine
+"""
+import pytest
+from app.services.db import TaxsaleSource
+from app.services.saved_search import SavedSearchEngine, SearchCompileError
+
+
+@pytest.fixture
+def source(taxsale_db, taxsale_tables):
+    """Search metadata, two saved searches and one county's certificates."""
+    taxsale_tables('vg_SearchCriteria', 'vg_SearchType', 'vg_SavedSearches', 'vg_SavedSearchCriteria',
+                   'vg_CountyInfo', 'vg_TaxCertificateFile27', 'vg_TaxCertificateView27')
+    taxsale_db.executescript("""
+        INSERT INTO dbo.vg_SearchCriteria (TableColumn, TableName, ColumnDescription, SearchType) VALUES
+            ('LocCity', 'vg_TaxCertificateFile', 'City', 'Text'),
+            ('JustValue', 'vg_TaxCertificateFile', 'Just Value', 'Numeric'),
+            ('CondoComplex', 'vg_TaxCertificateView', 'Condo Complex', 'Text');
+        INSERT INTO dbo.vg_SearchType (Condition, sqlConditionValue) VALUES ('Is greater than', '>');
+        INSERT INTO dbo.vg_CountyInfo (VGProductID, TaxCertTableName, TaxViewTableName) VALUES
+            (27, 'vg_TaxCertificateFile27', 'vg_TaxCertificateView27');
+
+        INSERT INTO dbo.vg_SavedSearches (SearchID, UserID, SearchName, VGProductID) VALUES
+            (1, 'u', 'Ocala over 50k', 27), (2, 'u', 'Lakes', 27);
+        INSERT INTO dbo.vg_SavedSearchCriteria (SavedSearchID, SearchColumn, SearchFunction, SearchValue,
+                                                SqlStatement) VALUES
+            (1, 'City', 'Starts With', 'Oca', 'DROP TABLE dbo.vg_CountyInfo'),
+            (1, 'JustValue', 'Is greater than', '$50,000', NULL),
+            (2, 'Condo Complex', 'contains', '100%', NULL);
+    """)
+    taxsale_db.executemany(
+        "INSERT INTO dbo.vg_TaxCertificateFile27 (PropertyNo, LocCity, JustValue) VALUES (?, ?, ?)",
+        [('P-%03d' % i, 'OCALA' if i % 2 else 'Dunnellon', 40000 + i * 1000) for i in range(30)])
+    taxsale_db.executemany(
+        "INSERT INTO dbo.vg_TaxCertificateView27 (PropertyNumber, CondoComplex) VALUES (?, ?)",
+        [('P-001', 'Lakes 100% Club'), ('P-002', 'Lakes 1000')])
+    return TaxsaleSource(connection=taxsale_db, dialect='sqlite')
+
+
+def test_compiles_parameterized_query(source):
+    """Criteria become bound parameters; the stored SqlStatement is never used."""
+    engine = SavedSearchEngine(source=source)
+    compiled = engine.compile(1)
+    assert 'Oca' not in compiled.sql and 'DROP' not in compiled.sql
+    assert compiled.params == ('Oca%', 50000.0)
+    assert engine.compile(1) is compiled
+    assert (engine.hits, engine.misses) == (1, 1)
+
+
+def test_pages_and_total(source):
+    """Pages are ordered by property and report whether more rows follow."""
+    engine = SavedSearchEngine(source=source, result_ttl=0)
+    first = engine.run(1, page=1, page_size=4, include_total=True)
+    # Odd properties above 50,000: P-011 .. P-029
+    assert first['total'] == 10
+    assert [row['PropertyNo'] for row in first['rows']] == ['P-011', 'P-013', 'P-015', 'P-017']
+    assert first['has_more']
+    last = engine.run(1, page=3, page_size=4)
+    assert [row['PropertyNo'] for row in last['rows']] == ['P-027', 'P-029']
+    assert not last['has_more']
+
+
+def test_view_columns_and_literal_wildcards(source):
+    """View columns join the property view and LIKE wildcards in values match literally."""
+    result = SavedSearchEngine(source=source).run(2)
+    assert [row['PropertyNo'] for row in result['rows']] == ['P-001']
+
+
+def test_invalidate_and_errors(source, taxsale_db):
+    """Edited searches recompile after invalidation; bad criteria are rejected."""
+    engine = SavedSearchEngine(source=source)
+    engine.compile(1)
+    taxsale_db.execute("UPDATE dbo.vg_SavedSearchCriteria SET SearchFunction = 'sounds like' "
+                       "WHERE SavedSearchID = 1 AND SearchColumn = 'City'")
+    assert engine.compile(1).params == ('Oca%', 50000.0)
+    engine.invalidate(1)
+    with pytest.raises(SearchCompileError):
+        engine.compile(1)
+    with pytest.raises(SearchCompileError):
+        engine.compile(404)
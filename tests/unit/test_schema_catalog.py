@@ -0,0 +1,67 @@
+"""
+Unit tests for the schema catalog
+"""
+import json
+import pytest
+from app.services import schema_catalog
+from app.services.schema_catalog import get_catalog, Column
+
+DDL = """CREATE TABLE [dbo].[vg_Widgets](
+\t[WidgetID] [int] IDENTITY(1,1) NOT NULL,
+\t[Name] [varchar](max) NULL,
+ CONSTRAINT [PK_vg_Widgets] PRIMARY KEY CLUSTERED
+(
+\t[WidgetID] ASC
+)WITH (PAD_INDEX = OFF) ON [PRIMARY]
+) ON [PRIMARY]
+GO
+"""
+
+
+@pytest.fixture(autouse=True)
+def fresh_catalogs(monkeypatch):
+    """Each test starts without the per-process catalog memo."""
+    monkeypatch.setattr(schema_catalog, '_catalogs', {})
+
+
+def test_parses_repo_scripts():
+    """Tables, keys, defaults, foreign keys and views come out of sql/."""
+    catalog = get_catalog()
+    assert catalog.has_table('VG_BIDBUDGET')
+    assert catalog.primary_key('vg_BidBudget') == ['BidBudgetID']
+    assert catalog.column('vg_BidBudget', 'budgetamount') == Column('BudgetAmount', 'decimal', 18, 2, False, False,
+                                                                    None)
+    assert catalog.column('vg_BidBudget', 'ActivityDate').default == '(getdate())'
+    assert catalog.column('vg_BidBudget', 'BidBudgetID').identity
+
+    assert catalog.foreign_keys('vg_ActivityBid')[0]['ref_table'] == 'vg_ActivityBaseTable'
+    assert [k['table'] for k in catalog.referenced_by('vg_ActivityBaseTable')] == ['vg_ActivityBid']
+
+    view = catalog.view('vg_CountyBidCoverageView')
+    assert view['columns'] == ['VGProductID', 'CountyName', 'ItemCount', 'BiddedProperties', 'Coverage']
+    assert view['references'] == ['vg_CountyBidCountView', 'vg_CountyInfo', 'vg_Queues']
+    assert catalog.view('vw_aspnet_Profiles')['columns'][-1] == 'DataSize'
+    assert 'vg_TaxCertificateFile27' in catalog.tables_matching(r'vg_TaxCertificateFile\d+')
+
+
+def test_serialized_cache_is_reused(tmp_path, monkeypatch):
+    """A fresh process loads the JSON cache instead of re-parsing, until a script changes."""
+    sql_dir = tmp_path / 'sql'
+    sql_dir.mkdir()
+    script = sql_dir / 'dbo.vg_Widgets.Table.sql'
+    script.write_bytes(DDL.encode('utf-16'))
+    cache_path = str(tmp_path / 'catalog.json')
+
+    catalog = get_catalog(str(sql_dir), cache_path=cache_path)
+    assert catalog.column('vg_Widgets', 'Name').length is None
+    with open(cache_path) as f:
+        assert json.load(f)['fingerprint'] == catalog.fingerprint
+
+    monkeypatch.setattr(schema_catalog, '_catalogs', {})
+    monkeypatch.setattr(schema_catalog, 'build_catalog', lambda sql_dir: pytest.fail('cache not used'))
+    assert get_catalog(str(sql_dir), cache_path=cache_path).primary_key('vg_Widgets') == ['WidgetID']
+
+    monkeypatch.undo()
+    monkeypatch.setattr(schema_catalog, '_catalogs', {})
+    script.write_bytes(DDL.replace('[Name]', '[Label]').encode('utf-16'))
+    assert get_catalog(str(sql_dir), cache_path=cache_path).column('vg_Widgets', 'Label') is not None
@@ -0,0 +1,51 @@
+"""
+Unit tests for Server-Timing headers
+"""
+from flask import jsonify
+from app import create_app
+from app.utils.metrics import track_upstream
+from app.utils.server_timing import format_header
+from config.testing import TestingConfig
+
+
+class TimingConfig(TestingConfig):
+    SERVER_TIMING_ENABLED = True
+
+
+def add_report_route(app):
+    @app.route('/timing-probe')
+    def timing_probe():
+        with track_upstream('grafana', 'query'):
+            pass
+        with track_upstream('grafana', 'query'):
+            pass
+        return jsonify({'success': True})
+
+
+def test_format_header_merges_repeated_steps():
+    header = format_header([('db', 2.0, 'query'), ('render', 1.25, 'pages/x.html'), ('db', 3.0, 'query'),
+                            ('parse', 0.5, 'say "hi"')], total_ms=10)
+    assert header == ('db;dur=5.0;desc="2 calls", render;dur=1.2;desc="pages/x.html", '
+                      'parse;dur=0.5;desc="say \'hi\'", total;dur=10.0')
+
+
+def test_steps_are_reported_in_the_response_header():
+    """Upstream calls, serialization, auth checks and template rendering each get an entry."""
+    app = create_app(TimingConfig)
+    add_report_route(app)
+    client = app.test_client()
+
+    header = client.get('/timing-probe').headers['Server-Timing']
+    names = [part.split(';')[0] for part in header.split(', ')]
+    assert names == ['grafana', 'serialize', 'total']
+    assert 'desc="2 calls"' in header
+
+    assert client.get('/dashboard').headers['Server-Timing'].startswith('auth;dur=')
+    login_header = client.get('/login').headers['Server-Timing']
+    assert login_header.startswith('render;dur=') and 'desc="auth/login.html"' in login_header
+
+
+def test_no_header_when_disabled():
+    app = create_app(TestingConfig)
+    add_report_route(app)
+    assert 'Server-Timing' not in app.test_client().get('/timing-probe').headers
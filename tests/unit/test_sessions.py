@@ -0,0 +1,108 @@
+"""
+Unit tests for server-side sessions
+"""
+from datetime import datetime, timezone
+from flask import session
+from flask.sessions import SecureCookieSessionInterface
+from app import create_app
+from app.utils.sessions import (LocalSessionStore, RedisSessionStore, SessionSerializer, ServerSessionInterface,
+                                init_sessions)
+from config.testing import TestingConfig
+
+
+class CountingStore(LocalSessionStore):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append('get')
+        return super().get(key)
+
+    def set(self, key, value, ttl):
+        self.calls.append('set')
+        super().set(key, value, ttl)
+
+    def delete(self, key):
+        self.calls.append('delete')
+        super().delete(key)
+
+
+def test_sessions_are_loaded_lazily_and_saved_only_when_changed():
+    app = create_app(TestingConfig)
+    store = CountingStore()
+    app.session_interface = ServerSessionInterface(store)
+    app.add_url_rule('/t/login', 'login_test', lambda: session.update(user_id=1) or 'ok')
+    app.add_url_rule('/t/whoami', 'whoami_test', lambda: str(session.get('user_id')))
+    app.add_url_rule('/t/plain', 'plain_test', lambda: 'plain')
+    app.add_url_rule('/t/logout', 'logout_test', lambda: session.clear() or 'bye')
+    client = app.test_client()
+
+    client.get('/t/login')
+    assert store.calls == ['set']
+    assert client.get('/t/whoami').data == b'1'
+    client.get('/t/plain')
+    assert store.calls == ['set', 'get']
+
+    client.get('/t/logout')
+    assert store.calls[-2:] == ['get', 'delete']
+    assert client.get('/t/whoami').data == b'None'
+
+
+def test_tampered_cookie_is_ignored():
+    app = create_app(TestingConfig)
+    app.add_url_rule('/t/login', 'login_test', lambda: session.update(user_id=1) or 'ok')
+    app.add_url_rule('/t/whoami', 'whoami_test', lambda: str(session.get('user_id')))
+    client = app.test_client()
+    client.get('/t/login')
+
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME'], domain='localhost.test')
+    sid = cookie.value.rsplit('.', 1)[0]
+    client.set_cookie(app.config['SESSION_COOKIE_NAME'], sid + '.forged', domain='localhost.test')
+    assert client.get('/t/whoami').data == b'None'
+
+
+def test_signing_in_moves_the_session_to_a_new_id():
+    app = create_app(TestingConfig)
+    store = CountingStore()
+    app.session_interface = ServerSessionInterface(store)
+    app.add_url_rule('/t/visit', 'visit_test', lambda: session.update(theme='dark') or 'ok')
+    app.add_url_rule('/t/whoami', 'whoami_test', lambda: f"{session.get('user_id')} {session.get('theme')}")
+    client = app.test_client()
+
+    client.get('/t/visit')
+    before = client.get_cookie(app.config['SESSION_COOKIE_NAME'], domain='localhost.test').value
+    client.post('/login', data={'email': 'demo@example.com', 'password': 'demo123'})
+    after = client.get_cookie(app.config['SESSION_COOKIE_NAME'], domain='localhost.test').value
+    assert after != before
+    assert len(store._entries) == 1
+    assert client.get('/t/whoami').data == b'1 dark'
+
+    # The pre-sign-in id no longer leads anywhere
+    client.set_cookie(app.config['SESSION_COOKIE_NAME'], before, domain='localhost.test')
+    assert client.get('/t/whoami').data == b'None None'
+
+
+def test_serializer_keeps_flask_types_and_compresses_large_sessions():
+    serializer = SessionSerializer(compress_threshold=512)
+    small = {'user_id': 1, 'at': datetime(2025, 3, 31, tzinfo=timezone.utc), 'ids': (1, 2)}
+    assert serializer.dumps(small)[:1] == SessionSerializer.RAW
+    assert serializer.loads(serializer.dumps(small)) == small
+
+    large = {'_flashes': [('info', 'Report generated')] * 100}
+    raw = serializer.dumps(large)
+    assert raw[:1] == SessionSerializer.COMPRESSED
+    assert len(raw) < 200
+    assert serializer.loads(raw) == large
+
+
+def test_redis_store_uses_pooled_client_and_falls_back_to_cookies():
+    app = create_app(TestingConfig)
+    app.config.update(SESSION_TYPE='redis', SESSION_REDIS=None)
+    assert init_sessions(app) is None
+    assert isinstance(app.session_interface, SecureCookieSessionInterface)
+
+    app.config.update(SESSION_REDIS='redis://localhost:6379/0', SESSION_REDIS_MAX_CONNECTIONS=5)
+    store = init_sessions(app)
+    assert isinstance(store, RedisSessionStore)
+    assert store.client.connection_pool.max_connections == 5
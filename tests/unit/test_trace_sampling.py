@@ -0,0 +1,62 @@
+"""
+Unit tests for adaptive Sentry trace sampling
+"""
+from flask import Flask, jsonify
+from app.utils.trace_sampling import TraceSampler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def context(path, parent_sampled=None):
+    return {'parent_sampled': parent_sampled, 'wsgi_environ': {'PATH_INFO': path, 'REQUEST_METHOD': 'GET'}}
+
+
+def test_rates_by_path_and_per_second_cap():
+    """Static and health paths are cheap, prefixes override the default, and the bucket caps volume."""
+    clock = FakeClock()
+    sampler = TraceSampler(default_rate=0.1, route_rates={'/reports/api/': 0.5}, max_per_second=2,
+                           clock=clock, rand=lambda: 0.0)
+    assert sampler.rate_for('/static/css/site.css') == 0.0
+    assert sampler.rate_for('/health') == 0.01
+    assert sampler.rate_for('/reports/api/counties') == 0.5
+    assert sampler.rate_for('/settings') == 0.1
+
+    assert sampler(context('/static/js/app.js')) == 0.0
+    assert [sampler(context('/settings')) for _ in range(3)] == [1.0, 1.0, 0.0]
+    clock.now += 0.5
+    assert sampler(context('/settings')) == 1.0
+    # Distributed traces keep the upstream decision, whatever the cap
+    assert sampler(context('/settings', parent_sampled=True)) == 1.0
+    assert sampler(context('/reports/api/counties', parent_sampled=False)) == 0.0
+
+
+def test_slow_and_failing_routes_are_sampled_in_full():
+    """Request timings and 5xx responses fed back from the app raise a route to 100%."""
+    clock = FakeClock()
+    sampler = TraceSampler(default_rate=0.0, slow_ms=50, error_boost_seconds=60, clock=clock)
+    app = Flask(__name__)
+
+    @app.route('/items/<int:item_id>')
+    def item(item_id):
+        if item_id == 0:
+            return jsonify({'success': False, 'error': 'boom'}), 500
+        return jsonify({'success': True})
+
+    sampler.init_app(app)
+    client = app.test_client()
+    client.get('/items/1')
+    assert sampler.rate_for('/items/2') == 0.0
+
+    client.get('/items/0')
+    assert sampler.rate_for('/items/2') == 1.0
+    clock.now += 61
+    assert sampler.rate_for('/items/2') == 0.0
+
+    sampler.record('/items/<int:item_id>', 5000)
+    assert sampler.rate_for('/items/3') == 1.0
@@ -0,0 +1,179 @@
+"""
+Unit tests for the authenticated user directory
+"""
+import pytest
+from app import create_app
+from app.routes.auth import current_user, login_required, role_required
+from app.services import user_directory
+from app.services.db import TaxsaleSource
+from app.services.user_directory import UserDirectory
+from config.testing import TestingConfig
+
+ALICE = '6F9619FF-8B86-D011-B42D-00C04FC964FF'
+BOB = '7A1B2C3D-0000-4000-8000-000000000002'
+CAROL = '7A1B2C3D-0000-4000-8000-000000000003'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingSource(TaxsaleSource):
+    def __init__(self, connection):
+        super().__init__(connection=connection, dialect='sqlite')
+        self.queries = 0
+
+    def query(self, sql, params=()):
+        self.queries += 1
+        return super().query(sql, params)
+
+
+@pytest.fixture
+def membership_db(taxsale_db, taxsale_tables):
+    """Alice is an admin and bidder, Bob a locked-out bidder, Carol has no roles or details."""
+    taxsale_tables('vw_aspnet_MembershipUsers', 'vg_UserDetails', 'vw_aspnet_Roles', 'vw_aspnet_UsersInRoles')
+    taxsale_db.executescript(f"""
+        INSERT INTO dbo.vw_aspnet_MembershipUsers (UserId, UserName, Email, IsApproved, IsLockedOut) VALUES
+            ('{ALICE}', 'alice', 'alice@example.com', 1, 0), ('{BOB}', 'bob', 'bob@example.com', 1, 1),
+            ('{CAROL}', 'carol', 'carol@example.com', 1, 0);
+        INSERT INTO dbo.vg_UserDetails (UserId, FirstName, LastName, Company) VALUES
+            ('{ALICE}', 'Alice', 'Avery', 'Volusia County'),
+            ('{BOB}', 'Bob', 'Baker', 'Bidders LLC');
+        INSERT INTO dbo.vw_aspnet_Roles (RoleId, RoleName, LoweredRoleName) VALUES
+            (1, 'Admin', 'admin'), (2, 'Bidder', 'bidder');
+        INSERT INTO dbo.vw_aspnet_UsersInRoles (UserId, RoleId) VALUES ('{ALICE}', 1), ('{ALICE}', 2), ('{BOB}', 2);
+    """)
+    return taxsale_db
+
+
+@pytest.fixture
+def directory(membership_db):
+    return UserDirectory(source=CountingSource(membership_db), ttl=60, clock=Clock())
+
+
+def test_users_resolve_in_one_query_and_are_served_from_cache(directory):
+    users = directory.get_many([ALICE, BOB, CAROL, 'unknown'])
+    assert directory.source.queries == 1
+    alice = users[ALICE.lower()]
+    assert (alice.UserName, alice.LastName, alice.roles) == ('alice', 'Avery', frozenset({'admin', 'bidder'}))
+    assert alice.has_role('ADMIN') and alice.active
+    assert not users[BOB.lower()].active
+    assert users[CAROL.lower()].roles == frozenset() and users[CAROL.lower()].FirstName is None
+    assert users['unknown'] is None
+
+    assert directory.get(ALICE.lower()) is alice
+    assert directory.get('unknown') is None
+    assert directory.source.queries == 1
+
+    directory.clock.now += 61
+    directory.get(ALICE)
+    assert directory.source.queries == 2
+
+
+def test_role_change_invalidates_in_bulk(directory, membership_db):
+    directory.get_many([ALICE, BOB, CAROL])
+    membership_db.execute("UPDATE dbo.vw_aspnet_Roles SET LoweredRoleName = 'buyer' WHERE RoleId = 2")
+
+    assert directory.invalidate_role('Bidder') == 2
+    assert directory.get(CAROL).roles == frozenset()
+    assert directory.source.queries == 1
+    assert directory.get_many([ALICE, BOB])[BOB.lower()].roles == frozenset({'buyer'})
+    assert directory.source.queries == 2
+
+    assert directory.invalidate_all() == 1
+    directory.get(CAROL)
+    assert directory.source.queries == 3
+
+
+def test_login_required_resolves_the_user_once_per_request(directory, monkeypatch):
+    monkeypatch.setattr(user_directory, '_directory', directory)
+    app = create_app(TestingConfig)
+    app.config['USER_DIRECTORY_ENABLED'] = True
+
+    @login_required
+    def whoami():
+        return current_user().UserName
+
+    @role_required('admin')
+    def admin():
+        return 'admin'
+
+    app.add_url_rule('/t/whoami', 'whoami_test', whoami)
+    app.add_url_rule('/t/admin', 'admin_test', admin)
+    client = app.test_client()
+
+    with client.session_transaction() as sess:
+        sess['user_id'] = ALICE
+    assert client.get('/t/whoami').data == b'alice'
+    assert client.get('/t/admin').data == b'admin'
+    assert directory.source.queries == 1
+
+    with client.session_transaction() as sess:
+        sess['user_id'] = BOB
+    response = client.get('/t/whoami')
+    assert response.status_code == 302 and '/login' in response.location
+    with client.session_transaction() as sess:
+        assert 'user_id' not in sess
+
+    with client.session_transaction() as sess:
+        sess['user_id'] = CAROL
+    assert client.get('/t/admin').status_code == 403
+    assert client.post('/reports/api/counties/refresh').status_code == 403
+    assert client.post('/reports/api/bidder-numbers/27/allocate').status_code == 403
+    assert client.delete('/reports/api/bidder-numbers/pending').status_code == 403
+    assert client.get('/reports/api/bid-exposure').status_code == 403
+    assert client.get(f'/reports/api/bid-exposure/users/{ALICE}').status_code == 403
+    assert client.get(f'/reports/api/activity/users/{ALICE}').status_code == 403
+    assert client.get('/reports/api/activity/daily').status_code == 403
+    assert client.get('/reports/api/payments/reconciliation/27').status_code == 403
+    assert client.get(f'/reports/api/bidder-numbers/27/users/{ALICE}').status_code == 403
+    assert client.get('/reports/api/queues/2/load-forecast').status_code == 403
+    assert client.get(f'/reports/api/activity/users/{CAROL.lower()}?start=2024-13-01').status_code == 400
+
+    # The demo sign-in's integer id never reaches the uniqueidentifier column
+    queries = directory.source.queries
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    assert client.get('/t/whoami').status_code == 302
+    assert directory.source.queries == queries
+
+    # Signing out drops the cached entry, so the next sign-in reads current roles
+    with client.session_transaction() as sess:
+        sess['user_id'] = ALICE
+    client.get('/logout')
+    with client.session_transaction() as sess:
+        sess['user_id'] = ALICE
+    client.get('/t/whoami')
+    assert directory.source.queries == queries + 1
+
+
+def test_demo_sign_in_has_the_configured_roles(tmp_path):
+    app = create_app(TestingConfig)
+    app.config['DEMO_USER_ROLES'] = ('Administrator',)
+    app.config['REPORTING_STORE_DIR'] = str(tmp_path)
+    client = app.test_client()
+    client.post('/login', data={'email': 'demo@example.com', 'password': 'demo123'})
+    assert client.get('/reports/api/payments/reconciliation/27').status_code == 404
+    assert client.get('/reports/api/queues/2/load-forecast').status_code == 400
+
+
+def test_lookup_overlapping_an_invalidation_is_not_cached(directory):
+    directory.get(ALICE)
+    directory.clock.now += 61
+    load = directory._load
+
+    def load_then_revoke(user_ids):
+        users = load(user_ids)
+        # The role is revoked while these rows are on their way back
+        directory.invalidate_role('admin')
+        return users
+
+    directory._load = load_then_revoke
+    assert directory.get(ALICE).has_role('admin')
+    directory._load = load
+    directory.get(ALICE)
+    assert directory.source.queries == 3